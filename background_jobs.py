@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Background Jobs - 交互模式的后台任务
+每个提交的任务在后台线程中运行，提示符立即返回，一个人可以同时跑多个任务：
+
+- jobs / status <id> / show <id> / cancel <id> / save <id> 管理任务
+- 任务阶段变化时在提示符上方刷新一行进度
+- 同时运行的任务数有上限（QUAD_MAX_JOBS / --jobs），超出的排队
+- 后台任务的控制台输出按线程收集到各自的日志里，不会打乱提示符
+
+流水线只需提供 progress 钩子：每进入一个阶段调用 system.progress(阶段名)，
+取消在阶段边界生效（进行中的 LLM 请求会先完成）。
+
+环境变量:
+    QUAD_MAX_JOBS  同时运行的后台任务数 (默认: 2)
+"""
+
+import io
+import os
+import sys
+import time
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_JOBS = int(os.getenv("QUAD_MAX_JOBS", "2"))
+
+PROMPT = "\n🎯 任务> "
+
+STATUS_ICONS = {
+    "queued": "⏸️",
+    "running": "🔄",
+    "done": "✅",
+    "failed": "❌",
+    "cancelled": "🚫",
+}
+
+
+class JobCancelled(Exception):
+    """任务在阶段边界被取消"""
+
+
+# ============== 按线程分流的标准输出 ==============
+
+class ThreadRoutedOutput:
+    """
+    替换 sys.stdout：后台任务线程的输出写入该任务的日志，其他线程照常输出
+
+    原始流保存在 console 中，进度行等需要直接显示的内容写到这里。
+    """
+
+    def __init__(self, console):
+        self.console = console
+        self._local = threading.local()
+
+    def capture(self, buffer: Optional[io.StringIO]):
+        """当前线程的输出写入 buffer（None 恢复为控制台）"""
+        self._local.buffer = buffer
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.console.write(text)
+
+    def flush(self):
+        if getattr(self._local, "buffer", None) is None:
+            self.console.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.console, name)
+
+
+# ============== 任务 ==============
+
+@dataclass
+class Job:
+    job_id: int
+    task: str
+    status: str = "queued"
+    stage: str = ""
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stages: List[Tuple[str, float]] = field(default_factory=list)  # (阶段, 开始时间)
+    system: Any = None
+    result: Any = None
+    error: Optional[str] = None
+    report: Optional[str] = None
+    log: io.StringIO = field(default_factory=io.StringIO)
+    future: Optional[Future] = None
+    cancel_requested: threading.Event = field(default_factory=threading.Event)
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def enter_stage(self, stage: str):
+        """流水线进入新阶段；已请求取消时在这里中断"""
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+        self.stage = stage
+        self.stages.append((stage, time.time()))
+
+    def stage_timings(self) -> List[Tuple[str, float]]:
+        """各阶段耗时（秒），最后一个阶段算到结束或当前"""
+        end = self.finished_at or time.time()
+        timings = []
+        for i, (stage, started) in enumerate(self.stages):
+            stopped = self.stages[i + 1][1] if i + 1 < len(self.stages) else end
+            timings.append((stage, stopped - started))
+        return timings
+
+    def describe(self) -> str:
+        task = self.task if len(self.task) <= 30 else self.task[:30] + "…"
+        stage = f" {self.stage}" if self.status == "running" and self.stage else ""
+        return f"{STATUS_ICONS[self.status]} #{self.job_id}{stage} {self.elapsed():.0f}s  {task}"
+
+
+class JobManager:
+    """
+    后台任务管理
+
+    Args:
+        create_system: 创建流水线实例（每个任务一个实例，互不共享状态）
+        run: run(system, task) 执行流水线并返回结果
+        max_jobs: 同时运行的任务数
+        auto_save: 完成后是否自动保存报告
+    """
+
+    def __init__(self, create_system: Callable[[], Any], run: Callable[[Any, str], Any],
+                 max_jobs: int = MAX_JOBS, auto_save: bool = True):
+        self.create_system = create_system
+        self.run = run
+        self.max_jobs = max_jobs
+        self.auto_save = auto_save
+        self.jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="quad-job")
+        self._print_lock = threading.Lock()
+        self._closing = False
+        self.output = sys.stdout if isinstance(sys.stdout, ThreadRoutedOutput) \
+            else ThreadRoutedOutput(sys.stdout)
+
+    def install(self):
+        """接管 sys.stdout，使后台任务的输出进入各自日志"""
+        sys.stdout = self.output
+
+    def uninstall(self):
+        sys.stdout = self.output.console
+
+    # ---------- 提交与执行 ----------
+
+    def submit(self, task: str) -> Job:
+        job = Job(next(self._ids), task)
+        self.jobs[job.job_id] = job
+        job.future = self._executor.submit(self._execute, job)
+        if sum(1 for j in self.jobs.values() if j.status == "running") >= self.max_jobs:
+            self.notify(f"⏸️ #{job.job_id} 已排队（同时最多运行 {self.max_jobs} 个任务）")
+        return job
+
+    def _execute(self, job: Job):
+        if job.cancel_requested.is_set():
+            job.status = "cancelled"
+            return
+        self.output.capture(job.log)
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.system = self.create_system()
+            job.system.progress = lambda stage: self._on_stage(job, stage)
+            job.result = self.run(job.system, job.task)
+            if self.auto_save:
+                job.report = job.system.save_report(job.result)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            import traceback
+            traceback.print_exc(file=job.log)
+        finally:
+            job.finished_at = time.time()
+            self.output.capture(None)
+        self.notify(self._finished_line(job))
+
+    def _on_stage(self, job: Job, stage: str):
+        job.enter_stage(stage)
+        self.notify(self.progress_line())
+
+    def _finished_line(self, job: Job) -> str:
+        if job.status == "done":
+            suffix = f"，报告: {job.report}" if job.report else "，save 保存报告"
+            return f"✅ #{job.job_id} 完成 ({job.elapsed():.0f}s){suffix}"
+        if job.status == "cancelled":
+            return f"🚫 #{job.job_id} 已取消"
+        return f"❌ #{job.job_id} 失败: {job.error}（show {job.job_id} 查看日志）"
+
+    # ---------- 显示 ----------
+
+    def progress_line(self) -> str:
+        """所有进行中/排队任务的单行进度"""
+        active = [j for j in self.jobs.values() if j.status in ("running", "queued")]
+        if not active:
+            return "💤 没有进行中的任务"
+        return "⏳ " + "  ".join(
+            f"[#{j.job_id} {j.stage or '排队'} {j.elapsed():.0f}s]" for j in active)
+
+    def notify(self, line: str):
+        """在提示符上方插入一行，并重绘提示符"""
+        with self._print_lock:
+            prompt = "\n" if self._closing else PROMPT
+            self.output.console.write(f"\r\033[K{line}{prompt}")
+            self.output.console.flush()
+
+    # ---------- 命令 ----------
+
+    def get(self, job_id: str) -> Optional[Job]:
+        try:
+            return self.jobs.get(int(job_id.lstrip("#")))
+        except ValueError:
+            return None
+
+    def cancel(self, job: Job) -> str:
+        if job.status in ("done", "failed", "cancelled"):
+            return f"ℹ️ #{job.job_id} 已结束"
+        job.cancel_requested.set()
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+            return f"🚫 #{job.job_id} 已从队列移除"
+        return f"🛑 #{job.job_id} 将在当前阶段结束后取消"
+
+    def status_text(self, job: Job) -> str:
+        lines = [job.describe(), f"   任务: {job.task}"]
+        for stage, seconds in job.stage_timings():
+            lines.append(f"   · {stage:<16} {seconds:.1f}s")
+        if job.error:
+            lines.append(f"   错误: {job.error}")
+        if job.report:
+            lines.append(f"   报告: {job.report}")
+        return "\n".join(lines)
+
+    def shutdown(self):
+        """取消排队和进行中的任务并等待线程退出"""
+        self._closing = True
+        running = False
+        for job in self.jobs.values():
+            if job.status in ("queued", "running"):
+                running = running or job.status == "running"
+                self.cancel(job)
+        if running:
+            print("⏳ 等待进行中的任务在当前阶段结束...")
+        self._executor.shutdown(wait=True)
+
+
+# ============== REPL ==============
+
+HELP = """命令:
+  <任务描述>      在后台启动任务（提示符立即返回）
+  jobs           列出全部任务
+  status <id>    查看任务各阶段耗时
+  show <id>      查看任务的完整输出
+  cancel <id>    取消任务（进行中的任务在当前阶段结束后停止）
+  save <id>      保存任务报告
+  quit/exit      退出（会取消未完成的任务）"""
+
+
+def run_repl(manager: JobManager, banner: str):
+    """后台任务版交互模式"""
+    print(banner)
+    print(HELP)
+    print(f"\n   同时运行上限: {manager.max_jobs} 个任务")
+
+    manager.install()
+    try:
+        while True:
+            try:
+                line = input(PROMPT).strip()
+            except (KeyboardInterrupt, EOFError):
+                print("\n\n👋 再见!")
+                break
+            if not line:
+                continue
+
+            command, _, arg = line.partition(" ")
+            command = command.lower()
+            arg = arg.strip()
+
+            if command in ("quit", "exit", "q"):
+                print("👋 再见!")
+                break
+            if command in ("help", "?"):
+                print(HELP)
+                continue
+            if command == "jobs":
+                if not manager.jobs:
+                    print("ℹ️ 还没有任务")
+                for job in manager.jobs.values():
+                    print(f"  {job.describe()}")
+                continue
+            if command in ("status", "show", "cancel", "save"):
+                if not arg:
+                    # 不带编号的指令词不能当作任务提交
+                    print(f"⚠️ 用法: {command} <id>")
+                    continue
+                job = manager.get(arg)
+                if job is None:
+                    print(f"⚠️ 没有任务 #{arg}")
+                    continue
+                if command == "status":
+                    print(manager.status_text(job))
+                elif command == "show":
+                    print(job.log.getvalue() or "（暂无输出）")
+                elif command == "cancel":
+                    print(manager.cancel(job))
+                elif job.result is None:
+                    print(f"⚠️ #{job.job_id} 还没有结果")
+                elif job.report:
+                    # 已保存（含自动保存）的任务不再重复归档
+                    print(f"ℹ️ #{job.job_id} 已保存: {job.report}")
+                else:
+                    job.report = job.system.save_report(job.result)
+                continue
+
+            job = manager.submit(line)
+            print(f"🚀 #{job.job_id} 已启动，jobs 查看进度")
+    finally:
+        manager.shutdown()
+        manager.uninstall()
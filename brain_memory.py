@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Brain Memory - 四脑 Bot 的频道级对话记忆
+按 (频道, 脑) 保存最近几轮对话：
+- 每个会话是定长环形缓冲区，并受 Token 预算约束，超出的旧轮次压缩进滚动摘要
+- 内存中最多保留 MAX_CONVERSATIONS 个会话（LRU 淘汰），服务多少频道内存都不增长
+- 可选 SQLite 持久化（写穿），重启或被淘汰后再次访问时自动加载
+
+环境变量:
+    FOUR_BRAIN_MEMORY_DB  SQLite 文件路径（不设置则只在内存中保存）
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from run_budget import estimate_tokens
+
+MEMORY_DB = os.getenv("FOUR_BRAIN_MEMORY_DB", "")
+
+MAX_TURNS = 12              # 每个会话保留的最近消息条数（用户 + 回复各算一条）
+TOKEN_BUDGET = 1500         # 每个会话原文部分的 Token 上限
+MAX_CONVERSATIONS = 500     # 内存中最多保留的会话数
+SUMMARY_MAX_CHARS = 600     # 滚动摘要最大长度
+SNIPPET_CHARS = 80          # 压缩时每条消息保留的字符数
+
+
+@dataclass
+class Conversation:
+    """单个 (频道, 脑) 的对话记忆"""
+    turns: Deque[Tuple[str, str]] = field(default_factory=lambda: deque(maxlen=MAX_TURNS))
+    summary: str = ""
+
+    def tokens(self) -> int:
+        return sum(estimate_tokens(content) for _, content in self.turns) + estimate_tokens(self.summary)
+
+
+def _compact_line(role: str, content: str) -> str:
+    speaker = "用户" if role == "user" else "我"
+    text = " ".join(content.split())
+    if len(text) > SNIPPET_CHARS:
+        text = text[:SNIPPET_CHARS] + "…"
+    return f"{speaker}：{text}"
+
+
+class ConversationMemory:
+    """
+    有界的多会话记忆
+
+    单个会话的大小由 MAX_TURNS / TOKEN_BUDGET / SUMMARY_MAX_CHARS 限定，
+    会话数量由 MAX_CONVERSATIONS 限定，因此总内存有固定上限。
+    """
+
+    def __init__(self, db_path: Optional[str] = MEMORY_DB,
+                 max_turns: int = MAX_TURNS, token_budget: int = TOKEN_BUDGET,
+                 max_conversations: int = MAX_CONVERSATIONS):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[Tuple[str, str], Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_memory (
+                    channel_id TEXT NOT NULL,
+                    brain_id TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    turns TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (channel_id, brain_id)
+                )
+            """)
+            self._db.commit()
+
+    # ---------- 读取 ----------
+
+    def _get(self, key: Tuple[str, str]) -> Conversation:
+        """取出会话并标记为最近使用；不在内存中时尝试从 SQLite 加载"""
+        conversation = self._conversations.get(key)
+        if conversation is not None:
+            self._conversations.move_to_end(key)
+            return conversation
+
+        conversation = Conversation(turns=deque(maxlen=self.max_turns))
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT summary, turns FROM conversation_memory WHERE channel_id = ? AND brain_id = ?",
+                key
+            ).fetchone()
+            if row:
+                conversation.summary = row[0]
+                conversation.turns.extend(tuple(turn) for turn in json.loads(row[1]))
+
+        self._conversations[key] = conversation
+        while len(self._conversations) > self.max_conversations:
+            # 淘汰最久未使用的会话；开启持久化时数据已在 SQLite 中
+            self._conversations.popitem(last=False)
+        return conversation
+
+    def history(self, channel_id: Optional[str], brain_id: str) -> List[Dict[str, str]]:
+        """
+        组装可直接拼进 messages 的历史
+
+        Returns:
+            [{"role": "system", "content": 摘要}, {"role": "user"/"assistant", ...}, ...]
+        """
+        if not channel_id:
+            return []
+        with self._lock:
+            conversation = self._get((channel_id, brain_id))
+            messages = []
+            if conversation.summary:
+                messages.append({"role": "system", "content": f"【之前对话摘要】\n{conversation.summary}"})
+            messages.extend({"role": role, "content": content} for role, content in conversation.turns)
+            return messages
+
+    # ---------- 写入 ----------
+
+    def append(self, channel_id: Optional[str], brain_id: str, user_message: str, reply: str):
+        """记录一轮对话，超出预算时压缩旧轮次"""
+        if not channel_id:
+            return
+        key = (channel_id, brain_id)
+        with self._lock:
+            conversation = self._get(key)
+            for role, content in (("user", user_message), ("assistant", reply)):
+                if len(conversation.turns) == conversation.turns.maxlen:
+                    # 环形缓冲区满，最旧的一条先进入摘要
+                    self._fold(conversation, [conversation.turns.popleft()])
+                conversation.turns.append((role, content))
+            self._compact(conversation)
+            self._persist(key, conversation)
+
+    def _compact(self, conversation: Conversation):
+        """原文超出 Token 预算时，把最旧的一问一答压缩进摘要（至少保留最近一轮）"""
+        while conversation.tokens() > self.token_budget and len(conversation.turns) > 2:
+            self._fold(conversation, [conversation.turns.popleft(), conversation.turns.popleft()])
+
+    @staticmethod
+    def _fold(conversation: Conversation, turns: List[Tuple[str, str]]):
+        lines = [_compact_line(role, content) for role, content in turns]
+        summary = "\n".join(filter(None, [conversation.summary] + lines))
+        if len(summary) > SUMMARY_MAX_CHARS:
+            # 只保留较新的摘要内容
+            summary = summary[-SUMMARY_MAX_CHARS:]
+            summary = summary[summary.find("\n") + 1:] if "\n" in summary else summary
+        conversation.summary = summary
+
+    def _persist(self, key: Tuple[str, str], conversation: Conversation):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO conversation_memory VALUES (?, ?, ?, ?, ?)",
+            (key[0], key[1], conversation.summary,
+             json.dumps(list(conversation.turns), ensure_ascii=False),
+             datetime.now().isoformat())
+        )
+        self._db.commit()
+
+    def forget(self, channel_id: str, brain_id: Optional[str] = None):
+        """清除频道记忆（brain_id 为空时清除该频道全部脑）"""
+        with self._lock:
+            for key in [k for k in self._conversations
+                        if k[0] == channel_id and (brain_id is None or k[1] == brain_id)]:
+                del self._conversations[key]
+            if self._db is not None:
+                if brain_id is None:
+                    self._db.execute("DELETE FROM conversation_memory WHERE channel_id = ?", (channel_id,))
+                else:
+                    self._db.execute(
+                        "DELETE FROM conversation_memory WHERE channel_id = ? AND brain_id = ?",
+                        (channel_id, brain_id)
+                    )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """内存占用概况"""
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "turns": sum(len(c.turns) for c in self._conversations.values()),
+                "tokens": sum(c.tokens() for c in self._conversations.values()),
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Brain Workers - 四脑 Bot 的进程拆分模式
+Discord 网关进程只负责收发指令，LLM 编排、JSON 处理和 Webhook 投递都放到
+工作进程里执行，再多的讨论同时进行也不会拖慢网关进程的事件循环（心跳）。
+
+- 任务通过 multiprocessing 队列下发，结果通过结果队列回传
+- 同一频道的任务固定分给同一个工作进程，频道记忆保持连续
+- 网关侧取消任务（指令被取代）时，对应工作进程中的协程一并取消
+- 工作进程异常退出（OOM、段错误等）时，分给它的任务立即以错误结束，并重启该进程
+- 每个任务有超时上限，超时后取消并释放指令队列的位置
+
+环境变量:
+    FOUR_BRAIN_WORKERS            工作进程数 (默认: 0，即在 Bot 进程内执行)
+    FOUR_BRAIN_WORKER_CONCURRENCY 每个工作进程同时处理的任务数 (默认: 4)
+    FOUR_BRAIN_JOB_TIMEOUT        单个任务的超时秒数 (默认: 600)
+"""
+
+import os
+import time
+import zlib
+import asyncio
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait as wait_sentinels
+from typing import Any, Dict, List, Optional
+
+WORKERS = int(os.getenv("FOUR_BRAIN_WORKERS", "0"))
+WORKER_CONCURRENCY = int(os.getenv("FOUR_BRAIN_WORKER_CONCURRENCY", "4"))
+JOB_TIMEOUT = float(os.getenv("FOUR_BRAIN_JOB_TIMEOUT", "600"))
+RESTART_DELAY = 1.0       # 工作进程退出后等待多久再重启（避免启动即崩溃时反复重启）
+
+
+# ============== 工作进程 ==============
+
+async def _handle_job(collaboration, job: Dict) -> Any:
+    """在工作进程中执行一个任务"""
+    if job["kind"] == "single":
+        return await collaboration.single_brain_response(job["brain_id"], job["message"], job["channel_id"])
+    if job["kind"] == "discussion":
+        return await collaboration.collaborative_discussion(job["message"], job["channel_id"])
+    if job["kind"] == "forget":
+        collaboration.memory.forget(job["channel_id"])
+        return None
+    raise ValueError(f"未知任务类型: {job['kind']}")
+
+
+async def _worker_loop(worker_id: int, job_queue, result_queue):
+    # 延迟导入：只有工作进程需要完整的编排代码
+    from four_brain_system import FourBrainCollaboration
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(WORKER_CONCURRENCY)
+    running: Dict[int, asyncio.Task] = {}
+
+    async def run(job: Dict):
+        start_time = time.time()
+        try:
+            async with semaphore:
+                result = await _handle_job(collaboration, job)
+            result_queue.put({"job_id": job["job_id"], "ok": True, "result": result,
+                              "elapsed": time.time() - start_time})
+        except asyncio.CancelledError:
+            result_queue.put({"job_id": job["job_id"], "ok": False, "cancelled": True})
+        except Exception as e:
+            result_queue.put({"job_id": job["job_id"], "ok": False, "error": str(e)})
+        finally:
+            running.pop(job["job_id"], None)
+
+    async with FourBrainCollaboration() as collaboration:
+        print(f"🧩 工作进程 #{worker_id} 已启动 (pid {os.getpid()})")
+        while True:
+            message = await loop.run_in_executor(None, job_queue.get)
+            if message is None:
+                break
+            if "cancel" in message:
+                task = running.get(message["cancel"])
+                if task is not None:
+                    task.cancel()
+                continue
+            running[message["job_id"]] = asyncio.ensure_future(run(message))
+
+        for task in list(running.values()):
+            task.cancel()
+        if running:
+            await asyncio.gather(*running.values(), return_exceptions=True)
+
+
+def worker_main(worker_id: int, job_queue, result_queue):
+    """工作进程入口"""
+    try:
+        asyncio.run(_worker_loop(worker_id, job_queue, result_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+# ============== 网关侧 ==============
+
+class WorkerPool:
+    """
+    工作进程池（在 Bot 进程中使用）
+
+    run() 返回 awaitable，结果由后台线程从结果队列读取后交回事件循环，
+    网关进程的事件循环本身不做任何阻塞操作。另一个后台线程监视工作进程，
+    进程退出时由事件循环让它名下的任务失败并重启进程。
+    """
+
+    def __init__(self, workers: int = WORKERS, job_timeout: float = JOB_TIMEOUT):
+        self.size = workers
+        self._ctx = mp.get_context("spawn")
+        self._job_queues: List = []
+        self._result_queue = self._ctx.Queue()
+        self._processes: List = []
+        self._pending: Dict[int, "asyncio.Future"] = {}
+        self._assigned: Dict[int, int] = {}  # job_id → worker
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._closing = False
+        self.job_timeout = job_timeout
+        self.restarts = 0
+
+    def _spawn(self, worker_id: int):
+        """启动（或重启）一个工作进程；重启时换新的任务队列，丢弃发给旧进程的消息"""
+        job_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=worker_main, args=(worker_id, job_queue, self._result_queue), daemon=True
+        )
+        process.start()
+        if worker_id < len(self._processes):
+            self._job_queues[worker_id] = job_queue
+            self._processes[worker_id] = process
+        else:
+            self._job_queues.append(job_queue)
+            self._processes.append(process)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        for worker_id in range(self.size):
+            self._spawn(worker_id)
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+        self._watcher = threading.Thread(target=self._watch_processes, daemon=True)
+        self._watcher.start()
+        print(f"🧩 进程拆分模式：{self.size} 个工作进程")
+
+    def _watch_processes(self):
+        """等待任一工作进程退出，交给事件循环处理（每个进程对象只报告一次）"""
+        reported = set()
+        while not self._closing:
+            processes = list(self._processes)
+            sentinels = {p.sentinel: (worker_id, p) for worker_id, p in enumerate(processes)
+                         if id(p) not in reported}
+            for sentinel in wait_sentinels(list(sentinels), timeout=1.0):
+                worker_id, process = sentinels[sentinel]
+                reported.add(id(process))
+                if not self._closing:
+                    self._loop.call_soon_threadsafe(self._worker_exited, worker_id, process)
+
+    def _worker_exited(self, worker_id: int, process):
+        """工作进程退出：分给它的任务以错误结束，稍后重启"""
+        if self._closing or self._processes[worker_id] is not process:
+            return
+        process.join(timeout=0.1)
+        error = RuntimeError(f"工作进程 #{worker_id} 异常退出 (exitcode {process.exitcode})")
+        for job_id, worker in list(self._assigned.items()):
+            if worker != worker_id:
+                continue
+            self._assigned.pop(job_id, None)
+            future = self._pending.pop(job_id, None)
+            if future is not None and not future.done():
+                future.set_exception(error)
+        print(f"  ⚠️ {error}，{RESTART_DELAY:.0f} 秒后重启")
+        self._loop.call_later(RESTART_DELAY, self._restart, worker_id, process)
+
+    def _restart(self, worker_id: int, process):
+        if self._closing or self._processes[worker_id] is not process:
+            return
+        self._spawn(worker_id)
+        self.restarts += 1
+
+    def _read_results(self):
+        while True:
+            message = self._result_queue.get()
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._resolve, message)
+
+    def _resolve(self, message: Dict):
+        job_id = message["job_id"]
+        self._assigned.pop(job_id, None)
+        future = self._pending.pop(job_id, None)
+        if future is None or future.done():
+            return
+        if message["ok"]:
+            future.set_result(message["result"])
+        elif message.get("cancelled"):
+            future.cancel()
+        else:
+            future.set_exception(RuntimeError(message["error"]))
+
+    def _worker_for(self, channel_id: Optional[str]) -> int:
+        """同一频道固定分配到同一个工作进程"""
+        return zlib.crc32((channel_id or "").encode("utf-8")) % self.size
+
+    async def run(self, kind: str, message: str, channel_id: Optional[str],
+                  brain_id: Optional[str] = None) -> Any:
+        """
+        下发任务并等待结果
+
+        调用方被取消时（如指令被新指令取代）或超过 job_timeout 时，通知工作进程取消该任务；
+        工作进程异常退出或正在重启时抛出 RuntimeError。
+        """
+        job_id = next(self._ids)
+        worker = self._worker_for(channel_id)
+        if not self._processes[worker].is_alive():
+            raise RuntimeError(f"工作进程 #{worker} 正在重启，请稍后再试")
+        future = self._loop.create_future()
+        self._pending[job_id] = future
+        self._assigned[job_id] = worker
+        self._job_queues[worker].put({
+            "job_id": job_id, "kind": kind, "brain_id": brain_id,
+            "message": message, "channel_id": channel_id,
+        })
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.job_timeout)
+        except asyncio.TimeoutError:
+            self._cancel_job(job_id)
+            raise RuntimeError(f"任务超时 ({self.job_timeout:.0f} 秒)")
+        except asyncio.CancelledError:
+            self._cancel_job(job_id)
+            raise
+
+    def _cancel_job(self, job_id: int):
+        worker = self._assigned.pop(job_id, None)
+        if worker is not None:
+            self._job_queues[worker].put({"cancel": job_id})
+        self._pending.pop(job_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.size,
+            "alive": sum(1 for p in self._processes if p.is_alive()),
+            "in_flight": len(self._pending),
+            "restarts": self.restarts,
+        }
+
+    def close(self, timeout: float = 5.0):
+        """通知工作进程退出并等待"""
+        self._closing = True
+        for job_queue in self._job_queues:
+            job_queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._result_queue.put(None)
+        for thread in (self._reader, self._watcher):
+            if thread is not None:
+                thread.join(timeout)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Command Queue - Discord 指令并发控制
+所有指令经过同一个异步工作队列：
+- 全局并发上限 + 每个服务器（guild）并发上限，超出时排队并告知排队位置
+- 同一用户在同一频道发出新指令时，取消上一条尚未完成的指令（包括进行中的
+  aiohttp 请求），避免用户重问时旧请求继续占用名额
+
+环境变量:
+    FOUR_BRAIN_MAX_CONCURRENT  全局同时执行的指令数 (默认: 4)
+    FOUR_BRAIN_MAX_PER_GUILD   每个服务器同时执行的指令数 (默认: 2)
+"""
+
+import os
+import asyncio
+import itertools
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+MAX_CONCURRENT = int(os.getenv("FOUR_BRAIN_MAX_CONCURRENT", "4"))
+MAX_PER_GUILD = int(os.getenv("FOUR_BRAIN_MAX_PER_GUILD", "2"))
+
+
+class CommandSuperseded(Exception):
+    """指令被同一用户在同一频道的新指令取代"""
+
+
+@dataclass
+class Job:
+    job_id: int
+    guild_id: str
+    channel_id: str
+    user_id: str
+    task: Optional["asyncio.Task"] = None
+    started: bool = False
+    superseded: bool = False
+
+
+@dataclass
+class _GuildSlot:
+    semaphore: asyncio.Semaphore
+    users: int = 0  # 正在排队或执行的指令数，归零时回收
+
+
+class CommandQueue:
+    """
+    带全局/服务器级并发上限的可取消指令队列
+
+    submit() 在独立的 Task 中执行指令，先占服务器名额再占全局名额，
+    这样一个繁忙的服务器只会占满自己的名额，不会挤占其他服务器。
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, max_per_guild: int = MAX_PER_GUILD):
+        self.max_concurrent = max_concurrent
+        self.max_per_guild = max_per_guild
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._guilds: Dict[str, _GuildSlot] = {}
+        self._active: Dict[Tuple[str, str], Job] = {}  # (频道, 用户) → 最新指令
+        self._waiting: List[Job] = []  # 按提交顺序排队的指令
+        self._ids = itertools.count(1)
+        self.running = 0
+
+    def position(self, job: Job) -> int:
+        """排队位置（从 1 开始），已开始执行时为 0"""
+        return self._waiting.index(job) + 1 if job in self._waiting else 0
+
+    async def submit(self, guild_id: Optional[str], channel_id: str, user_id: str,
+                     factory: Callable[[], Awaitable[Any]],
+                     on_queued: Optional[Callable[[int], Awaitable[Any]]] = None) -> Any:
+        """
+        提交并等待指令完成
+
+        Args:
+            guild_id: 服务器ID（私信为 None）
+            channel_id: 频道ID
+            user_id: 用户ID
+            factory: 返回指令协程的函数
+            on_queued: 需要排队时回调，参数为排队位置
+
+        Raises:
+            CommandSuperseded: 被同一用户在同一频道的新指令取代
+        """
+        job = Job(next(self._ids), guild_id or "dm", channel_id, user_id)
+        key = (channel_id, user_id)
+        previous = self._active.get(key)
+        if previous is not None and previous.task is not None and not previous.task.done():
+            previous.superseded = True
+            previous.task.cancel()
+        self._active[key] = job
+
+        job.task = asyncio.ensure_future(self._run(job, factory, on_queued))
+        try:
+            await asyncio.wait({job.task})
+        except asyncio.CancelledError:
+            # 调用方自身被取消（如 Bot 关闭），一并取消指令
+            job.task.cancel()
+            raise
+        finally:
+            if self._active.get(key) is job:
+                del self._active[key]
+
+        if job.task.cancelled():
+            raise CommandSuperseded()
+        return job.task.result()
+
+    async def _run(self, job: Job, factory: Callable[[], Awaitable[Any]],
+                   on_queued: Optional[Callable[[int], Awaitable[Any]]]) -> Any:
+        slot = self._guilds.get(job.guild_id)
+        if slot is None:
+            slot = self._guilds[job.guild_id] = _GuildSlot(asyncio.Semaphore(self.max_per_guild))
+        slot.users += 1
+        self._waiting.append(job)
+        try:
+            if on_queued is not None and (slot.semaphore.locked() or self._global.locked()):
+                await on_queued(self.position(job))
+            async with slot.semaphore:
+                async with self._global:
+                    self._waiting.remove(job)
+                    job.started = True
+                    self.running += 1
+                    try:
+                        return await factory()
+                    finally:
+                        self.running -= 1
+        finally:
+            if job in self._waiting:
+                self._waiting.remove(job)
+            slot.users -= 1
+            if slot.users == 0:
+                del self._guilds[job.guild_id]
+
+    def stats(self) -> Dict[str, int]:
+        """队列概况"""
+        return {
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "guilds": len(self._guilds),
+            "max_concurrent": self.max_concurrent,
+            "max_per_guild": self.max_per_guild,
+        }
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Discord Stream - 流式回复到 Discord
+先用 Webhook 发出占位消息，再把 OpenClaw 的 SSE 增量按节流频率编辑进这条消息，
+用户看到的等待时间从完整生成时间缩短到首 Token 时间。
+
+- 编辑频率受 EDIT_INTERVAL 限制，遇到 429 按 retry_after 退避
+- 内容超过单条上限时，当前消息定稿，剩余部分续写到新消息
+- 占位消息或续写消息发送失败时停止流式编辑，finish() 时把未发出的内容改为普通发送
+"""
+
+import json
+import time
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+DISCORD_LIMIT = 2000      # Discord 单条消息字符上限
+ROLLOVER_AT = 1900        # 超过该长度换新消息（留出光标等余量）
+EDIT_INTERVAL = 1.2       # 两次编辑的最小间隔（秒），Webhook 约每 2 秒 5 次
+EDIT_ATTEMPTS = 3         # 定稿编辑（换新消息前、finish）的最多尝试次数
+CURSOR = " ▌"
+PLACEHOLDER = "💭 思考中..."
+
+
+# ============== SSE 解析 ==============
+
+def parse_sse_line(line: str) -> Tuple[Optional[str], Optional[str], Optional[Dict], bool]:
+    """
+    解析一行 SSE
+
+    Returns:
+        (增量文本, finish_reason, usage, 是否结束)
+    """
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None, None, None, False
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None, None, None, True
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return None, None, None, False
+    choices = chunk.get("choices") or [{}]
+    delta = choices[0].get("delta", {}).get("content")
+    return delta, choices[0].get("finish_reason"), chunk.get("usage"), False
+
+
+async def iter_sse(resp) -> AsyncIterator[Tuple[Optional[str], Optional[str], Optional[Dict]]]:
+    """
+    逐条产出 (增量文本, finish_reason, usage)
+
+    兼容三种响应：真实的 SSE 流、录制/回放磁带中的整段 SSE 文本，
+    以及网关忽略 stream 参数时返回的普通 JSON。
+    """
+    content = getattr(resp, "content", None)
+    if content is not None and hasattr(content, "__aiter__"):
+        async for raw in content:
+            delta, finish_reason, usage, done = parse_sse_line(raw.decode("utf-8", errors="ignore"))
+            if done:
+                return
+            if delta or finish_reason or usage:
+                yield delta, finish_reason, usage
+        return
+
+    text = await resp.text()
+    if text.lstrip().startswith("data:"):
+        for line in text.splitlines():
+            delta, finish_reason, usage, done = parse_sse_line(line)
+            if done:
+                return
+            if delta or finish_reason or usage:
+                yield delta, finish_reason, usage
+        return
+
+    data = json.loads(text)
+    choice = data["choices"][0]
+    yield choice["message"]["content"], choice.get("finish_reason"), data.get("usage")
+
+
+# ============== 流式消息 ==============
+
+def _split(text: str, limit: int) -> Tuple[str, str]:
+    """在 limit 之前切分，优先在换行处切开，避免把一句话拆到两条消息"""
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut], text[cut:].lstrip("\n")
+
+
+class StreamingWebhookMessage:
+    """
+    通过 Webhook 发送并持续编辑的消息
+
+    用法:
+        message = StreamingWebhookMessage(session, webhook_url, username, avatar_url)
+        await message.start()
+        await message.append("增量...")
+        await message.finish()
+    """
+
+    def __init__(self, session, webhook_url: str, username: str, avatar_url: Optional[str] = None,
+                 edit_interval: float = EDIT_INTERVAL):
+        self.session = session
+        self.webhook_url = webhook_url.rstrip("/")
+        self.username = username
+        self.avatar_url = avatar_url
+        self.edit_interval = edit_interval
+        self.message_ids: List[str] = []
+        self.text = ""            # 当前消息的内容（流式失败后为尚未发出的内容）
+        self.full_text = ""       # 全部内容
+        self._shown = ""          # 当前消息最近一次编辑后的内容
+        self._last_edit = 0.0
+        self._blocked_until = 0.0  # 429 退避截止时间
+        self.edits = 0
+        self.failed = False       # 流式发送失败，改为 finish() 时普通发送
+
+    async def start(self):
+        """发送占位消息，失败时整条回复改为结束后普通发送"""
+        if not await self._post(PLACEHOLDER):
+            self.failed = True
+
+    async def _post(self, content: str) -> bool:
+        payload = {
+            "content": content,
+            "username": self.username,
+            "allowed_mentions": {"parse": []}
+        }
+        if self.avatar_url:
+            payload["avatar_url"] = self.avatar_url
+        for _ in range(3):
+            async with self.session.post(f"{self.webhook_url}?wait=true", json=payload) as resp:
+                if resp.status == 429:
+                    await asyncio.sleep(await self._retry_after(resp))
+                    continue
+                if resp.status not in (200, 204):
+                    print(f"  ⚠️ Webhook 发送失败: HTTP {resp.status}")
+                    return False
+                data = await resp.json()
+                self.message_ids.append(str(data["id"]))
+                self._shown = content
+                self._last_edit = time.monotonic()
+                return True
+        return False
+
+    async def _edit(self, content: str) -> bool:
+        if not self.message_ids:
+            return False
+        if content == self._shown:
+            return True
+        url = f"{self.webhook_url}/messages/{self.message_ids[-1]}"
+        async with self.session.patch(url, json={"content": content, "allowed_mentions": {"parse": []}}) as resp:
+            self._last_edit = time.monotonic()
+            if resp.status == 429:
+                self._blocked_until = time.monotonic() + await self._retry_after(resp)
+                return False
+            if resp.status not in (200, 204):
+                print(f"  ⚠️ Webhook 编辑失败: HTTP {resp.status}")
+                return False
+            self._shown = content
+            self.edits += 1
+            return True
+
+    @staticmethod
+    async def _retry_after(resp) -> float:
+        try:
+            return float((await resp.json()).get("retry_after", 1.0))
+        except (ValueError, TypeError, AttributeError):
+            return 1.0
+
+    async def append(self, delta: str):
+        """追加增量；到达节流间隔时编辑消息，超长时换新消息"""
+        self.full_text += delta
+        self.text += delta
+        if self.failed:
+            return
+
+        while len(self.text) > ROLLOVER_AT:
+            head, rest = _split(self.text, ROLLOVER_AT)
+            if not await self._edit_until_done(head):
+                # 当前消息没能定稿，剩余内容（含 head）留到 finish() 普通发送
+                self.failed = True
+                return
+            # 单次增量可能很长（非流式 JSON、磁带回放），新消息先只放一条的量，其余由循环继续换页
+            if not await self._post(rest[:ROLLOVER_AT] + CURSOR if rest else PLACEHOLDER):
+                # head 已定稿在上一条消息里，只剩 rest 未发出
+                self.text = rest
+                self.failed = True
+                return
+            self.text = rest
+
+        now = time.monotonic()
+        if now >= self._blocked_until and now - self._last_edit >= self.edit_interval:
+            await self._edit(self.text + CURSOR)
+
+    async def _edit_until_done(self, content: str) -> bool:
+        """等待编辑窗口并重试，直到编辑成功或用完 EDIT_ATTEMPTS 次"""
+        for _ in range(EDIT_ATTEMPTS):
+            await self._wait_for_slot(force=True)
+            if await self._edit(content):
+                return True
+        return False
+
+    async def _send_plain(self, text: str) -> bool:
+        """不再编辑，按单条上限切分后逐条发送"""
+        ok = True
+        while text:
+            head, text = _split(text, DISCORD_LIMIT) if len(text) > DISCORD_LIMIT else (text, "")
+            ok = await self._post(head) and ok
+        return ok
+
+    async def _wait_for_slot(self, force: bool = False):
+        """等到允许编辑（force 时等待而不是跳过）"""
+        wait = max(self._blocked_until, self._last_edit + self.edit_interval) - time.monotonic()
+        if wait > 0 and force:
+            await asyncio.sleep(wait)
+
+    async def finish(self, final_text: Optional[str] = None) -> bool:
+        """定稿：去掉光标，写入最终内容（出错时可传入替换内容）"""
+        if final_text is not None and not self.full_text:
+            self.text = self.full_text = final_text
+        if not self.failed and await self._edit_until_done(self.text or "（无内容）"):
+            return True
+        # 流式发送失败：未发出的内容改为普通发送（已显示的占位/光标消息保持原样）
+        self.failed = True
+        return await self._send_plain(self.text or "（无内容）")
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Fake Discord Webhook - 本地 Discord Webhook 模拟服务
+不往真实频道刷屏，也能测试 send_to_discord / send_as_brain / test_discord_integration.py
+在限流下的表现：
+
+- 每个 Webhook 一个限流桶（默认 2 秒 5 次）+ 全局限流（默认每秒 50 次）
+- 返回真实的 X-RateLimit-Limit/Remaining/Reset/Reset-After/Bucket 响应头，
+  超限时返回 429 和 retry_after（全局限流带 "global": true）
+- content 超过 2000 字符或为空时返回 400（与 Discord 相同的错误码）
+- 支持 ?wait=true 返回消息对象，以及 PATCH .../messages/{id} 编辑消息（流式回复）
+- 统计每个 Webhook 的接受/拒绝数，并按到达顺序记录消息，用于检查乱序和丢失
+
+接口:
+    POST  /api/webhooks/{id}/{token}[?wait=true]
+    PATCH /api/webhooks/{id}/{token}/messages/{message_id}
+    GET   /_stats      统计（JSON）
+    POST  /_reset      清空统计和限流桶
+
+使用方法:
+    python3 fake_discord_webhook.py serve                     # 启动并打印 WEBHOOK_* 环境变量
+    eval "$(python3 fake_discord_webhook.py env)"             # 把 WEBHOOK_* 指向本地服务
+    python3 fake_discord_webhook.py loadtest -n 30            # 压测 send_to_discord 和 send_as_brain
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+DISCORD_LIMIT = 2000           # 单条消息字符上限
+WEBHOOK_LIMIT = 5              # 每个 Webhook 每个窗口的请求数
+WEBHOOK_WINDOW = 2.0           # Webhook 限流窗口（秒）
+GLOBAL_LIMIT = 50              # 全局每秒请求数
+DEFAULT_PORT = 8790
+
+# 各脚本使用的 Webhook 环境变量对应的角色
+DEFAULT_ROLES = ["PM", "DEV", "REVIEWER", "TESTER", "MEMO", "CEO", "CTO", "COO", "CMO"]
+
+_WEBHOOK_PATH = re.compile(r"^/api/webhooks/([^/]+)/([^/]+)(?:/messages/([^/]+))?/?$")
+_SEQ_TAG = re.compile(r"^\[#(\d+)\]")
+
+
+# ============== 限流 ==============
+
+@dataclass
+class RateBucket:
+    """固定窗口限流桶：窗口从第一次请求开始计时"""
+    limit: int
+    window: float
+    remaining: int = 0
+    reset_at: float = 0.0
+
+    def take(self, now: float) -> Tuple[bool, float]:
+        """
+        消耗一次额度
+
+        Returns:
+            (是否允许, 距离窗口重置的秒数)
+        """
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+        reset_after = max(0.0, self.reset_at - now)
+        if self.remaining <= 0:
+            return False, reset_after
+        self.remaining -= 1
+        return True, reset_after
+
+
+@dataclass
+class WebhookStats:
+    accepted: int = 0
+    edits: int = 0
+    rate_limited: int = 0
+    too_long: int = 0
+    empty: int = 0
+    first_at: Optional[float] = None
+    last_at: Optional[float] = None
+
+
+@dataclass
+class FakeDiscordState:
+    """服务端状态：限流桶、统计、按到达顺序记录的消息"""
+    webhook_limit: int = WEBHOOK_LIMIT
+    webhook_window: float = WEBHOOK_WINDOW
+    global_limit: int = GLOBAL_LIMIT
+    buckets: Dict[str, RateBucket] = field(default_factory=dict)
+    global_bucket: Optional[RateBucket] = None
+    webhooks: Dict[str, WebhookStats] = field(default_factory=dict)
+    messages: List[Dict] = field(default_factory=list)
+    global_limited: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self.global_bucket = RateBucket(self.global_limit, 1.0)
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+            self.global_bucket = RateBucket(self.global_limit, 1.0)
+            self.webhooks.clear()
+            self.messages.clear()
+            self.global_limited = 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            webhooks = {key: vars(s).copy() for key, s in self.webhooks.items()}
+            messages = [dict(m) for m in self.messages]
+            global_limited = self.global_limited
+        accepted = sum(s["accepted"] for s in webhooks.values())
+        first = min((s["first_at"] for s in webhooks.values() if s["first_at"]), default=None)
+        last = max((s["last_at"] for s in webhooks.values() if s["last_at"]), default=None)
+        span = (last - first) if first and last else 0.0
+        return {
+            "accepted": accepted,
+            "edits": sum(s["edits"] for s in webhooks.values()),
+            "rate_limited": sum(s["rate_limited"] for s in webhooks.values()),
+            "global_limited": global_limited,
+            "rejected_too_long": sum(s["too_long"] for s in webhooks.values()),
+            "rejected_empty": sum(s["empty"] for s in webhooks.values()),
+            "throughput_per_s": round(accepted / span, 2) if span > 0 else None,
+            "order_violations": order_violations(messages),
+            "webhooks": webhooks,
+            "messages": messages,
+        }
+
+
+def order_violations(messages: List[Dict]) -> Dict[str, int]:
+    """
+    按 Webhook 统计乱序消息数
+
+    只检查以 [#序号] 开头的消息（压测时由发送方加上），
+    序号小于该 Webhook 之前已到达的最大序号即视为乱序。
+    """
+    highest: Dict[str, int] = {}
+    violations: Dict[str, int] = {}
+    for message in messages:
+        match = _SEQ_TAG.match(message.get("content", ""))
+        if not match:
+            continue
+        seq = int(match.group(1))
+        key = message["webhook"]
+        if seq < highest.get(key, -1):
+            violations[key] = violations.get(key, 0) + 1
+        highest[key] = max(highest.get(key, -1), seq)
+    return violations
+
+
+# ============== HTTP 服务 ==============
+
+class FakeDiscordHandler(BaseHTTPRequestHandler):
+    server_version = "FakeDiscord/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> FakeDiscordState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: Optional[Dict], headers: Optional[Dict[str, str]] = None):
+        data = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _read_json(self) -> Optional[Dict]:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/_stats":
+            self._send_json(200, self.state.stats())
+        else:
+            self._send_json(404, {"message": "404: Not Found", "code": 0})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/_reset":
+            self.state.reset()
+            self._send_json(204, None)
+            return
+        self._handle_webhook("POST")
+
+    def do_PATCH(self):
+        self._handle_webhook("PATCH")
+
+    def _handle_webhook(self, method: str):
+        url = urlparse(self.path)
+        match = _WEBHOOK_PATH.match(url.path)
+        payload = self._read_json()
+        if not match or (method == "PATCH") != bool(match.group(3)):
+            self._send_json(404, {"message": "Unknown Webhook", "code": 10015})
+            return
+        if payload is None:
+            self._send_json(400, {"message": "Cannot send an empty message", "code": 50006})
+            return
+
+        webhook_key = f"{match.group(1)}/{match.group(2)}"
+        state = self.state
+        now = time.monotonic()
+        with state.lock:
+            stats = state.webhooks.setdefault(webhook_key, WebhookStats())
+            bucket = state.buckets.setdefault(
+                webhook_key, RateBucket(state.webhook_limit, state.webhook_window))
+
+            allowed_global, global_reset = state.global_bucket.take(now)
+            if not allowed_global:
+                state.global_limited += 1
+                stats.rate_limited += 1
+                self._send_json(429, {
+                    "message": "You are being rate limited.",
+                    "retry_after": round(global_reset, 3),
+                    "global": True,
+                }, {"Retry-After": str(max(1, round(global_reset))),
+                    "X-RateLimit-Global": "true", "X-RateLimit-Scope": "global"})
+                return
+
+            allowed, reset_after = bucket.take(now)
+            headers = {
+                "X-RateLimit-Limit": str(bucket.limit),
+                "X-RateLimit-Remaining": str(bucket.remaining),
+                "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+                "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+                "X-RateLimit-Bucket": webhook_key.replace("/", "-"),
+            }
+            if not allowed:
+                stats.rate_limited += 1
+                headers.update({"Retry-After": str(max(1, round(reset_after))),
+                                "X-RateLimit-Scope": "user"})
+                self._send_json(429, {
+                    "message": "You are being rate limited.",
+                    "retry_after": round(reset_after, 3),
+                    "global": False,
+                }, headers)
+                return
+
+            content = payload.get("content") or ""
+            if len(content) > DISCORD_LIMIT:
+                stats.too_long += 1
+                self._send_json(400, {
+                    "message": "Invalid Form Body",
+                    "code": 50035,
+                    "errors": {"content": {"_errors": [{
+                        "code": "BASE_TYPE_MAX_LENGTH",
+                        "message": f"Must be {DISCORD_LIMIT} or fewer in length."
+                    }]}},
+                }, headers)
+                return
+            if not content.strip() and not payload.get("embeds"):
+                stats.empty += 1
+                self._send_json(400, {"message": "Cannot send an empty message", "code": 50006}, headers)
+                return
+
+            wall = time.time()
+            stats.first_at = stats.first_at or wall
+            stats.last_at = wall
+            if method == "PATCH":
+                stats.edits += 1
+                message_id = match.group(3)
+            else:
+                stats.accepted += 1
+                message_id = str(len(state.messages) + 1)
+                state.messages.append({
+                    "id": message_id,
+                    "webhook": webhook_key,
+                    "username": payload.get("username", ""),
+                    "content": content,
+                    "length": len(content),
+                    "received_at": wall,
+                })
+
+        wait = parse_qs(url.query).get("wait", ["false"])[0].lower() == "true"
+        if method == "PATCH" or wait:
+            self._send_json(200, {"id": message_id, "content": content,
+                                  "author": {"username": payload.get("username", "")}}, headers)
+        else:
+            self._send_json(204, None, headers)
+
+
+class FakeDiscordServer:
+    """
+    在后台线程中运行的模拟服务
+
+    用法:
+        with FakeDiscordServer() as server:
+            url = server.webhook_url("PM")
+            ...
+            print(server.state.stats())
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 webhook_limit: int = WEBHOOK_LIMIT, webhook_window: float = WEBHOOK_WINDOW,
+                 global_limit: int = GLOBAL_LIMIT, verbose: bool = False):
+        self.httpd = ThreadingHTTPServer((host, port), FakeDiscordHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = FakeDiscordState(webhook_limit, webhook_window, global_limit)
+        self.httpd.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> FakeDiscordState:
+        return self.httpd.state
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def webhook_url(self, role: str) -> str:
+        return f"{self.base_url}/api/webhooks/{role.lower()}/fake-token"
+
+    def start(self) -> "FakeDiscordServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+# ============== 压测 ==============
+
+def _loadtest_quad(urls: Dict[str, str], count: int, oversize: bool) -> Dict:
+    """多线程并发调用 QuadBrainSystem.send_to_discord，每个角色按序发送"""
+    from concurrent.futures import ThreadPoolExecutor
+    import quad_brain
+
+    system = quad_brain.QuadBrainSystem()
+    for role in quad_brain.WEBHOOKS:
+        quad_brain.WEBHOOKS[role] = urls[role]
+
+    def send_all(role: str) -> int:
+        delivered = 0
+        for i in range(count):
+            body = "x" * 2500 if oversize and i == count - 1 else f"消息 {i}"
+            delivered += system.send_to_discord(role, f"[#{i}] {body}")
+        return delivered
+
+    with ThreadPoolExecutor(max_workers=len(quad_brain.WEBHOOKS)) as pool:
+        delivered = sum(pool.map(send_all, list(quad_brain.WEBHOOKS)))
+    return {"sent": count * len(quad_brain.WEBHOOKS), "delivered": delivered}
+
+
+def _loadtest_four(urls: Dict[str, str], count: int, oversize: bool) -> Dict:
+    """asyncio 并发调用 FourBrainCollaboration.send_as_brain，每个脑按序发送"""
+    import asyncio
+    import four_brain_system
+
+    for brain_id in four_brain_system.WEBHOOKS:
+        four_brain_system.WEBHOOKS[brain_id] = urls[brain_id.upper()]
+
+    async def run() -> int:
+        async with four_brain_system.FourBrainCollaboration() as collaboration:
+            async def send_all(brain_id: str) -> int:
+                delivered = 0
+                for i in range(count):
+                    body = "x" * 2500 if oversize and i == count - 1 else f"消息 {i}"
+                    delivered += bool(await collaboration.send_as_brain(brain_id, f"[#{i}] {body}"))
+                return delivered
+            results = await asyncio.gather(*(send_all(b) for b in four_brain_system.WEBHOOKS))
+            return sum(results)
+
+    return {"sent": count * len(four_brain_system.WEBHOOKS), "delivered": asyncio.run(run())}
+
+
+def _print_stats(title: str, client: Dict, stats: Dict, elapsed: float):
+    print(f"\n📊 {title}")
+    print(f"   客户端: 发送 {client['sent']} 条，报告成功 {client['delivered']} 条，耗时 {elapsed:.1f}秒")
+    print(f"   服务端: 接受 {stats['accepted']} 条，429 {stats['rate_limited']} 次"
+          f"（全局 {stats['global_limited']}），超长 {stats['rejected_too_long']}，空消息 {stats['rejected_empty']}")
+    lost = client["sent"] - stats["accepted"]
+    print(f"   吞吐: {stats['throughput_per_s'] or '-'} 条/秒，丢失 {lost} 条")
+    violations = stats["order_violations"]
+    if violations:
+        print(f"   ⚠️ 乱序: {violations}")
+    else:
+        print(f"   ✅ 各 Webhook 内消息顺序正确")
+    if client["delivered"] != stats["accepted"]:
+        print(f"   ⚠️ 客户端报告的成功数与服务端不一致")
+
+
+def run_loadtest(args) -> int:
+    targets = ["quad", "four"] if args.target == "both" else [args.target]
+    with FakeDiscordServer(port=0, webhook_limit=args.webhook_limit,
+                           webhook_window=args.webhook_window,
+                           global_limit=args.global_limit) as server:
+        urls = {role: server.webhook_url(role) for role in DEFAULT_ROLES}
+        for target in targets:
+            server.state.reset()
+            start_time = time.time()
+            if target == "quad":
+                client = _loadtest_quad(urls, args.messages, args.oversize)
+                title = "quad_brain.send_to_discord"
+            else:
+                client = _loadtest_four(urls, args.messages, args.oversize)
+                title = "four_brain_system.send_as_brain"
+            _print_stats(title, client, server.state.stats(), time.time() - start_time)
+    return 0
+
+
+# ============== CLI ==============
+
+def _env_lines(base_url: str, roles: List[str]) -> List[str]:
+    return [f"export WEBHOOK_{role}={base_url}/api/webhooks/{role.lower()}/fake-token" for role in roles]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 Discord Webhook 模拟服务（带限流）')
+    sub = parser.add_subparsers(dest='command')
+
+    def add_limits(p):
+        p.add_argument('--webhook-limit', type=int, default=WEBHOOK_LIMIT, help='每个 Webhook 每窗口请求数')
+        p.add_argument('--webhook-window', type=float, default=WEBHOOK_WINDOW, help='Webhook 限流窗口（秒）')
+        p.add_argument('--global-limit', type=int, default=GLOBAL_LIMIT, help='全局每秒请求数')
+
+    serve = sub.add_parser('serve', help='启动服务')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--verbose', '-v', action='store_true', help='打印每个请求')
+    add_limits(serve)
+
+    env = sub.add_parser('env', help='打印指向本地服务的 WEBHOOK_* 环境变量')
+    env.add_argument('--host', default='127.0.0.1')
+    env.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    loadtest = sub.add_parser('loadtest', help='压测 send_to_discord / send_as_brain')
+    loadtest.add_argument('--messages', '-n', type=int, default=20, help='每个角色发送的消息数')
+    loadtest.add_argument('--target', choices=['quad', 'four', 'both'], default='both')
+    loadtest.add_argument('--oversize', action='store_true', help='每个角色最后一条发送超长消息')
+    add_limits(loadtest)
+
+    args = parser.parse_args()
+
+    if args.command == 'env':
+        print("\n".join(_env_lines(f"http://{args.host}:{args.port}", DEFAULT_ROLES)))
+    elif args.command == 'serve':
+        server = FakeDiscordServer(args.host, args.port, args.webhook_limit,
+                                   args.webhook_window, args.global_limit, args.verbose)
+        print(f"🛰️  Fake Discord 已启动: {server.base_url}")
+        print(f"   限流: 每个 Webhook {args.webhook_limit} 次/{args.webhook_window}秒，全局 {args.global_limit} 次/秒")
+        print(f"   统计: curl {server.base_url}/_stats\n")
+        print("\n".join(_env_lines(server.base_url, DEFAULT_ROLES)))
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            stats = server.state.stats()
+            print(f"\n📊 接受 {stats['accepted']} 条，429 {stats['rate_limited']} 次，"
+                  f"超长 {stats['rejected_too_long']} 条")
+    elif args.command == 'loadtest':
+        sys.exit(run_loadtest(args))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,37 @@
 
 import os
 import json
+import time
 import asyncio
 import aiohttp
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Awaitable, Dict, List, Optional
 import discord
 from discord.ext import commands, tasks
 
+from llm_cassette import wrap_async_session
+from llm_telemetry import get_output_stats, continuation_messages, MAX_CONTINUATIONS
+from brain_memory import ConversationMemory
+from command_queue import CommandQueue, CommandSuperseded
+from discord_stream import StreamingWebhookMessage, iter_sse
+from brain_workers import WorkerPool, WORKERS
+
 # ============== 配置区域 ==============
 
 # OpenClaw API 配置
 OPENCLAW_BASE_URL = "http://localhost:18789"
 OPENCLAW_TOKEN = os.getenv("OPENCLAW_TOKEN", "")
+MODEL = "kimi-coding/k2p5"
+DEFAULT_MAX_TOKENS = 1000  # 无历史统计时的默认 max_tokens
+
+# !all 讨论模式：roundtable = 四脑并发首轮 + 并发回应轮；sequential = 依次发言
+DISCUSSION_MODE = os.getenv("FOUR_BRAIN_DISCUSSION_MODE", "roundtable")
+REBUTTAL_ROUND = os.getenv("FOUR_BRAIN_REBUTTAL", "1") != "0"  # 圆桌模式是否追加回应轮
+REBUTTAL_SNIPPET = 200  # 回应轮中每位的首轮观点摘录长度
+REBUTTAL_MAX_TOKENS = 400  # 回应轮无历史统计时的默认 max_tokens
+
+# 单脑回复是否流式编辑 Webhook 消息（0 关闭，等完整回复后一次性发送）
+STREAMING = os.getenv("FOUR_BRAIN_STREAMING", "1") != "0"
 
 # Discord Bot Token（用于监听消息）
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN", "")
@@ -88,60 +107,182 @@ BRAINS = {
 class FourBrainCollaboration:
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
-        self.conversation_history: Dict[str, list] = {k: [] for k in BRAINS.keys()}
+        self.memory = ConversationMemory()  # (频道, 脑) 级对话记忆
         self.active_brain: Optional[str] = None
+        self.output_stats = get_output_stats()
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = wrap_async_session(aiohttp.ClientSession())
         return self
         
     async def __aexit__(self, *args):
         if self.session:
             await self.session.close()
+        self.memory.close()
     
-    async def call_openclaw(self, brain_id: str, user_message: str, context: str = "") -> str:
-        """调用 OpenClaw API，使用特定人格"""
-        brain = BRAINS[brain_id]
+    async def call_openclaw(self, brain_id: str, user_message: str, context: str = "",
+                            stats_key: Optional[str] = None,
+                            default_max_tokens: int = DEFAULT_MAX_TOKENS,
+                            history: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        调用 OpenClaw API，使用特定人格
+
+        Args:
+            brain_id: 脑ID
+            user_message: 用户问题
+            context: 其他脑的观点
+            stats_key: 输出长度统计键（默认为 brain_id，回应轮单独统计）
+            default_max_tokens: 无历史统计时的 max_tokens
+            history: 该频道与该脑之前的对话（摘要 + 最近几轮）
+        """
+        stats_key = stats_key or brain_id
+        messages = self._build_messages(brain_id, user_message, context, history)
         
-        # 构建消息历史
+        # 构建请求体（兼容 OpenAI 格式），max_tokens 按该脑历史输出长度自适应
+        payload = {
+            "model": MODEL,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": self.output_stats.choose_max_tokens(stats_key, MODEL, default_max_tokens)
+        }
+        headers = self._gateway_headers()
+        
+        try:
+            start_time = time.time()
+            content = ""
+            completion_tokens = None
+            truncated = False
+            
+            for _ in range(MAX_CONTINUATIONS + 1):
+                async with self.session.post(
+                    f"{OPENCLAW_BASE_URL}/v1/chat/completions",
+                    json=payload,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=60)
+                ) as resp:
+                    if resp.status != 200:
+                        if content:
+                            # 续写失败时保留已生成的部分
+                            break
+                        self.output_stats.record_error(stats_key, MODEL)
+                        error_text = await resp.text()
+                        return f"❌ API 错误 ({resp.status}): {error_text[:200]}"
+                    data = await resp.json()
+                
+                choice = data["choices"][0]
+                content += choice["message"]["content"]
+                usage = data.get("usage", {})
+                if usage.get("completion_tokens") is not None:
+                    completion_tokens = (completion_tokens or 0) + usage["completion_tokens"]
+                
+                # 因长度截断时自动续写
+                truncated = choice.get("finish_reason") == "length"
+                if not truncated:
+                    break
+                payload = dict(payload, messages=continuation_messages(messages, content))
+            
+            latency = int((time.time() - start_time) * 1000)
+            self.output_stats.record(stats_key, MODEL, completion_tokens, truncated, latency)
+            return content
+        except Exception as e:
+            self.output_stats.record_error(stats_key, MODEL)
+            return f"❌ 请求失败: {str(e)}"
+    
+    @staticmethod
+    def _build_messages(brain_id: str, user_message: str, context: str = "",
+                        history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """构建消息列表：人格 + 频道记忆 + （可选上下文）问题"""
+        brain = BRAINS[brain_id]
         messages = [
             {"role": "system", "content": brain["system_prompt"]},
         ]
+        messages.extend(history or [])
         
         # 添加上下文（其他脑的观点）
         if context:
             messages.append({"role": "user", "content": f"【上下文】{context}\n\n【你的任务】请从{brain['name']}的角度，对以下问题给出你的观点：\n{user_message}"})
         else:
             messages.append({"role": "user", "content": user_message})
-        
-        # 构建请求体（兼容 OpenAI 格式）
+        return messages
+    
+    @staticmethod
+    def _gateway_headers() -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {OPENCLAW_TOKEN}"
+        }
+    
+    async def stream_brain_response(self, brain_id: str, user_message: str,
+                                    history: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        流式回复：先发占位消息，再把 SSE 增量节流编辑进去
+
+        用户在首个 Token 到达时就能看到内容；超过 2000 字符自动续到新消息。
+        """
+        brain = BRAINS[brain_id]
+        messages = self._build_messages(brain_id, user_message, history=history)
         payload = {
-            "model": "kimi-coding/k2p5",
+            "model": MODEL,
             "messages": messages,
             "temperature": 0.7,
-            "max_tokens": 1000
+            "max_tokens": self.output_stats.choose_max_tokens(brain_id, MODEL, DEFAULT_MAX_TOKENS),
+            "stream": True
         }
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {OPENCLAW_TOKEN}"
-        }
+        stream_message = StreamingWebhookMessage(
+            self.session, WEBHOOKS[brain_id], brain["name"], brain["avatar"])
+        await stream_message.start()
         
+        start_time = time.time()
+        content = ""
+        completion_tokens = None
+        truncated = False
         try:
-            async with self.session.post(
-                f"{OPENCLAW_BASE_URL}/v1/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=60)
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    error_text = await resp.text()
-                    return f"❌ API 错误 ({resp.status}): {error_text[:200]}"
+            for _ in range(MAX_CONTINUATIONS + 1):
+                finish_reason = None
+                async with self.session.post(
+                    f"{OPENCLAW_BASE_URL}/v1/chat/completions",
+                    json=payload,
+                    headers=self._gateway_headers(),
+                    timeout=aiohttp.ClientTimeout(total=120)
+                ) as resp:
+                    if resp.status != 200:
+                        if content:
+                            # 续写失败时保留已生成的部分
+                            break
+                        self.output_stats.record_error(brain_id, MODEL)
+                        error_text = await resp.text()
+                        content = f"❌ API 错误 ({resp.status}): {error_text[:200]}"
+                        await stream_message.finish(content)
+                        return content
+                    async for delta, chunk_finish, usage in iter_sse(resp):
+                        if delta:
+                            content += delta
+                            await stream_message.append(delta)
+                        if chunk_finish:
+                            finish_reason = chunk_finish
+                        if usage and usage.get("completion_tokens") is not None:
+                            completion_tokens = (completion_tokens or 0) + usage["completion_tokens"]
+                
+                # 因长度截断时自动续写
+                truncated = finish_reason == "length"
+                if not truncated:
+                    break
+                payload = dict(payload, messages=continuation_messages(messages, content))
         except Exception as e:
-            return f"❌ 请求失败: {str(e)}"
+            # 中途出错也算失败调用；已生成的部分照常发出
+            self.output_stats.record_error(brain_id, MODEL)
+            if not content:
+                content = f"❌ 请求失败: {str(e)}"
+                await stream_message.finish(content)
+                return content
+            await stream_message.finish()
+            return content
+        
+        await stream_message.finish()
+        latency = int((time.time() - start_time) * 1000)
+        self.output_stats.record(brain_id, MODEL, completion_tokens, truncated, latency)
+        return content
     
     async def send_as_brain(self, brain_id: str, message: str, channel_id: str = None):
         """通过 Webhook 以特定人格发送消息"""
@@ -166,40 +307,127 @@ class FourBrainCollaboration:
             print(f"❌ Webhook 发送失败: {e}")
             return False
     
-    async def collaborative_discussion(self, topic: str, channel_id: str = None):
-        """四脑协同讨论"""
+    async def collaborative_discussion(self, topic: str, channel_id: str = None,
+                                       mode: Optional[str] = None,
+                                       rebuttal: Optional[bool] = None):
+        """
+        四脑协同讨论
+
+        Args:
+            topic: 讨论主题
+            channel_id: 频道ID
+            mode: roundtable / sequential（默认取 DISCUSSION_MODE）
+            rebuttal: 圆桌模式是否追加回应轮（默认取 REBUTTAL_ROUND）
+        """
+        if (mode or DISCUSSION_MODE) == "sequential":
+            return await self.sequential_discussion(topic, channel_id)
+        return await self.roundtable_discussion(
+            topic, channel_id, REBUTTAL_ROUND if rebuttal is None else rebuttal)
+    
+    async def _gather_in_order(self, calls: Dict[str, Awaitable[str]], channel_id: str = None,
+                               prefix: str = "") -> Dict[str, str]:
+        """
+        并发等待各脑结果，并按 BRAINS 顺序依次发送
+
+        某个脑一旦完成且排在它前面的都已发出，就立即发送，
+        频道里的发言顺序固定，同时不必等全部完成。
+        """
+        tasks = {brain_id: asyncio.ensure_future(call) for brain_id, call in calls.items()}
+        results = {}
+        try:
+            for brain_id in BRAINS:
+                if brain_id not in tasks:
+                    continue
+                results[brain_id] = await tasks[brain_id]
+                await self.send_as_brain(brain_id, prefix + results[brain_id], channel_id)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return results
+    
+    async def roundtable_discussion(self, topic: str, channel_id: str = None,
+                                    rebuttal: bool = True) -> Dict[str, str]:
+        """
+        圆桌模式：四脑并发回答，再并发进行一轮简短回应
+
+        总耗时约为两次 LLM 延迟（关闭回应轮时为一次），而不是顺序模式的四次。
+        """
+        print("🧠💻⚙️🎨 四脑同时思考中...")
+        results = await self._gather_in_order(
+            {brain_id: self.call_openclaw(brain_id, topic, history=self.memory.history(channel_id, brain_id))
+             for brain_id in BRAINS},
+            channel_id
+        )
+        self._remember(channel_id, topic, results)
+        
+        if not rebuttal:
+            return results
+        
+        print("🔁 回应轮：四脑互评中...")
+        summaries = {
+            brain_id: f"{BRAINS[brain_id]['name']}：{content[:REBUTTAL_SNIPPET]}..."
+            for brain_id, content in results.items()
+        }
+        calls = {}
+        for brain_id in BRAINS:
+            others = "\n".join(s for other, s in summaries.items() if other != brain_id)
+            calls[brain_id] = self.call_openclaw(
+                brain_id,
+                f"请针对其他人的观点做简短回应（补充、赞同或反驳，150字以内），不要重复你首轮说过的内容。\n话题：{topic}",
+                f"你首轮的观点：{summaries[brain_id]}\n其他人的观点：\n{others}",
+                stats_key=f"{brain_id}:rebuttal",
+                default_max_tokens=REBUTTAL_MAX_TOKENS
+            )
+        rebuttals = await self._gather_in_order(calls, channel_id, prefix="🔁 **回应**\n")
+        results.update({f"{brain_id}_rebuttal": content for brain_id, content in rebuttals.items()})
+        return results
+    
+    async def sequential_discussion(self, topic: str, channel_id: str = None) -> Dict[str, str]:
+        """顺序模式：CEO → CTO → COO → CMO，每位参考前面的观点"""
         results = {}
         
         # 1. CEO 先定方向
         print("🧠 CEO 思考中...")
-        results["ceo"] = await self.call_openclaw("ceo", topic)
+        results["ceo"] = await self.call_openclaw("ceo", topic, history=self.memory.history(channel_id, "ceo"))
         await self.send_as_brain("ceo", results["ceo"], channel_id)
         
         # 2. CTO 评估技术可行性
         print("💻 CTO 思考中...")
         context = f"CEO观点：{results['ceo'][:300]}..."
-        results["cto"] = await self.call_openclaw("cto", topic, context)
+        results["cto"] = await self.call_openclaw("cto", topic, context, history=self.memory.history(channel_id, "cto"))
         await self.send_as_brain("cto", results["cto"], channel_id)
         
         # 3. COO 制定执行计划
         print("⚙️ COO 思考中...")
         context = f"CEO：{results['ceo'][:200]}...\nCTO：{results['cto'][:200]}..."
-        results["coo"] = await self.call_openclaw("coo", topic, context)
+        results["coo"] = await self.call_openclaw("coo", topic, context, history=self.memory.history(channel_id, "coo"))
         await self.send_as_brain("coo", results["coo"], channel_id)
         
         # 4. CMO 优化传播
         print("🎨 CMO 思考中...")
         context = f"CEO：{results['ceo'][:150]}...\nCTO：{results['cto'][:150]}...\nCOO：{results['coo'][:150]}..."
-        results["cmo"] = await self.call_openclaw("cmo", topic, context)
+        results["cmo"] = await self.call_openclaw("cmo", topic, context, history=self.memory.history(channel_id, "cmo"))
         await self.send_as_brain("cmo", results["cmo"], channel_id)
         
+        self._remember(channel_id, topic, results)
         return results
     
+    def _remember(self, channel_id: Optional[str], message: str, results: Dict[str, str]):
+        """把各脑的回答写入频道记忆（失败的回答不记录）"""
+        for brain_id, content in results.items():
+            if brain_id in BRAINS and not content.startswith("❌"):
+                self.memory.append(channel_id, brain_id, message, content)
+    
     async def single_brain_response(self, brain_id: str, message: str, channel_id: str = None):
         """单个脑回复"""
         print(f"🔄 {BRAINS[brain_id]['name']} 思考中...")
-        response = await self.call_openclaw(brain_id, message)
-        await self.send_as_brain(brain_id, response, channel_id)
+        history = self.memory.history(channel_id, brain_id)
+        if STREAMING and WEBHOOKS.get(brain_id):
+            response = await self.stream_brain_response(brain_id, message, history)
+        else:
+            response = await self.call_openclaw(brain_id, message, history=history)
+            await self.send_as_brain(brain_id, response, channel_id)
+        self._remember(channel_id, message, {brain_id: response})
         return response
 
 
@@ -211,16 +439,53 @@ class FourBrainBot(commands.Bot):
         intents.message_content = True
         super().__init__(command_prefix="!", intents=intents)
         self.collaboration = None
+        self.workers: Optional[WorkerPool] = None
+        self.queue: Optional[CommandQueue] = None
+        self.loop_lag_ms = 0.0
         
     async def setup_hook(self):
-        self.collaboration = FourBrainCollaboration()
-        await self.collaboration.__aenter__()
+        if WORKERS > 0:
+            # 进程拆分模式：本进程只做 Discord 收发，编排交给工作进程
+            self.workers = WorkerPool(WORKERS)
+            self.workers.start()
+        else:
+            self.collaboration = FourBrainCollaboration()
+            await self.collaboration.__aenter__()
+        self.queue = CommandQueue()
+        self.loop.create_task(self._monitor_loop_lag())
         
     async def close(self):
         if self.collaboration:
             await self.collaboration.__aexit__(None, None, None)
+        if self.workers:
+            await asyncio.get_running_loop().run_in_executor(None, self.workers.close)
         await super().close()
     
+    async def _monitor_loop_lag(self):
+        """测量事件循环延迟：sleep(1) 实际多睡了多久"""
+        loop = asyncio.get_running_loop()
+        while not self.is_closed():
+            start = loop.time()
+            await asyncio.sleep(1)
+            self.loop_lag_ms = max(0.0, (loop.time() - start - 1) * 1000)
+    
+    async def ask_brain(self, brain_id: str, question: str, channel_id: str):
+        """单脑回复（进程拆分模式下交给工作进程）"""
+        if self.workers:
+            return await self.workers.run("single", question, channel_id, brain_id)
+        return await self.collaboration.single_brain_response(brain_id, question, channel_id)
+    
+    async def discuss(self, topic: str, channel_id: str):
+        """四脑讨论（进程拆分模式下交给工作进程）"""
+        if self.workers:
+            return await self.workers.run("discussion", topic, channel_id)
+        return await self.collaboration.collaborative_discussion(topic, channel_id)
+    
+    async def forget_channel(self, channel_id: str):
+        if self.workers:
+            return await self.workers.run("forget", "", channel_id)
+        self.collaboration.memory.forget(channel_id)
+    
     async def on_ready(self):
         print(f"✅ 四脑协同系统已上线！Bot: {self.user}")
         print("\n可用指令：")
@@ -229,6 +494,8 @@ class FourBrainBot(commands.Bot):
         print("  !coo <问题>    - 询问 COO")
         print("  !cmo <问题>    - 询问 CMO")
         print("  !all <话题>    - 四脑协同讨论")
+        print("  !forget        - 清除本频道对话记忆")
+        print("  !queue         - 查看指令队列")
         print("  !brains        - 显示四脑介绍")
     
     async def on_command_error(self, ctx, error):
@@ -240,6 +507,27 @@ class FourBrainBot(commands.Bot):
 bot = FourBrainBot()
 
 
+async def run_queued(ctx, factory):
+    """
+    通过指令队列执行，受全局/服务器并发上限约束
+
+    同一用户在同一频道的新指令会取消上一条未完成的指令。
+    """
+    async def notify_queued(position: int):
+        await ctx.send(f"⏳ 当前较忙，你的指令排在第 {position} 位...")
+    
+    try:
+        return await bot.queue.submit(
+            str(ctx.guild.id) if ctx.guild else None,
+            str(ctx.channel.id),
+            str(ctx.author.id),
+            factory,
+            on_queued=notify_queued
+        )
+    except CommandSuperseded:
+        print(f"🛑 {ctx.author} 的上一条指令已被新指令取代")
+
+
 @bot.command()
 async def brains(ctx):
     """显示四脑介绍"""
@@ -268,40 +556,72 @@ async def brains(ctx):
 @bot.command()
 async def ceo(ctx, *, question):
     """询问 CEO"""
-    async with ctx.typing():
-        await bot.collaboration.single_brain_response("ceo", question, str(ctx.channel.id))
+    async def respond():
+        async with ctx.typing():
+            await bot.ask_brain("ceo", question, str(ctx.channel.id))
+    await run_queued(ctx, respond)
 
 
 @bot.command()
 async def cto(ctx, *, question):
     """询问 CTO"""
-    async with ctx.typing():
-        await bot.collaboration.single_brain_response("cto", question, str(ctx.channel.id))
+    async def respond():
+        async with ctx.typing():
+            await bot.ask_brain("cto", question, str(ctx.channel.id))
+    await run_queued(ctx, respond)
 
 
 @bot.command()
 async def coo(ctx, *, question):
     """询问 COO"""
-    async with ctx.typing():
-        await bot.collaboration.single_brain_response("coo", question, str(ctx.channel.id))
+    async def respond():
+        async with ctx.typing():
+            await bot.ask_brain("coo", question, str(ctx.channel.id))
+    await run_queued(ctx, respond)
 
 
 @bot.command()
 async def cmo(ctx, *, question):
     """询问 CMO"""
-    async with ctx.typing():
-        await bot.collaboration.single_brain_response("cmo", question, str(ctx.channel.id))
+    async def respond():
+        async with ctx.typing():
+            await bot.ask_brain("cmo", question, str(ctx.channel.id))
+    await run_queued(ctx, respond)
+
+
+@bot.command()
+async def forget(ctx):
+    """清除本频道的四脑对话记忆"""
+    await bot.forget_channel(str(ctx.channel.id))
+    await ctx.send("🧹 已清除本频道的对话记忆")
 
 
 @bot.command()
 async def all(ctx, *, topic):
     """四脑协同讨论"""
-    await ctx.send(f"🔔 四脑圆桌会议开始！主题：**{topic}**")
-    
-    async with ctx.typing():
-        await bot.collaboration.collaborative_discussion(topic, str(ctx.channel.id))
-    
-    await ctx.send("✅ 讨论结束！")
+    async def discuss():
+        await ctx.send(f"🔔 四脑圆桌会议开始！主题：**{topic}**")
+        
+        start_time = time.time()
+        async with ctx.typing():
+            await bot.discuss(topic, str(ctx.channel.id))
+        
+        await ctx.send(f"✅ 讨论结束！（用时 {time.time() - start_time:.0f} 秒）")
+    await run_queued(ctx, discuss)
+
+
+@bot.command()
+async def queue(ctx):
+    """查看指令队列"""
+    stats = bot.queue.stats()
+    message = (
+        f"📊 执行中 {stats['running']}/{stats['max_concurrent']}，排队 {stats['waiting']}，"
+        f"每个服务器最多同时 {stats['max_per_guild']} 条，事件循环延迟 {bot.loop_lag_ms:.0f}ms"
+    )
+    if bot.workers:
+        worker_stats = bot.workers.stats()
+        message += f"\n🧩 工作进程 {worker_stats['alive']}/{worker_stats['workers']}，进行中 {worker_stats['in_flight']}，重启 {worker_stats['restarts']} 次"
+    await ctx.send(message)
 
 
 # ============== 启动入口 ==============
@@ -315,5 +635,7 @@ if __name__ == "__main__":
     print("🚀 启动四脑协同系统...")
     print(f"   OpenClaw API: {OPENCLAW_BASE_URL}")
     print(f"   四脑人格: {', '.join(BRAINS.keys())}")
+    print(f"   讨论模式: {DISCUSSION_MODE}{' + 回应轮' if DISCUSSION_MODE != 'sequential' and REBUTTAL_ROUND else ''}")
+    print(f"   运行模式: {f'进程拆分 ({WORKERS} 个工作进程)' if WORKERS > 0 else '单进程'}")
     
     bot.run(DISCORD_BOT_TOKEN)
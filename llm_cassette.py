@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+LLM Cassette - 网关流量录制/回放
+把 call_llm / call_openclaw 的每次请求和响应（含原始延迟和 usage）录制到
+JSONL 磁带文件，回放时按录制顺序确定性地返回，可按原始节奏或尽快回放。
+
+环境变量:
+    LLM_CASSETTE         磁带文件路径（不设置则不启用）
+    LLM_CASSETTE_MODE    record / replay (默认: record)
+    LLM_CASSETTE_TIMING  recorded / fast / 延迟倍率数字 (默认: recorded)
+
+使用方法:
+    LLM_CASSETTE=run.jsonl python3 quad_brain_agentic.py "写个计算器"
+    LLM_CASSETTE=run.jsonl LLM_CASSETTE_MODE=replay python3 quad_brain_agentic.py "写个计算器"
+    python3 llm_cassette.py run.jsonl          # 查看磁带摘要
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+# 只拦截对话补全请求，Webhook 等其他流量原样透传
+GATEWAY_PATH = "/v1/chat/completions"
+
+
+def _canonical(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def request_key(payload: Dict) -> str:
+    """完整请求的精确匹配键"""
+    return hashlib.sha256(_canonical(payload).encode("utf-8")).hexdigest()[:24]
+
+
+def persona_key(payload: Dict) -> str:
+    """
+    宽松匹配键：模型 + system prompt
+
+    编排方式改变（上下文裁剪、并行度）后 user 消息会不同，
+    此时按同一人格的调用顺序回放录制的响应。
+    """
+    messages = payload.get("messages", [])
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    return hashlib.sha256(_canonical([payload.get("model"), system]).encode("utf-8")).hexdigest()[:24]
+
+
+_ENV_CASSETTES: Dict[tuple, "Cassette"] = {}
+
+
+class Cassette:
+    """
+    磁带文件
+
+    record 模式下每次请求追加一行 JSON；replay 模式下按精确键、再按人格键
+    查找下一条录制记录，同一键的记录按录制顺序依次返回，用尽后重复最后一条。
+
+    每条记录同时在两个索引中排队，任一索引取出后即标记为已消费，另一个索引跳过它，
+    这样部分请求变化（走人格键）时也不会把已回放的响应再返回一次。
+    """
+
+    def __init__(self, path: str, mode: str = "record", timing: str = "recorded"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知磁带模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.timing_scale = self._parse_timing(timing)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._by_request: Dict[str, Deque[Dict]] = {}
+        self._by_persona: Dict[str, Deque[Dict]] = {}
+        self._last: Dict[str, Dict] = {}
+        self._used: set = set()  # 已消费记录的序号
+
+        if mode == "replay":
+            self._load()
+
+    @staticmethod
+    def _parse_timing(timing: str) -> float:
+        if timing == "recorded":
+            return 1.0
+        if timing == "fast":
+            return 0.0
+        return max(0.0, float(timing))
+
+    @classmethod
+    def from_env(cls) -> Optional["Cassette"]:
+        """
+        根据环境变量获取磁带，未配置时返回 None
+
+        同一进程内共享同一个实例，多个系统实例按统一顺序消费回放记录。
+        """
+        path = os.getenv("LLM_CASSETTE", "")
+        if not path:
+            return None
+        mode = os.getenv("LLM_CASSETTE_MODE", "record")
+        timing = os.getenv("LLM_CASSETTE_TIMING", "recorded")
+        key = (path, mode, timing)
+        if key not in _ENV_CASSETTES:
+            _ENV_CASSETTES[key] = cls(path, mode=mode, timing=timing)
+        return _ENV_CASSETTES[key]
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+        for seq, line in enumerate(lines):
+            entry = json.loads(line)
+            entry["_seq"] = seq
+            self._by_request.setdefault(entry["key"], deque()).append(entry)
+            self._by_persona.setdefault(entry["persona"], deque()).append(entry)
+
+    @staticmethod
+    def intercepts(url: str) -> bool:
+        return url.rstrip("/").endswith(GATEWAY_PATH)
+
+    def record(self, payload: Dict, status: int, body: Any, latency_ms: int):
+        """追加一条录制记录"""
+        usage = body.get("usage") if isinstance(body, dict) else None
+        entry = {
+            "key": request_key(payload),
+            "persona": persona_key(payload),
+            "recorded_at": datetime.now().isoformat(),
+            "request": payload,
+            "status": status,
+            "response": body,
+            "latency_ms": latency_ms,
+            "usage": usage,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def _pop(self, index: Dict[str, Deque[Dict]], key: str) -> Optional[Dict]:
+        queue = index.get(key)
+        while queue:
+            entry = queue.popleft()
+            if entry["_seq"] in self._used:
+                continue
+            self._used.add(entry["_seq"])
+            return entry
+        return None
+
+    def next_entry(self, payload: Dict) -> Optional[Dict]:
+        """
+        取出与请求匹配的下一条录制记录
+
+        先按精确键、再按人格键取未回放过的记录；两个队列都用完时重放该请求上一次拿到的记录。
+        """
+        key, persona = request_key(payload), persona_key(payload)
+        with self._lock:
+            entry = self._pop(self._by_request, key)
+            if entry is None:
+                entry = self._pop(self._by_persona, persona)
+            if entry is None:
+                entry = self._last.get(key) or self._last.get(persona)
+            else:
+                self._last[key] = self._last[persona] = entry
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def replay_delay(self, entry: Optional[Dict]) -> float:
+        """回放等待时间（秒）"""
+        if entry is None or not entry.get("latency_ms"):
+            return 0.0
+        return entry["latency_ms"] / 1000 * self.timing_scale
+
+
+MISS_BODY = {"error": {"message": "cassette miss: 磁带中没有匹配的录制记录"}}
+
+
+# ============== 同步 (requests) ==============
+
+class CassetteResponse:
+    """回放响应，兼容 requests.Response 的常用接口"""
+
+    def __init__(self, status_code: int, body: Any):
+        self.status_code = status_code
+        self._body = body
+        self.text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+
+    def json(self) -> Any:
+        return self._body if not isinstance(self._body, str) else json.loads(self._body)
+
+
+class CassetteSession:
+    """
+    包装 requests.Session：网关请求经过磁带，其他请求直接透传
+
+    replay 模式下 inner 可以为 None（完全离线）。
+    """
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+        self.headers = inner.headers if inner is not None else {}
+
+    def post(self, url: str, json: Dict = None, **kwargs):
+        if not self.cassette.intercepts(url):
+            return self.inner.post(url, json=json, **kwargs)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.next_entry(json)
+            delay = self.cassette.replay_delay(entry)
+            if delay:
+                time.sleep(delay)
+            if entry is None:
+                return CassetteResponse(404, MISS_BODY)
+            return CassetteResponse(entry["status"], entry["response"])
+
+        start_time = time.time()
+        response = self.inner.post(url, json=json, **kwargs)
+        latency = int((time.time() - start_time) * 1000)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        self.cassette.record(json, response.status_code, body, latency)
+        return response
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+def wrap_session(session, cassette: Optional[Cassette] = None):
+    """按环境变量（或指定磁带）包装同步 session，未启用时原样返回"""
+    cassette = cassette or Cassette.from_env()
+    if cassette is None:
+        return session
+    return CassetteSession(cassette, session)
+
+
+# ============== 异步 (aiohttp) ==============
+
+class AsyncCassetteResponse:
+    """回放响应，兼容 aiohttp.ClientResponse 的常用接口"""
+
+    def __init__(self, status: int, body: Any):
+        self.status = status
+        self._body = body
+
+    async def json(self, **kwargs) -> Any:
+        return self._body if not isinstance(self._body, str) else json.loads(self._body)
+
+    async def text(self, **kwargs) -> str:
+        return self._body if isinstance(self._body, str) else json.dumps(self._body, ensure_ascii=False)
+
+
+class _AsyncCassetteRequest:
+    """session.post(...) 的返回值，支持 async with 用法"""
+
+    def __init__(self, session: "AsyncCassetteSession", url: str, payload: Dict, kwargs: Dict):
+        self.session = session
+        self.url = url
+        self.payload = payload
+        self.kwargs = kwargs
+        self._passthrough = None
+
+    async def __aenter__(self):
+        cassette = self.session.cassette
+        if not cassette.intercepts(self.url):
+            self._passthrough = self.session.inner.post(self.url, json=self.payload, **self.kwargs)
+            return await self._passthrough.__aenter__()
+
+        if cassette.mode == "replay":
+            entry = cassette.next_entry(self.payload)
+            delay = cassette.replay_delay(entry)
+            if delay:
+                await asyncio.sleep(delay)
+            if entry is None:
+                return AsyncCassetteResponse(404, MISS_BODY)
+            return AsyncCassetteResponse(entry["status"], entry["response"])
+
+        start_time = time.time()
+        async with self.session.inner.post(self.url, json=self.payload, **self.kwargs) as resp:
+            raw = await resp.text()
+            status = resp.status
+        latency = int((time.time() - start_time) * 1000)
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            body = raw
+        cassette.record(self.payload, status, body, latency)
+        return AsyncCassetteResponse(status, body)
+
+    async def __aexit__(self, *args):
+        if self._passthrough is not None:
+            return await self._passthrough.__aexit__(*args)
+        return False
+
+
+class AsyncCassetteSession:
+    """包装 aiohttp.ClientSession：网关请求经过磁带，Webhook 等请求直接透传"""
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+
+    def post(self, url: str, json: Dict = None, **kwargs) -> _AsyncCassetteRequest:
+        return _AsyncCassetteRequest(self, url, json, kwargs)
+
+    def patch(self, url: str, **kwargs):
+        # 只有 Webhook 消息编辑会用到，直接透传
+        return self.inner.patch(url, **kwargs)
+
+    async def close(self):
+        if self.inner is not None:
+            await self.inner.close()
+
+
+def wrap_async_session(session, cassette: Optional[Cassette] = None):
+    """按环境变量（或指定磁带）包装 aiohttp session，未启用时原样返回"""
+    cassette = cassette or Cassette.from_env()
+    if cassette is None:
+        return session
+    return AsyncCassetteSession(cassette, session)
+
+
+# ============== 磁带摘要 ==============
+
+def summarize_cassette(path: str) -> Dict:
+    """统计磁带中的请求数、延迟和 Token"""
+    entries: List[Dict] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+
+    latencies = [e["latency_ms"] for e in entries if e.get("latency_ms") is not None]
+    tokens = [(e.get("usage") or {}).get("total_tokens") or 0 for e in entries]
+    return {
+        "requests": len(entries),
+        "errors": sum(1 for e in entries if e.get("status") != 200),
+        "total_latency_s": round(sum(latencies) / 1000, 1),
+        "avg_latency_ms": int(sum(latencies) / len(latencies)) if latencies else 0,
+        "total_tokens": sum(tokens),
+        "models": sorted({e["request"].get("model", "") for e in entries}),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python3 llm_cassette.py <cassette.jsonl>")
+        sys.exit(1)
+
+    summary = summarize_cassette(sys.argv[1])
+    print(f"📼 磁带: {sys.argv[1]}")
+    print(f"   请求数: {summary['requests']} (错误 {summary['errors']})")
+    print(f"   总延迟: {summary['total_latency_s']}秒 (平均 {summary['avg_latency_ms']}ms)")
+    print(f"   总 Token: {summary['total_tokens']:,}")
+    print(f"   模型: {', '.join(summary['models'])}")
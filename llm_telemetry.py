@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+LLM Telemetry - 角色级调用统计
+按 (角色, 模型) 持久化记录历史输出长度、延迟、错误和审查结果：
+- 输出长度用于自适应选择 max_tokens：取高分位数再加余量，短输出角色
+  （MEMO/REVIEWER）延迟更低，长输出角色（DEV）不再被硬编码上限截断
+- 延迟、错误率和通过率供 model_router 按角色选择模型
+
+环境变量:
+    QUAD_TELEMETRY_FILE  统计文件路径 (默认: quad_brain_telemetry.json，设为 off 关闭)
+
+使用方法:
+    python3 llm_telemetry.py     # 查看各角色统计和当前推荐的 max_tokens
+"""
+
+import os
+import json
+import math
+import threading
+import contextlib
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，退化为不加文件锁
+    fcntl = None
+
+TELEMETRY_FILE = os.getenv("QUAD_TELEMETRY_FILE", "quad_brain_telemetry.json")
+
+MAX_SAMPLES = 200         # 每个 (角色, 模型) 保留的最近样本数
+MIN_SAMPLES = 5           # 样本不足时使用调用方给定的默认值
+PERCENTILE = 95           # 取历史输出长度的 P95
+HEADROOM = 1.25           # 在分位数基础上预留的余量
+MIN_MAX_TOKENS = 256
+MAX_MAX_TOKENS = 8192
+MAX_CONTINUATIONS = 2     # finish_reason == "length" 时最多续写次数
+
+SAMPLE_FIELDS = ("output_tokens", "latency_ms", "outcomes")   # 保留最近 MAX_SAMPLES 个的样本列表
+COUNTER_FIELDS = ("calls", "truncated", "errors")             # 累加计数
+
+CONTINUE_PROMPT = "你的回复因长度限制被截断了。请从中断处继续输出，不要重复已输出的内容。"
+
+
+def continuation_messages(messages: List[Dict], partial: str) -> List[Dict]:
+    """构造续写请求的消息列表：原消息 + 已输出部分 + 续写指令"""
+    return messages + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+def percentile(values: List[int], pct: float) -> float:
+    """线性插值分位数"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(ordered[low])
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class OutputLengthStats:
+    """
+    (角色, 模型) 输出长度统计
+
+    记录的是续写合并后的完整输出 token 数，因此分布反映真实长度，
+    而不是被 max_tokens 截断后的长度。
+
+    多个进程（brain_workers 的工作进程）共用同一个统计文件：每个进程只记下自上次
+    写入以来的新增样本，写入时在文件锁内重新读取文件、合并新增部分再写回，
+    不会互相覆盖对方的样本。
+    """
+
+    def __init__(self, path: Optional[str] = TELEMETRY_FILE):
+        self.path = None if path in (None, "", "off") else path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = self._read() if self.path else {}
+        self._pending: Dict[str, Dict] = {}  # 尚未写入文件的新增样本
+
+    def _read(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("roles", {})
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _key(role: str, model: str) -> str:
+        return f"{role}|{model}"
+
+    @staticmethod
+    def _fill(entry: Dict) -> Dict:
+        # 兼容只有输出长度字段的旧统计文件
+        for name in SAMPLE_FIELDS:
+            entry.setdefault(name, [])
+        for name in COUNTER_FIELDS:
+            entry.setdefault(name, 0)
+        return entry
+
+    def _entries(self, role: str, model: str):
+        """(内存中的统计, 待写入的新增部分)"""
+        key = self._key(role, model)
+        return (self._fill(self._data.setdefault(key, {})),
+                self._fill(self._pending.setdefault(key, {})))
+
+    def record(self, role: str, model: str, completion_tokens: Optional[int],
+               truncated: bool = False, latency_ms: Optional[int] = None):
+        """记录一次成功调用的输出长度和延迟"""
+        if not role:
+            return
+        with self._lock:
+            for entry in self._entries(role, model):
+                if completion_tokens is not None:
+                    entry["output_tokens"] = (entry["output_tokens"] + [int(completion_tokens)])[-MAX_SAMPLES:]
+                if latency_ms is not None:
+                    entry["latency_ms"] = (entry["latency_ms"] + [int(latency_ms)])[-MAX_SAMPLES:]
+                entry["calls"] += 1
+                if truncated:
+                    entry["truncated"] += 1
+            self._save()
+
+    def record_error(self, role: str, model: str):
+        """记录一次失败调用（HTTP 错误或请求异常）"""
+        if not role:
+            return
+        with self._lock:
+            for entry in self._entries(role, model):
+                entry["calls"] += 1
+                entry["errors"] += 1
+            self._save()
+
+    def record_outcome(self, role: str, model: str, success: bool):
+        """
+        记录一次输出的质量结果
+
+        DEV 记录代码是否通过审查，审查类角色记录能否给出明确结论。
+        """
+        if not role:
+            return
+        with self._lock:
+            for entry in self._entries(role, model):
+                entry["outcomes"] = (entry["outcomes"] + [1 if success else 0])[-MAX_SAMPLES:]
+            self._save()
+
+    def model_health(self, role: str, model: str) -> Dict:
+        """
+        (角色, 模型) 的实测表现
+
+        Returns:
+            {"calls", "error_rate", "success_rate", "outcome_samples", "p50_latency_ms"}
+            没有样本的项为 None
+        """
+        with self._lock:
+            entry = dict(self._data.get(self._key(role, model), {}))
+        calls = entry.get("calls", 0)
+        outcomes = entry.get("outcomes", [])
+        latencies = entry.get("latency_ms", [])
+        return {
+            "calls": calls,
+            "error_rate": entry.get("errors", 0) / calls if calls else None,
+            "success_rate": sum(outcomes) / len(outcomes) if outcomes else None,
+            "outcome_samples": len(outcomes),
+            "p50_latency_ms": percentile(latencies, 50) if latencies else None,
+        }
+
+    def choose_max_tokens(self, role: str, model: str, default: int) -> int:
+        """
+        根据历史输出长度选择 max_tokens
+
+        样本不足时返回 default；否则取 P95 × 余量，向上取整到 64 的倍数。
+        """
+        with self._lock:
+            samples = self._data.get(self._key(role, model), {}).get("output_tokens", [])
+            if len(samples) < MIN_SAMPLES:
+                return default
+            target = percentile(samples, PERCENTILE) * HEADROOM
+        target = int(math.ceil(target / 64) * 64)
+        return max(MIN_MAX_TOKENS, min(MAX_MAX_TOKENS, target))
+
+    def summary(self) -> Dict[str, Dict]:
+        """各 (角色, 模型) 的统计摘要"""
+        with self._lock:
+            items = list(self._data.items())
+        result = {}
+        for key, entry in items:
+            samples = entry.get("output_tokens", [])
+            role, _, model = key.partition("|")
+            health = self.model_health(role, model)
+            result[key] = {
+                "role": role,
+                "model": model,
+                "calls": entry.get("calls", 0),
+                "truncated": entry.get("truncated", 0),
+                "errors": entry.get("errors", 0),
+                "p50": round(percentile(samples, 50)),
+                "p95": round(percentile(samples, PERCENTILE)),
+                "max_tokens": self.choose_max_tokens(role, model, 0),
+                "p50_latency_ms": round(health["p50_latency_ms"] or 0),
+                "success_rate": health["success_rate"],
+            }
+        return result
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """跨进程的文件锁（锁文件与统计文件同目录）"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        """在文件锁内重新读取文件，合并本进程的新增样本后写回"""
+        if not self.path:
+            self._pending.clear()
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with self._file_lock():
+                data = self._read()
+                for key, delta in self._pending.items():
+                    entry = self._fill(data.setdefault(key, {}))
+                    for name in SAMPLE_FIELDS:
+                        entry[name] = (entry[name] + delta[name])[-MAX_SAMPLES:]
+                    for name in COUNTER_FIELDS:
+                        entry[name] += delta[name]
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": 1, "roles": data}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            self._data = data
+            self._pending.clear()
+        except OSError as e:
+            print(f"  ⚠️ 统计文件写入失败: {e}")
+
+
+_DEFAULT_STATS: Optional[OutputLengthStats] = None
+
+
+def get_output_stats() -> OutputLengthStats:
+    """进程内共享的统计实例"""
+    global _DEFAULT_STATS
+    if _DEFAULT_STATS is None:
+        _DEFAULT_STATS = OutputLengthStats()
+    return _DEFAULT_STATS
+
+
+def set_output_stats(stats: Optional[OutputLengthStats]) -> Optional[OutputLengthStats]:
+    """
+    替换进程内共享的统计实例，返回原实例
+
+    基准测试的模拟/回放运行用它换成不落盘的统计 (OutputLengthStats(None))，
+    避免零延迟或合成的样本污染驱动 model_router 和自适应 max_tokens 的真实统计。
+    """
+    global _DEFAULT_STATS
+    previous = _DEFAULT_STATS
+    _DEFAULT_STATS = stats
+    return previous
+
+
+if __name__ == "__main__":
+    stats = get_output_stats()
+    summary = stats.summary()
+    if not summary:
+        print(f"ℹ️ 暂无统计数据 ({TELEMETRY_FILE})")
+    else:
+        print(f"📊 角色输出长度统计 ({TELEMETRY_FILE})")
+        print(f"{'角色':<12}{'模型':<24}{'调用':>6}{'截断':>6}{'错误':>6}{'P50':>8}{'P95':>8}"
+              f"{'max_tokens':>12}{'延迟P50':>10}{'成功率':>8}")
+        for item in summary.values():
+            max_tokens = item["max_tokens"] or "默认"
+            success = "-" if item["success_rate"] is None else f"{item['success_rate']:.0%}"
+            print(f"{item['role']:<12}{item['model']:<24}{item['calls']:>6}{item['truncated']:>6}"
+                  f"{item['errors']:>6}{item['p50']:>8}{item['p95']:>8}{max_tokens:>12}"
+                  f"{item['p50_latency_ms']:>10}{success:>8}")
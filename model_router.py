@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Model Router - 按角色选择模型
+REVIEWER 结论、MEMO 总结不需要 DEV 用的重型代码模型。路由表按
+(工作流, 角色) 给出候选模型链（由便宜到强），结合 llm_telemetry 实测的
+延迟、错误率和通过率选择模型；审查 FAIL 或结论无法解析时升级到链上更强的模型，
+调用失败时沿链回退。
+
+环境变量:
+    QUAD_FAST_MODEL    轻量模型（不设置则与主模型相同，即不分流）
+    QUAD_ROUTES_FILE   自定义路由表 JSON，格式同 DEFAULT_ROUTES
+
+使用方法:
+    python3 model_router.py                  # 查看默认路由
+    python3 model_router.py -w enterprise    # 查看某个工作流的路由和实测数据
+"""
+
+import os
+import json
+from typing import Dict, List, Optional
+
+from llm_telemetry import OutputLengthStats, get_output_stats
+from run_budget import price_per_1k
+
+# ============== 路由表 ==============
+
+FAST_MODEL = os.getenv("QUAD_FAST_MODEL", "")
+
+# 工作流 → 角色 → 候选模型链（由便宜到强）；"*" 为默认角色，"default" 为默认工作流。
+# "heavy" 指主模型（QUAD_MODEL / --model），"fast" 指 QUAD_FAST_MODEL，也可直接写模型名
+DEFAULT_ROUTES: Dict[str, Dict[str, List[str]]] = {
+    "default": {
+        "PM": ["fast", "heavy"],
+        "DEV": ["heavy"],
+        "REVIEWER": ["fast", "heavy"],
+        "TESTER": ["fast", "heavy"],
+        "SECURITY": ["heavy"],
+        "MEMO": ["fast"],
+        "WRITER": ["fast", "heavy"],
+        "*": ["heavy"],
+    },
+    # MVP 追求速度：PM 只用轻量模型，DEV 被打回后再升级
+    "mvp_fast": {
+        "PM": ["fast"],
+        "DEV": ["fast", "heavy"],
+    },
+    # 安全优先：审查类角色始终使用主模型
+    "security_first": {
+        "REVIEWER": ["heavy"],
+        "TESTER": ["heavy"],
+    },
+}
+
+MIN_OUTCOME_SAMPLES = 5    # 通过率样本不足时不参与判断
+MIN_SUCCESS_RATE = 0.6     # 低于该通过率的模型不再被选中
+MAX_ERROR_RATE = 0.2       # 高于该错误率的模型不再被选中
+COST_WEIGHT = 100          # 每千 Token 单价折算成秒的权重（0.01 ≈ 1 秒）
+
+# 给出 verdict 的角色，结论无法解析时视为低置信度
+VERDICT_ROLES = ("REVIEWER", "TESTER", "SECURITY")
+
+
+def load_routes(path: Optional[str] = None) -> Dict[str, Dict[str, List[str]]]:
+    """加载路由表：默认路由 + 自定义文件覆盖"""
+    routes = {wf: dict(roles) for wf, roles in DEFAULT_ROUTES.items()}
+    path = path or os.getenv("QUAD_ROUTES_FILE", "")
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for wf, roles in json.load(f).items():
+                routes.setdefault(wf, {}).update(roles)
+    return routes
+
+
+def _dedupe(models: List[str]) -> List[str]:
+    return [m for i, m in enumerate(models) if m and m not in models[:i]]
+
+
+class ModelRouter:
+    """
+    按 (工作流, 角色) 选择模型
+
+    escalation 为升级级别：0 从链首开始选择，每升一级跳过链上最便宜的一个模型。
+    """
+
+    def __init__(self, workflow_id: Optional[str] = None, base_model: str = "kimi-coding/k2p5",
+                 stats: Optional[OutputLengthStats] = None,
+                 routes: Optional[Dict[str, Dict[str, List[str]]]] = None,
+                 fast_model: str = FAST_MODEL):
+        self.workflow_id = workflow_id
+        self.base_model = base_model
+        self.aliases = {"heavy": base_model, "fast": fast_model or base_model}
+        self.stats = stats or get_output_stats()
+        self.routes = routes or load_routes()
+
+    def chain(self, role: str) -> List[str]:
+        """角色的候选模型链；base_model 始终作为最后的兜底"""
+        workflow_routes = self.routes.get(self.workflow_id or "", {})
+        default_routes = self.routes.get("default", {})
+        models = (workflow_routes.get(role) or default_routes.get(role)
+                  or workflow_routes.get("*") or default_routes.get("*") or [])
+        return _dedupe([self.aliases.get(m, m) for m in models] + [self.base_model])
+
+    def healthy(self, role: str, model: str) -> bool:
+        """实测错误率和通过率是否达标（样本不足视为达标）"""
+        health = self.stats.model_health(role, model)
+        if health["error_rate"] is not None and health["calls"] >= MIN_OUTCOME_SAMPLES \
+                and health["error_rate"] > MAX_ERROR_RATE:
+            return False
+        if health["outcome_samples"] >= MIN_OUTCOME_SAMPLES \
+                and health["success_rate"] < MIN_SUCCESS_RATE:
+            return False
+        return True
+
+    def score(self, role: str, model: str) -> float:
+        """代价分：P50 延迟（秒）+ 单价折算；未测量的延迟按 0 计，便于探索新模型"""
+        latency_ms = self.stats.model_health(role, model)["p50_latency_ms"] or 0
+        return latency_ms / 1000 + COST_WEIGHT * price_per_1k(model)
+
+    def plan(self, role: str, escalation: int = 0) -> List[str]:
+        """
+        本次调用的模型尝试顺序
+
+        Returns:
+            首个为选中的模型，其后为调用失败时依次回退的模型
+        """
+        chain = self.chain(role)
+        pool = chain[min(escalation, len(chain) - 1):]
+        eligible = [m for m in pool if self.healthy(role, m)]
+        if not eligible:
+            # 全部不达标时用链上最强的模型
+            return [pool[-1]]
+        chosen = min(eligible, key=lambda m: self.score(role, m))
+        return [chosen] + [m for m in eligible if m != chosen]
+
+    def route(self, role: str, escalation: int = 0) -> str:
+        return self.plan(role, escalation)[0]
+
+    def can_escalate(self, role: str, model: str) -> bool:
+        """链上是否还有比当前模型更强的模型"""
+        chain = self.chain(role)
+        return model in chain and chain.index(model) < len(chain) - 1
+
+    def escalation_of(self, role: str, model: str) -> int:
+        """当前模型在链上的位置，用于“再升一级”"""
+        chain = self.chain(role)
+        return chain.index(model) if model in chain else 0
+
+    def describe(self) -> Dict[str, str]:
+        """各角色当前会选中的模型"""
+        roles = set(self.routes.get("default", {})) | set(self.routes.get(self.workflow_id or "", {}))
+        roles.discard("*")
+        return {role: self.route(role) for role in sorted(roles)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='查看角色模型路由')
+    parser.add_argument('--workflow', '-w', help='工作流ID')
+    parser.add_argument('--model', '-m', default=os.getenv("QUAD_MODEL", "kimi-coding/k2p5"),
+                        help='主模型')
+    args = parser.parse_args()
+
+    router = ModelRouter(args.workflow, base_model=args.model)
+    print(f"🧭 模型路由 (工作流: {args.workflow or 'default'})")
+    print(f"   主模型: {args.model}  轻量模型: {FAST_MODEL or '未设置'}\n")
+    for role in router.describe():
+        chain = router.chain(role)
+        chosen = router.route(role)
+        print(f"  {role:<10} → {chosen}")
+        for model in chain:
+            health = router.stats.model_health(role, model)
+            latency = health["p50_latency_ms"]
+            success = health["success_rate"]
+            mark = "✅" if router.healthy(role, model) else "⚠️"
+            print(f"      {mark} {model:<24} 延迟P50 {'-' if latency is None else f'{latency:.0f}ms':>8}"
+                  f"  通过率 {'-' if success is None else f'{success:.0%}':>5}  单价 {price_per_1k(model)}")
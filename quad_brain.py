@@ -6,14 +6,22 @@ Quad Brain Collaboration System
 """
 
 import os
+import re
 import sys
 import json
 import time
 import requests
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 from dataclasses import dataclass
 
+from llm_cassette import wrap_session
+from llm_telemetry import get_output_stats, continuation_messages, MAX_CONTINUATIONS
+from model_router import ModelRouter
+from background_jobs import JobManager, run_repl, MAX_JOBS
+from report_archive import ArchivedRun, archive_run, confirm_skip_pm, find_prior_run, output_from
+from run_trace import Tracer
+
 # ============== 配置区域 ==============
 
 # OpenClaw Gateway 配置
@@ -23,6 +31,10 @@ OPENCLAW_TOKEN = os.getenv("OPENCLAW_TOKEN", "")
 # 模型选择 (从配置中选择一个)
 MODEL = os.getenv("QUAD_MODEL", "kimi-coding/k2p5")
 
+# 无历史统计时的默认 max_tokens（有统计后按角色自适应）
+DEFAULT_MAX_TOKENS = 2000
+REUSE_MODE = os.getenv("QUAD_REUSE", "off")  # 相似历史任务的复用方式: off / seed / skip-pm
+
 # Discord Webhooks (可选，如果不配置则在本地输出)
 WEBHOOKS = {
     "PM": os.getenv("WEBHOOK_PM", ""),
@@ -131,6 +143,7 @@ class BrainOutput:
     timestamp: str
     tokens_used: Optional[int] = None
     latency_ms: Optional[int] = None
+    model: Optional[str] = None  # 实际使用的模型
 
 
 @dataclass
@@ -142,6 +155,8 @@ class CollaborationResult:
     reviewer_output: BrainOutput
     memo_output: BrainOutput
     total_time: float
+    trace_path: Optional[str] = None  # 运行时间线（Chrome trace-event JSON）
+    final_verdict: Optional[str] = None  # REVIEWER 结论: PASS / FAIL，调用失败时为 None
 
 
 # ============== 核心类 ==============
@@ -153,45 +168,94 @@ class QuadBrainSystem:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {OPENCLAW_TOKEN}"
         })
+        self.session = wrap_session(self.session)
+        self.output_stats = get_output_stats()
+        self.router = ModelRouter("quad_basic", base_model=MODEL)
         self.results: Dict[str, BrainOutput] = {}
+        self.last_model = MODEL
+        self.progress: Optional[Callable[[str], None]] = None  # 阶段进度钩子（后台任务模式）
+        self.tracer = Tracer(enabled=False)  # 每次运行开始时替换
         
-    def call_llm(self, persona: str, context: str) -> tuple[str, Optional[int]]:
-        """调用 OpenClaw API，返回 (内容, token数)"""
+    def call_llm(self, persona: str, context: str, role: str = "") -> tuple[str, Optional[int], Optional[int]]:
+        """
+        调用 OpenClaw API，返回 (内容, token数, 延迟ms)
+
+        max_tokens 按角色历史输出长度自适应选择；回复因长度截断时自动续写。
+        模型由 model_router 按角色选择（未配置 QUAD_FAST_MODEL 时即 MODEL）。
+        """
+        entry = self.tracer.now()
+        messages = [
+            {"role": "system", "content": persona},
+            {"role": "user", "content": context}
+        ]
+        model = self.router.route(role) if role else MODEL
+        self.last_model = model
         payload = {
-            "model": MODEL,
-            "messages": [
-                {"role": "system", "content": persona},
-                {"role": "user", "content": context}
-            ],
+            "model": model,
+            "messages": messages,
             "temperature": 0.7,
-            "max_tokens": 2000
+            "max_tokens": self.output_stats.choose_max_tokens(role, model, DEFAULT_MAX_TOKENS)
         }
+        self.tracer.complete("queue", "llm", entry, max_tokens=payload["max_tokens"])
         
         try:
             start_time = time.time()
-            response = self.session.post(
-                f"{OPENCLAW_BASE_URL}/v1/chat/completions",
-                json=payload,
-                timeout=120
-            )
-            latency = int((time.time() - start_time) * 1000)
+            content = ""
+            tokens = None
+            completion_tokens = None
+            truncated = False
             
-            if response.status_code == 200:
+            for continuation in range(MAX_CONTINUATIONS + 1):
+                response = self.tracer.post(
+                    self.session,
+                    f"{OPENCLAW_BASE_URL}/v1/chat/completions",
+                    name="续写请求" if continuation else "请求",
+                    json=payload,
+                    timeout=120
+                )
+                
+                if response.status_code != 200:
+                    if content:
+                        # 续写失败时保留已生成的部分
+                        break
+                    self.output_stats.record_error(role, model)
+                    latency = int((time.time() - start_time) * 1000)
+                    error_msg = f"❌ API 错误 (HTTP {response.status_code}): {response.text[:200]}"
+                    return error_msg, None, latency
+                
                 data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                tokens = data.get("usage", {}).get("total_tokens")
-                return content, tokens, latency
-            else:
-                error_msg = f"❌ API 错误 (HTTP {response.status_code}): {response.text[:200]}"
-                return error_msg, None, latency
+                choice = data["choices"][0]
+                content += choice["message"]["content"]
+                usage = data.get("usage", {})
+                if usage.get("total_tokens") is not None:
+                    tokens = (tokens or 0) + usage["total_tokens"]
+                if usage.get("completion_tokens") is not None:
+                    completion_tokens = (completion_tokens or 0) + usage["completion_tokens"]
+                
+                truncated = choice.get("finish_reason") == "length"
+                if not truncated:
+                    break
+                print(f"  ✂️ {role or 'LLM'} 输出被截断，自动续写...")
+                payload = dict(payload, messages=continuation_messages(messages, content))
+            
+            latency = int((time.time() - start_time) * 1000)
+            self.output_stats.record(role, model, completion_tokens, truncated, latency)
+            return content, tokens, latency
                 
         except requests.exceptions.Timeout:
+            self.output_stats.record_error(role, model)
             return "❌ 请求超时，请检查 OpenClaw 是否运行正常", None, None
         except requests.exceptions.ConnectionError:
+            self.output_stats.record_error(role, model)
             return f"❌ 无法连接到 OpenClaw ({OPENCLAW_BASE_URL})，请确认服务已启动", None, None
         except Exception as e:
             return f"❌ 请求异常: {str(e)}", None, None
     
+    def _progress(self, stage: str):
+        """通知进入新阶段（后台任务模式下用于进度行和取消检查）"""
+        if self.progress:
+            self.progress(stage)
+    
     def send_to_discord(self, role: str, content: str) -> bool:
         """通过 Webhook 发送到 Discord"""
         webhook_url = WEBHOOKS.get(role)
@@ -209,7 +273,9 @@ class QuadBrainSystem:
         }
         
         try:
-            response = requests.post(webhook_url, json=data, timeout=10)
+            with self.tracer.span(f"Discord {role}", "discord") as span:
+                response = requests.post(webhook_url, json=data, timeout=10)
+                span["status"] = response.status_code
             return response.status_code in [200, 204]
         except Exception as e:
             print(f"  ⚠️ Discord 发送失败: {e}")
@@ -243,28 +309,53 @@ class QuadBrainSystem:
     def run_pipeline(self, user_input: str) -> CollaborationResult:
         """运行四脑流水线"""
         start_time = time.time()
+        self.tracer = Tracer.for_run("quad", task=user_input, model=MODEL)
+        run_start = self.tracer.now()
         print(f"\n🚀 四脑协同流水线启动")
         print(f"   任务: {user_input[:50]}{'...' if len(user_input) > 50 else ''}")
         print(f"   模型: {MODEL}")
+        prior = find_prior_run(user_input)
+        if prior:
+            hint = f"复用方式: {REUSE_MODE}" if REUSE_MODE != "off" else "--reuse seed/skip-pm 可复用"
+            print(f"   🔁 相似历史任务: {prior.describe()}（{hint}）")
+            if REUSE_MODE == "off":
+                prior = None
         print(f"   时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         
         # ========== 1. PM 阶段 ==========
-        print(f"📝 阶段 1/4: PM 分析需求...")
-        pm_content, pm_tokens, pm_latency = self.call_llm(
-            PERSONAS["PM"],
-            f"用户需求: {user_input}"
-        )
-        self.results["PM"] = BrainOutput(
-            role="PM",
-            content=pm_content,
-            timestamp=datetime.now().isoformat(),
-            tokens_used=pm_tokens,
-            latency_ms=pm_latency
-        )
-        self.broadcast("PM", pm_content, "需求分析")
-        time.sleep(1)
+        self._progress("PM")
+        if prior and REUSE_MODE == "skip-pm" and confirm_skip_pm(prior, user_input):
+            print(f"♻️ 阶段 1/4: 复用历史运行 #{prior.run_id} 的规格书，跳过 PM")
+            pm_content = prior.pm
+            self.results["PM"] = BrainOutput(
+                role="PM",
+                content=pm_content,
+                timestamp=datetime.now().isoformat(),
+                model=f"reuse#{prior.run_id}"
+            )
+            self.broadcast("PM", pm_content, f"需求分析·复用 #{prior.run_id}")
+        else:
+            print(f"📝 阶段 1/4: PM 分析需求...")
+            with self.tracer.span("PM", "role") as span:
+                pm_content, pm_tokens, pm_latency = self.call_llm(
+                    PERSONAS["PM"],
+                    f"用户需求: {user_input}" + (prior.pm_reference() if prior else ""),
+                    role="PM"
+                )
+                span.update(model=self.last_model, tokens=pm_tokens)
+            self.results["PM"] = BrainOutput(
+                role="PM",
+                content=pm_content,
+                timestamp=datetime.now().isoformat(),
+                tokens_used=pm_tokens,
+                latency_ms=pm_latency,
+                model=self.last_model
+            )
+            self.broadcast("PM", pm_content, "需求分析")
+            self.tracer.sleep(1, "阶段间隔")
         
         # ========== 2. DEV 阶段 ==========
+        self._progress("DEV")
         print(f"💻 阶段 2/4: DEV 编写代码...")
         dev_context = f"""原始需求: {user_input}
 
@@ -272,22 +363,29 @@ class QuadBrainSystem:
 {pm_content}
 
 请根据以上需求编写代码。"""
+        if prior:
+            dev_context += prior.dev_reference()
         
-        dev_content, dev_tokens, dev_latency = self.call_llm(
-            PERSONAS["DEV"],
-            dev_context
-        )
+        with self.tracer.span("DEV", "role") as span:
+            dev_content, dev_tokens, dev_latency = self.call_llm(
+                PERSONAS["DEV"],
+                dev_context,
+                role="DEV"
+            )
+            span.update(model=self.last_model, tokens=dev_tokens)
         self.results["DEV"] = BrainOutput(
             role="DEV",
             content=dev_content,
             timestamp=datetime.now().isoformat(),
             tokens_used=dev_tokens,
-            latency_ms=dev_latency
+            latency_ms=dev_latency,
+            model=self.last_model
         )
         self.broadcast("DEV", dev_content, "代码实现")
-        time.sleep(1)
+        self.tracer.sleep(1, "阶段间隔")
         
         # ========== 3. REVIEWER 阶段 ==========
+        self._progress("REVIEWER")
         print(f"🔍 阶段 3/4: REVIEWER 审查代码...")
         review_context = f"""原始需求: {user_input}
 
@@ -299,21 +397,26 @@ class QuadBrainSystem:
 
 请审查这段代码。"""
         
-        review_content, review_tokens, review_latency = self.call_llm(
-            PERSONAS["REVIEWER"],
-            review_context
-        )
+        with self.tracer.span("REVIEWER", "role") as span:
+            review_content, review_tokens, review_latency = self.call_llm(
+                PERSONAS["REVIEWER"],
+                review_context,
+                role="REVIEWER"
+            )
+            span.update(model=self.last_model, tokens=review_tokens)
         self.results["REVIEWER"] = BrainOutput(
             role="REVIEWER",
             content=review_content,
             timestamp=datetime.now().isoformat(),
             tokens_used=review_tokens,
-            latency_ms=review_latency
+            latency_ms=review_latency,
+            model=self.last_model
         )
         self.broadcast("REVIEWER", review_content, "代码审查")
-        time.sleep(1)
+        self.tracer.sleep(1, "阶段间隔")
         
         # ========== 4. MEMO 阶段 ==========
+        self._progress("MEMO")
         print(f"📋 阶段 4/4: MEMO 生成日报...")
         memo_context = f"""请总结以下协作过程，生成执行摘要。
 
@@ -329,21 +432,27 @@ class QuadBrainSystem:
 审查意见:
 {review_content}"""
         
-        memo_content, memo_tokens, memo_latency = self.call_llm(
-            PERSONAS["MEMO"],
-            memo_context
-        )
+        with self.tracer.span("MEMO", "role") as span:
+            memo_content, memo_tokens, memo_latency = self.call_llm(
+                PERSONAS["MEMO"],
+                memo_context,
+                role="MEMO"
+            )
+            span.update(model=self.last_model, tokens=memo_tokens)
         self.results["MEMO"] = BrainOutput(
             role="MEMO",
             content=memo_content,
             timestamp=datetime.now().isoformat(),
             tokens_used=memo_tokens,
-            latency_ms=memo_latency
+            latency_ms=memo_latency,
+            model=self.last_model
         )
         self.broadcast("MEMO", memo_content, "执行摘要")
         
         # 计算总时间
         total_time = time.time() - start_time
+        self.tracer.complete("quad", "run", run_start)
+        trace_path = self.tracer.save()
         
         # 输出统计
         print(f"\n✅ 四脑协同完成！")
@@ -354,6 +463,8 @@ class QuadBrainSystem:
         ])
         if total_tokens > 0:
             print(f"   总 Token: {total_tokens:,}")
+        if trace_path:
+            print(f"   时间线: {trace_path}")
         
         return CollaborationResult(
             original_input=user_input,
@@ -361,21 +472,49 @@ class QuadBrainSystem:
             dev_output=self.results["DEV"],
             reviewer_output=self.results["REVIEWER"],
             memo_output=self.results["MEMO"],
-            total_time=total_time
+            total_time=total_time,
+            trace_path=trace_path,
+            final_verdict=self.parse_verdict(review_content)
         )
     
+    @staticmethod
+    def parse_verdict(content: str) -> Optional[str]:
+        """
+        解析 REVIEWER 结论
+
+        人格要求没有问题时回复"✅ PASS"，有问题时直接列出问题，
+        所以没有 PASS 标记的审查意见视为 FAIL；调用失败（❌ 开头）时返回 None。
+        """
+        if not content or content.startswith("❌"):
+            return None
+        match = re.search(r'\*\*VERDICT:\s*(PASS|FAIL)\*\*', content, re.IGNORECASE)
+        if match:
+            return match.group(1).upper()
+        for line in reversed(content.strip().split('\n')):
+            line_upper = line.upper()
+            if 'FAIL' in line_upper:
+                return 'FAIL'
+            if 'PASS' in line_upper:
+                return 'PASS'
+        return 'FAIL'
+    
     def save_report(self, result: CollaborationResult, filename: Optional[str] = None):
         """保存完整报告到文件"""
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"quad_brain_report_{timestamp}.md"
         
+        trace_md = ""
+        if result.trace_path:
+            trace_md = f"**时间线**: [{result.trace_path}]({result.trace_path})（用 ui.perfetto.dev 或 chrome://tracing 打开）\n"
+        
         report = f"""# 🧠 四脑协同报告
 
 **任务**: {result.original_input}
 **时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 **总耗时**: {result.total_time:.1f}秒
-
+**最终审查**: {result.final_verdict or 'UNKNOWN'}
+{trace_md}
 ---
 
 ## 📝 PM·产品经理
@@ -409,16 +548,24 @@ class QuadBrainSystem:
             f.write(report)
         
         print(f"   报告已保存: {filename}")
+        archive_run(ArchivedRun(
+            pipeline="quad",
+            task=result.original_input,
+            model=MODEL,
+            outputs=[output_from(o) for o in (result.pm_output, result.dev_output,
+                                                result.reviewer_output, result.memo_output)],
+            total_time=result.total_time,
+            final_verdict=result.final_verdict,
+            report_path=filename,
+        ))
         return filename
 
 
 # ============== 交互模式 ==============
 
-def interactive_mode():
-    """交互式运行"""
-    system = QuadBrainSystem()
-    
-    print("""
+def interactive_mode(max_jobs: int = MAX_JOBS, save: bool = True):
+    """交互式运行：每个任务在后台执行，可同时进行多个"""
+    banner = """
 ╔══════════════════════════════════════════════════════════╗
 ║           🧠 Quad Brain Collaboration System              ║
 ║                   四脑协同流水线                          ║
@@ -426,45 +573,14 @@ def interactive_mode():
 ║  PM  →  DEV  →  REVIEWER  →  MEMO                        ║
 ║  需求   开发     审查        总结                         ║
 ╚══════════════════════════════════════════════════════════╝
-
-命令:
-  <任务描述>     启动四脑协作
-  save          保存上次报告
-  quit/exit     退出
-""")
-    
-    last_result: Optional[CollaborationResult] = None
-    
-    while True:
-        try:
-            user_input = input("\n🎯 任务> ").strip()
-            
-            if not user_input:
-                continue
-            
-            if user_input.lower() in ['quit', 'exit', 'q']:
-                print("👋 再见!")
-                break
-            
-            if user_input.lower() == 'save':
-                if last_result:
-                    system.save_report(last_result)
-                else:
-                    print("⚠️ 没有可保存的报告，先执行一个任务")
-                continue
-            
-            # 运行流水线
-            result = system.run_pipeline(user_input)
-            last_result = result
-            
-            # 自动保存
-            system.save_report(result)
-            
-        except KeyboardInterrupt:
-            print("\n\n👋 再见!")
-            break
-        except Exception as e:
-            print(f"❌ 错误: {e}")
+"""
+    manager = JobManager(
+        QuadBrainSystem,
+        lambda system, task: system.run_pipeline(task),
+        max_jobs=max_jobs,
+        auto_save=save,
+    )
+    run_repl(manager, banner)
 
 
 def single_run(task: str, save: bool = True):
@@ -487,12 +603,17 @@ if __name__ == "__main__":
     parser.add_argument('task', nargs='?', help='任务描述（如果不提供则进入交互模式）')
     parser.add_argument('--no-save', action='store_true', help='不保存报告')
     parser.add_argument('--model', default=MODEL, help=f'模型名称 (默认: {MODEL})')
+    parser.add_argument('--jobs', '-j', type=int, default=MAX_JOBS,
+                        help=f'交互模式同时运行的任务数 (默认: {MAX_JOBS})')
+    parser.add_argument('--reuse', choices=['off', 'seed', 'skip-pm'], default=REUSE_MODE,
+                        help=f'相似历史任务的复用方式 (默认: {REUSE_MODE})')
     
     args = parser.parse_args()
     
     # 更新模型
     if args.model:
         MODEL = args.model
+    REUSE_MODE = args.reuse
     
     # 检查配置
     if not OPENCLAW_TOKEN:
@@ -507,4 +628,4 @@ if __name__ == "__main__":
     if args.task:
         single_run(args.task, save=not args.no_save)
     else:
-        interactive_mode()
+        interactive_mode(max_jobs=args.jobs, save=not args.no_save)
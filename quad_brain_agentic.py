@@ -16,15 +16,25 @@ import json
 import time
 import requests
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 from dataclasses import dataclass, field
 
+from llm_cassette import wrap_session
+from llm_telemetry import get_output_stats, continuation_messages, MAX_CONTINUATIONS
+from run_budget import RunBudget, BudgetExceeded, estimate_tokens, add_budget_arguments, budget_from_args
+from model_router import ModelRouter
+from background_jobs import JobManager, run_repl, MAX_JOBS
+from report_archive import ArchivedRun, PriorRun, archive_run, confirm_skip_pm, find_prior_run, output_from
+from run_trace import Tracer
+
 # ============== 配置区域 ==============
 
 OPENCLAW_BASE_URL = os.getenv("OPENCLAW_URL", "http://localhost:18789")
 OPENCLAW_TOKEN = os.getenv("OPENCLAW_TOKEN", "")
 MODEL = os.getenv("QUAD_MODEL", "kimi-coding/k2p5")
 MAX_RETRIES = 3  # 最大重写次数
+DEFAULT_MAX_TOKENS = 2000  # 无历史统计时的默认 max_tokens
+REUSE_MODE = os.getenv("QUAD_REUSE", "off")  # 相似历史任务的复用方式: off / seed / skip-pm
 
 WEBHOOKS = {
     "PM": os.getenv("WEBHOOK_PM", ""),
@@ -99,6 +109,7 @@ class BrainOutput:
     tokens_used: Optional[int] = None
     latency_ms: Optional[int] = None
     attempt: int = 1  # 第几次尝试
+    model: Optional[str] = None  # 实际使用的模型
 
 
 @dataclass
@@ -112,6 +123,8 @@ class CollaborationResult:
     memo_output: Optional[BrainOutput] = None
     total_time: float = 0
     total_attempts: int = 0
+    budget: Optional[Dict] = None  # 预算使用摘要（未设置预算时为 None）
+    trace_path: Optional[str] = None  # 运行时间线（Chrome trace-event JSON）
 
 
 # ============== 核心类 ==============
@@ -123,41 +136,128 @@ class AgenticQuadBrain:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {OPENCLAW_TOKEN}"
         })
+        self.session = wrap_session(self.session)
+        self.output_stats = get_output_stats()
+        self.budget: Optional[RunBudget] = None
+        self.router = ModelRouter("quad_basic", base_model=MODEL)
+        self.last_model = MODEL
         self.iteration = 0
+        self.progress: Optional[Callable[[str], None]] = None  # 阶段进度钩子（后台任务模式）
+        self.prior: Optional[PriorRun] = None  # 复用的相似历史运行
+        self.tracer = Tracer(enabled=False)  # 每次运行开始时替换
         
-    def call_llm(self, persona: str, context: str) -> Tuple[str, Optional[int], Optional[int]]:
-        """调用 OpenClaw API"""
+    def call_llm(self, persona: str, context: str, role: str = "",
+                 model: Optional[str] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        """
+        调用 OpenClaw API
+
+        max_tokens 按角色历史输出长度自适应选择；回复因长度截断时自动续写。
+        设置了预算时调用前先检查，不足时降级模型或抛出 BudgetExceeded。
+        实际使用的模型记录在 self.last_model。
+        """
+        entry = self.tracer.now()
+        messages = [
+            {"role": "system", "content": persona},
+            {"role": "user", "content": context}
+        ]
+        model = model or MODEL
+        max_tokens = self.output_stats.choose_max_tokens(role, model, DEFAULT_MAX_TOKENS)
+        if self.budget:
+            model = self.budget.admit(role, model, estimate_tokens(persona + context) + max_tokens)
+        self.last_model = model
         payload = {
-            "model": MODEL,
-            "messages": [
-                {"role": "system", "content": persona},
-                {"role": "user", "content": context}
-            ],
+            "model": model,
+            "messages": messages,
             "temperature": 0.7,
-            "max_tokens": 2000
+            "max_tokens": max_tokens
         }
+        self.tracer.complete("queue", "llm", entry, max_tokens=max_tokens)
         
         try:
             start_time = time.time()
-            response = self.session.post(
-                f"{OPENCLAW_BASE_URL}/v1/chat/completions",
-                json=payload,
-                timeout=120
-            )
-            latency = int((time.time() - start_time) * 1000)
+            content = ""
+            tokens = None
+            completion_tokens = None
+            truncated = False
             
-            if response.status_code == 200:
+            for continuation in range(MAX_CONTINUATIONS + 1):
+                call_start = time.time()
+                response = self.tracer.post(
+                    self.session,
+                    f"{OPENCLAW_BASE_URL}/v1/chat/completions",
+                    name="续写请求" if continuation else "请求",
+                    json=payload,
+                    timeout=120
+                )
+                
+                if response.status_code != 200:
+                    if content:
+                        # 续写失败时保留已生成的部分
+                        break
+                    self.output_stats.record_error(role, model)
+                    latency = int((time.time() - start_time) * 1000)
+                    error_msg = f"❌ API 错误 (HTTP {response.status_code}): {response.text[:200]}"
+                    return error_msg, None, latency
+                
                 data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                tokens = data.get("usage", {}).get("total_tokens")
-                return content, tokens, latency
-            else:
-                error_msg = f"❌ API 错误 (HTTP {response.status_code}): {response.text[:200]}"
-                return error_msg, None, latency
+                choice = data["choices"][0]
+                content += choice["message"]["content"]
+                usage = data.get("usage", {})
+                if usage.get("total_tokens") is not None:
+                    tokens = (tokens or 0) + usage["total_tokens"]
+                if usage.get("completion_tokens") is not None:
+                    completion_tokens = (completion_tokens or 0) + usage["completion_tokens"]
+                if self.budget:
+                    self.budget.charge(role, model, usage.get("total_tokens"),
+                                       int((time.time() - call_start) * 1000))
+                
+                truncated = choice.get("finish_reason") == "length"
+                if not truncated:
+                    break
+                payload = dict(payload, messages=continuation_messages(messages, content))
+                if self.budget:
+                    try:
+                        self.budget.admit(role, model, estimate_tokens(content) + max_tokens)
+                    except BudgetExceeded:
+                        # 预算不够续写，保留已生成的部分
+                        break
+                print(f"  ✂️ {role or 'LLM'} 输出被截断，自动续写...")
+            
+            latency = int((time.time() - start_time) * 1000)
+            self.output_stats.record(role, model, completion_tokens, truncated, latency)
+            return content, tokens, latency
                 
+        except BudgetExceeded:
+            raise
         except Exception as e:
+            self.output_stats.record_error(role, model)
             return f"❌ 请求异常: {str(e)}", None, None
     
+    def call_routed(self, role: str, context: str,
+                    escalation: int = 0) -> Tuple[str, Optional[int], Optional[int], str]:
+        """
+        按路由表选择模型调用，失败时沿候选链回退
+
+        Args:
+            role: 角色
+            context: 用户消息
+            escalation: 升级级别（0 = 按实测数据选最划算的模型）
+
+        Returns:
+            (内容, Token, 延迟, 实际使用的模型)
+        """
+        plan = self.router.plan(role, escalation)
+        with self.tracer.span(role, "role", escalation=escalation or None) as span:
+            for i, model in enumerate(plan):
+                with self.tracer.span(f"{role} @ {model}", "llm") as call:
+                    content, tokens, latency = self.call_llm(PERSONAS[role], context, role=role, model=model)
+                    call.update(model=self.last_model, tokens=tokens, error=content.startswith("❌") or None)
+                if not content.startswith("❌") or i == len(plan) - 1:
+                    span.update(model=self.last_model, tokens=tokens, fallbacks=i or None)
+                    return content, tokens, latency, self.last_model
+                print(f"  ↪️ {role} 在 {model} 上调用失败，回退到 {plan[i + 1]}")
+                self.tracer.instant("fallback", "role", role=role, failed=model, next=plan[i + 1])
+    
     def parse_verdict(self, content: str) -> Optional[str]:
         """解析审查结果，提取 PASS/FAIL"""
         # 查找 **VERDICT: PASS** 或 **VERDICT: FAIL**
@@ -176,6 +276,11 @@ class AgenticQuadBrain:
         
         return None
     
+    def _progress(self, stage: str):
+        """通知进入新阶段（后台任务模式下用于进度行和取消检查）"""
+        if self.progress:
+            self.progress(stage)
+    
     def send_to_discord(self, role: str, content: str, attempt: int = 1) -> bool:
         """发送到 Discord"""
         webhook_url = WEBHOOKS.get(role)
@@ -198,7 +303,9 @@ class AgenticQuadBrain:
         }
         
         try:
-            response = requests.post(webhook_url, json=data, timeout=10)
+            with self.tracer.span(f"Discord {role}", "discord", attempt=attempt) as span:
+                response = requests.post(webhook_url, json=data, timeout=10)
+                span["status"] = response.status_code
             return response.status_code in [200, 204]
         except Exception as e:
             print(f"  ⚠️ Discord 发送失败: {e}")
@@ -226,19 +333,43 @@ class AgenticQuadBrain:
         else:
             self.print_to_console(role, content, attempt)
     
+    def find_prior(self, user_input: str) -> Optional[PriorRun]:
+        """查找相似的历史运行；QUAD_REUSE=off 时只提示不复用"""
+        prior = find_prior_run(user_input)
+        if prior is None:
+            return None
+        if REUSE_MODE == "off":
+            print(f"   🔁 相似历史任务: {prior.describe()}（--reuse seed/skip-pm 可复用）")
+            return None
+        print(f"   🔁 相似历史任务: {prior.describe()}，复用方式: {REUSE_MODE}")
+        return prior
+    
     def run_pm_phase(self, user_input: str) -> BrainOutput:
         """PM 阶段"""
+        self._progress("PM")
+        if self.prior and REUSE_MODE == "skip-pm" and confirm_skip_pm(self.prior, user_input):
+            print(f"\n♻️ 阶段 1: 复用历史运行 #{self.prior.run_id} 的规格书，跳过 PM")
+            output = BrainOutput(
+                role="PM",
+                content=self.prior.pm,
+                timestamp=datetime.now().isoformat(),
+                model=f"reuse#{self.prior.run_id}"
+            )
+            self.broadcast("PM", f"♻️ 复用相似任务 {self.prior.describe()} 的规格书\n\n{self.prior.pm}")
+            return output
+        
         print(f"\n📝 阶段 1: PM 分析需求...")
-        content, tokens, latency = self.call_llm(
-            PERSONAS["PM"],
-            f"用户需求: {user_input}"
-        )
+        context = f"用户需求: {user_input}"
+        if self.prior:
+            context += self.prior.pm_reference()
+        content, tokens, latency, model = self.call_routed("PM", context)
         output = BrainOutput(
             role="PM",
             content=content,
             timestamp=datetime.now().isoformat(),
             tokens_used=tokens,
-            latency_ms=latency
+            latency_ms=latency,
+            model=model
         )
         self.broadcast("PM", content)
         return output
@@ -246,6 +377,7 @@ class AgenticQuadBrain:
     def run_dev_phase(self, user_input: str, pm_output: str, 
                       previous_review: str = None, attempt: int = 1) -> BrainOutput:
         """DEV 阶段"""
+        self._progress(f"DEV 第{attempt}次")
         print(f"\n💻 阶段 2: DEV 编写代码... (第{attempt}次)")
         
         if previous_review:
@@ -268,15 +400,19 @@ class AgenticQuadBrain:
 {pm_output}
 
 请编写完整的代码实现。"""
+            if self.prior:
+                context += self.prior.dev_reference()
         
-        content, tokens, latency = self.call_llm(PERSONAS["DEV"], context)
+        # 每被打回一次升一级模型
+        content, tokens, latency, model = self.call_routed("DEV", context, escalation=attempt - 1)
         output = BrainOutput(
             role="DEV",
             content=content,
             timestamp=datetime.now().isoformat(),
             tokens_used=tokens,
             latency_ms=latency,
-            attempt=attempt
+            attempt=attempt,
+            model=model
         )
         self.broadcast("DEV", content, attempt)
         return output
@@ -284,6 +420,7 @@ class AgenticQuadBrain:
     def run_reviewer_phase(self, user_input: str, pm_output: str, 
                           dev_output: str, attempt: int = 1) -> BrainOutput:
         """REVIEWER 阶段"""
+        self._progress(f"REVIEWER 第{attempt}次")
         print(f"\n🔍 阶段 3: REVIEWER 审查代码... (第{attempt}次)")
         
         context = f"""原始需求: {user_input}
@@ -297,8 +434,21 @@ class AgenticQuadBrain:
 请严格审查这段代码。
 记住：最后一行必须输出 **VERDICT: PASS** 或 **VERDICT: FAIL**"""
         
-        content, tokens, latency = self.call_llm(PERSONAS["REVIEWER"], context)
+        content, tokens, latency, model = self.call_routed("REVIEWER", context)
         verdict = self.parse_verdict(content)
+        self.output_stats.record_outcome("REVIEWER", model, verdict is not None)
+        
+        if verdict is None and self.router.can_escalate("REVIEWER", model):
+            # 结论无法解析（低置信度），换更强的模型重新审查
+            print(f"  ⬆️ 审查结论无法解析，升级模型重新审查...")
+            escalation = self.router.escalation_of("REVIEWER", model) + 1
+            retry_content, retry_tokens, retry_latency, model = self.call_routed(
+                "REVIEWER", context, escalation=escalation)
+            verdict = self.parse_verdict(retry_content)
+            self.output_stats.record_outcome("REVIEWER", model, verdict is not None)
+            content = retry_content
+            tokens = (tokens or 0) + (retry_tokens or 0) or None
+            latency = (latency or 0) + (retry_latency or 0)
         
         output = BrainOutput(
             role="REVIEWER",
@@ -307,7 +457,8 @@ class AgenticQuadBrain:
             verdict=verdict,
             tokens_used=tokens,
             latency_ms=latency,
-            attempt=attempt
+            attempt=attempt,
+            model=model
         )
         
         # 显示审查结果
@@ -321,6 +472,7 @@ class AgenticQuadBrain:
     def run_memo_phase(self, user_input: str, pm_output: str, dev_output: str,
                       reviewer_output: str, iterations: list) -> BrainOutput:
         """MEMO 阶段"""
+        self._progress("MEMO")
         print(f"\n📋 阶段 4: MEMO 生成最终日报...")
         
         iteration_summary = "\n\n".join([
@@ -349,18 +501,20 @@ class AgenticQuadBrain:
 4. 最终状态
 5. 下一步建议"""
         
-        content, tokens, latency = self.call_llm(PERSONAS["MEMO"], context)
+        content, tokens, latency, model = self.call_routed("MEMO", context)
         output = BrainOutput(
             role="MEMO",
             content=content,
             timestamp=datetime.now().isoformat(),
             tokens_used=tokens,
-            latency_ms=latency
+            latency_ms=latency,
+            model=model
         )
         self.broadcast("MEMO", content)
         return output
     
-    def run_agentic_workflow(self, user_input: str) -> CollaborationResult:
+    def run_agentic_workflow(self, user_input: str,
+                             budget: Optional[RunBudget] = None) -> CollaborationResult:
         """
         运行 Agentic 工作流（闭环迭代版）
         
@@ -371,26 +525,114 @@ class AgenticQuadBrain:
            - 如果 FAIL：返回步骤 2，携带审查意见（最多 MAX_RETRIES 次）
            - 如果 PASS：进入步骤 4
         4. MEMO 生成日报
+        
+        Args:
+            user_input: 任务描述
+            budget: 运行预算；剩余预算不够下一次调用时提前终止（或降级模型）
         """
         start_time = time.time()
         result = CollaborationResult(original_input=user_input)
+        self.tracer = Tracer.for_run("agentic", task=user_input, model=MODEL)
+        run_start = self.tracer.now()
+        self.budget = budget
+        if budget:
+            budget.start()
         
         print(f"\n🚀 Agentic 四脑协同启动（闭环迭代模式）")
         print(f"   任务: {user_input[:60]}{'...' if len(user_input) > 60 else ''}")
         print(f"   模型: {MODEL}")
         print(f"   最大重试: {MAX_RETRIES} 次")
+        if budget:
+            print(f"   预算: {budget.describe()}")
         print(f"   时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         
+        self.prior = self.find_prior(user_input)
+        iterations = []
+        try:
+            self._run_pm_and_loop(user_input, result, iterations)
+        except BudgetExceeded as e:
+            print(f"\n⛔ 预算耗尽，工作流提前终止: {e.reason}")
+            if iterations and not result.final_dev_output:
+                result.final_dev_output = iterations[-1]['dev']
+                result.final_reviewer_output = iterations[-1]['reviewer']
+                result.total_attempts = len(iterations)
+        
+        result.dev_iterations = iterations
+        
+        # ========== 4. MEMO 阶段（只有审查通过才执行）==========
+        memo_ran = False
+        if result.final_reviewer_output and result.final_reviewer_output.verdict == "PASS":
+            try:
+                result.memo_output = self.run_memo_phase(
+                    user_input,
+                    result.pm_output.content,
+                    result.final_dev_output.content,
+                    result.final_reviewer_output.content,
+                    iterations
+                )
+                memo_ran = True
+            except BudgetExceeded as e:
+                print(f"\n⛔ 预算不足，跳过 MEMO: {e.reason}")
+        
+        if not memo_ran and budget and budget.stopped:
+            result.memo_output = BrainOutput(
+                role="MEMO",
+                content=f"⛔ 项目状态：预算耗尽，提前终止\n\n原因：{budget.stopped}\n\n已完成 {len(iterations)} 轮迭代。\n\n建议：\n1. 提高预算或设置降级模型后重跑\n2. 简化功能范围\n3. 人工检查已生成的部分",
+                timestamp=datetime.now().isoformat()
+            )
+            self.broadcast("MEMO", result.memo_output.content)
+        elif not memo_ran:
+            # 如果最终也没通过，生成一个失败总结
+            result.memo_output = BrainOutput(
+                role="MEMO",
+                content=f"⚠️ 项目状态：未通过审查\n\n经过 {result.total_attempts} 轮迭代，代码仍未能通过审查。\n\n建议：\n1. 重新审查需求文档\n2. 简化功能范围\n3. 人工介入审查具体问题",
+                timestamp=datetime.now().isoformat()
+            )
+            self.broadcast("MEMO", result.memo_output.content)
+        
+        # ========== 统计 ==========
+        total_time = time.time() - start_time
+        result.total_time = total_time
+        if budget:
+            result.budget = budget.summary()
+        self.tracer.complete("agentic", "run", run_start, verdict=result.final_reviewer_output.verdict
+                             if result.final_reviewer_output else None)
+        result.trace_path = self.tracer.save()
+        
+        print(f"\n{'='*50}")
+        print(f"✅ Agentic 工作流完成！")
+        print(f"{'='*50}")
+        print(f"   总耗时: {total_time:.1f}秒")
+        print(f"   迭代轮次: {result.total_attempts}/{MAX_RETRIES}")
+        print(f"   审查结果: {result.final_reviewer_output.verdict if result.final_reviewer_output else 'UNKNOWN'}")
+        
+        total_tokens = sum([
+            result.pm_output.tokens_used or 0 if result.pm_output else 0,
+            sum(it['dev'].tokens_used or 0 for it in iterations),
+            sum(it['reviewer'].tokens_used or 0 for it in iterations),
+            result.memo_output.tokens_used or 0
+        ])
+        if total_tokens > 0:
+            print(f"   总 Token: {total_tokens:,}")
+        if budget and budget.stopped:
+            print(f"   ⛔ 预算终止: {budget.stopped}")
+        if result.trace_path:
+            print(f"   时间线: {result.trace_path}")
+        
+        return result
+    
+    def _run_pm_and_loop(self, user_input: str, result: CollaborationResult, iterations: list):
+        """PM 阶段 + DEV ↔ REVIEWER 循环（预算不足时由 BudgetExceeded 中断）"""
         # ========== 1. PM 阶段 ==========
         result.pm_output = self.run_pm_phase(user_input)
-        time.sleep(1)
+        self.tracer.sleep(1, "阶段间隔")
         
         # ========== 2-3. DEV ↔ REVIEWER 循环 ==========
-        iterations = []
         attempt = 1
         previous_review = None
         
         while attempt <= MAX_RETRIES:
+            iteration_start = self.tracer.now()
             print(f"\n{'='*50}")
             print(f"  迭代轮次: {attempt}/{MAX_RETRIES}")
             print(f"{'='*50}")
@@ -402,7 +644,7 @@ class AgenticQuadBrain:
                 previous_review,
                 attempt
             )
-            time.sleep(1)
+            self.tracer.sleep(1, "阶段间隔")
             
             # REVIEWER 审查
             reviewer_output = self.run_reviewer_phase(
@@ -412,11 +654,18 @@ class AgenticQuadBrain:
                 attempt
             )
             
+            # DEV 模型的通过率供路由参考
+            if reviewer_output.verdict:
+                self.output_stats.record_outcome("DEV", dev_output.model,
+                                                 reviewer_output.verdict == "PASS")
+            
             # 记录这一轮
             iterations.append({
                 'dev': dev_output,
                 'reviewer': reviewer_output
             })
+            self.tracer.complete(f"第{attempt}轮", "iteration", iteration_start,
+                                 verdict=reviewer_output.verdict)
             
             # 判断结果
             if reviewer_output.verdict == "PASS":
@@ -430,7 +679,7 @@ class AgenticQuadBrain:
                     print(f"\n⚠️ 审查未通过，准备第{attempt+1}轮修改...")
                     previous_review = reviewer_output.content
                     attempt += 1
-                    time.sleep(2)
+                    self.tracer.sleep(2, "重试间隔")
                 else:
                     print(f"\n❌ 已达最大重试次数({MAX_RETRIES})，使用最后一版代码")
                     result.final_dev_output = dev_output
@@ -444,48 +693,6 @@ class AgenticQuadBrain:
                 result.final_reviewer_output = reviewer_output
                 result.total_attempts = attempt
                 break
-        
-        result.dev_iterations = iterations
-        
-        # ========== 4. MEMO 阶段（只有审查通过才执行）==========
-        if result.final_reviewer_output and result.final_reviewer_output.verdict == "PASS":
-            result.memo_output = self.run_memo_phase(
-                user_input,
-                result.pm_output.content,
-                result.final_dev_output.content,
-                result.final_reviewer_output.content,
-                iterations
-            )
-        else:
-            # 如果最终也没通过，生成一个失败总结
-            result.memo_output = BrainOutput(
-                role="MEMO",
-                content=f"⚠️ 项目状态：未通过审查\n\n经过 {result.total_attempts} 轮迭代，代码仍未能通过审查。\n\n建议：\n1. 重新审查需求文档\n2. 简化功能范围\n3. 人工介入审查具体问题",
-                timestamp=datetime.now().isoformat()
-            )
-            self.broadcast("MEMO", result.memo_output.content)
-        
-        # ========== 统计 ==========
-        total_time = time.time() - start_time
-        result.total_time = total_time
-        
-        print(f"\n{'='*50}")
-        print(f"✅ Agentic 工作流完成！")
-        print(f"{'='*50}")
-        print(f"   总耗时: {total_time:.1f}秒")
-        print(f"   迭代轮次: {result.total_attempts}/{MAX_RETRIES}")
-        print(f"   审查结果: {result.final_reviewer_output.verdict if result.final_reviewer_output else 'UNKNOWN'}")
-        
-        total_tokens = sum([
-            result.pm_output.tokens_used or 0,
-            sum(it['dev'].tokens_used or 0 for it in iterations),
-            sum(it['reviewer'].tokens_used or 0 for it in iterations),
-            result.memo_output.tokens_used or 0
-        ])
-        if total_tokens > 0:
-            print(f"   总 Token: {total_tokens:,}")
-        
-        return result
     
     def save_report(self, result: CollaborationResult, filename: Optional[str] = None):
         """保存完整报告"""
@@ -494,10 +701,18 @@ class AgenticQuadBrain:
             filename = f"agentic_report_{timestamp}.md"
         
         iterations_md = "\n\n".join([
-            f"### 第{i+1}轮\n\n**DEV 代码:**\n```\n{it['dev'].content[:1000]}...\n```\n\n**REVIEWER 意见 ({it['reviewer'].verdict}):**\n{it['reviewer'].content[:800]}..."
+            f"### 第{i+1}轮 (DEV: {it['dev'].model}, REVIEWER: {it['reviewer'].model})\n\n**DEV 代码:**\n```\n{it['dev'].content[:1000]}...\n```\n\n**REVIEWER 意见 ({it['reviewer'].verdict}):**\n{it['reviewer'].content[:800]}..."
             for i, it in enumerate(result.dev_iterations)
         ])
         
+        trace_md = ""
+        if result.trace_path:
+            trace_md = f"**时间线**: [{result.trace_path}]({result.trace_path})（用 ui.perfetto.dev 或 chrome://tracing 打开）\n"
+        
+        budget_md = ""
+        if self.budget and result.budget:
+            budget_md = "\n".join(self.budget.report_lines()) + "\n"
+        
         report = f"""# 🤖 Agentic 四脑协同报告
 
 **任务**: {result.original_input}
@@ -505,12 +720,12 @@ class AgenticQuadBrain:
 **总耗时**: {result.total_time:.1f}秒
 **迭代轮次**: {result.total_attempts}/{MAX_RETRIES}
 **最终审查**: {result.final_reviewer_output.verdict if result.final_reviewer_output else 'UNKNOWN'}
-
+{trace_md}{budget_md}
 ---
 
 ## 📝 PM·产品经理
 
-{result.pm_output.content}
+{result.pm_output.content if result.pm_output else 'N/A'}
 
 ---
 
@@ -533,16 +748,31 @@ class AgenticQuadBrain:
             f.write(report)
         
         print(f"   报告已保存: {filename}")
+        outputs = [output_from(result.pm_output)] if result.pm_output else []
+        for it in result.dev_iterations:
+            outputs += [output_from(it['dev']), output_from(it['reviewer'])]
+        if result.memo_output:
+            outputs.append(output_from(result.memo_output))
+        archive_run(ArchivedRun(
+            pipeline="agentic",
+            task=result.original_input,
+            model=MODEL,
+            outputs=outputs,
+            total_time=result.total_time,
+            final_verdict=result.final_reviewer_output.verdict if result.final_reviewer_output else None,
+            iterations=result.total_attempts,
+            report_path=filename,
+            budget=result.budget,
+        ))
         return filename
 
 
 # ============== 交互模式 ==============
 
-def interactive_mode():
-    """交互式运行"""
-    system = AgenticQuadBrain()
-    
-    print("""
+def interactive_mode(max_jobs: int = MAX_JOBS, save: bool = True,
+                     budget_factory: Optional[Callable[[], Optional[RunBudget]]] = None):
+    """交互式运行：每个任务在后台执行，可同时进行多个"""
+    banner = """
 ╔══════════════════════════════════════════════════════════╗
 ║     🤖 Agentic Quad Brain - 闭环迭代版                    ║
 ║                                                          ║
@@ -552,54 +782,23 @@ def interactive_mode():
 ║  • 审查失败自动反馈重写                                  ║
 ║  • 最多 3 轮迭代                                         ║
 ║  • 通过后才生成日报                                      ║
+║  • 任务在后台运行，可同时进行多个                        ║
 ╚══════════════════════════════════════════════════════════╝
-
-命令:
-  <任务描述>     启动工作流
-  save          保存上次报告
-  quit/exit     退出
-""")
-    
-    last_result: Optional[CollaborationResult] = None
-    
-    while True:
-        try:
-            user_input = input("\n🎯 任务> ").strip()
-            
-            if not user_input:
-                continue
-            
-            if user_input.lower() in ['quit', 'exit', 'q']:
-                print("👋 再见!")
-                break
-            
-            if user_input.lower() == 'save':
-                if last_result:
-                    system.save_report(last_result)
-                else:
-                    print("⚠️ 没有可保存的报告")
-                continue
-            
-            # 运行工作流
-            result = system.run_agentic_workflow(user_input)
-            last_result = result
-            
-            # 自动保存
-            system.save_report(result)
-            
-        except KeyboardInterrupt:
-            print("\n\n👋 再见!")
-            break
-        except Exception as e:
-            print(f"❌ 错误: {e}")
-            import traceback
-            traceback.print_exc()
+"""
+    manager = JobManager(
+        AgenticQuadBrain,
+        lambda system, task: system.run_agentic_workflow(
+            task, budget=budget_factory() if budget_factory else None),
+        max_jobs=max_jobs,
+        auto_save=save,
+    )
+    run_repl(manager, banner)
 
 
-def single_run(task: str, save: bool = True):
+def single_run(task: str, save: bool = True, budget: Optional[RunBudget] = None):
     """单次运行"""
     system = AgenticQuadBrain()
-    result = system.run_agentic_workflow(task)
+    result = system.run_agentic_workflow(task, budget=budget)
     
     if save:
         system.save_report(result)
@@ -618,13 +817,20 @@ if __name__ == "__main__":
     parser.add_argument('--model', default=MODEL, help=f'模型 (默认: {MODEL})')
     parser.add_argument('--max-retries', type=int, default=MAX_RETRIES, 
                        help=f'最大重试次数 (默认: {MAX_RETRIES})')
+    parser.add_argument('--jobs', '-j', type=int, default=MAX_JOBS,
+                       help=f'交互模式同时运行的任务数 (默认: {MAX_JOBS})')
+    parser.add_argument('--reuse', choices=['off', 'seed', 'skip-pm'], default=REUSE_MODE,
+                       help=f'相似历史任务的复用方式 (默认: {REUSE_MODE})')
+    add_budget_arguments(parser)
     
     args = parser.parse_args()
     
     MODEL = args.model
     MAX_RETRIES = args.max_retries
+    REUSE_MODE = args.reuse
     
     if args.task:
-        single_run(args.task, save=not args.no_save)
+        single_run(args.task, save=not args.no_save, budget=budget_from_args(args))
     else:
-        interactive_mode()
+        interactive_mode(max_jobs=args.jobs, save=not args.no_save,
+                         budget_factory=lambda: budget_from_args(args))
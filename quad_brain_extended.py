@@ -20,12 +20,18 @@ from extended_roles import (
     EXTENDED_ROLES, WORKFLOWS, ROLE_COMBINATIONS,
     get_role_prompt, suggest_workflow, list_roles, list_workflows
 )
+from llm_cassette import wrap_session
+from llm_telemetry import get_output_stats, continuation_messages, MAX_CONTINUATIONS
+from run_budget import RunBudget, BudgetExceeded, estimate_tokens, add_budget_arguments, budget_from_args
+from model_router import ModelRouter, VERDICT_ROLES
+from run_trace import Tracer
 
 # ============== 配置 ==============
 
 OPENCLAW_BASE_URL = os.getenv("OPENCLAW_URL", "http://localhost:18789")
 OPENCLAW_TOKEN = os.getenv("OPENCLAW_TOKEN", "")
 MODEL = os.getenv("QUAD_MODEL", "kimi-coding/k2p5")
+DEFAULT_MAX_TOKENS = 2000  # 无历史统计时的默认 max_tokens
 
 # 自动加载所有角色的 Webhook
 WEBHOOKS = {}
@@ -45,6 +51,8 @@ class AgentOutput:
     tokens_used: Optional[int] = None
     latency_ms: Optional[int] = None
     attempt: int = 1
+    step: int = 0  # 所属的工作流序列步骤（用于计算关键路径）
+    model: Optional[str] = None  # 实际使用的模型
 
 
 @dataclass
@@ -56,6 +64,8 @@ class WorkflowResult:
     total_time: float
     final_verdict: str
     iterations: int
+    budget: Optional[Dict] = None  # 预算使用摘要（未设置预算时为 None）
+    trace_path: Optional[str] = None  # 运行时间线（Chrome trace-event JSON）
 
 
 # ============== 核心类 ==============
@@ -68,43 +78,125 @@ class ExtendedAgenticSystem:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {OPENCLAW_TOKEN}"
         })
+        self.session = wrap_session(self.session)
+        self.output_stats = get_output_stats()
         self.results: Dict[str, List[AgentOutput]] = {}
-        
-    def call_llm(self, role_id: str, context: str) -> Tuple[str, Optional[int], Optional[int]]:
-        """调用 OpenClaw API"""
+        self.current_step = 0
+        self.budget: Optional[RunBudget] = None
+        self.router = ModelRouter(base_model=model)
+        self.last_model = model
+        self.tracer = Tracer(enabled=False)  # 每次运行开始时替换
+        
+    def call_llm(self, role_id: str, context: str,
+                 model: Optional[str] = None) -> Tuple[str, Optional[int], Optional[int]]:
+        """
+        调用 OpenClaw API
+
+        max_tokens 按角色历史输出长度自适应选择；回复因长度截断时自动续写。
+        设置了预算时调用前先检查，不足时降级模型或抛出 BudgetExceeded。
+        实际使用的模型记录在 self.last_model。
+        """
+        entry = self.tracer.now()
         persona = get_role_prompt(role_id)
         if not persona:
             return f"Error: Unknown role {role_id}", None, None
         
+        messages = [
+            {"role": "system", "content": persona},
+            {"role": "user", "content": context}
+        ]
+        model = model or self.model
+        max_tokens = self.output_stats.choose_max_tokens(role_id, model, DEFAULT_MAX_TOKENS)
+        if self.budget:
+            model = self.budget.admit(role_id, model, estimate_tokens(persona + context) + max_tokens)
+        self.last_model = model
         payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": persona},
-                {"role": "user", "content": context}
-            ],
+            "model": model,
+            "messages": messages,
             "temperature": 0.7,
-            "max_tokens": 2000
+            "max_tokens": max_tokens
         }
+        self.tracer.complete("queue", "llm", entry, max_tokens=max_tokens)
         
         try:
             start_time = time.time()
-            response = self.session.post(
-                f"{OPENCLAW_BASE_URL}/v1/chat/completions",
-                json=payload,
-                timeout=120
-            )
-            latency = int((time.time() - start_time) * 1000)
+            content = ""
+            tokens = None
+            completion_tokens = None
+            truncated = False
             
-            if response.status_code == 200:
+            for continuation in range(MAX_CONTINUATIONS + 1):
+                call_start = time.time()
+                response = self.tracer.post(
+                    self.session,
+                    f"{OPENCLAW_BASE_URL}/v1/chat/completions",
+                    name="续写请求" if continuation else "请求",
+                    json=payload,
+                    timeout=120
+                )
+                
+                if response.status_code != 200:
+                    if content:
+                        # 续写失败时保留已生成的部分
+                        break
+                    self.output_stats.record_error(role_id, model)
+                    latency = int((time.time() - start_time) * 1000)
+                    return f"❌ API Error: {response.status_code}", None, latency
+                
                 data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                tokens = data.get("usage", {}).get("total_tokens")
-                return content, tokens, latency
-            else:
-                return f"❌ API Error: {response.status_code}", None, latency
+                choice = data["choices"][0]
+                content += choice["message"]["content"]
+                usage = data.get("usage", {})
+                if usage.get("total_tokens") is not None:
+                    tokens = (tokens or 0) + usage["total_tokens"]
+                if usage.get("completion_tokens") is not None:
+                    completion_tokens = (completion_tokens or 0) + usage["completion_tokens"]
+                if self.budget:
+                    self.budget.charge(role_id, model, usage.get("total_tokens"),
+                                       int((time.time() - call_start) * 1000))
+                
+                truncated = choice.get("finish_reason") == "length"
+                if not truncated:
+                    break
+                payload = dict(payload, messages=continuation_messages(messages, content))
+                if self.budget:
+                    try:
+                        self.budget.admit(role_id, model, estimate_tokens(content) + max_tokens)
+                    except BudgetExceeded:
+                        # 预算不够续写，保留已生成的部分
+                        break
+                print(f"  ✂️ {role_id} 输出被截断，自动续写...")
+            
+            latency = int((time.time() - start_time) * 1000)
+            self.output_stats.record(role_id, model, completion_tokens, truncated, latency)
+            return content, tokens, latency
+                
+        except BudgetExceeded:
+            raise
         except Exception as e:
+            self.output_stats.record_error(role_id, model)
             return f"❌ Error: {str(e)}", None, None
     
+    def call_routed(self, role_id: str, context: str,
+                    escalation: int = 0) -> Tuple[str, Optional[int], Optional[int], str]:
+        """
+        按路由表选择模型调用，失败时沿候选链回退
+
+        Returns:
+            (内容, Token, 延迟, 实际使用的模型)
+        """
+        plan = self.router.plan(role_id, escalation)
+        with self.tracer.span(role_id, "role", escalation=escalation or None) as span:
+            for i, model in enumerate(plan):
+                with self.tracer.span(f"{role_id} @ {model}", "llm") as call:
+                    content, tokens, latency = self.call_llm(role_id, context, model=model)
+                    call.update(model=self.last_model, tokens=tokens, error=content.startswith("❌") or None)
+                if not content.startswith("❌") or i == len(plan) - 1:
+                    span.update(model=self.last_model, tokens=tokens, fallbacks=i or None)
+                    return content, tokens, latency, self.last_model
+                print(f"  ↪️ {role_id} 在 {model} 上调用失败，回退到 {plan[i + 1]}")
+                self.tracer.instant("fallback", "role", role=role_id, failed=model, next=plan[i + 1])
+    
     def parse_verdict(self, content: str, role_id: str) -> Optional[str]:
         """解析审查结果"""
         content_upper = content.upper()
@@ -163,7 +255,9 @@ class ExtendedAgenticSystem:
         }
         
         try:
-            response = requests.post(webhook_url, json=data, timeout=10)
+            with self.tracer.span(f"Discord {role_id}", "discord", attempt=attempt) as span:
+                response = requests.post(webhook_url, json=data, timeout=10)
+                span["status"] = response.status_code
             return response.status_code in [200, 204]
         except:
             return False
@@ -198,9 +292,29 @@ class ExtendedAgenticSystem:
         
         print(f"\n{emoji} 运行 {role_info.get('name', role_id)}... (第{attempt}次)")
         
-        content, tokens, latency = self.call_llm(role_id, context)
+        # 每重试一轮升一级模型
+        content, tokens, latency, model = self.call_routed(role_id, context, escalation=attempt - 1)
         verdict = self.parse_verdict(content, role_id)
         
+        if role_id in VERDICT_ROLES:
+            self.output_stats.record_outcome(role_id, model, verdict is not None)
+            if verdict is None and self.router.can_escalate(role_id, model):
+                # 结论无法解析（低置信度），换更强的模型重新审查
+                print(f"  ⬆️ {role_id} 结论无法解析，升级模型重新审查...")
+                escalation = self.router.escalation_of(role_id, model) + 1
+                retry_content, retry_tokens, retry_latency, model = self.call_routed(
+                    role_id, context, escalation=escalation)
+                verdict = self.parse_verdict(retry_content, role_id)
+                self.output_stats.record_outcome(role_id, model, verdict is not None)
+                content = retry_content
+                tokens = (tokens or 0) + (retry_tokens or 0) or None
+                latency = (latency or 0) + (retry_latency or 0)
+            if verdict and self.results.get("DEV"):
+                # DEV 模型的通过率供路由参考
+                dev_output = self.results["DEV"][-1]
+                self.output_stats.record_outcome("DEV", dev_output.model,
+                                                 verdict in ["PASS", "SECURE"])
+        
         output = AgentOutput(
             role=role_id,
             content=content,
@@ -208,7 +322,9 @@ class ExtendedAgenticSystem:
             verdict=verdict,
             tokens_used=tokens,
             latency_ms=latency,
-            attempt=attempt
+            attempt=attempt,
+            step=self.current_step,
+            model=model
         )
         
         # 显示结果
@@ -225,16 +341,30 @@ class ExtendedAgenticSystem:
         return output
     
     def run_workflow(self, task: str, workflow_id: str = "quad_basic", 
-                     use_discord: bool = False) -> WorkflowResult:
-        """运行完整工作流"""
+                     use_discord: bool = False,
+                     budget: Optional[RunBudget] = None) -> WorkflowResult:
+        """
+        运行完整工作流
+
+        设置了 budget 时，剩余预算不够下一次调用就降级模型或提前终止，
+        最终结果记为 BUDGET_STOPPED。
+        """
         workflow = WORKFLOWS.get(workflow_id, WORKFLOWS["quad_basic"])
         start_time = time.time()
+        self.tracer = Tracer.for_run(workflow_id, task=task, model=self.model)
+        run_start = self.tracer.now()
+        self.budget = budget
+        if budget:
+            budget.start()
+        self.router = ModelRouter(workflow_id, base_model=self.model)
         
         print("=" * 70)
         print(f"🚀 启动工作流: {workflow['name']}")
         print(f"   任务: {task[:60]}{'...' if len(task) > 60 else ''}")
         print(f"   角色: {', '.join(workflow['roles'])}")
         print(f"   模型: {self.model}")
+        if budget:
+            print(f"   预算: {budget.describe()}")
         print("=" * 70)
         
         # 清空结果
@@ -246,17 +376,21 @@ class ExtendedAgenticSystem:
         loops = workflow.get("loops", {})
         
         # 执行序列
-        for step in sequence:
-            if isinstance(step, list):
-                # 并行执行
-                print(f"\n⚡ 并行执行: {', '.join(step)}")
-                # 简化为顺序执行（实际可改为真正的并行）
-                for role_id in step:
-                    self._execute_role(role_id, task, loops, use_discord)
+        try:
+            for step_index, step in enumerate(sequence):
+                self.current_step = step_index
+                if isinstance(step, list):
+                    # 并行执行
+                    print(f"\n⚡ 并行执行: {', '.join(step)}")
+                    # 简化为顺序执行（实际可改为真正的并行）
+                    for role_id in step:
+                        self._execute_role(role_id, task, loops, use_discord)
+                        total_iterations += 1
+                else:
+                    self._execute_role(step, task, loops, use_discord)
                     total_iterations += 1
-            else:
-                self._execute_role(step, task, loops, use_discord)
-                total_iterations += 1
+        except BudgetExceeded as e:
+            print(f"\n⛔ 预算耗尽，工作流在 {e.role} 之前提前终止: {e.reason}")
         
         total_time = time.time() - start_time
         
@@ -267,6 +401,8 @@ class ExtendedAgenticSystem:
                 if output.verdict in ["FAIL", "NEEDS_FIX"]:
                     final_verdict = "NEEDS_FIX"
                     break
+        if budget and budget.stopped:
+            final_verdict = "BUDGET_STOPPED"
         
         result = WorkflowResult(
             task=task,
@@ -275,8 +411,11 @@ class ExtendedAgenticSystem:
             outputs=self.results,
             total_time=total_time,
             final_verdict=final_verdict,
-            iterations=total_iterations
+            iterations=total_iterations,
+            budget=budget.summary() if budget else None
         )
+        self.tracer.complete(workflow['name'], "run", run_start, verdict=final_verdict)
+        result.trace_path = self.tracer.save()
         
         self._print_summary(result)
         return result
@@ -299,7 +438,10 @@ class ExtendedAgenticSystem:
             max_retries = loop_config.get("max_retries", 3)
             
             for attempt in range(1, max_retries + 1):
+                iteration_start = self.tracer.now()
                 output = self.run_agent(role_id, context, attempt, use_discord)
+                self.tracer.complete(f"{role_id} 第{attempt}轮", "iteration", iteration_start,
+                                     verdict=output.verdict)
                 
                 # 检查是否通过
                 if output.verdict in ["PASS", "SECURE"]:
@@ -309,7 +451,7 @@ class ExtendedAgenticSystem:
                     print(f"  ⚠️ {role_id} 未通过，准备第{attempt+1}轮...")
                     # 更新上下文，包含审查意见
                     context = self._build_context(role_id, task, include_feedback=True)
-                    time.sleep(2)
+                    self.tracer.sleep(2, "重试间隔")
                 else:
                     print(f"  ❌ {role_id} 达到最大重试次数")
         else:
@@ -364,6 +506,12 @@ class ExtendedAgenticSystem:
         )
         if total_tokens > 0:
             print(f"   总 Token: {total_tokens:,}")
+        if self.budget:
+            print(f"   预算: {self.budget.describe()}")
+            for event in self.budget.events:
+                print(f"     {event}")
+        if result.trace_path:
+            print(f"   时间线: {result.trace_path}")
         
         print(f"\n   角色输出:")
         for role_id, outputs in result.outputs.items():
@@ -371,7 +519,8 @@ class ExtendedAgenticSystem:
             emoji = role_info.get("emoji", "🤖")
             attempts = len(outputs)
             verdict = outputs[-1].verdict if outputs else "N/A"
-            print(f"     {emoji} {role_id}: {attempts}轮, 结果={verdict}")
+            models = ", ".join(sorted({o.model for o in outputs if o.model}))
+            print(f"     {emoji} {role_id}: {attempts}轮, 结果={verdict}, 模型={models}")
         
         print("=" * 70)
 
@@ -444,6 +593,7 @@ def main():
                        help='启用Discord输出')
     parser.add_argument('--list-workflows', action='store_true', help='列出工作流')
     parser.add_argument('--list-roles', action='store_true', help='列出角色')
+    add_budget_arguments(parser)
     
     args = parser.parse_args()
     
@@ -463,7 +613,7 @@ def main():
     system = ExtendedAgenticSystem(model=args.model)
     
     if args.task:
-        system.run_workflow(args.task, args.workflow, args.discord)
+        system.run_workflow(args.task, args.workflow, args.discord, budget_from_args(args))
     else:
         interactive_mode(system)
 
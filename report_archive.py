@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Report Archive - 流水线报告的 SQLite 归档
+save_report 在写 Markdown 报告的同时，把每次运行的任务、模型、各角色输出、
+Token、延迟、审查结论和迭代次数写入 SQLite：
+
+- FTS5 全文索引（trigram 分词，中文子串也能命中），找以前的方案不用再 grep
+- 延迟/Token 汇总一条 SQL 按 (角色, 模型) 分组算出
+- 旧的 *_report_*.md 可以 import 进来
+- 任务的 MinHash 签名（task_similarity）用于查找换了说法的重复任务，
+  流水线可以复用历史运行的 PM/DEV 输出
+
+环境变量:
+    QUAD_ARCHIVE_DB         归档文件路径 (默认: quad_brain_archive.db，off 关闭)
+    QUAD_REUSE_THRESHOLD    相似任务判定阈值 (默认: 0.6)
+    QUAD_SKIP_PM_THRESHOLD  skip-pm 免确认直接复用的相似度 (默认: 0.9)
+
+使用方法:
+    python3 report_archive.py search 斐波那契          # 全文搜索
+    python3 report_archive.py similar "实现斐波那契数列"  # 相似的历史任务
+    python3 report_archive.py show 42                  # 查看某次运行
+    python3 report_archive.py stats --since 7          # 最近 7 天各角色延迟/Token
+    python3 report_archive.py import *_report_*.md     # 导入旧报告
+"""
+
+import os
+import re
+import json
+import sys
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import task_similarity
+
+ARCHIVE_DB = os.getenv("QUAD_ARCHIVE_DB", "quad_brain_archive.db")
+REUSE_THRESHOLD = float(os.getenv("QUAD_REUSE_THRESHOLD", "0.6"))
+# 字符 n-gram 相似度分不清"登录接口"和"登出接口"这种只差一个字的不同任务，
+# 跳过 PM 要求相似度远高于提示阈值，否则先让用户确认
+SKIP_PM_THRESHOLD = float(os.getenv("QUAD_SKIP_PM_THRESHOLD", "0.9"))
+SEED_MAX_CHARS = 3000  # 复用历史输出时拼进上下文的最大长度
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pipeline TEXT NOT NULL,
+    task TEXT NOT NULL,
+    model TEXT,
+    created_at TEXT NOT NULL,
+    total_time REAL,
+    total_tokens INTEGER,
+    final_verdict TEXT,
+    iterations INTEGER,
+    report_path TEXT,
+    budget TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    model TEXT,
+    content TEXT NOT NULL,
+    tokens INTEGER,
+    latency_ms INTEGER,
+    verdict TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outputs_run ON outputs(run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created_at);
+CREATE TABLE IF NOT EXISTS task_signatures (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS task_bands (
+    band_key TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_task_bands ON task_bands(band_key);
+"""
+
+
+@dataclass
+class ArchivedOutput:
+    """一次角色输出"""
+    role: str
+    content: str
+    attempt: int = 1
+    model: Optional[str] = None
+    tokens: Optional[int] = None
+    latency_ms: Optional[int] = None
+    verdict: Optional[str] = None
+
+
+@dataclass
+class ArchivedRun:
+    """一次流水线运行"""
+    pipeline: str
+    task: str
+    outputs: List[ArchivedOutput] = field(default_factory=list)
+    model: Optional[str] = None
+    total_time: Optional[float] = None
+    final_verdict: Optional[str] = None
+    iterations: Optional[int] = None
+    report_path: Optional[str] = None
+    budget: Optional[Dict] = None
+    created_at: Optional[str] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(o.tokens or 0 for o in self.outputs)
+
+
+@dataclass
+class PriorRun:
+    """与当前任务相似的历史运行"""
+    run_id: int
+    task: str
+    similarity: float
+    final_verdict: Optional[str]
+    pm: Optional[str] = None   # PM 规格书
+    dev: Optional[str] = None  # 最后一版 DEV 代码
+
+    def describe(self) -> str:
+        return f"#{self.run_id}「{self.task[:30]}」(相似度 {self.similarity:.2f})"
+
+    def pm_reference(self) -> str:
+        """拼进 PM 上下文的参考规格书"""
+        return (f"\n\n【参考】相似的历史任务 {self.describe()} 的规格书如下，合适的部分可直接沿用：\n"
+                f"{self.pm[:SEED_MAX_CHARS]}")
+
+    def dev_reference(self) -> str:
+        """拼进 DEV 首次编写上下文的参考代码（没有时为空）"""
+        if not self.dev:
+            return ""
+        return (f"\n\n【参考】相似的历史任务 {self.describe()} 已通过审查的代码如下，可在此基础上修改：\n"
+                f"{self.dev[:SEED_MAX_CHARS]}")
+
+
+def output_from(brain_output, attempt: Optional[int] = None) -> ArchivedOutput:
+    """从 BrainOutput / AgentOutput 转换"""
+    return ArchivedOutput(
+        role=brain_output.role,
+        content=brain_output.content,
+        attempt=attempt or getattr(brain_output, "attempt", 1),
+        model=getattr(brain_output, "model", None),
+        tokens=brain_output.tokens_used,
+        latency_ms=brain_output.latency_ms,
+        verdict=getattr(brain_output, "verdict", None),
+    )
+
+
+class ReportArchive:
+    """
+    报告归档库
+
+    同一连接可被多个线程（后台任务）共享，写入由锁串行化。
+    """
+
+    def __init__(self, path: str = ARCHIVE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(SCHEMA)
+        self.tokenizer = self._create_fts()
+        self._index_missing_signatures()
+        self._db.commit()
+
+    def _create_fts(self) -> str:
+        """建全文索引；trigram 分词需要 SQLite 3.34+，否则退回 unicode61"""
+        row = self._db.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'runs_fts'").fetchone()
+        if row:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._db.execute(
+                    f"CREATE VIRTUAL TABLE runs_fts USING fts5(task, body, tokenize='{tokenizer}')")
+                return tokenizer
+            except sqlite3.OperationalError:
+                continue
+        raise RuntimeError("当前 SQLite 不支持 FTS5")
+
+    def _index_signature(self, run_id: int, task: str):
+        signature = task_similarity.signature_of(task)
+        self._db.execute("INSERT OR REPLACE INTO task_signatures VALUES (?, ?)",
+                         (run_id, task_similarity.encode(signature)))
+        self._db.executemany("INSERT INTO task_bands VALUES (?, ?)",
+                             [(key, run_id) for key in task_similarity.band_keys(signature)])
+
+    def _index_missing_signatures(self):
+        """为没有签名的历史运行（旧归档、导入的报告）补建索引"""
+        rows = self._db.execute(
+            "SELECT id, task FROM runs WHERE id NOT IN (SELECT run_id FROM task_signatures)").fetchall()
+        for row in rows:
+            self._index_signature(row["id"], row["task"])
+
+    # ---------- 写入 ----------
+
+    def add_run(self, run: ArchivedRun) -> int:
+        """写入一次运行，返回 run_id"""
+        created_at = run.created_at or datetime.now().isoformat(timespec="seconds")
+        body = "\n\n".join(f"[{o.role}] {o.content}" for o in run.outputs)
+        with self._lock:
+            cursor = self._db.execute(
+                """INSERT INTO runs (pipeline, task, model, created_at, total_time, total_tokens,
+                                     final_verdict, iterations, report_path, budget)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (run.pipeline, run.task, run.model, created_at, run.total_time, run.total_tokens,
+                 run.final_verdict, run.iterations, run.report_path,
+                 json.dumps(run.budget, ensure_ascii=False) if run.budget else None))
+            run_id = cursor.lastrowid
+            self._db.executemany(
+                """INSERT INTO outputs (run_id, role, attempt, model, content, tokens, latency_ms, verdict)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(run_id, o.role, o.attempt, o.model, o.content, o.tokens, o.latency_ms, o.verdict)
+                 for o in run.outputs])
+            self._db.execute("INSERT INTO runs_fts (rowid, task, body) VALUES (?, ?, ?)",
+                             (run_id, run.task, body))
+            self._index_signature(run_id, run.task)
+            self._db.commit()
+        return run_id
+
+    # ---------- 查询 ----------
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        全文搜索任务和各角色输出
+
+        trigram 分词下不足 3 个字的关键词无法走索引，改用 LIKE。
+        """
+        query = query.strip()
+        with self._lock:
+            if self.tokenizer == "trigram" and len(query) < 3:
+                pattern = f"%{query}%"
+                rows = self._db.execute(
+                    """SELECT r.id, r.pipeline, r.task, r.created_at, r.final_verdict, r.report_path,
+                              substr(f.body, max(1, instr(f.body, ?) - 30), 80) AS snippet
+                       FROM runs_fts f JOIN runs r ON r.id = f.rowid
+                       WHERE f.task LIKE ? OR f.body LIKE ?
+                       ORDER BY r.id DESC LIMIT ?""",
+                    (query, pattern, pattern, limit)).fetchall()
+            else:
+                phrase = '"' + query.replace('"', '""') + '"'
+                rows = self._db.execute(
+                    """SELECT r.id, r.pipeline, r.task, r.created_at, r.final_verdict, r.report_path,
+                              snippet(runs_fts, 1, '【', '】', '…', 16) AS snippet
+                       FROM runs_fts f JOIN runs r ON r.id = f.rowid
+                       WHERE runs_fts MATCH ?
+                       ORDER BY bm25(runs_fts) LIMIT ?""",
+                    (phrase, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def similar(self, task: str, threshold: float = REUSE_THRESHOLD, limit: int = 5,
+                passed_only: bool = False) -> List[Dict]:
+        """
+        相似的历史任务（按相似度降序）
+
+        先用 LSH 分桶取候选，再用签名估计相似度过滤，不需要扫描全部历史。
+        passed_only 时只返回审查通过（final_verdict 为 PASS）的运行。
+        """
+        signature = task_similarity.signature_of(task)
+        keys = task_similarity.band_keys(signature)
+        with self._lock:
+            placeholders = ",".join("?" * len(keys))
+            rows = self._db.execute(
+                f"""SELECT r.id, r.task, r.pipeline, r.created_at, r.final_verdict, s.signature
+                    FROM runs r JOIN task_signatures s ON s.run_id = r.id
+                    WHERE r.id IN (SELECT DISTINCT run_id FROM task_bands WHERE band_key IN ({placeholders}))""",
+                keys).fetchall()
+        results = []
+        for row in rows:
+            if passed_only and row["final_verdict"] != "PASS":
+                continue
+            score = task_similarity.similarity(signature, task_similarity.decode(row["signature"]))
+            if score >= threshold:
+                results.append({"run_id": row["id"], "task": row["task"], "pipeline": row["pipeline"],
+                                "created_at": row["created_at"], "final_verdict": row["final_verdict"],
+                                "similarity": score})
+        results.sort(key=lambda r: (-r["similarity"], -r["run_id"]))
+        return results[:limit]
+
+    def prior_run(self, task: str, threshold: float = REUSE_THRESHOLD) -> Optional[PriorRun]:
+        """最相似的、审查通过的历史运行，附带其 PM 规格书和最后一版 DEV 代码"""
+        for match in self.similar(task, threshold, passed_only=True):
+            run = self.get(match["run_id"])
+            pm = [o["content"] for o in run["outputs"] if o["role"] == "PM"]
+            dev = [o["content"] for o in run["outputs"] if o["role"] == "DEV"]
+            if not pm or pm[-1].startswith("❌"):
+                continue
+            return PriorRun(match["run_id"], match["task"], match["similarity"], match["final_verdict"],
+                            pm=pm[-1], dev=dev[-1] if dev and not dev[-1].startswith("❌") else None)
+        return None
+
+    def get(self, run_id: int) -> Optional[Dict]:
+        """一次运行的完整记录"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            outputs = self._db.execute(
+                "SELECT * FROM outputs WHERE run_id = ? ORDER BY rowid", (run_id,)).fetchall()
+        run = dict(row)
+        run["outputs"] = [dict(o) for o in outputs]
+        return run
+
+    def stats(self, since_days: Optional[int] = None, pipeline: Optional[str] = None) -> List[Dict]:
+        """按 (角色, 模型) 汇总调用次数、延迟、Token 和审查通过率（一条查询）"""
+        since = (datetime.now() - timedelta(days=since_days)).isoformat() if since_days else ""
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT o.role, o.model,
+                          COUNT(*) AS calls,
+                          COUNT(DISTINCT o.run_id) AS runs,
+                          AVG(o.latency_ms) AS avg_latency_ms,
+                          MAX(o.latency_ms) AS max_latency_ms,
+                          SUM(o.latency_ms) AS total_latency_ms,
+                          AVG(o.tokens) AS avg_tokens,
+                          SUM(o.tokens) AS total_tokens,
+                          SUM(o.verdict = 'PASS') AS passes,
+                          SUM(o.verdict IS NOT NULL) AS verdicts
+                   FROM outputs o JOIN runs r ON r.id = o.run_id
+                   WHERE r.created_at >= ? AND (? IS NULL OR r.pipeline = ?)
+                   GROUP BY o.role, o.model
+                   ORDER BY total_latency_ms DESC""",
+                (since, pipeline, pipeline)).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_DEFAULT_ARCHIVE: Optional[ReportArchive] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_archive() -> Optional[ReportArchive]:
+    """进程内共享的归档实例；QUAD_ARCHIVE_DB=off 时返回 None"""
+    global _DEFAULT_ARCHIVE
+    if not ARCHIVE_DB or ARCHIVE_DB.lower() == "off":
+        return None
+    with _DEFAULT_LOCK:
+        if _DEFAULT_ARCHIVE is None:
+            _DEFAULT_ARCHIVE = ReportArchive(ARCHIVE_DB)
+        return _DEFAULT_ARCHIVE
+
+
+def find_prior_run(task: str, threshold: float = REUSE_THRESHOLD) -> Optional[PriorRun]:
+    """在默认归档中查找可复用的相似历史运行；归档关闭或出错时返回 None"""
+    try:
+        archive = get_archive()
+        return archive.prior_run(task, threshold) if archive else None
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"  ⚠️ 查找相似任务失败: {e}")
+        return None
+
+
+def confirm_skip_pm(prior: PriorRun, task: str) -> bool:
+    """
+    skip-pm 前确认历史任务确实是同一个任务
+
+    相似度达到 SKIP_PM_THRESHOLD 直接复用；否则在交互终端中展示两个任务请用户确认，
+    非交互环境（后台任务、重定向输入）不跳过 PM，改为以历史规格书为参考（同 seed）。
+    """
+    if prior.similarity >= SKIP_PM_THRESHOLD:
+        return True
+    interactive = sys.stdin.isatty() and threading.current_thread() is threading.main_thread()
+    if interactive:
+        print(f"   当前任务: {task[:60]}")
+        print(f"   历史任务: {prior.task[:60]} (#{prior.run_id}，相似度 {prior.similarity:.2f})")
+        try:
+            answer = input("   是同一个任务、直接沿用历史规格书跳过 PM 吗? [y/N] ").strip().lower()
+        except EOFError:
+            answer = ""
+        if answer in ("y", "yes"):
+            return True
+    else:
+        print(f"   ⚠️ 相似度 {prior.similarity:.2f} 低于 {SKIP_PM_THRESHOLD}，无法确认，不跳过 PM")
+    print("   PM 照常运行，以历史规格书为参考")
+    return False
+
+
+def archive_run(run: ArchivedRun) -> Optional[int]:
+    """写入默认归档；归档失败不影响报告保存"""
+    try:
+        archive = get_archive()
+        if archive is None:
+            return None
+        run_id = archive.add_run(run)
+        print(f"   已归档: #{run_id} ({archive.path})")
+        return run_id
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"  ⚠️ 报告归档失败: {e}")
+        return None
+
+
+# ============== 导入旧报告 ==============
+
+_ROLE_HEADING = re.compile(r"^## \S+\s+([A-Z]+)·", re.MULTILINE)
+_FIELD = re.compile(r"^\*\*(任务|时间|总耗时|最终审查|迭代轮次)\*\*:\s*(.+)$", re.MULTILINE)
+
+
+def parse_report(path: str) -> Optional[ArchivedRun]:
+    """解析 quad_brain_report_*.md / agentic_report_*.md"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    fields = dict(_FIELD.findall(text))
+    if "任务" not in fields:
+        return None
+
+    headings = list(_ROLE_HEADING.finditer(text))
+    outputs = []
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        content = text[match.end():end].split("\n", 1)[-1]
+        content = content.rsplit("\n---", 1)[0].strip()
+        outputs.append(ArchivedOutput(role=match.group(1), content=content))
+
+    verdict = fields.get("最终审查", "").strip()
+    total_time = re.match(r"[\d.]+", fields.get("总耗时", ""))
+    iterations = re.match(r"\d+", fields.get("迭代轮次", ""))
+    created_at = None
+    if "时间" in fields:
+        try:
+            created_at = datetime.strptime(fields["时间"].strip(), "%Y-%m-%d %H:%M:%S").isoformat()
+        except ValueError:
+            pass
+    return ArchivedRun(
+        pipeline="agentic" if "Agentic" in text[:200] else "quad",
+        task=fields["任务"].strip(),
+        outputs=outputs,
+        total_time=float(total_time.group()) if total_time else None,
+        final_verdict=verdict if verdict not in ("", "None", "UNKNOWN") else None,
+        iterations=int(iterations.group()) if iterations else None,
+        report_path=path,
+        created_at=created_at,
+    )
+
+
+# ============== CLI ==============
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='流水线报告归档')
+    parser.add_argument('--db', default=ARCHIVE_DB, help=f'归档文件 (默认: {ARCHIVE_DB})')
+    sub = parser.add_subparsers(dest='command')
+
+    search = sub.add_parser('search', help='全文搜索')
+    search.add_argument('query')
+    search.add_argument('--limit', '-n', type=int, default=10)
+
+    similar = sub.add_parser('similar', help='相似的历史任务')
+    similar.add_argument('task')
+    similar.add_argument('--threshold', type=float, default=REUSE_THRESHOLD)
+    similar.add_argument('--limit', '-n', type=int, default=5)
+
+    show = sub.add_parser('show', help='查看某次运行')
+    show.add_argument('run_id', type=int)
+
+    stats = sub.add_parser('stats', help='各角色延迟/Token 汇总')
+    stats.add_argument('--since', type=int, help='最近 N 天')
+    stats.add_argument('--pipeline', choices=['quad', 'agentic'])
+
+    importer = sub.add_parser('import', help='导入旧的 Markdown 报告')
+    importer.add_argument('files', nargs='+')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+
+    archive = ReportArchive(args.db)
+
+    if args.command == 'search':
+        results = archive.search(args.query, args.limit)
+        print(f"🔎 「{args.query}」 找到 {len(results)} 条（共 {archive.count()} 次运行）\n")
+        for r in results:
+            snippet = " ".join((r["snippet"] or "").split())
+            print(f"  #{r['id']:<5} {r['created_at'][:16]}  {r['pipeline']:<8} {r['final_verdict'] or '-':<6} {r['task'][:40]}")
+            print(f"         {snippet}")
+            if r["report_path"]:
+                print(f"         📄 {r['report_path']}")
+
+    elif args.command == 'similar':
+        results = archive.similar(args.task, args.threshold, args.limit)
+        print(f"🔁 与「{args.task}」相似的历史任务（阈值 {args.threshold}）: {len(results)} 条\n")
+        for r in results:
+            print(f"  #{r['run_id']:<5} {r['similarity']:.2f}  {r['created_at'][:16]}  "
+                  f"{r['final_verdict'] or '-':<6} {r['task'][:50]}")
+
+    elif args.command == 'show':
+        run = archive.get(args.run_id)
+        if run is None:
+            print(f"⚠️ 没有运行 #{args.run_id}")
+            return
+        print(f"# #{run['id']} {run['task']}")
+        print(f"   {run['pipeline']} | {run['created_at']} | 模型 {run['model'] or '-'} | "
+              f"耗时 {run['total_time'] or 0:.1f}秒 | Token {run['total_tokens'] or 0:,} | "
+              f"结论 {run['final_verdict'] or '-'}")
+        for o in run["outputs"]:
+            attempt = f" 第{o['attempt']}轮" if o["attempt"] > 1 else ""
+            meta = f"{o['model'] or '-'}, {o['latency_ms'] or '-'}ms, {o['tokens'] or '-'} tokens"
+            print(f"\n## {o['role']}{attempt} ({meta}){' ' + o['verdict'] if o['verdict'] else ''}\n")
+            print(o["content"])
+
+    elif args.command == 'stats':
+        rows = archive.stats(args.since, args.pipeline)
+        scope = f"最近 {args.since} 天" if args.since else "全部"
+        print(f"📊 {scope}运行统计（共 {archive.count()} 次运行）\n")
+        print(f"  {'角色':<10} {'模型':<22} {'调用':>5} {'平均延迟':>9} {'最大延迟':>9} {'平均Token':>9} {'总Token':>9} {'通过率':>6}")
+        for r in rows:
+            pass_rate = f"{r['passes'] / r['verdicts']:.0%}" if r["verdicts"] else "-"
+            avg_latency = f"{r['avg_latency_ms']:.0f}ms" if r["avg_latency_ms"] is not None else "-"
+            max_latency = f"{r['max_latency_ms']}ms" if r["max_latency_ms"] is not None else "-"
+            avg_tokens = f"{r['avg_tokens']:.0f}" if r["avg_tokens"] is not None else "-"
+            print(f"  {r['role']:<10} {(r['model'] or '-'):<22} {r['calls']:>5} {avg_latency:>9} "
+                  f"{max_latency:>9} {avg_tokens:>9} {r['total_tokens'] or 0:>9,} {pass_rate:>6}")
+
+    elif args.command == 'import':
+        imported = 0
+        for path in args.files:
+            run = parse_report(path)
+            if run is None:
+                print(f"  ⚠️ 跳过 {path}（无法识别）")
+                continue
+            archive.add_run(run)
+            imported += 1
+        print(f"✅ 导入 {imported}/{len(args.files)} 份报告")
+
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Run Budget - 单次工作流运行预算
+限制一次运行的 Token、预估费用和墙钟时间。每次调用前预估下一次调用的消耗，
+剩余预算不够时先尝试降级到更便宜的模型，仍不够则提前终止，并在报告中说明。
+
+环境变量:
+    QUAD_MODEL_PRICES  模型单价覆盖，格式 "模型=每千Token价格,..."
+
+使用方法:
+    budget = RunBudget(max_tokens=20000, max_cost=0.5, deadline_s=300,
+                       fallback_model="kimi-coding/k2")
+    system.run_agentic_workflow("写个计算器", budget=budget)
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# ============== 单价 ==============
+
+# 每千 Token 的预估价格（输入输出合计，仅用于预算估算）
+MODEL_PRICES: Dict[str, float] = {
+    "kimi-coding/k2p5": 0.012,
+    "kimi-coding/k2": 0.004,
+}
+DEFAULT_PRICE_PER_1K = 0.01
+
+for _item in os.getenv("QUAD_MODEL_PRICES", "").split(","):
+    if "=" in _item:
+        _model, _price = _item.split("=", 1)
+        MODEL_PRICES[_model.strip()] = float(_price)
+
+
+def price_per_1k(model: str) -> float:
+    return MODEL_PRICES.get(model, DEFAULT_PRICE_PER_1K)
+
+
+def estimate_cost(model: str, tokens: int) -> float:
+    """按单价估算费用"""
+    return tokens / 1000 * price_per_1k(model)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本 Token 数
+
+    中文约 1~1.5 字符/Token、英文约 4 字符/Token，按 2 字符/Token 折中，
+    只用于预算判断，不需要精确。
+    """
+    return len(text) // 2 + 1
+
+
+class BudgetExceeded(Exception):
+    """剩余预算不足以覆盖下一次调用"""
+
+    def __init__(self, reason: str, role: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.role = role
+
+
+# ============== 预算 ==============
+
+@dataclass
+class RunBudget:
+    """
+    单次运行预算
+
+    三项限制均可为 None（不限制）。预算对象在整条流水线中传递，
+    call_llm 调用前用 admit() 取得可用模型，调用后用 charge() 记账。
+    """
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    deadline_s: Optional[float] = None
+    fallback_model: Optional[str] = None
+
+    tokens_used: int = 0
+    cost_used: float = 0.0
+    calls: int = 0
+    started_at: float = field(default_factory=time.time)
+    stopped: Optional[str] = None  # 提前终止的原因
+    events: List[str] = field(default_factory=list)  # 降级/终止记录
+    _latencies: Dict[str, List[int]] = field(default_factory=dict)
+
+    @property
+    def enabled(self) -> bool:
+        return any(v is not None for v in (self.max_tokens, self.max_cost, self.deadline_s))
+
+    def start(self):
+        """开始计时（运行开始时调用）"""
+        self.started_at = time.time()
+
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def _projected_latency(self, role: str) -> float:
+        """按本次运行中同角色（或全部调用）的平均延迟预估下一次调用耗时（秒）"""
+        samples = self._latencies.get(role) or [
+            ms for values in self._latencies.values() for ms in values
+        ]
+        return sum(samples) / len(samples) / 1000 if samples else 0.0
+
+    def _fits(self, model: str, projected_tokens: int) -> Optional[str]:
+        """检查 Token 和费用是否足够，不够时返回原因"""
+        if self.max_tokens is not None and self.tokens_used + projected_tokens > self.max_tokens:
+            return (f"Token 预算不足 (已用 {self.tokens_used:,}/{self.max_tokens:,}，"
+                    f"下一次预计 {projected_tokens:,})")
+        if self.max_cost is not None:
+            projected_cost = estimate_cost(model, projected_tokens)
+            if self.cost_used + projected_cost > self.max_cost:
+                return (f"费用预算不足 (已用 {self.cost_used:.4f}/{self.max_cost:.4f}，"
+                        f"下一次预计 {projected_cost:.4f})")
+        return None
+
+    def admit(self, role: str, model: str, projected_tokens: int) -> str:
+        """
+        调用前检查预算
+
+        Args:
+            role: 角色
+            model: 计划使用的模型
+            projected_tokens: 预计消耗的 Token（输入 + max_tokens）
+
+        Returns:
+            本次应使用的模型（可能已降级为 fallback_model）
+
+        Raises:
+            BudgetExceeded: 降级后仍不足，或剩余时间不够
+        """
+        if self.stopped:
+            raise BudgetExceeded(self.stopped, role)
+
+        if self.deadline_s is not None:
+            remaining = self.deadline_s - self.elapsed()
+            projected = self._projected_latency(role)
+            if remaining <= 0 or projected > remaining:
+                self._stop(f"时间预算不足 (已用 {self.elapsed():.0f}s/{self.deadline_s:.0f}s，"
+                           f"{role} 预计 {projected:.0f}s)", role)
+
+        reason = self._fits(model, projected_tokens)
+        if reason is None:
+            return model
+
+        if self.fallback_model and self.fallback_model != model:
+            if self._fits(self.fallback_model, projected_tokens) is None:
+                self.events.append(f"⬇️ {role}: {reason}，降级为 {self.fallback_model}")
+                print(f"  ⬇️ {role} 预算紧张，降级为 {self.fallback_model}")
+                return self.fallback_model
+
+        self._stop(reason, role)
+
+    def _stop(self, reason: str, role: str):
+        self.stopped = reason
+        self.events.append(f"⛔ {role}: {reason}，提前终止")
+        print(f"  ⛔ {reason}，在 {role} 之前提前终止")
+        raise BudgetExceeded(reason, role)
+
+    def charge(self, role: str, model: str, tokens: Optional[int], latency_ms: Optional[int]):
+        """调用后记账"""
+        self.calls += 1
+        if tokens:
+            self.tokens_used += tokens
+            self.cost_used += estimate_cost(model, tokens)
+        if latency_ms is not None:
+            self._latencies.setdefault(role, []).append(latency_ms)
+
+    def summary(self) -> Dict:
+        """预算使用摘要（写入报告/JSON）"""
+        return {
+            "max_tokens": self.max_tokens,
+            "max_cost": self.max_cost,
+            "deadline_s": self.deadline_s,
+            "fallback_model": self.fallback_model,
+            "tokens_used": self.tokens_used,
+            "cost_used": round(self.cost_used, 4),
+            "elapsed_s": round(self.elapsed(), 1),
+            "calls": self.calls,
+            "stopped": self.stopped,
+            "events": list(self.events),
+        }
+
+    def describe(self) -> str:
+        """已用/上限的简短描述"""
+        limits = []
+        if self.max_tokens is not None:
+            limits.append(f"Token {self.tokens_used:,}/{self.max_tokens:,}")
+        if self.max_cost is not None:
+            limits.append(f"费用 {self.cost_used:.4f}/{self.max_cost:.4f}")
+        if self.deadline_s is not None:
+            limits.append(f"时间 {self.elapsed():.0f}s/{self.deadline_s:.0f}s")
+        if self.fallback_model:
+            limits.append(f"降级模型 {self.fallback_model}")
+        return "，".join(limits)
+
+    def report_lines(self) -> List[str]:
+        """报告中的预算说明（Markdown 行）"""
+        lines = [f"**预算**: {self.describe()}"]
+        if self.stopped:
+            lines.append(f"**预算终止**: {self.stopped}")
+        lines.extend(f"- {event}" for event in self.events)
+        return lines
+
+
+def add_budget_arguments(parser):
+    """为命令行添加预算参数"""
+    parser.add_argument('--budget-tokens', type=int, help='单次运行 Token 上限')
+    parser.add_argument('--budget-cost', type=float, help='单次运行预估费用上限')
+    parser.add_argument('--deadline', type=float, help='单次运行墙钟时间上限（秒）')
+    parser.add_argument('--fallback-model', help='预算紧张时降级使用的模型')
+
+
+def budget_from_args(args) -> Optional[RunBudget]:
+    """根据命令行参数创建预算，未设置任何限制时返回 None"""
+    budget = RunBudget(
+        max_tokens=args.budget_tokens,
+        max_cost=args.budget_cost,
+        deadline_s=args.deadline,
+        fallback_model=args.fallback_model,
+    )
+    return budget if budget.enabled else None
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Run Trace - 流水线运行时间线
+每次运行输出一份 Chrome trace-event JSON（可用 chrome://tracing 或 https://ui.perfetto.dev 打开），
+看清 5 分钟的 run_workflow 时间到底花在网关、我们自己的节奏 sleep 还是 Discord 上：
+
+- role      每次角色调用（含模型、升级级别、回退）
+- llm       单次 call_llm，内部每个请求分为 queue（预算/路由准备）、ttfb（发出到收到响应头，
+            网关非流式返回，生成时间包含在这里）、download（读取响应体）
+- discord   Webhook 投递（含 HTTP 状态）
+- sleep     阶段之间的节奏等待
+- iteration DEV ↔ REVIEWER 的每一轮
+
+环境变量:
+    QUAD_TRACE_DIR  trace 文件目录 (默认: quad_traces，off 关闭)
+
+使用方法:
+    python3 run_trace.py quad_traces/trace_agentic_20250219_105030.json   # 按类别汇总耗时
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+TRACE_DIR = os.getenv("QUAD_TRACE_DIR", "quad_traces")
+
+
+class Tracer:
+    """
+    收集一次运行的 trace 事件
+
+    时间戳为相对运行开始的微秒数；每个线程一条轨道。enabled=False 时所有方法为空操作。
+    """
+
+    def __init__(self, name: str = "run", enabled: bool = True, metadata: Optional[Dict] = None):
+        self.name = name
+        self.enabled = enabled
+        self.metadata = metadata or {}
+        self.events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._threads: Dict[int, int] = {}
+
+    @classmethod
+    def for_run(cls, name: str, **metadata) -> "Tracer":
+        """按 QUAD_TRACE_DIR 决定是否启用"""
+        return cls(name, enabled=bool(TRACE_DIR) and TRACE_DIR.lower() != "off", metadata=metadata)
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _tid(self) -> int:
+        ident = threading.get_ident()
+        if ident not in self._threads:
+            self._threads[ident] = len(self._threads) + 1
+            self.events.append({
+                "name": "thread_name", "ph": "M", "pid": 1, "tid": self._threads[ident],
+                "args": {"name": threading.current_thread().name},
+            })
+        return self._threads[ident]
+
+    def now(self) -> float:
+        """当前时间点，供 complete() 使用"""
+        return time.perf_counter()
+
+    def complete(self, name: str, cat: str, start: float, end: Optional[float] = None, **args):
+        """记录一个已结束的区间（start/end 来自 now()）"""
+        if not self.enabled:
+            return
+        end = end if end is not None else time.perf_counter()
+        with self._lock:
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": self._tid(),
+                "ts": round((start - self._origin) * 1_000_000, 1),
+                "dur": round(max(0.0, end - start) * 1_000_000, 1),
+                "args": {k: v for k, v in args.items() if v is not None},
+            })
+
+    @contextmanager
+    def span(self, name: str, cat: str, **args):
+        """
+        记录代码块的区间
+
+        yield 出的 dict 可在块内补充 args（如 HTTP 状态、Token 数）。
+        """
+        extra: Dict[str, Any] = {}
+        start = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            self.complete(name, cat, start, **args, **extra)
+
+    def instant(self, name: str, cat: str, **args):
+        """记录一个时间点事件（如模型回退）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.append({
+                "name": name, "cat": cat, "ph": "i", "s": "t", "pid": 1, "tid": self._tid(),
+                "ts": round(self._now_us(), 1), "args": args,
+            })
+
+    def sleep(self, seconds: float, reason: str = ""):
+        """带 trace 的 time.sleep"""
+        with self.span("sleep", "sleep", seconds=seconds, reason=reason or None):
+            time.sleep(seconds)
+
+    def post(self, session, url: str, name: str = "request", **kwargs):
+        """
+        带分段计时的 session.post
+
+        stream=True 时 post 在收到响应头后返回，据此拆分 ttfb 与 download；
+        连接池新建了连接时在 args 中标记 new_connection。
+        """
+        if not self.enabled:
+            return session.post(url, **kwargs)
+        pool = _connection_pool(session, url)
+        connections_before = getattr(pool, "num_connections", None)
+        start = time.perf_counter()
+        response = session.post(url, stream=True, **kwargs)
+        headers_at = time.perf_counter()
+        status = getattr(response, "status_code", None)
+        if hasattr(response, "content"):
+            response.content  # 读完响应体，释放连接
+        end = time.perf_counter()
+        new_connection = None
+        if connections_before is not None:
+            new_connection = getattr(pool, "num_connections", 0) > connections_before
+        self.complete(name, "http", start, end, status=status, new_connection=new_connection)
+        self.complete("ttfb", "http", start, headers_at)
+        self.complete("download", "http", headers_at, end)
+        return response
+
+    def summary(self) -> Dict[str, float]:
+        return summarize_events(self.events)
+
+    def save(self, directory: Optional[str] = None) -> Optional[str]:
+        """写出 trace 文件，返回路径（未启用时返回 None）"""
+        if not self.enabled:
+            return None
+        directory = directory or TRACE_DIR
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        path = os.path.join(directory, f"trace_{self.name}_{timestamp}.json")
+        with self._lock:
+            data = {
+                "traceEvents": list(self.events),
+                "displayTimeUnit": "ms",
+                "otherData": dict(self.metadata, name=self.name),
+            }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+
+
+def _connection_pool(session, url: str):
+    """取出 requests.Session 对应的 urllib3 连接池（取不到时返回 None）"""
+    inner = getattr(session, "inner", session)  # CassetteSession 包装
+    try:
+        return inner.get_adapter(url).poolmanager.connection_from_url(url)
+    except Exception:
+        return None
+
+
+def summarize_events(events: List[Dict]) -> Dict[str, float]:
+    """按类别汇总耗时（毫秒）；http 类只统计最外层请求，避免与 ttfb/download 重复"""
+    totals: Dict[str, float] = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        cat = event.get("cat", "")
+        if cat == "http" and event["name"] in ("ttfb", "download"):
+            cat = f"http.{event['name']}"
+        totals[cat] = totals.get(cat, 0.0) + event["dur"] / 1000
+    return totals
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python3 run_trace.py <trace.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        trace = json.load(f)
+    events = trace["traceEvents"]
+    spans = [e for e in events if e.get("ph") == "X"]
+    wall = max((e["ts"] + e["dur"] for e in spans), default=0) / 1000
+    print(f"🧭 {trace.get('otherData', {}).get('name', sys.argv[1])}  总时长 {wall / 1000:.1f}秒\n")
+    for cat, ms in sorted(summarize_events(events).items(), key=lambda kv: -kv[1]):
+        share = ms / wall if wall else 0
+        print(f"  {cat:<14} {ms / 1000:>8.1f}秒  {share:>5.0%}")
+    print("\n  提示: role / llm / iteration 是嵌套区间，占比会重叠")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Task Similarity - 任务近似重复检测（离线 MinHash）
+换一种说法提交的任务（"写一个斐波那契函数" / "实现斐波那契数列计算"）精确哈希永远命中不了。
+这里用字符 n-gram 的 MinHash 签名估计 Jaccard 相似度，配合 LSH 分桶快速找候选，
+不依赖任何外部向量服务。
+
+- 中文按单字 + 相邻二字切片，英文按单词切片
+- 先去掉"帮我写一个"之类的套话，只比较任务本身
+- 64 个哈希函数，分成 32 个桶（每桶 2 行），相似度 0.4 以上几乎必然进入候选
+
+中英文混说（"斐波那契" / "Fibonacci"）没有共同字符，无法识别。
+
+使用方法:
+    python3 task_similarity.py "写一个斐波那契函数" "实现斐波那契数列计算"
+"""
+
+import re
+import hashlib
+from typing import Iterable, List, Set, Tuple
+
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 61) - 1
+
+
+def _permutations(count: int) -> List[Tuple[int, int]]:
+    """确定性生成 (a, b) 系数，签名跨进程、跨机器可比"""
+    coefficients = []
+    for i in range(count):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % (_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "big") % _PRIME
+        coefficients.append((a, b))
+    return coefficients
+
+
+_PERMUTATIONS = _permutations(NUM_PERM)
+
+# 不影响任务含义的套话
+FILLER_PHRASES = [
+    "帮我", "请你", "请", "麻烦", "能不能", "可以", "给我",
+    "写一个", "写个", "做一个", "做个", "实现一个", "开发一个", "编写一个", "设计一个",
+    "实现", "开发", "编写", "设计", "一个", "一下", "用python", "使用python",
+]
+_FILLER = re.compile("|".join(re.escape(p) for p in sorted(FILLER_PHRASES, key=len, reverse=True)))
+_CJK_RUN = re.compile(r"[一-鿿]+")
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+def normalize(text: str) -> str:
+    return _FILLER.sub(" ", text.lower())
+
+
+def shingles(text: str) -> Set[str]:
+    """切片：中文单字 + 二字组，英文单词"""
+    text = normalize(text)
+    result: Set[str] = set()
+    for run in _CJK_RUN.findall(text):
+        result.update(run)
+        result.update(run[i:i + 2] for i in range(len(run) - 1))
+    result.update(_WORD.findall(text))
+    return result
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(items: Iterable[str]) -> List[int]:
+    """MinHash 签名（空集合返回全最大值）"""
+    signature = [_MAX_HASH] * NUM_PERM
+    for item in items:
+        h = _hash(item)
+        for i, (a, b) in enumerate(_PERMUTATIONS):
+            value = (a * h + b) % _PRIME
+            if value < signature[i]:
+                signature[i] = value
+    return signature
+
+
+def signature_of(text: str) -> List[int]:
+    return minhash(shingles(text))
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """签名估计的 Jaccard 相似度"""
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y and x != _MAX_HASH) / NUM_PERM
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    """LSH 分桶键：任一桶相同即为候选"""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode(), digest_size=8).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+def encode(signature: List[int]) -> bytes:
+    return b"".join(value.to_bytes(8, "big") for value in signature)
+
+
+def decode(blob: bytes) -> List[int]:
+    return [int.from_bytes(blob[i:i + 8], "big") for i in range(0, len(blob), 8)]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print('用法: python3 task_similarity.py "任务A" "任务B"')
+        sys.exit(1)
+    a, b = sys.argv[1], sys.argv[2]
+    exact = len(shingles(a) & shingles(b)) / max(1, len(shingles(a) | shingles(b)))
+    print(f"MinHash 相似度: {similarity(signature_of(a), signature_of(b)):.2f}  (精确 Jaccard {exact:.2f})")
@@ -4,6 +4,8 @@ import os
 import json
 import requests
 
+from llm_cassette import wrap_session
+
 # 加载环境变量
 WEBHOOKS = {
     "PM": os.getenv("WEBHOOK_PM"),
@@ -16,6 +18,9 @@ OPENCLAW_URL = os.getenv("OPENCLAW_URL", "http://localhost:18789")
 OPENCLAW_TOKEN = os.getenv("OPENCLAW_TOKEN")
 MODEL = os.getenv("QUAD_MODEL", "kimi-coding/k2p5")
 
+# 网关请求走 session，便于通过 LLM_CASSETTE 录制/回放
+GATEWAY = wrap_session(requests.Session())
+
 def call_llm(system_prompt, user_message):
     """调用 OpenClaw API"""
     payload = {
@@ -34,7 +39,7 @@ def call_llm(system_prompt, user_message):
     }
     
     try:
-        resp = requests.post(
+        resp = GATEWAY.post(
             f"{OPENCLAW_URL}/v1/chat/completions",
             json=payload,
             headers=headers,
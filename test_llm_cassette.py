@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""磁带回放测试：精确键与人格键混合匹配时不重复消费记录"""
+import os
+import tempfile
+
+from llm_cassette import Cassette
+
+SYSTEM = "你是一名资深开发工程师"
+
+
+def payload(user_message):
+    return {
+        "model": "kimi-coding/k2p5",
+        "messages": [
+            {"role": "system", "content": SYSTEM},
+            {"role": "user", "content": user_message},
+        ],
+    }
+
+
+def reply(text):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+def record_cassette(path, pairs):
+    cassette = Cassette(path, mode="record")
+    for message, text in pairs:
+        cassette.record(payload(message), 200, reply(text), latency_ms=0)
+
+
+def content(entry):
+    return entry["response"]["choices"][0]["message"]["content"]
+
+
+def test_mixed_exact_and_persona_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl")
+        record_cassette(path, [("a", "r1"), ("b", "r2")])
+
+        cassette = Cassette(path, mode="replay", timing="fast")
+        assert content(cassette.next_entry(payload("a"))) == "r1"
+        # 第二个请求稍有变化，只能按人格键匹配，应拿到尚未回放的 r2
+        assert content(cassette.next_entry(payload("b（改）"))) == "r2"
+        assert cassette.hits == 2 and cassette.misses == 0
+
+
+def test_persona_then_exact_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl")
+        record_cassette(path, [("a", "r1"), ("b", "r2")])
+
+        cassette = Cassette(path, mode="replay", timing="fast")
+        assert content(cassette.next_entry(payload("a（改）"))) == "r1"
+        assert content(cassette.next_entry(payload("b"))) == "r2"
+
+
+def test_exhausted_exact_queue_falls_back_to_persona():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl")
+        record_cassette(path, [("a", "r1"), ("b", "r2")])
+
+        cassette = Cassette(path, mode="replay", timing="fast")
+        assert content(cassette.next_entry(payload("a"))) == "r1"
+        # 精确键 "a" 已用完，应按人格键取到未回放的 r2，而不是重放 r1
+        assert content(cassette.next_entry(payload("a"))) == "r2"
+        # 两个队列都用完后才重放上一条
+        assert content(cassette.next_entry(payload("a"))) == "r2"
+
+
+if __name__ == "__main__":
+    test_mixed_exact_and_persona_replay()
+    test_persona_then_exact_replay()
+    test_exhausted_exact_queue_falls_back_to_persona()
+    print("✅ 磁带回放测试通过")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评分引擎等价性检查与性能基准
+对三种评分策略，检查 core.scoring.ScoringEngine 与各原入口的输出逐项相同，
+并报告每种策略逐店 / 向量化评分的吞吐（店铺/秒）：
+
+    linear  waimai_diagnosis.DiagnosisEngine.calculate_score / diagnose
+    three   waimai_diagnosis_pro.DiagnosisEngine.calculate_metric_score / diagnose
+    five    core.evaluator.ScoreEvaluator._calculate_metric_score / evaluate_all_dimensions
+
+使用方法:
+    python3 benchmark_scoring.py                 # 默认 20000 家随机店铺
+    python3 benchmark_scoring.py -n 100000 --strategy three
+
+存在不一致时以退出码 1 结束，可在替换或下线原引擎前运行。
+"""
+
+import sys
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Tuple
+
+from core.scoring import ScoringEngine, ThresholdTable, STRATEGIES
+from core.batch import DIMENSION_LAYOUT
+from core.calculator import quick_calculate
+from core.evaluator import ScoreEvaluator
+from models import ShopMetrics
+
+import waimai_diagnosis as basic
+import waimai_diagnosis_pro as pro
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 NumPy 时跳过向量化部分
+    np = None
+
+
+# ==================== 测试数据 ====================
+
+def boundary_values(thresholds) -> List[float]:
+    """阈值本身、两侧的邻近值、0 和负数，覆盖每个分段的边界"""
+    values = [0.0, -1.0]
+    for t in thresholds:
+        if t is None:
+            continue
+        values += [t, t * (1 - 1e-9), t * (1 + 1e-9), t - 0.01, t + 0.01, t * 0.5, t * 2]
+    return values
+
+
+def random_values(rng: random.Random, thresholds, count: int) -> List[float]:
+    top = max([abs(t) for t in thresholds if t is not None] or [1.0]) * 2.5
+    return [rng.uniform(-0.1 * top, top) for _ in range(count)]
+
+
+def random_basic_shop(rng: random.Random) -> "basic.ShopMetrics":
+    return basic.ShopMetrics(
+        exposure_count=rng.randint(0, 80000),
+        visit_rate=round(rng.uniform(0, 20), 1),
+        order_rate=round(rng.uniform(5, 45), 1),
+        avg_order_value=round(rng.uniform(10, 70), 1),
+        order_count=rng.randint(0, 1200),
+        repurchase_rate=round(rng.uniform(0, 45), 1),
+        positive_rate=round(rng.uniform(75, 100), 1),
+        negative_rate=round(rng.uniform(0, 15), 1),
+        ontime_rate=round(rng.uniform(75, 100), 1),
+        refund_rate=round(rng.uniform(0, 12), 1),
+        complaint_rate=round(rng.uniform(0, 4), 2),
+    )
+
+
+def random_pro_record(rng: random.Random) -> Dict[str, float]:
+    """随机抽取部分指标（按配置顺序，与批量输入相同）"""
+    record = {}
+    for metric_id, config in pro.METRIC_CONFIGS.items():
+        if rng.random() < 0.85:
+            excellent, _, fair = config.thresholds
+            record[metric_id] = round(rng.uniform(0, max(excellent, fair) * 1.8), 2)
+    return record
+
+
+def random_core_shop(rng: random.Random, index: int) -> ShopMetrics:
+    exposure = rng.randint(0, 20000)
+    visit = int(exposure * rng.uniform(0, 0.3))
+    order_uv = int(visit * rng.uniform(0, 0.5))
+    orders = int(order_uv * rng.uniform(1.0, 1.3))
+    return ShopMetrics(
+        name=f"店铺{index}",
+        category=rng.choice(["快餐简餐", "正餐", "饮品甜品", "夜宵烧烤"]),
+        stage=rng.choice(["new", "growth", "mature"]),
+        exposure_uv=exposure, visit_uv=visit, order_uv=order_uv, order_count=orders,
+        revenue=round(orders * rng.uniform(10, 70), 2),
+        promotion_cost=round(rng.uniform(0, 400), 2),
+        cancel_count=rng.randint(0, max(1, orders // 10)),
+        positive_reviews=rng.randint(0, 400), negative_reviews=rng.randint(0, 40),
+        complaints=rng.randint(0, 8), rating=round(rng.uniform(3.5, 5.0), 1),
+        cook_time=round(rng.uniform(3, 30), 1), ontime_rate=round(rng.uniform(80, 100), 1),
+        refund_rate=round(rng.uniform(0, 8), 1),
+    )
+
+
+# ==================== 检查 ====================
+
+class Checker:
+    """记录比较次数和不一致的样例"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checked = 0
+        self.failures: List[str] = []
+
+    def same(self, label: str, expected, actual, strict_type: bool = True):
+        self.checked += 1
+        if expected != actual or (strict_type and type(expected) is not type(actual)):
+            if len(self.failures) < 5:
+                self.failures.append(f"{label}: 原实现 {expected!r}，新引擎 {actual!r}")
+            else:
+                self.failures.append("")
+
+    def same_array(self, label: str, expected: List[float], actual):
+        for i, (e, a) in enumerate(zip(expected, actual.tolist())):
+            self.same(f"{label}[{i}]", float(e), a, strict_type=False)
+
+    def report(self) -> bool:
+        if not self.failures:
+            print(f"   ✅ {self.name}: {self.checked} 项一致")
+            return True
+        print(f"   ❌ {self.name}: {len(self.failures)}/{self.checked} 项不一致")
+        for failure in filter(None, self.failures[:5]):
+            print(f"      {failure}")
+        return False
+
+
+def _rate(count: int, func: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    func()
+    return count / max(time.perf_counter() - started, 1e-9)
+
+
+def check_linear(rng: random.Random, count: int) -> Tuple[bool, Dict[str, float]]:
+    legacy = basic.DiagnosisEngine()
+    engine = ScoringEngine(ThresholdTable.from_benchmarks(basic.IndustryBenchmarks.BENCHMARKS))
+
+    metric = Checker("单项指标 calculate_score")
+    for rule in engine.table.rules:
+        low, avg, high = basic.IndustryBenchmarks.BENCHMARKS[rule.name][:3]
+        values = boundary_values((low, avg, high)) + random_values(rng, (low, high), 200)
+        expected = [legacy.calculate_score(rule.name, v) for v in values]
+        for v, e in zip(values, expected):
+            metric.same(f"{rule.name}({v})", e, engine.score_metric(rule.name, v))
+        if np is not None:
+            metric.same_array(f"{rule.name} 向量化", expected, engine.score_metric_array(rule.name, values))
+
+    shops = [random_basic_shop(rng) for _ in range(count)]
+    records = [vars(s) for s in shops]
+    shop = Checker("综合评分 diagnose")
+    for i, (s, record) in enumerate(zip(shops, records)):
+        result = legacy.diagnose(s)
+        scored = engine.score_shop(record)
+        shop.same(f"店铺{i} total_score", result["total_score"], scored.overall)
+        for name, detail in result["metrics_detail"].items():
+            shop.same(f"店铺{i} {name}", detail["score"], round(scored.metric_scores[name], 2))
+    rates = {
+        "原实现逐店": _rate(count, lambda: [[legacy.calculate_score(name, r[name]) for name in r] for r in records]),
+        "新引擎逐店": _rate(count, lambda: [engine.score_shop(r) for r in records]),
+    }
+    if np is not None:
+        columns = {name: np.array([r[name] for r in records], dtype=np.float64) for name in records[0]}
+        overall = engine.score_columns(columns).overall
+        shop.same_array("向量化 total_score", [engine.score_shop(r).overall for r in records], overall)
+        rates["新引擎向量化"] = _rate(count, lambda: engine.score_columns(columns))
+    return metric.report() & shop.report(), rates
+
+
+def check_three(rng: random.Random, count: int) -> Tuple[bool, Dict[str, float]]:
+    engine = ScoringEngine(ThresholdTable.from_metric_configs(pro.METRIC_CONFIGS, pro.CATEGORY_WEIGHTS))
+    strategy = STRATEGIES["three"]
+
+    metric = Checker("单项指标 calculate_metric_score")
+    for rule in engine.table.rules:
+        config = pro.METRIC_CONFIGS[rule.name]
+        values = boundary_values(config.thresholds) + random_values(rng, config.thresholds, 200)
+        expected = [pro.DiagnosisEngine.calculate_metric_score(v, config) for v in values]
+        for v, (score, status) in zip(values, expected):
+            metric.same(f"{rule.name}({v})", score, engine.score_metric(rule.name, v))
+            metric.same(f"{rule.name}({v}) 状态", status, strategy.status(v, rule.thresholds, rule.reverse))
+        if np is not None:
+            metric.same_array(f"{rule.name} 向量化", [s for s, _ in expected],
+                              engine.score_metric_array(rule.name, values))
+
+    records = [random_pro_record(rng) for _ in range(count)]
+    shop = Checker("综合评分 diagnose")
+    for i, record in enumerate(records):
+        result = pro.DiagnosisEngine.diagnose(record)
+        scored = engine.score_shop(record)
+        shop.same(f"记录{i} overall_score", result["overall_score"], scored.overall)
+        shop.same(f"记录{i} 分组得分", {cat: data["score"] for cat, data in result["category_scores"].items()},
+                  scored.group_scores)
+        shop.same(f"记录{i} 指标得分", {m.metric_id: m.score for m in result["metrics_detail"]},
+                  scored.metric_scores)
+    rates = {
+        "原实现逐店": _rate(count, lambda: [
+            [pro.DiagnosisEngine.calculate_metric_score(v, pro.METRIC_CONFIGS[k]) for k, v in r.items()]
+            for r in records]),
+        "新引擎逐店": _rate(count, lambda: [engine.score_shop(r) for r in records]),
+    }
+    if np is not None:
+        columns = {metric_id: np.array([r.get(metric_id, np.nan) for r in records], dtype=np.float64)
+                   for metric_id in pro.METRIC_CONFIGS}
+        overall = engine.score_columns(columns).overall
+        shop.same_array("向量化 overall_score", [engine.score_shop(r).overall for r in records], overall)
+        rates["新引擎向量化"] = _rate(count, lambda: engine.score_columns(columns))
+    return metric.report() & shop.report(), rates
+
+
+def check_five(rng: random.Random, count: int) -> Tuple[bool, Dict[str, float]]:
+    from core.batch import BatchScorer, columns_from_metrics
+
+    strategy = STRATEGIES["five"]
+    shops = [random_core_shop(rng, i) for i in range(count)]
+    calcs = [quick_calculate(s) for s in shops]
+    evaluators = [ScoreEvaluator(s, c) for s, c in zip(shops, calcs)]
+    tables: Dict[Tuple[str, str], ScoringEngine] = {}
+
+    def engine_for(s: ShopMetrics) -> ScoringEngine:
+        key = (s.category, s.stage)
+        if key not in tables:
+            tables[key] = ScoringEngine(ThresholdTable.from_dimension_thresholds(*key))
+        return tables[key]
+
+    metric = Checker("单项指标 _calculate_metric_score")
+    evaluator = evaluators[0]
+    for rule in engine_for(shops[0]).table.rules:
+        dim, name = rule.name.split(".")
+        raw = BatchScorer._metric_thresholds(_SPECS[(dim, name)], shops[0].category, shops[0].stage)
+        values = boundary_values(rule.thresholds or ()) + random_values(rng, rule.thresholds or (), 200)
+        expected = [evaluator._calculate_metric_score(v, raw, rule.reverse) for v in values]
+        for v, e in zip(values, expected):
+            metric.same(f"{rule.name}({v})", e, strategy.score(v, rule.thresholds, rule.reverse))
+        if np is not None:
+            metric.same_array(f"{rule.name} 向量化", expected,
+                              strategy.score_array(values, rule.thresholds, rule.reverse))
+
+    shop = Checker("维度指标得分 evaluate_all_dimensions")
+    all_dimensions = [e.evaluate_all_dimensions() for e in evaluators]
+    for i, (s, calc, dimensions) in enumerate(zip(shops, calcs, all_dimensions)):
+        engine = engine_for(s)
+        for dim in dimensions:
+            for m in dim.metrics:
+                rule = engine.table.by_name.get(f"{dim.name}.{m.name}")
+                if rule is None:  # 客单价按 P50 比例评分
+                    continue
+                source = s.rating if m.name == "rating" else getattr(calc, _SOURCES[m.name])
+                shop.same(f"店铺{i} {rule.name}", m.score, strategy.score(source, rule.thresholds, rule.reverse))
+
+    rates = {
+        "原实现逐店": _rate(count, lambda: [e.evaluate_all_dimensions() for e in evaluators]),
+        "新引擎逐店": _rate(count, lambda: [
+            [engine_for(s).score_metric(rule.name, s.rating if rule.name.endswith(".rating")
+                                        else getattr(c, _SOURCES[rule.name.split(".")[1]]))
+             for rule in engine_for(s).table.rules]
+            for s, c in zip(shops, calcs)]),
+    }
+    if np is not None:
+        columns = columns_from_metrics(shops)
+        scores = BatchScorer().score(columns)
+        shop.same_array("向量化总体评分",
+                        [e.calculate_overall_score(d) for e, d in zip(evaluators, all_dimensions)], scores.overall)
+        rates["新引擎向量化"] = _rate(count, lambda: BatchScorer().score(columns))
+    return metric.report() & shop.report(), rates
+
+
+# core 的 (维度, 指标) -> MetricSpec，指标名 -> CalculationResult 字段
+_SPECS = {(dim, spec.name): spec for dim, _, specs in DIMENSION_LAYOUT for spec in specs}
+_SOURCES = {spec.name: spec.source for spec in _SPECS.values()}
+
+CHECKS = {"linear": check_linear, "three": check_three, "five": check_five}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='评分引擎等价性检查与性能基准')
+    parser.add_argument('-n', '--shops', type=int, default=20000, help='每种策略的随机店铺数')
+    parser.add_argument('--strategy', choices=list(CHECKS) + ['all'], default='all', help='要检查的策略')
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+    names = list(CHECKS) if args.strategy == 'all' else [args.strategy]
+    if np is None:
+        print("⚠️ 未安装 NumPy，跳过向量化部分")
+
+    ok = True
+    summary = []
+    for name in names:
+        print(f"\n🔍 策略 {name}")
+        passed, rates = CHECKS[name](random.Random(args.seed), args.shops)
+        ok &= passed
+        summary.append((name, rates))
+
+    print(f"\n📊 吞吐 (店铺/秒，{args.shops} 家)")
+    print("   策略        原实现逐店    新引擎逐店    新引擎向量化")
+    for name, rates in summary:
+        cells = [f"{rates[k]:>14,.0f}" if k in rates else f"{'-':>14}" for k in ("原实现逐店", "新引擎逐店", "新引擎向量化")]
+        print(f"   {name:<6}{''.join(cells)}")
+    print("   (原实现逐店: linear / three 只计单项指标评分；five 为 evaluate_all_dimensions)")
+
+    print("\n✅ 全部一致" if ok else "\n❌ 存在不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+阈值校准工具
+单遍读取历史店铺（日）数据，按 品类 × 阶段 × 指标 维护 KLL 分位数草图，
+输出可被 config.thresholds 加载的版本化阈值文件
+
+输入为 JSONL（每行一个对象）或 CSV（表头），字段名与 ShopMetrics 相同，
+缺失的字段按 ShopMetrics 默认值处理。
+
+使用方法:
+    # 单机：直接生成阈值文件
+    python3 calibrate_thresholds.py history.jsonl -o thresholds_2026Q3.json --version 2026Q3
+
+    # 多机：各自生成草图，再合并生成阈值文件
+    python3 calibrate_thresholds.py part1.csv --sketch-out part1.sketch.json
+    python3 calibrate_thresholds.py --merge part1.sketch.json part2.sketch.json -o thresholds.json
+
+    # 使用校准阈值诊断
+    WAIMAI_THRESHOLDS=thresholds.json python3 your_script.py
+"""
+
+import sys
+import csv
+import json
+import time
+import argparse
+from dataclasses import fields, MISSING
+from typing import Dict, Iterator, List, Tuple
+
+from models import ShopMetrics
+from core.calibration import ThresholdCalibrator, LEVEL_QUANTILES
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 NumPy 时逐条计算
+    np = None
+
+# ShopMetrics 字段及其默认值
+FIELD_DEFAULTS = {f.name: f.default for f in fields(ShopMetrics) if f.default is not MISSING}
+NUMERIC_FIELDS = [name for name, default in FIELD_DEFAULTS.items()
+                  if isinstance(default, (int, float)) and not isinstance(default, bool)]
+TEXT_FIELDS = ["name", "platform", "category", "stage", "business_district"]
+
+
+# ==================== 输入读取 ====================
+
+def iter_records(path: str, fmt: str = "auto") -> Iterator[Tuple[int, Dict]]:
+    """
+    逐条读取历史数据（不把整个文件读进内存）
+
+    Yields:
+        (行号, 记录)；无法解析的行记录为 {"error": ...}
+    """
+    if fmt == "auto":
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    stream = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8-sig', newline='')
+    try:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(stream), 2):
+                yield line_no, {k: v for k, v in row.items() if v not in (None, "")}
+        else:
+            for line_no, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {"error": f"JSON 解析失败: {e.msg}"}
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, {"error": "每行应为一个 JSON 对象"}
+                    continue
+                yield line_no, record
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def normalize_record(record: Dict) -> Dict:
+    """按 ShopMetrics 字段取值并转换类型，缺失字段取默认值"""
+    normalized = {"name": str(record.get("name", ""))}
+    for name in TEXT_FIELDS[1:]:
+        normalized[name] = str(record.get(name, FIELD_DEFAULTS[name]))
+    for name in NUMERIC_FIELDS:
+        value = record.get(name)
+        normalized[name] = FIELD_DEFAULTS[name] if value is None else float(value)
+    return normalized
+
+
+def _flush(calibrator: ThresholdCalibrator, pending: List[Dict]):
+    if not pending:
+        return
+    if np is not None:
+        columns = {name: np.array([r[name] for r in pending], dtype=np.float64) for name in NUMERIC_FIELDS}
+        for name in ("category", "stage"):
+            columns[name] = np.array([r[name] for r in pending], dtype=object)
+        calibrator.add_columns(columns)
+    else:
+        for record in pending:
+            calibrator.add(ShopMetrics(**record))
+    pending.clear()
+
+
+def calibrate_files(paths: List[str], k: int = 200, fmt: str = "auto", chunk_size: int = 50000) -> ThresholdCalibrator:
+    """读取全部输入文件，返回写满草图的校准器"""
+    calibrator = ThresholdCalibrator(k=k)
+    pending: List[Dict] = []
+    errors = 0
+    started = time.time()
+    for path in paths:
+        for line_no, record in iter_records(path, fmt):
+            if "error" in record:
+                errors += 1
+                print(f"⚠️ {path}:{line_no} {record['error']}", file=sys.stderr)
+                continue
+            try:
+                pending.append(normalize_record(record))
+            except (TypeError, ValueError) as e:
+                errors += 1
+                print(f"⚠️ {path}:{line_no} 数值格式错误: {e}", file=sys.stderr)
+                continue
+            if len(pending) >= chunk_size:
+                _flush(calibrator, pending)
+                elapsed = time.time() - started
+                print(f"\r⏳ 已处理 {calibrator.records} 条 ({calibrator.records / max(elapsed, 1e-9):.0f} 条/秒)",
+                      end="", file=sys.stderr, flush=True)
+    _flush(calibrator, pending)
+    print(f"\r✅ 读取完成: {calibrator.records} 条，跳过 {errors} 条，用时 {time.time() - started:.1f} 秒",
+          file=sys.stderr)
+    return calibrator
+
+
+def parse_quantiles(text: str) -> Dict[str, float]:
+    """解析 --quantiles，如 danger=0.1,poor=0.25,fair=0.5,good=0.75,excellent=0.9"""
+    quantiles = dict(LEVEL_QUANTILES)
+    for item in text.split(","):
+        level, _, value = item.partition("=")
+        if level.strip() not in quantiles:
+            raise ValueError(f"❌ 未知的阈值等级: {level.strip()}")
+        quantiles[level.strip()] = float(value)
+    return quantiles
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='从历史数据校准诊断阈值')
+    parser.add_argument('inputs', nargs='*', help='历史数据文件 (JSONL 或 CSV，- 表示标准输入)')
+    parser.add_argument('--format', choices=['auto', 'jsonl', 'csv'], default='auto', help='输入格式')
+    parser.add_argument('--merge', nargs='+', default=[], help='要合并的草图文件 (--sketch-out 生成)')
+    parser.add_argument('--sketch-out', type=str, help='保存草图文件，供其他机器合并')
+    parser.add_argument('-o', '--output', type=str, help='输出阈值文件 (JSON)')
+    parser.add_argument('--version', type=str, help='阈值版本号 (默认按生成时间)')
+    parser.add_argument('--k', type=int, default=200, help='草图精度参数，越大越准、占用越多')
+    parser.add_argument('--min-count', type=int, default=100, help='分组样本数少于该值时沿用默认阈值')
+    parser.add_argument('--quantiles', type=str, help='阈值等级对应的分位数，如 danger=0.1,excellent=0.9')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='每次批量计算的记录数')
+
+    args = parser.parse_args()
+
+    if not args.inputs and not args.merge:
+        parser.print_help()
+        print("\n💡 提示: 指定历史数据文件，或用 --merge 合并多台机器生成的草图")
+        return
+    if not args.output and not args.sketch_out:
+        print("❌ 请至少指定 --output 或 --sketch-out")
+        sys.exit(1)
+
+    calibrator = calibrate_files(args.inputs, k=args.k, fmt=args.format, chunk_size=args.chunk_size) \
+        if args.inputs else ThresholdCalibrator(k=args.k)
+    for path in args.merge:
+        calibrator.merge(ThresholdCalibrator.load_sketches(path))
+        print(f"🔗 已合并草图: {path}")
+
+    if args.sketch_out:
+        calibrator.save_sketches(args.sketch_out)
+        print(f"📦 草图已保存到: {args.sketch_out} ({len(calibrator.sketches)} 个分组，{calibrator.records} 条)")
+
+    if args.output:
+        quantiles = parse_quantiles(args.quantiles) if args.quantiles else None
+        data = calibrator.write_thresholds(args.output, version=args.version, min_count=args.min_count,
+                                           level_quantiles=quantiles)
+        print(f"✅ 阈值文件已保存到: {args.output} (版本 {data['version']})")
+        print(f"   分组: {len(data['groups'])} 个，客单价基准: {len(data['aov_benchmark'])} 个品类")
+        for key, names in data["defaults_kept"].items():
+            print(f"   ⚠️ {key} 样本不足或分布退化，沿用默认阈值: {', '.join(names)}")
+        print(f"\n💡 使用: WAIMAI_THRESHOLDS={args.output} python3 ...")
+
+
+if __name__ == "__main__":
+    main()
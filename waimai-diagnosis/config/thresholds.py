@@ -2,10 +2,16 @@
 """
 指标阈值配置文件
 定义各品类、各维度的评分阈值标准
+
+下面的阈值为人工设定的默认值；用 calibrate_thresholds.py 从历史数据校准出的
+阈值文件可以通过 load_calibrated_thresholds() 或环境变量 WAIMAI_THRESHOLDS 加载，
+加载后按 品类 × 阶段 覆盖对应指标的阈值和品类客单价基准。
 """
 
+import os
+import json
 from enum import Enum
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 
 class ShopStage(Enum):
@@ -230,13 +236,65 @@ EFFICIENCY_THRESHOLDS = {
 }
 
 
+# ==================== 校准阈值 ====================
+# 校准阈值文件的格式版本
+CALIBRATION_SCHEMA = 1
+
+# 当前加载的校准阈值 (None 表示只使用上面的默认阈值)
+_CALIBRATED: Optional[Dict] = None
+
+
+def load_calibrated_thresholds(path: str) -> Dict:
+    """
+    加载 calibrate_thresholds.py 生成的阈值文件
+
+    Args:
+        path: 阈值文件路径 (JSON)
+
+    Returns:
+        阈值文件内容 (含 version、records 等元信息)
+    """
+    global _CALIBRATED
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get("schema") != CALIBRATION_SCHEMA:
+        raise ValueError(f"❌ 不支持的阈值文件格式版本: {data.get('schema')} (需要 {CALIBRATION_SCHEMA})")
+    _CALIBRATED = data
+    return data
+
+
+def clear_calibrated_thresholds():
+    """卸载校准阈值，恢复默认阈值"""
+    global _CALIBRATED
+    _CALIBRATED = None
+
+
+def calibrated_version() -> Optional[str]:
+    """当前加载的校准阈值版本 (未加载时为 None)"""
+    return _CALIBRATED.get("version") if _CALIBRATED else None
+
+
+def _calibrated_group(category: Optional[str], stage: Optional[str]) -> Dict:
+    """取 品类/阶段 的校准阈值，没有时退回该品类全部阶段合并的阈值"""
+    if not _CALIBRATED or category is None:
+        return {}
+    groups = _CALIBRATED.get("groups", {})
+    group = groups.get(f"{category}/{stage}") if stage is not None else None
+    if group is None:
+        group = groups.get(f"{category}/*", {})
+    return group.get("thresholds", {})
+
+
 # ==================== 阈值获取函数 ====================
-def get_thresholds_by_dimension(dimension: str) -> Dict:
+def get_thresholds_by_dimension(dimension: str, category: Optional[str] = None,
+                                stage: Optional[str] = None) -> Dict:
     """
     获取指定维度的所有阈值配置
     
     Args:
         dimension: 维度名称 (traffic/aov/satisfaction/efficiency)
+        category: 品类名称 (加载了校准阈值时用于选择分组)
+        stage: 发展阶段 (同上)
     
     Returns:
         该维度的阈值配置字典
@@ -247,7 +305,11 @@ def get_thresholds_by_dimension(dimension: str) -> Dict:
         "satisfaction": SATISFACTION_THRESHOLDS,
         "efficiency": EFFICIENCY_THRESHOLDS,
     }
-    return thresholds_map.get(dimension, {})
+    thresholds = thresholds_map.get(dimension, {})
+    calibrated = _calibrated_group(category, stage).get(dimension)
+    if calibrated:
+        thresholds = dict(thresholds, **calibrated)
+    return thresholds
 
 
 def get_dimension_weights(stage: str) -> Dict[str, float]:
@@ -274,6 +336,10 @@ def get_aov_benchmark(category: str, percentile: str = "P50") -> float:
     Returns:
         基准客单价
     """
+    if _CALIBRATED:
+        calibrated = _CALIBRATED.get("aov_benchmark", {}).get(category, {})
+        if percentile in calibrated:
+            return calibrated[percentile]
     category_data = AOV_BENCHMARK.get(category, AOV_BENCHMARK[CategoryType.FAST_FOOD.value])
     return category_data.get(percentile, 28)
 
@@ -313,3 +379,8 @@ def is_reverse_metric(metric_name: str) -> bool:
         是否为反向指标
     """
     return metric_name in REVERSE_METRICS
+
+
+# 设置了 WAIMAI_THRESHOLDS 时自动加载校准阈值
+if os.getenv("WAIMAI_THRESHOLDS"):
+    load_calibrated_thresholds(os.environ["WAIMAI_THRESHOLDS"])
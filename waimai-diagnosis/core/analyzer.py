@@ -15,6 +15,28 @@ from models import (
     ActionItem,
     GradeLevel,
 )
+from core.sensitivity import sensitivity
+
+
+# 问题标题 -> 对应指标，行动计划按该指标的提分空间排序
+ISSUE_METRICS = {
+    "入店转化率过低": "visit_conversion",
+    "下单转化率偏低": "order_conversion",
+    "曝光成本过高": "exposure_cost",
+    "整体转化效率低下": "overall_conversion",
+    "订单取消率偏高": "cancel_rate",
+    "客单价低于品类平均": "aov",
+    "毛利率过低": "profit_margin",
+    "平台评分偏低": "rating",
+    "差评率过高": "negative_rate",
+    "投诉率异常": "complaint_rate",
+    "出餐时间过长": "cook_time",
+    "准时率不达标": "ontime_rate",
+    "退单率偏高": "refund_rate",
+}
+
+# 按预计总分提升划分优先级: (提升下限, 优先级)，不足最低一档为 P2
+IMPACT_PRIORITIES = ((1.0, "P0"), (0.3, "P1"))
 
 
 @dataclass
@@ -65,6 +87,7 @@ class DiagnosisAnalyzer:
         self.dimensions = {d.name: d for d in dimensions}
         self.issues: List[IssueItem] = []
         self.suggestions: List[SuggestionItem] = []
+        self.sensitivity = None
     
     def analyze(self) -> DiagnosisReport:
         """
@@ -106,6 +129,7 @@ class DiagnosisAnalyzer:
             dimension_scores=list(self.dimensions.values()),
             top_issues=[self._issue_to_dict(i) for i in top_issues],
             action_plan=action_plan,
+            sensitivity=self.sensitivity,
             raw_metrics=self.metrics
         )
         
@@ -385,37 +409,41 @@ class DiagnosisAnalyzer:
         return effect_map.get(issue.title, "预期有显著改善")
     
     def _generate_action_plan(self) -> Dict[str, List[ActionItem]]:
-        """生成行动计划"""
-        p0_items = []  # 本周必做
-        p1_items = []  # 近期完成
-        p2_items = []  # 持续优化
+        """
+        生成行动计划
+
+        每个问题按对应指标改善到下一个阈值分段时总分的实际变化 (core.sensitivity 的 impact，
+        含杠杆字段对其他指标的连带影响) 排序，并按提升幅度划分 P0/P1/P2，而不是按问题等级固定优先级。
+        """
+        self.sensitivity = sensitivity(self.metrics, self.calc, list(self.dimensions.values()))
+        plan: Dict[str, List[ActionItem]] = {"P0": [], "P1": [], "P2": []}
         
+        ranked = []
         for issue in self.issues:
-            action = ActionItem(
-                priority="P0" if issue.level == "critical" else "P1",
+            item = self.sensitivity.get(ISSUE_METRICS.get(issue.title, ""))
+            ranked.append((item.impact if item else 0.0, issue))
+        ranked.sort(key=lambda pair: -pair[0])
+        
+        for gain, issue in ranked:
+            priority = next((p for bound, p in IMPACT_PRIORITIES if gain >= bound), "P2")
+            expected_effect = self._get_expected_effect(issue)
+            if gain > 0:
+                expected_effect += f"，预计总分 +{gain:.1f}"
+            plan[priority].append(ActionItem(
+                priority=priority,
                 title=f"解决: {issue.title}",
                 description=issue.description,
-                expected_effect=self._get_expected_effect(issue),
+                expected_effect=expected_effect,
                 time_estimate="1-3天" if issue.level == "critical" else "1-2周",
-                dimension=issue.dimension
-            )
-            
-            if issue.level == "critical":
-                p0_items.append(action)
-            elif issue.level == "major":
-                p1_items.append(action)
-            else:
-                p2_items.append(action)
+                dimension=issue.dimension,
+                score_gain=round(gain, 2)
+            ))
         
-        # 如果没有严重问题，添加一些通用优化建议
-        if not p0_items:
-            p2_items.extend(self._get_general_improvements())
+        # 如果没有高收益行动，添加一些通用优化建议
+        if not plan["P0"]:
+            plan["P2"].extend(self._get_general_improvements())
         
-        return {
-            "P0": p0_items,
-            "P1": p1_items,
-            "P2": p2_items
-        }
+        return plan
     
     def _get_general_improvements(self) -> List[ActionItem]:
         """获取通用优化建议"""
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+批量评分模块
+对成千上万家店铺一次性计算衍生指标、指标得分、维度得分和总体评分
+
+输入为按字段存放的列（ShopMetrics 字段名 -> 数组），所有计算在 NumPy 上
+广播完成，不再为每家店铺创建 MetricsCalculator / ScoreEvaluator 对象。
+结果与逐店铺的标量路径（quick_calculate + ScoreEvaluator）逐位一致：
+运算顺序与标量代码保持相同，round(x, 1) 在 .5 边界附近回退到内置 round。
+
+NumPy 为可选依赖，仅批量评分需要；标量路径不受影响。
+"""
+
+from dataclasses import dataclass, field, fields, MISSING
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 未安装 NumPy 时仅批量评分不可用
+    np = None
+
+from models import ShopMetrics
+from core.scoring import STRATEGIES, FiveThresholdScoring
+from config.thresholds import (
+    get_thresholds_by_dimension,
+    get_dimension_weights,
+    get_aov_benchmark,
+    calibrated_version,
+)
+
+
+# ==================== 评分布局 ====================
+# 与 ScoreEvaluator 各 _evaluate_* 方法中的指标顺序、权重、阈值一一对应
+
+# ScoreEvaluator 中取消率使用的固定阈值
+CANCEL_THRESHOLDS = {"danger": 0.12, "poor": 0.07, "fair": 0.04, "good": 0.02, "excellent": 0.01}
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """单个评分指标的定义"""
+    name: str                       # 指标名称 (与 MetricDetail.name 一致)
+    source: str                     # 取值字段 (CalculationResult 字段，rating 取原始指标)
+    weight: float                   # 维度内权重
+    threshold_group: Optional[str]  # 阈值所在维度 (None 表示使用固定阈值)
+    is_reverse: bool = False        # 是否为反向指标
+    unit: str = ""                  # MetricDetail.unit
+    description: str = ""           # MetricDetail.description
+    scale: float = 100              # 展示值 = round(取值 * scale, ndigits)
+    ndigits: Optional[int] = 2      # None 表示展示原始值
+
+
+DIMENSION_LAYOUT: List[Tuple[str, str, List[MetricSpec]]] = [
+    ("traffic", "流量健康度", [
+        MetricSpec("visit_conversion", "visit_conversion_rate", 0.30, "traffic",
+                   unit="%", description="访问UV/曝光UV，反映店铺吸引力"),
+        MetricSpec("order_conversion", "order_conversion_rate", 0.35, "traffic",
+                   unit="%", description="下单UV/访问UV，反映商品竞争力"),
+        MetricSpec("exposure_cost", "exposure_cost_per_uv", 0.20, "traffic", True,
+                   unit="元", description="推广费/曝光UV，反映流量获取成本", scale=1),
+        MetricSpec("overall_conversion", "overall_conversion_rate", 0.15, "traffic",
+                   unit="%", description="下单UV/曝光UV，整体转化效率"),
+    ]),
+    ("conversion", "转化能力", [
+        MetricSpec("overall_conversion", "overall_conversion_rate", 0.50, "traffic",
+                   unit="%", description="整体转化效率"),
+        MetricSpec("order_conversion", "order_conversion_rate", 0.35, "traffic",
+                   unit="%", description="页面转化能力"),
+        MetricSpec("cancel_rate", "cancel_rate", 0.15, None, True,
+                   unit="%", description="取消订单占比，反向指标"),
+    ]),
+    ("aov", "客单价水平", [
+        MetricSpec("aov", "aov", 0.40, None,  # 相对品类 P50 的比例评分
+                   unit="元", description="营业额/订单量", scale=1),
+        MetricSpec("profit_margin", "profit_margin", 0.35, "aov",
+                   unit="%", description="估算毛利率"),
+    ]),
+    ("satisfaction", "顾客满意度", [
+        MetricSpec("rating", "rating", 0.35, "satisfaction",
+                   unit="分", description="平台评分(1-5分)", ndigits=None),
+        MetricSpec("positive_rate", "positive_rate", 0.25, "satisfaction",
+                   unit="%", description="好评占比"),
+        MetricSpec("negative_rate", "negative_rate", 0.25, "satisfaction", True,
+                   unit="%", description="差评占比，反向指标"),
+        MetricSpec("complaint_rate", "complaint_rate", 0.15, "satisfaction", True,
+                   unit="‱", description="投诉率，反向指标", scale=10000, ndigits=4),
+    ]),
+    ("efficiency", "运营效率", [
+        MetricSpec("cook_time", "cook_time", 0.30, "efficiency", True,
+                   unit="分钟", description="平均出餐时间", scale=1, ndigits=1),
+        MetricSpec("ontime_rate", "ontime_rate", 0.30, "efficiency",
+                   unit="%", description="准时送达率"),
+        MetricSpec("refund_rate", "refund_rate", 0.25, "efficiency", True,
+                   unit="%", description="退单率，反向指标"),
+        MetricSpec("cancel_rate", "cancel_rate", 0.15, None, True,
+                   unit="%", description="取消率，反向指标"),
+    ]),
+]
+
+# ScoreEvaluator._get_level 的得分分界
+LEVELS = ("excellent", "good", "fair", "poor", "danger")
+LEVEL_BOUNDS = (90, 80, 70, 60)
+
+# 数值字段及其默认值（缺失的列按 ShopMetrics 默认值补齐）
+NUMERIC_FIELDS: Dict[str, float] = {
+    f.name: f.default for f in fields(ShopMetrics)
+    if f.default is not MISSING and f.type in (int, float, "int", "float")
+}
+TEXT_FIELDS = ("name", "platform", "category", "stage", "business_district")
+
+# __post_init__ 中截断为非负的字段
+NON_NEGATIVE_FIELDS = ("exposure_uv", "visit_uv", "order_uv", "order_count")
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("批量评分需要 NumPy，请先安装: pip install numpy")
+
+
+# ==================== 列数据 ====================
+
+def columns_from_metrics(shops: Iterable[ShopMetrics]) -> Dict[str, Any]:
+    """
+    将 ShopMetrics 列表转换为列数据
+
+    Returns:
+        字段名 -> 数组 (数值字段为 float64，文本字段为 object 数组)
+    """
+    _require_numpy()
+    shops = list(shops)
+    columns: Dict[str, Any] = {}
+    for name in NUMERIC_FIELDS:
+        columns[name] = np.fromiter((getattr(s, name) for s in shops), dtype=np.float64, count=len(shops))
+    for name in TEXT_FIELDS:
+        columns[name] = np.array([getattr(s, name) for s in shops], dtype=object)
+    return columns
+
+
+def _column(columns: Mapping[str, Any], name: str, size: int):
+    if name in columns:
+        return np.asarray(columns[name], dtype=np.float64)
+    return np.full(size, float(NUMERIC_FIELDS[name]))
+
+
+def _column_size(columns: Mapping[str, Any]) -> int:
+    for value in columns.values():
+        return len(value)
+    return 0
+
+
+def pyround(values, ndigits: int = 1):
+    """
+    与内置 round(x, ndigits) 逐位一致的向量化版本
+
+    np.round 先乘 10**ndigits 再舍入，在 .5 边界附近可能与内置 round 的精确十进制舍入不同，
+    这些元素（以及放大后超出整数精度的元素）单独用内置 round 计算。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    with np.errstate(invalid="ignore"):
+        fallback = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | (np.abs(scaled) >= 2.0 ** 52)
+    if fallback.any():
+        index = np.flatnonzero(fallback)
+        rounded[index] = [round(float(v), ndigits) for v in values[index]]
+    return rounded
+
+
+def round1(values):
+    """round(x, 1) 的向量化版本（维度得分、总体评分）"""
+    return pyround(values, 1)
+
+
+def metric_levels(scores):
+    """向量化的 ScoreEvaluator._get_level，返回 LEVELS 中的下标"""
+    scores = np.asarray(scores, dtype=np.float64)
+    return np.select([scores >= bound for bound in LEVEL_BOUNDS], range(len(LEVEL_BOUNDS)),
+                     len(LEVEL_BOUNDS)).astype(np.int8)
+
+
+def display_values(values, spec: MetricSpec):
+    """MetricDetail.value 的展示值（与 ScoreEvaluator 中的 round 一致）"""
+    values = np.asarray(values, dtype=np.float64)
+    if spec.ndigits is None:
+        return values
+    return pyround(values * spec.scale if spec.scale != 1 else values, spec.ndigits)
+
+
+def threshold_scores(values, thresholds: Dict[str, float], is_reverse: bool = False):
+    """
+    向量化的 ScoreEvaluator._calculate_metric_score（core.scoring 的五档策略）
+
+    阈值可以是标量，也可以是逐店铺数组。
+    """
+    return STRATEGIES["five"].score_array(values, FiveThresholdScoring.compile(thresholds), is_reverse)
+
+
+def aov_ratio_scores(aov, benchmark_p50):
+    """向量化的客单价评分（相对品类 P50 的比例）"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(benchmark_p50 > 0, aov / benchmark_p50, 1.0)
+    return np.select(
+        [ratio >= 1.5, ratio >= 1.2, ratio >= 1.0, ratio >= 0.8],
+        [95.0, 85.0, 75.0, 60.0],
+        np.maximum(30.0, ratio * 50),
+    )
+
+
+# ==================== 批量结果 ====================
+
+@dataclass
+class BatchScores:
+    """
+    批量评分结果
+
+    所有数组长度等于店铺数；新店 (stage=new) 不考核客单价维度，
+    其 dimension_scores["aov"] 为 NaN，且不计入总体评分。
+    """
+    calc: Dict[str, Any]                            # CalculationResult 字段 -> 数组
+    metric_scores: Dict[str, Dict[str, Any]]        # 维度 -> 指标 -> 得分数组
+    dimension_scores: Dict[str, Any]                # 维度 -> 得分数组
+    dimension_weights: Dict[str, Any]               # 维度 -> 权重数组
+    overall: Any                                    # 总体评分数组
+    benchmarks: Dict[Tuple[str, str], Any] = field(default_factory=dict)  # (维度, 指标) -> 基准值数组
+
+    def metric_values(self, dim: str, spec: MetricSpec):
+        """某个指标的展示值数组（即 MetricDetail.value）"""
+        return display_values(self.calc[spec.source], spec)
+
+    def __len__(self) -> int:
+        return len(self.overall)
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """取出单家店铺的评分（维度缺失时不包含该维度）"""
+        dimensions = {}
+        for dim, scores in self.dimension_scores.items():
+            score = float(scores[index])
+            if score == score:  # 跳过 NaN
+                dimensions[dim] = score
+        return {"overall_score": float(self.overall[index]), "dimensions": dimensions}
+
+
+# ==================== 批量评分引擎 ====================
+
+class BatchScorer:
+    """
+    批量评分引擎
+
+    构造时从 config.thresholds 取出并固定全部默认阈值和权重，之后每次 score()
+    只做数组运算。加载了校准阈值 (config.thresholds.load_calibrated_thresholds)
+    时，score() 按 品类 × 阶段 取各分组的阈值，展开成逐店铺的阈值数组。
+    """
+
+    def __init__(self):
+        _require_numpy()
+        self.layout = DIMENSION_LAYOUT
+        self.thresholds: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for dim, _, specs in self.layout:
+            for spec in specs:
+                self.thresholds[(dim, spec.name)] = self._metric_thresholds(spec)
+        # 维度内权重之和，与 _weighted_average 的 sum() 顺序一致
+        self.metric_weight_totals = {dim: sum(spec.weight for spec in specs) for dim, _, specs in self.layout}
+
+    @staticmethod
+    def _metric_thresholds(spec: MetricSpec, category: Optional[str] = None,
+                           stage: Optional[str] = None) -> Dict[str, float]:
+        if spec.threshold_group is None:
+            return CANCEL_THRESHOLDS if spec.name == "cancel_rate" else {}
+        return get_thresholds_by_dimension(spec.threshold_group, category, stage).get(spec.name, {})
+
+    def _row_thresholds(self, dim: str, spec: MetricSpec, categories, stages, group_index):
+        """
+        各店铺适用的阈值
+
+        所有 品类 × 阶段 分组的阈值相同时直接返回默认阈值 dict；
+        否则返回 阈值名 -> 逐店铺数组，threshold_scores 按元素广播，结果与标量路径一致。
+        """
+        if calibrated_version() is None:
+            return self.thresholds[(dim, spec.name)]
+        per_group = [self._metric_thresholds(spec, category, stage)
+                     for category in categories for stage in stages]
+        first = per_group[0]
+        if all(thresholds == first for thresholds in per_group):
+            return first
+        return {
+            level: np.array([thresholds[level] for thresholds in per_group], dtype=np.float64)[group_index]
+            for level in first
+        }
+
+    def calculate(self, columns: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        向量化的 MetricsCalculator.calculate_all
+
+        Returns:
+            CalculationResult 字段名 -> 数组
+        """
+        size = _column_size(columns)
+        col = {name: _column(columns, name, size) for name in NUMERIC_FIELDS}
+        for name in NON_NEGATIVE_FIELDS:
+            col[name] = np.maximum(0, col[name])
+
+        exposure = col["exposure_uv"]
+        visit = col["visit_uv"]
+        order_uv = col["order_uv"]
+        orders = col["order_count"]
+
+        calc: Dict[str, Any] = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # 流量指标
+            calc["visit_conversion_rate"] = np.where(exposure > 0, visit / exposure, 0.0)
+            calc["order_conversion_rate"] = np.where(visit > 0, order_uv / visit, 0.0)
+            calc["overall_conversion_rate"] = np.where(exposure > 0, order_uv / exposure, 0.0)
+            calc["exposure_cost_per_uv"] = np.where(exposure > 0, col["promotion_cost"] / exposure, 0.0)
+
+            # 订单指标
+            calc["aov"] = np.where(orders > 0, col["revenue"] / orders, 0.0)
+            calc["actual_aov"] = np.where(orders > 0, col["actual_revenue"] / orders, 0.0)
+            total_orders = orders + col["cancel_count"]
+            calc["cancel_rate"] = np.where(total_orders > 0, col["cancel_count"] / total_orders, 0.0)
+
+            # 评价指标
+            total_reviews = col["positive_reviews"] + col["negative_reviews"]
+            calc["total_reviews"] = total_reviews
+            calc["positive_rate"] = np.where(total_reviews > 0, col["positive_reviews"] / total_reviews, 1.0)
+            calc["negative_rate"] = np.where(total_reviews > 0, col["negative_reviews"] / total_reviews, 0.0)
+            monthly_orders = orders * 30
+            calc["complaint_rate"] = np.where(monthly_orders > 0, col["complaints"] / monthly_orders, 0.0)
+            calc["negative_reply_rate"] = np.where(
+                col["negative_reviews"] > 0, col["replied_negative"] / col["negative_reviews"], 1.0)
+
+            # 效率指标
+            calc["cook_time"] = col["cook_time"]
+            calc["ontime_rate"] = col["ontime_rate"] / 100.0
+            calc["refund_rate"] = col["refund_rate"] / 100.0
+
+            # 盈利指标
+            promotion_ratio = col["promotion_cost"] / col["revenue"]
+            calc["profit_margin"] = np.where(
+                col["revenue"] > 0, np.maximum(0.0, 1.0 - 0.55 - promotion_ratio), 0.0)
+
+        calc["rating"] = col["rating"]  # 满意度维度直接使用原始评分
+        return calc
+
+    @staticmethod
+    def _codes(columns: Mapping[str, Any], name: str, size: int, default: str):
+        """文本列编码：返回 (不重复取值, 每家店铺的取值下标)"""
+        values = columns.get(name)
+        if values is None:
+            return np.array([default], dtype=object), np.zeros(size, dtype=np.intp)
+        unique, inverse = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+        return unique, inverse.reshape(-1)
+
+    def score(self, columns: Mapping[str, Any]) -> BatchScores:
+        """
+        计算全部店铺的指标得分、维度得分和总体评分
+
+        Args:
+            columns: ShopMetrics 字段名 -> 数组（缺失的数值列按默认值补齐）
+        """
+        size = _column_size(columns)
+        calc = self.calculate(columns)
+
+        stages, stage_index = self._codes(columns, "stage", size, "growth")
+        has_aov = (stages != "new")[stage_index]
+        categories, category_index = self._codes(columns, "category", size, "快餐简餐")
+        benchmark_p50 = np.array([get_aov_benchmark(c, "P50") for c in categories], dtype=np.float64)[category_index]
+        group_index = category_index * len(stages) + stage_index
+
+        metric_scores: Dict[str, Dict[str, Any]] = {}
+        dimension_scores: Dict[str, Any] = {}
+        dimension_weights: Dict[str, Any] = {}
+        defaults = {"traffic": 0.25, "conversion": 0.25, "aov": 0.15, "satisfaction": 0.20, "efficiency": 0.15}
+
+        for dim, _, specs in self.layout:
+            scores = {}
+            weighted = None
+            for spec in specs:
+                if dim == "aov" and spec.name == "aov":
+                    value = aov_ratio_scores(calc["aov"], benchmark_p50)
+                else:
+                    thresholds = self._row_thresholds(dim, spec, categories, stages, group_index)
+                    value = threshold_scores(calc[spec.source], thresholds, spec.is_reverse)
+                scores[spec.name] = value
+                weighted = value * spec.weight if weighted is None else weighted + value * spec.weight
+            metric_scores[dim] = scores
+            total = self.metric_weight_totals[dim]
+            dim_score = round1(weighted / total) if total else np.zeros(size)
+            dimension_weights[dim] = np.array(
+                [get_dimension_weights(stage).get(dim, defaults[dim]) for stage in stages],
+                dtype=np.float64)[stage_index]
+            if dim == "aov":
+                dim_score = np.where(has_aov, dim_score, np.nan)
+            dimension_scores[dim] = dim_score
+
+        # 总体评分：按维度顺序累加，新店跳过客单价维度
+        weighted_sum = None
+        total_weight = None
+        for dim, _, _ in self.layout:
+            term = dimension_scores[dim] * dimension_weights[dim]
+            weight = dimension_weights[dim]
+            if weighted_sum is None:
+                weighted_sum, total_weight = term, weight
+            elif dim == "aov":
+                weighted_sum = np.where(has_aov, weighted_sum + term, weighted_sum)
+                total_weight = np.where(has_aov, total_weight + weight, total_weight)
+            else:
+                weighted_sum = weighted_sum + term
+                total_weight = total_weight + weight
+        with np.errstate(divide="ignore", invalid="ignore"):
+            overall = np.where(total_weight == 0, 0.0, round1(weighted_sum / total_weight))
+
+        return BatchScores(
+            calc=calc,
+            metric_scores=metric_scores,
+            dimension_scores=dimension_scores,
+            dimension_weights=dimension_weights,
+            overall=overall,
+            benchmarks={("aov", "aov"): benchmark_p50},
+        )
+
+
+def score_shops(shops: Iterable[ShopMetrics]) -> BatchScores:
+    """
+    批量评分的工具函数
+
+    Example:
+        >>> scores = score_shops([ShopMetrics(name="A", exposure_uv=1000, ...), ...])
+        >>> print(scores.overall)
+    """
+    return BatchScorer().score(columns_from_metrics(shops))
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+阈值校准模块
+从历史 ShopMetrics 数据流中按 品类 × 阶段 × 指标 维护 KLL 分位数草图，
+据此生成可被 config.thresholds 加载的版本化阈值文件
+
+- 单遍处理，每个草图只保存几百个值，数据量再大内存也有上限
+- 草图可以保存成文件，多台机器各自处理一部分数据后合并
+- 阈值取各分组的分位数：正向指标 danger=P10 … excellent=P90，反向指标反过来；
+  aov 的 P10…P90 作为品类客单价基准 (AOV_BENCHMARK)
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from models import ShopMetrics
+from core.calculator import quick_calculate
+from core.batch import DIMENSION_LAYOUT
+from core.sketch import KLLSketch
+from config.thresholds import CALIBRATION_SCHEMA
+
+# 草图文件的格式版本
+SKETCH_SCHEMA = 1
+
+# 阈值等级对应的分位数（正向指标；反向指标取 1 - q）
+LEVEL_QUANTILES: Dict[str, float] = {
+    "danger": 0.10,
+    "poor": 0.25,
+    "fair": 0.50,
+    "good": 0.75,
+    "excellent": 0.90,
+}
+
+# 客单价基准的分位数
+AOV_PERCENTILES: Dict[str, float] = {"P10": 0.10, "P25": 0.25, "P50": 0.50, "P75": 0.75, "P90": 0.90}
+
+# 需要校准的指标: 指标名 -> (阈值所在维度, 取值字段, 是否反向)；aov 的维度为 None
+CALIBRATED_METRICS: Dict[str, Tuple[Optional[str], str, bool]] = {"aov": (None, "aov", False)}
+for _, _, _specs in DIMENSION_LAYOUT:
+    for _spec in _specs:
+        if _spec.threshold_group is not None:
+            CALIBRATED_METRICS.setdefault(_spec.name, (_spec.threshold_group, _spec.source, _spec.is_reverse))
+
+# 指标有意义的前提：该原始字段 > 0（例如没有曝光的店铺不计入入店转化率）
+METRIC_BASES: Dict[str, Optional[str]] = {
+    "visit_conversion": "exposure_uv",
+    "order_conversion": "visit_uv",
+    "overall_conversion": "exposure_uv",
+    "exposure_cost": "exposure_uv",
+    "aov": "order_count",
+    "profit_margin": "revenue",
+    "rating": "rating",
+    "positive_rate": "total_reviews",
+    "negative_rate": "total_reviews",
+    "complaint_rate": "order_count",
+    "cook_time": "cook_time",
+    "ontime_rate": "ontime_rate",
+    "refund_rate": None,
+}
+
+GroupKey = Tuple[str, str]
+
+
+class ThresholdCalibrator:
+    """
+    阈值校准器
+
+    Example:
+        >>> calibrator = ThresholdCalibrator()
+        >>> for shop in history:
+        ...     calibrator.add(shop)
+        >>> calibrator.merge(ThresholdCalibrator.load_sketches("machine2.sketch.json"))
+        >>> calibrator.write_thresholds("thresholds_2026Q3.json", version="2026Q3")
+    """
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.records = 0
+        self.counts: Dict[GroupKey, int] = {}                     # 各分组的记录数
+        self.sketches: Dict[GroupKey, Dict[str, KLLSketch]] = {}
+
+    def _group(self, category: str, stage: str) -> Dict[str, KLLSketch]:
+        group = self.sketches.get((category, stage))
+        if group is None:
+            group = self.sketches[(category, stage)] = {name: KLLSketch(self.k) for name in CALIBRATED_METRICS}
+        return group
+
+    # ---------- 写入 ----------
+
+    def add(self, metrics: ShopMetrics):
+        """写入一条店铺（日）记录"""
+        calc = quick_calculate(metrics)
+        group = self._group(metrics.category, metrics.stage)
+        for name, (_, source, _) in CALIBRATED_METRICS.items():
+            base = METRIC_BASES.get(name)
+            if base is not None:
+                base_value = getattr(calc, base) if base == "total_reviews" else getattr(metrics, base)
+                if not base_value > 0:
+                    continue
+            value = metrics.rating if source == "rating" else getattr(calc, source)
+            group[name].update(value)
+        key = (metrics.category, metrics.stage)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.records += 1
+
+    def add_columns(self, columns: Mapping[str, Any]):
+        """
+        批量写入一段按列存放的记录（ShopMetrics 字段名 -> 数组，需要 NumPy）
+
+        衍生指标由 BatchScorer.calculate 向量化计算，与 add() 的结果相同。
+        """
+        import numpy as np
+        from core.batch import BatchScorer, NUMERIC_FIELDS, NON_NEGATIVE_FIELDS, _column, _column_size
+
+        size = _column_size(columns)
+        if size == 0:
+            return
+        calc = BatchScorer().calculate(columns)
+        bases = {"total_reviews": calc["total_reviews"]}
+        for name in NUMERIC_FIELDS:
+            values = _column(columns, name, size)
+            bases[name] = np.maximum(0, values) if name in NON_NEGATIVE_FIELDS else values
+        categories, category_index = BatchScorer._codes(columns, "category", size, "快餐简餐")
+        stages, stage_index = BatchScorer._codes(columns, "stage", size, "growth")
+        group_index = category_index * len(stages) + stage_index
+        for group_id in np.unique(group_index).tolist():
+            rows = group_index == group_id
+            key = (str(categories[group_id // len(stages)]), str(stages[group_id % len(stages)]))
+            group = self._group(*key)
+            for name, (_, source, _) in CALIBRATED_METRICS.items():
+                base = METRIC_BASES.get(name)
+                selected = rows if base is None else rows & (bases[base] > 0)
+                group[name].update_many(calc[source][selected].tolist())
+            self.counts[key] = self.counts.get(key, 0) + int(rows.sum())
+        self.records += size
+
+    def merge(self, other: "ThresholdCalibrator"):
+        """合并另一份校准器（另一台机器或另一段数据）的草图"""
+        if other.k != self.k:
+            raise ValueError(f"❌ 无法合并 k 不同的草图: {self.k} 与 {other.k}")
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        for (category, stage), sketches in other.sketches.items():
+            group = self._group(category, stage)
+            for name, sketch in sketches.items():
+                if name in group:
+                    group[name].merge(sketch)
+        self.records += other.records
+
+    # ---------- 草图文件 ----------
+
+    def to_dict(self) -> Dict:
+        return {
+            "schema": SKETCH_SCHEMA,
+            "kind": "waimai-threshold-sketches",
+            "k": self.k,
+            "records": self.records,
+            "groups": {
+                f"{category}/{stage}": {
+                    "count": self.counts.get((category, stage), 0),
+                    "sketches": {name: sketch.to_dict() for name, sketch in sketches.items()},
+                }
+                for (category, stage), sketches in self.sketches.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ThresholdCalibrator":
+        if data.get("kind") != "waimai-threshold-sketches" or data.get("schema") != SKETCH_SCHEMA:
+            raise ValueError(f"❌ 不是可识别的草图文件 (kind={data.get('kind')}, schema={data.get('schema')})")
+        calibrator = cls(k=data["k"])
+        calibrator.records = data.get("records", 0)
+        for key, entry in data["groups"].items():
+            category, stage = key.rsplit("/", 1)
+            calibrator.counts[(category, stage)] = entry["count"]
+            group = calibrator._group(category, stage)
+            for name, sketch in entry["sketches"].items():
+                group[name] = KLLSketch.from_dict(sketch)
+        return calibrator
+
+    def save_sketches(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load_sketches(cls, path: str) -> "ThresholdCalibrator":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    # ---------- 生成阈值 ----------
+
+    def _merged(self, category: str) -> Dict[str, KLLSketch]:
+        """某品类全部阶段合并后的草图"""
+        merged = {name: KLLSketch(self.k) for name in CALIBRATED_METRICS}
+        for (group_category, _), sketches in self.sketches.items():
+            if group_category == category:
+                for name, sketch in sketches.items():
+                    merged[name].merge(sketch)
+        return merged
+
+    @staticmethod
+    def _thresholds(sketch: KLLSketch, is_reverse: bool,
+                    level_quantiles: Mapping[str, float]) -> Optional[Dict[str, float]]:
+        """
+        由草图得到一组阈值；不满足评分公式的要求时返回 None
+
+        评分公式会除以 excellent/danger 和相邻阈值之差，因此要求阈值都大于 0 且严格单调。
+        """
+        thresholds = {}
+        for level, q in level_quantiles.items():
+            value = sketch.quantile(1 - q if is_reverse else q)
+            thresholds[level] = float(f"{value:.4g}")
+        ordered = [thresholds[level] for level in ("danger", "poor", "fair", "good", "excellent")]
+        if is_reverse:
+            ordered.reverse()
+        if ordered[0] <= 0 or any(a >= b for a, b in zip(ordered, ordered[1:])):
+            return None
+        return thresholds
+
+    def _group_entry(self, count: int, sketches: Dict[str, KLLSketch], min_count: int,
+                     level_quantiles: Mapping[str, float]) -> Tuple[Dict, List[str]]:
+        """一个分组的阈值，以及因样本不足或分布退化而沿用默认值的指标"""
+        thresholds: Dict[str, Dict[str, Dict[str, float]]] = {}
+        skipped = []
+        for name, (dimension, _, is_reverse) in CALIBRATED_METRICS.items():
+            if dimension is None:
+                continue
+            sketch = sketches[name]
+            calibrated = self._thresholds(sketch, is_reverse, level_quantiles) if sketch.n >= min_count else None
+            if calibrated is None:
+                skipped.append(name)
+                continue
+            thresholds.setdefault(dimension, {})[name] = calibrated
+        return {"count": count, "thresholds": thresholds}, skipped
+
+    def build_thresholds(self, version: Optional[str] = None, min_count: int = 100,
+                         level_quantiles: Optional[Mapping[str, float]] = None) -> Dict:
+        """
+        生成阈值文件内容
+
+        Args:
+            version: 阈值版本号（默认按生成时间）
+            min_count: 分组内某指标的样本数少于该值时沿用默认阈值
+            level_quantiles: 阈值等级 -> 分位数（默认 LEVEL_QUANTILES）
+
+        Returns:
+            可由 config.thresholds.load_calibrated_thresholds 加载的字典
+        """
+        level_quantiles = dict(level_quantiles or LEVEL_QUANTILES)
+        now = datetime.now()
+        groups: Dict[str, Dict] = {}
+        skipped: Dict[str, List[str]] = {}
+        aov_benchmark: Dict[str, Dict[str, float]] = {}
+
+        for category in sorted({category for category, _ in self.sketches}):
+            merged = self._merged(category)
+            stages = sorted(stage for group_category, stage in self.sketches if group_category == category)
+            entries = [(f"{category}/*", sum(self.counts.get((category, stage), 0) for stage in stages), merged)]
+            entries += [(f"{category}/{stage}", self.counts.get((category, stage), 0), self.sketches[(category, stage)])
+                        for stage in stages]
+            for key, count, sketches in entries:
+                groups[key], missing = self._group_entry(count, sketches, min_count, level_quantiles)
+                if missing:
+                    skipped[key] = missing
+            benchmark = {name: round(merged["aov"].quantile(q), 2) for name, q in AOV_PERCENTILES.items()} \
+                if merged["aov"].n >= min_count else {}
+            # 客单价评分以 P50 为分母
+            if benchmark.get("P50", 0) > 0:
+                aov_benchmark[category] = benchmark
+
+        return {
+            "schema": CALIBRATION_SCHEMA,
+            "version": version or now.strftime("%Y%m%d%H%M%S"),
+            "created_at": now.isoformat(timespec="seconds"),
+            "records": self.records,
+            "sketch_k": self.k,
+            "min_count": min_count,
+            "level_quantiles": level_quantiles,
+            "groups": groups,
+            "aov_benchmark": aov_benchmark,
+            "defaults_kept": skipped,
+        }
+
+    def write_thresholds(self, path: str, **kwargs) -> Dict:
+        """生成阈值文件并写出，返回文件内容"""
+        data = self.build_thresholds(**kwargs)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
@@ -110,7 +110,7 @@ class ScoreEvaluator:
         - 曝光成本
         - 综合转化率
         """
-        thresholds = get_thresholds_by_dimension("traffic")
+        thresholds = get_thresholds_by_dimension("traffic", self.category, self.stage)
         
         metrics = []
         
@@ -198,7 +198,7 @@ class ScoreEvaluator:
         与流量维度有重叠，但更关注转化效率
         """
         # 转化维度主要复用流量维度的核心转化指标
-        thresholds = get_thresholds_by_dimension("traffic")
+        thresholds = get_thresholds_by_dimension("traffic", self.category, self.stage)
         
         metrics = []
         
@@ -266,7 +266,7 @@ class ScoreEvaluator:
         """
         评估客单价水平维度
         """
-        thresholds = get_thresholds_by_dimension("aov")
+        thresholds = get_thresholds_by_dimension("aov", self.category, self.stage)
         
         metrics = []
         
@@ -332,7 +332,7 @@ class ScoreEvaluator:
         """
         评估顾客满意度维度
         """
-        thresholds = get_thresholds_by_dimension("satisfaction")
+        thresholds = get_thresholds_by_dimension("satisfaction", self.category, self.stage)
         
         metrics = []
         
@@ -416,7 +416,7 @@ class ScoreEvaluator:
         """
         评估运营效率维度
         """
-        thresholds = get_thresholds_by_dimension("efficiency")
+        thresholds = get_thresholds_by_dimension("efficiency", self.category, self.stage)
         
         metrics = []
         
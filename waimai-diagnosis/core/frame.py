@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+列式存储模块
+在内存中保存几十万家店铺的原始指标和诊断得分
+
+ShopMetrics / DiagnosisReport 每个实例都带 __dict__，报告里还嵌套着维度、指标列表，
+几十万家店铺会占用数 GB 内存。这里按列存放：
+
+- 数值字段存入 array 模块的定长数组（int 为 'q'，float 为 'd'，可选字段用 NaN 表示 None）
+- 平台、品类、阶段、商圈等低基数文本做字典编码，只存编号
+- 行视图 ShopRow / ResultRow 使用 __slots__，只记录 (frame, 下标)，不复制数据
+
+与原有 dataclass 的互相转换是无损的：to_metrics() / to_report() 得到的对象与写入时相等。
+"""
+
+from array import array
+from dataclasses import fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import (
+    ShopMetrics,
+    MetricDetail,
+    DimensionScore,
+    DiagnosisReport,
+    GradeLevel,
+)
+from core.batch import DIMENSION_LAYOUT, LEVELS
+
+_NAN = float("nan")
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def _is_missing(value: float) -> bool:
+    return value != value  # NaN
+
+
+class _Dictionary:
+    """字典编码的文本列：取值表 + 每行的编号"""
+
+    __slots__ = ("values", "lookup", "codes")
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.lookup: Dict[Any, int] = {}
+        self.codes = array("I")
+
+    def append(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, index: int):
+        return self.values[self.codes[index]]
+
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes)
+
+
+# ==================== 店铺指标 ====================
+
+_SHOP_FIELDS = fields(ShopMetrics)
+# 高基数文本（逐行保存）与低基数文本（字典编码）
+_PLAIN_TEXT = ("name",)
+_CODED_TEXT = tuple(f.name for f in _SHOP_FIELDS if f.type is str and f.name not in _PLAIN_TEXT)
+_INT_FIELDS = tuple(f.name for f in _SHOP_FIELDS if f.type is int)
+_FLOAT_FIELDS = tuple(f.name for f in _SHOP_FIELDS if f.type is float)
+_OPTIONAL_FIELDS = tuple(f.name for f in _SHOP_FIELDS if f.type == Optional[float])
+
+
+class ShopRow:
+    """
+    ShopMetricsFrame 的单行视图
+
+    按属性读取字段（row.exposure_uv），不复制数据；需要 ShopMetrics 时调用 to_metrics()。
+    """
+
+    __slots__ = ("_frame", "_index")
+
+    def __init__(self, frame: "ShopMetricsFrame", index: int):
+        self._frame = frame
+        self._index = index
+
+    def __getattr__(self, name: str):
+        return self._frame.value(name, self._index)
+
+    def to_metrics(self) -> ShopMetrics:
+        return self._frame.to_metrics(self._index)
+
+    def __repr__(self) -> str:
+        return f"ShopRow({self._index}, {self.name!r})"
+
+
+class ShopMetricsFrame:
+    """
+    店铺指标的列式存储
+
+    int 字段默认存为 'q'，遇到非整数值时整列升级为 'd'（升级前写入的整数读出时为等值浮点数）。
+    """
+
+    __slots__ = ("_plain", "_coded", "_numeric", "_size")
+
+    def __init__(self):
+        self._plain: Dict[str, List[str]] = {name: [] for name in _PLAIN_TEXT}
+        self._coded: Dict[str, _Dictionary] = {name: _Dictionary() for name in _CODED_TEXT}
+        self._numeric: Dict[str, array] = {}
+        for name in _INT_FIELDS:
+            self._numeric[name] = array("q")
+        for name in _FLOAT_FIELDS + _OPTIONAL_FIELDS:
+            self._numeric[name] = array("d")
+        self._size = 0
+
+    @classmethod
+    def from_metrics(cls, shops: Iterable[ShopMetrics]) -> "ShopMetricsFrame":
+        frame = cls()
+        frame.extend(shops)
+        return frame
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, metrics: ShopMetrics) -> int:
+        """追加一家店铺，返回其下标"""
+        for name in _PLAIN_TEXT:
+            self._plain[name].append(getattr(metrics, name))
+        for name in _CODED_TEXT:
+            self._coded[name].append(getattr(metrics, name))
+        for name in _INT_FIELDS:
+            value = getattr(metrics, name)
+            column = self._numeric[name]
+            if column.typecode == "q" and not (type(value) is int and _INT64_MIN <= value <= _INT64_MAX):
+                column = self._numeric[name] = array("d", column)
+            column.append(value if column.typecode == "q" else float(value))
+        for name in _FLOAT_FIELDS:
+            self._numeric[name].append(getattr(metrics, name))
+        for name in _OPTIONAL_FIELDS:
+            value = getattr(metrics, name)
+            self._numeric[name].append(_NAN if value is None else value)
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, shops: Iterable[ShopMetrics]):
+        for metrics in shops:
+            self.append(metrics)
+
+    def value(self, name: str, index: int):
+        """读取单个字段"""
+        if name in self._numeric:
+            value = self._numeric[name][index]
+            if name in _OPTIONAL_FIELDS and _is_missing(value):
+                return None
+            return value
+        if name in self._coded:
+            return self._coded[name][index]
+        if name in self._plain:
+            return self._plain[name][index]
+        raise AttributeError(name)
+
+    def row(self, index: int) -> ShopRow:
+        if not -self._size <= index < self._size:
+            raise IndexError(index)
+        return ShopRow(self, index % self._size)
+
+    __getitem__ = row
+
+    def __iter__(self) -> Iterator[ShopRow]:
+        for index in range(self._size):
+            yield ShopRow(self, index)
+
+    def to_metrics(self, index: int) -> ShopMetrics:
+        """还原为 ShopMetrics"""
+        return ShopMetrics(**{f.name: self.value(f.name, index) for f in _SHOP_FIELDS})
+
+    def to_list(self) -> List[ShopMetrics]:
+        return [self.to_metrics(i) for i in range(self._size)]
+
+    def column(self, name: str):
+        """数值列返回 array（零拷贝），文本列返回逐行取值的列表"""
+        if name in self._numeric:
+            return self._numeric[name]
+        if name in self._coded:
+            coded = self._coded[name]
+            return [coded.values[code] for code in coded.codes]
+        return self._plain[name]
+
+    def columns(self) -> Dict[str, Any]:
+        """
+        供 core.batch.BatchScorer 使用的列数据
+
+        需要 NumPy：float 列直接共享内存，文本列按编号展开为 object 数组。
+        """
+        import numpy as np
+
+        columns: Dict[str, Any] = {}
+        for name, column in self._numeric.items():
+            if column.typecode == "d":
+                columns[name] = np.frombuffer(column, dtype=np.float64) if len(column) else np.zeros(0)
+            else:
+                columns[name] = np.array(column, dtype=np.float64)
+        for name, coded in self._coded.items():
+            table = np.empty(len(coded.values), dtype=object)
+            table[:] = coded.values
+            columns[name] = table[np.array(coded.codes, dtype=np.intp)]
+        for name, values in self._plain.items():
+            columns[name] = np.array(values, dtype=object)
+        return columns
+
+    def nbytes(self) -> int:
+        """列数据占用的字节数（不含逐行保存的店铺名称字符串本身）"""
+        total = sum(column.itemsize * len(column) for column in self._numeric.values())
+        total += sum(coded.nbytes() for coded in self._coded.values())
+        total += sum(8 * len(values) for values in self._plain.values())  # 列表中的指针
+        return total
+
+
+# ==================== 诊断结果 ====================
+
+# 列式布局：维度顺序和每个维度的指标都来自 core.batch.DIMENSION_LAYOUT
+_DIMENSIONS = [(dim, name_cn, specs) for dim, name_cn, specs in DIMENSION_LAYOUT]
+_DIMENSION_INDEX = {dim: i for i, (dim, _, _) in enumerate(_DIMENSIONS)}
+_LEVEL_INDEX = {level: i for i, level in enumerate(LEVELS)}
+_GRADES = list(GradeLevel)
+_GRADE_INDEX = {grade: i for i, grade in enumerate(_GRADES)}
+
+
+class ResultRow:
+    """DiagnosisResultFrame 的单行视图"""
+
+    __slots__ = ("_frame", "_index")
+
+    def __init__(self, frame: "DiagnosisResultFrame", index: int):
+        self._frame = frame
+        self._index = index
+
+    @property
+    def shop_name(self) -> str:
+        return self._frame.shop_names[self._index]
+
+    @property
+    def overall_score(self) -> float:
+        return self._frame.overall[self._index]
+
+    @property
+    def grade(self) -> GradeLevel:
+        return _GRADES[self._frame.grades[self._index]]
+
+    def dimension_score(self, dim: str) -> Optional[float]:
+        """维度得分（该店铺未考核此维度时为 None）"""
+        score = self._frame.dimension_scores[dim][self._index]
+        return None if _is_missing(score) else score
+
+    def metric_score(self, dim: str, metric: str) -> float:
+        return self._frame.metric_scores[(dim, metric)][self._index]
+
+    def to_report(self) -> DiagnosisReport:
+        return self._frame.to_report(self._index)
+
+    def __repr__(self) -> str:
+        return f"ResultRow({self._index}, {self.shop_name!r}, {self.overall_score})"
+
+
+class DiagnosisResultFrame:
+    """
+    诊断结果的列式存储
+
+    每个 (维度, 指标) 保存展示值、得分、等级编号、基准值和同类百分位五列，维度保存得分和权重两列；
+    指标名称、权重、单位、说明等固定信息只在布局中保存一份。
+    问题清单、行动计划、提分空间等按店铺生成的内容只为非空的行单独保存。
+    """
+
+    __slots__ = ("shop_names", "_coded", "overall", "grades",
+                 "dimension_scores", "dimension_weights",
+                 "metric_values", "metric_scores", "metric_levels", "metric_benchmarks", "metric_percentiles",
+                 "metrics", "_raw_index", "_details", "_size")
+
+    def __init__(self):
+        self.shop_names: List[str] = []
+        self._coded = {name: _Dictionary() for name in ("diagnosis_date", "platform", "category", "stage")}
+        self.overall = array("d")
+        self.grades = array("b")
+        self.dimension_scores = {dim: array("d") for dim, _, _ in _DIMENSIONS}
+        self.dimension_weights = {dim: array("d") for dim, _, _ in _DIMENSIONS}
+        keys = [(dim, spec.name) for dim, _, specs in _DIMENSIONS for spec in specs]
+        self.metric_values = {key: array("d") for key in keys}
+        self.metric_scores = {key: array("d") for key in keys}
+        self.metric_levels = {key: array("b") for key in keys}
+        self.metric_benchmarks = {key: array("d") for key in keys}
+        self.metric_percentiles = {key: array("d") for key in keys}
+        self.metrics = ShopMetricsFrame()   # raw_metrics
+        self._raw_index = array("q")        # 在 metrics 中的下标，-1 表示无
+        self._details: Dict[int, Tuple] = {}  # 下标 -> (top_issues, action_plan, {维度: (issues, suggestions)}, sensitivity)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ---------- 写入 ----------
+
+    @classmethod
+    def from_reports(cls, reports: Iterable[DiagnosisReport]) -> "DiagnosisResultFrame":
+        frame = cls()
+        for report in reports:
+            frame.append(report)
+        return frame
+
+    def append(self, report: DiagnosisReport) -> int:
+        """
+        追加一份诊断报告，返回其下标
+
+        Raises:
+            ValueError: 报告中的维度或指标与列式布局不一致（无法无损保存）
+        """
+        dims = {d.name: d for d in report.dimension_scores}
+        if len(dims) != len(report.dimension_scores) or set(dims) - set(_DIMENSION_INDEX):
+            raise ValueError(f"❌ {report.shop_name}: 维度与列式布局不一致: {[d.name for d in report.dimension_scores]}")
+        order = [d.name for d in report.dimension_scores]
+        if order != sorted(order, key=_DIMENSION_INDEX.get):
+            raise ValueError(f"❌ {report.shop_name}: 维度顺序与列式布局不一致: {order}")
+
+        for dim, name_cn, specs in _DIMENSIONS:
+            score = dims.get(dim)
+            if score is None:
+                continue
+            layout = [(s.name, s.weight, s.unit, s.description) for s in specs]
+            actual = [(m.name, m.weight, m.unit, m.description) for m in score.metrics]
+            if score.name_cn != name_cn or actual != layout:
+                raise ValueError(f"❌ {report.shop_name}: {dim} 维度的指标与列式布局不一致")
+            for m in score.metrics:
+                if m.threshold_level not in _LEVEL_INDEX:
+                    raise ValueError(f"❌ {report.shop_name}: 未知的阈值等级 {m.threshold_level}")
+
+        index = self._size
+        self.shop_names.append(report.shop_name)
+        for name, coded in self._coded.items():
+            coded.append(getattr(report, name))
+        self.overall.append(report.overall_score)
+        self.grades.append(_GRADE_INDEX[report.grade])
+
+        dim_details = {}
+        for dim, _, specs in _DIMENSIONS:
+            score = dims.get(dim)
+            self.dimension_scores[dim].append(_NAN if score is None else score.score)
+            self.dimension_weights[dim].append(_NAN if score is None else score.weight)
+            details = {m.name: m for m in score.metrics} if score else {}
+            for spec in specs:
+                key = (dim, spec.name)
+                m = details.get(spec.name)
+                self.metric_values[key].append(_NAN if m is None else m.value)
+                self.metric_scores[key].append(_NAN if m is None else m.score)
+                self.metric_levels[key].append(-1 if m is None else _LEVEL_INDEX[m.threshold_level])
+                self.metric_benchmarks[key].append(_NAN if m is None or m.benchmark is None else m.benchmark)
+                self.metric_percentiles[key].append(_NAN if m is None or m.percentile is None else m.percentile)
+            if score is not None and (score.issues or score.suggestions):
+                dim_details[dim] = (score.issues, score.suggestions)
+
+        if report.top_issues or report.action_plan or dim_details or report.sensitivity is not None:
+            self._details[index] = (report.top_issues, report.action_plan, dim_details, report.sensitivity)
+        self._raw_index.append(-1 if report.raw_metrics is None else self.metrics.append(report.raw_metrics))
+        self._size += 1
+        return index
+
+    @classmethod
+    def from_batch(cls, scores, metrics: Optional[ShopMetricsFrame] = None,
+                   diagnosis_date: str = "") -> "DiagnosisResultFrame":
+        """
+        由 core.batch.BatchScores 直接构建（不经过 dataclass）
+
+        Args:
+            scores: BatchScorer.score() 的结果
+            metrics: 评分所用的店铺指标（提供店铺信息和 raw_metrics）
+            diagnosis_date: 诊断日期
+        """
+        import numpy as np
+        from core.batch import metric_levels
+
+        frame = cls()
+        size = len(scores)
+        if metrics is not None:
+            if len(metrics) != size:
+                raise ValueError(f"❌ 店铺数 {len(metrics)} 与评分结果数 {size} 不一致")
+            frame.metrics = metrics
+            frame.shop_names = list(metrics.column("name"))
+            for name in ("platform", "category", "stage"):
+                frame._coded[name] = _copy_dictionary(metrics._coded[name])
+            frame._raw_index = array("q", range(size))
+        else:
+            frame.shop_names = [""] * size
+            for name in ("platform", "category", "stage"):
+                for _ in range(size):
+                    frame._coded[name].append("")
+            frame._raw_index = array("q", [-1]) * size
+        for _ in range(size):
+            frame._coded["diagnosis_date"].append(diagnosis_date)
+
+        dtypes = {"d": np.float64, "b": np.int8, "q": np.int64}
+
+        def fill(column: array, values):
+            column.frombytes(np.ascontiguousarray(values, dtype=dtypes[column.typecode]).tobytes())
+
+        fill(frame.overall, scores.overall)
+        bounds = [(g.min_score, g.max_score) for g in _GRADES]
+        grade_index = np.select([(scores.overall >= lo) & (scores.overall <= hi) for lo, hi in bounds],
+                                range(len(bounds)), _GRADE_INDEX[GradeLevel.D])
+        fill(frame.grades, grade_index)
+
+        for dim, _, specs in _DIMENSIONS:
+            present = ~np.isnan(scores.dimension_scores[dim])
+            fill(frame.dimension_scores[dim], scores.dimension_scores[dim])
+            fill(frame.dimension_weights[dim], np.where(present, scores.dimension_weights[dim], np.nan))
+            for spec in specs:
+                key = (dim, spec.name)
+                fill(frame.metric_values[key], np.where(present, scores.metric_values(dim, spec), np.nan))
+                fill(frame.metric_scores[key], np.where(present, scores.metric_scores[dim][spec.name], np.nan))
+                fill(frame.metric_levels[key], np.where(present, metric_levels(scores.metric_scores[dim][spec.name]), -1))
+                benchmark = scores.benchmarks.get(key)
+                fill(frame.metric_benchmarks[key],
+                     np.where(present, benchmark, np.nan) if benchmark is not None else np.full(size, np.nan))
+                fill(frame.metric_percentiles[key], np.full(size, np.nan))
+        frame._size = size
+        return frame
+
+    # ---------- 读取 ----------
+
+    def row(self, index: int) -> ResultRow:
+        if not -self._size <= index < self._size:
+            raise IndexError(index)
+        return ResultRow(self, index % self._size)
+
+    __getitem__ = row
+
+    def __iter__(self) -> Iterator[ResultRow]:
+        for index in range(self._size):
+            yield ResultRow(self, index)
+
+    def to_report(self, index: int) -> DiagnosisReport:
+        """还原为 DiagnosisReport"""
+        top_issues, action_plan, dim_details, sensitivity = self._details.get(index, ([], {}, {}, None))
+        dimension_scores = []
+        for dim, name_cn, specs in _DIMENSIONS:
+            score = self.dimension_scores[dim][index]
+            if _is_missing(score):
+                continue
+            metrics = []
+            for spec in specs:
+                key = (dim, spec.name)
+                benchmark = self.metric_benchmarks[key][index]
+                percentile = self.metric_percentiles[key][index]
+                metrics.append(MetricDetail(
+                    name=spec.name,
+                    value=self.metric_values[key][index],
+                    score=self.metric_scores[key][index],
+                    weight=spec.weight,
+                    threshold_level=LEVELS[self.metric_levels[key][index]],
+                    benchmark=None if _is_missing(benchmark) else benchmark,
+                    unit=spec.unit,
+                    description=spec.description,
+                    percentile=None if _is_missing(percentile) else percentile,
+                ))
+            issues, suggestions = dim_details.get(dim, ([], []))
+            dimension_scores.append(DimensionScore(
+                name=dim,
+                name_cn=name_cn,
+                score=score,
+                weight=self.dimension_weights[dim][index],
+                metrics=metrics,
+                issues=list(issues),
+                suggestions=list(suggestions),
+            ))
+        raw_index = self._raw_index[index]
+        return DiagnosisReport(
+            shop_name=self.shop_names[index],
+            diagnosis_date=self._coded["diagnosis_date"][index],
+            platform=self._coded["platform"][index],
+            category=self._coded["category"][index],
+            stage=self._coded["stage"][index],
+            overall_score=self.overall[index],
+            grade=_GRADES[self.grades[index]].name,
+            dimension_scores=dimension_scores,
+            top_issues=list(top_issues),
+            action_plan=dict(action_plan),
+            sensitivity=sensitivity,
+            raw_metrics=None if raw_index < 0 else self.metrics.to_metrics(raw_index),
+        )
+
+    def to_list(self) -> List[DiagnosisReport]:
+        return [self.to_report(i) for i in range(self._size)]
+
+    def column(self, name: str) -> List[Any]:
+        """
+        逐行取值的文本列：shop_name / diagnosis_date / platform / category / stage，
+        以及取自 raw_metrics 的 business_district（无 raw_metrics 时为默认值）
+        """
+        if name == "shop_name":
+            return self.shop_names
+        if name in self._coded:
+            coded = self._coded[name]
+            return [coded.values[code] for code in coded.codes]
+        if name == "business_district":
+            default = ShopMetrics.__dataclass_fields__[name].default
+            return [default if raw < 0 else self.metrics.value(name, raw) for raw in self._raw_index]
+        raise KeyError(name)
+
+    def metric_columns(self) -> Dict[str, array]:
+        """
+        各指标的展示值列（同名指标取第一个出现的维度）和总体评分 overall；
+        未考核的维度为 NaN
+        """
+        columns: Dict[str, array] = {"overall": self.overall}
+        for (dim, metric), values in self.metric_values.items():
+            columns.setdefault(metric, values)
+        return columns
+
+    def nbytes(self) -> int:
+        """列数据占用的字节数（不含店铺名称字符串和文字详情）"""
+        columns = [self.overall, self.grades, self._raw_index]
+        for group in (self.dimension_scores, self.dimension_weights, self.metric_values,
+                      self.metric_scores, self.metric_levels, self.metric_benchmarks, self.metric_percentiles):
+            columns.extend(group.values())
+        total = sum(column.itemsize * len(column) for column in columns)
+        total += sum(coded.nbytes() for coded in self._coded.values())
+        return total + 8 * len(self.shop_names) + self.metrics.nbytes()
+
+
+def _copy_dictionary(source: _Dictionary) -> _Dictionary:
+    copy = _Dictionary()
+    copy.values = list(source.values)
+    copy.lookup = dict(source.lookup)
+    copy.codes = array("I", source.codes)
+    return copy
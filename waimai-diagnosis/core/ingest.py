@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+原始数据导入模块
+流式读取平台导出的订单、流量、评价明细 (CSV)，按店铺聚合滚动窗口，直接生成 ShopMetrics
+
+- 流量 / 订单 / 效率指标: 近 7 日日均（与 ShopMetrics 字段定义一致）
+- 评价指标: 近 30 日累计，评分为 30 日内评价的平均分
+
+每家店铺只保留窗口内（截止日往前 30 天）的按日汇总，窗口外的行直接丢弃，
+因此内存只与店铺数有关，与导出文件大小无关；文件逐行读取，可处理 GB 级导出。
+
+导出文件的表头可以是英文字段名，也可以是平台导出常见的中文列名（见 COLUMN_ALIASES）。
+"""
+
+import csv
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from models import ShopMetrics
+
+# 窗口长度 (天)
+SHORT_WINDOW = 7      # 日均指标
+LONG_WINDOW = 30      # 累计指标
+
+# 表头别名: 标准字段 -> 可接受的列名
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "shop_id": ("shop_id", "门店ID", "店铺ID", "门店id", "店铺id"),
+    "date": ("date", "order_time", "created_at", "review_time", "日期", "下单时间", "评价时间"),
+    "status": ("status", "订单状态", "状态"),
+    "amount": ("amount", "order_amount", "订单金额", "原价", "营业额"),
+    "actual_amount": ("actual_amount", "paid_amount", "实收金额", "商家实收"),
+    "cook_minutes": ("cook_minutes", "cook_time", "出餐时长", "出餐时间"),
+    "ontime": ("ontime", "is_ontime", "是否准时", "准时"),
+    "exposure_uv": ("exposure_uv", "曝光人数"),
+    "visit_uv": ("visit_uv", "进店人数", "访问人数"),
+    "order_uv": ("order_uv", "下单人数"),
+    "promotion_cost": ("promotion_cost", "推广花费", "推广费用"),
+    "rating": ("rating", "score", "评分", "星级"),
+    "complaint": ("complaint", "is_complaint", "是否投诉"),
+    "replied": ("replied", "is_replied", "是否回复", "商家回复"),
+    "name": ("name", "shop_name", "门店名称", "店铺名称"),
+    "platform": ("platform", "平台"),
+    "category": ("category", "品类", "经营品类"),
+    "stage": ("stage", "阶段", "发展阶段"),
+    "business_district": ("business_district", "district", "商圈", "商圈类型"),
+}
+
+# 订单状态
+CANCELLED_STATUSES = {"cancelled", "canceled", "cancel", "已取消", "取消"}
+REFUNDED_STATUSES = {"refunded", "refund", "已退款", "退款", "退单"}
+
+# 评价分档：>= 4 星为好评，<= 2 星为差评
+POSITIVE_MIN_RATING = 4
+NEGATIVE_MAX_RATING = 2
+
+_TRUE_VALUES = {"1", "true", "yes", "y", "是", "准时", "已回复"}
+
+# 按日汇总的槽位
+(ORDERS, CANCELS, REFUNDS, REVENUE, ACTUAL_REVENUE, COOK_SUM, COOK_COUNT, ONTIME, ONTIME_COUNT,
+ EXPOSURE, VISIT, ORDER_UV, PROMOTION,
+ POSITIVE, NEGATIVE, COMPLAINTS, REPLIED_NEGATIVE, RATING_SUM, RATING_COUNT) = range(19)
+SLOT_COUNT = 19
+
+
+def parse_day(text: str) -> int:
+    """日期或时间字符串 (2026-10-18 / 2026/1/5 12:30:00 / 2026-10-18T12:30) -> 日序号 (date.toordinal)"""
+    text = text.strip().split()[0].split("T")[0].replace("/", "-")
+    year, month, day = text.split("-")
+    return date(int(year), int(month), int(day)).toordinal()
+
+
+def _flag(text: str) -> bool:
+    return text.strip().lower() in _TRUE_VALUES
+
+
+def _float(text: str) -> float:
+    return float(text) if text.strip() else 0.0
+
+
+def _resolve_columns(header: Sequence[str], required: Iterable[str], optional: Iterable[str]) -> Dict[str, int]:
+    """按别名在表头中找列下标；缺少必需列时抛出 ValueError"""
+    positions = {name.strip(): i for i, name in enumerate(header)}
+    resolved = {}
+    for field_name in list(required) + list(optional):
+        for alias in COLUMN_ALIASES[field_name]:
+            if alias in positions:
+                resolved[field_name] = positions[alias]
+                break
+    missing = [name for name in required if name not in resolved]
+    if missing:
+        raise ValueError(f"❌ 表头缺少必需的列: {', '.join(missing)} (现有: {', '.join(header)})")
+    return resolved
+
+
+def _iter_rows(path: str, required: Sequence[str], optional: Sequence[str]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """逐行读取 CSV，返回 (行号, 标准字段 -> 文本)"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = list(_resolve_columns(header, required, optional).items())
+        for line_no, row in enumerate(reader, 2):
+            if not row:
+                continue
+            yield line_no, {name: (row[i] if i < len(row) else "") for name, i in columns}
+
+
+def metrics_from_totals(shop_id: str, info: Dict[str, str], week: Sequence[float],
+                        month: Sequence[float], span: int) -> ShopMetrics:
+    """
+    由窗口汇总生成 ShopMetrics
+
+    Args:
+        shop_id: 店铺ID (没有店铺名称时作为名称)
+        info: 店铺信息 (name / platform / category / stage / business_district)
+        week: 近 7 日各槽位合计
+        month: 近 30 日各槽位合计
+        span: 计算日均的天数
+    """
+    values = {
+        "name": info.get("name", shop_id),
+        "exposure_uv": round(week[EXPOSURE] / span),
+        "visit_uv": round(week[VISIT] / span),
+        "order_uv": round(week[ORDER_UV] / span),
+        "promotion_cost": round(week[PROMOTION] / span, 2),
+        "order_count": round(week[ORDERS] / span),
+        "revenue": round(week[REVENUE] / span, 2),
+        "actual_revenue": round(week[ACTUAL_REVENUE] / span, 2),
+        "cancel_count": round(week[CANCELS] / span),
+        "positive_reviews": int(month[POSITIVE]),
+        "negative_reviews": int(month[NEGATIVE]),
+        "complaints": int(month[COMPLAINTS]),
+        "replied_negative": int(month[REPLIED_NEGATIVE]),
+    }
+    for key in ("platform", "category", "stage", "business_district"):
+        if key in info:
+            values[key] = info[key]
+    if month[RATING_COUNT]:
+        values["rating"] = round(month[RATING_SUM] / month[RATING_COUNT], 2)
+    if week[COOK_COUNT]:
+        values["cook_time"] = round(week[COOK_SUM] / week[COOK_COUNT], 1)
+    if week[ONTIME_COUNT]:
+        values["ontime_rate"] = round(week[ONTIME] / week[ONTIME_COUNT] * 100, 2)
+    if week[ORDERS]:
+        values["refund_rate"] = round(week[REFUNDS] / week[ORDERS] * 100, 2)
+    return ShopMetrics(**values)
+
+
+class ShopWindowAggregator:
+    """
+    店铺滚动窗口聚合器
+
+    Example:
+        >>> aggregator = ShopWindowAggregator(as_of=date(2026, 10, 18))
+        >>> aggregator.load_shops("shops.csv")
+        >>> aggregator.ingest_orders("orders.csv")
+        >>> aggregator.ingest_traffic("traffic.csv")
+        >>> aggregator.ingest_reviews("reviews.csv")
+        >>> metrics = list(aggregator.to_metrics())
+    """
+
+    def __init__(self, as_of: Optional[date] = None):
+        """
+        Args:
+            as_of: 窗口截止日（含）；None 表示取数据中出现的最晚日期
+        """
+        self.as_of = as_of.toordinal() if as_of else None
+        self.latest = self.as_of or 0                               # 当前窗口截止日
+        self.days: Dict[str, Dict[int, List[float]]] = {}           # 店铺 -> 日 -> 汇总槽位
+        self.first_seen: Dict[str, int] = {}                        # 店铺最早出现的日期
+        self.shops: Dict[str, Dict[str, str]] = {}                  # 店铺基础信息
+        self.rows = 0
+        self.skipped = 0
+        self.errors: List[str] = []
+
+    # ---------- 窗口维护 ----------
+
+    def _bucket(self, shop_id: str, day: int) -> Optional[List[float]]:
+        """取店铺某日的汇总槽位；超出窗口的日期返回 None"""
+        if self.as_of is not None:
+            if day > self.as_of:
+                return None
+        elif day > self.latest:
+            self.latest = day
+        first = self.first_seen.get(shop_id)
+        if first is None or day < first:
+            self.first_seen[shop_id] = day
+        if day <= self.latest - LONG_WINDOW:
+            return None
+        shop_days = self.days.get(shop_id)
+        if shop_days is None:
+            shop_days = self.days[shop_id] = {}
+        bucket = shop_days.get(day)
+        if bucket is None:
+            bucket = shop_days[day] = [0.0] * SLOT_COUNT
+        return bucket
+
+    def prune(self):
+        """丢弃已滑出窗口的按日汇总"""
+        cutoff = self.latest - LONG_WINDOW
+        for shop_days in self.days.values():
+            for day in [d for d in shop_days if d <= cutoff]:
+                del shop_days[day]
+
+    def _ingest(self, path: str, required: Sequence[str], optional: Sequence[str],
+                handle: Callable[[Dict[str, str]], bool], prune_every: int = 1_000_000):
+        for line_no, row in _iter_rows(path, required, optional):
+            self.rows += 1
+            try:
+                if not handle(row):
+                    self.skipped += 1
+            except (ValueError, IndexError) as e:
+                self.skipped += 1
+                if len(self.errors) < 20:
+                    self.errors.append(f"{path}:{line_no} {e}")
+            if self.rows % prune_every == 0:
+                self.prune()
+
+    # ---------- 各类明细 ----------
+
+    def ingest_orders(self, path: str):
+        """
+        订单明细：每行一笔订单
+
+        必需列: shop_id, date(下单时间), status
+        可选列: amount, actual_amount, cook_minutes, ontime
+        """
+        def handle(row):
+            bucket = self._bucket(row["shop_id"], parse_day(row["date"]))
+            if bucket is None:
+                return False
+            status = row["status"].strip().lower()
+            if status in CANCELLED_STATUSES:
+                bucket[CANCELS] += 1
+                return True
+            bucket[ORDERS] += 1
+            if status in REFUNDED_STATUSES:
+                bucket[REFUNDS] += 1
+            amount = _float(row.get("amount", ""))
+            bucket[REVENUE] += amount
+            actual = row.get("actual_amount", "")
+            bucket[ACTUAL_REVENUE] += _float(actual) if actual.strip() else amount
+            cook = row.get("cook_minutes", "")
+            if cook.strip():
+                bucket[COOK_SUM] += float(cook)
+                bucket[COOK_COUNT] += 1
+            ontime = row.get("ontime", "")
+            if ontime.strip():
+                bucket[ONTIME] += _flag(ontime)
+                bucket[ONTIME_COUNT] += 1
+            return True
+
+        self._ingest(path, ("shop_id", "date", "status"),
+                     ("amount", "actual_amount", "cook_minutes", "ontime"), handle)
+
+    def ingest_traffic(self, path: str):
+        """
+        流量明细：每行一家店铺一天（同一天多行时累加，如分渠道导出）
+
+        必需列: shop_id, date, exposure_uv, visit_uv
+        可选列: order_uv, promotion_cost
+        """
+        def handle(row):
+            bucket = self._bucket(row["shop_id"], parse_day(row["date"]))
+            if bucket is None:
+                return False
+            bucket[EXPOSURE] += _float(row["exposure_uv"])
+            bucket[VISIT] += _float(row["visit_uv"])
+            bucket[ORDER_UV] += _float(row.get("order_uv", ""))
+            bucket[PROMOTION] += _float(row.get("promotion_cost", ""))
+            return True
+
+        self._ingest(path, ("shop_id", "date", "exposure_uv", "visit_uv"),
+                     ("order_uv", "promotion_cost"), handle)
+
+    def ingest_reviews(self, path: str):
+        """
+        评价明细：每行一条评价
+
+        必需列: shop_id, date(评价时间), rating
+        可选列: complaint, replied
+        """
+        def handle(row):
+            bucket = self._bucket(row["shop_id"], parse_day(row["date"]))
+            if bucket is None:
+                return False
+            rating = float(row["rating"])
+            bucket[RATING_SUM] += rating
+            bucket[RATING_COUNT] += 1
+            if rating >= POSITIVE_MIN_RATING:
+                bucket[POSITIVE] += 1
+            elif rating <= NEGATIVE_MAX_RATING:
+                bucket[NEGATIVE] += 1
+                if _flag(row.get("replied", "")):
+                    bucket[REPLIED_NEGATIVE] += 1
+            if _flag(row.get("complaint", "")):
+                bucket[COMPLAINTS] += 1
+            return True
+
+        self._ingest(path, ("shop_id", "date", "rating"), ("complaint", "replied"), handle)
+
+    def load_shops(self, path: str):
+        """
+        店铺信息：shop_id 及可选的 name / platform / category / stage / business_district
+        """
+        for _, row in _iter_rows(path, ("shop_id",),
+                                 ("name", "platform", "category", "stage", "business_district")):
+            self.shops[row["shop_id"]] = {k: v for k, v in row.items() if k != "shop_id" and v.strip()}
+
+    # ---------- 生成指标 ----------
+
+    def _totals(self, shop_days: Dict[int, List[float]], window: int) -> List[float]:
+        totals = [0.0] * SLOT_COUNT
+        start = self.latest - window
+        for day, bucket in shop_days.items():
+            if start < day <= self.latest:
+                for i, value in enumerate(bucket):
+                    totals[i] += value
+        return totals
+
+    def shop_metrics(self, shop_id: str) -> ShopMetrics:
+        """某家店铺截止日的 ShopMetrics；没有明细的指标保持 ShopMetrics 默认值"""
+        shop_days = self.days.get(shop_id, {})
+        week = self._totals(shop_days, SHORT_WINDOW)
+        month = self._totals(shop_days, LONG_WINDOW)
+        # 开业不足 7 天的店铺按实际天数计算日均
+        span = max(1, min(SHORT_WINDOW, self.latest - self.first_seen.get(shop_id, self.latest) + 1))
+        return metrics_from_totals(shop_id, self.shops.get(shop_id, {}), week, month, span)
+
+    def to_metrics(self) -> Iterator[ShopMetrics]:
+        """所有出现过的店铺（含只在店铺信息中出现的）截止日的 ShopMetrics"""
+        self.prune()
+        for shop_id in sorted(set(self.days) | set(self.shops)):
+            yield self.shop_metrics(shop_id)
+
+    @property
+    def as_of_date(self) -> Optional[date]:
+        """窗口截止日"""
+        return date.fromordinal(self.latest) if self.latest else None
+
+
+def ingest_exports(orders: Sequence[str] = (), traffic: Sequence[str] = (), reviews: Sequence[str] = (),
+                   shops: Optional[str] = None, as_of: Optional[date] = None) -> ShopWindowAggregator:
+    """
+    一次性导入多份导出文件的工具函数
+
+    Example:
+        >>> aggregator = ingest_exports(orders=["orders_1018.csv"], traffic=["traffic.csv"], reviews=["reviews.csv"])
+        >>> for metrics in aggregator.to_metrics():
+        ...     print(metrics.name, metrics.order_count)
+    """
+    aggregator = ShopWindowAggregator(as_of=as_of)
+    if shops:
+        aggregator.load_shops(shops)
+    for path in orders:
+        aggregator.ingest_orders(path)
+    for path in traffic:
+        aggregator.ingest_traffic(path)
+    for path in reviews:
+        aggregator.ingest_reviews(path)
+    return aggregator
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+同类店铺排名模块
+在已诊断的店铺组合中，计算某家店铺每项指标在同类店铺里的百分位和名次
+
+"同类"按 (品类, 商圈, 阶段) 分组，也可以放宽到 (品类, 商圈)、(品类, 阶段) 或只看品类。
+每个细分组、每项指标维护一个有序数组，查询用二分查找（O(log n)），
+新诊断的店铺用 insort 增量插入，不需要重建索引。
+
+百分位按"中位名次"计算：比该店铺差的店铺占比 + 持平店铺占比的一半，
+反向指标（出餐时间、差评率等）值越小越好。
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import DiagnosisReport, ShopMetrics
+from core.batch import DIMENSION_LAYOUT
+
+# 每项指标的方向（True 表示反向指标）；overall 为总体评分
+METRIC_DIRECTIONS: Dict[str, bool] = {"overall": False}
+for _, _, _specs in DIMENSION_LAYOUT:
+    for _spec in _specs:
+        METRIC_DIRECTIONS[_spec.name] = _spec.is_reverse
+
+# 分组层级：从最细到最粗
+PEER_LEVELS = ("exact", "district", "stage", "category")
+
+_DEFAULT_DISTRICT = ShopMetrics.__dataclass_fields__["business_district"].default
+
+PeerKey = Tuple[str, Optional[str], Optional[str]]
+
+
+def peer_key(level: str, category: str, district: str, stage: str) -> PeerKey:
+    """某一分组层级下的分组键（未参与分组的字段为 None）"""
+    if level == "exact":
+        return (category, district, stage)
+    if level == "district":
+        return (category, district, None)
+    if level == "stage":
+        return (category, None, stage)
+    if level == "category":
+        return (category, None, None)
+    raise ValueError(f"未知的分组层级: {level}")
+
+
+def _coarse_keys(exact: PeerKey) -> List[PeerKey]:
+    category, district, stage = exact
+    return [peer_key(level, category, district, stage) for level in PEER_LEVELS[1:]]
+
+
+def _report_values(report: DiagnosisReport) -> Dict[str, float]:
+    """报告中各指标的展示值（同名指标在不同维度中取值相同，取第一个）"""
+    values = {"overall": report.overall_score}
+    for dim in report.dimension_scores:
+        for metric in dim.metrics:
+            values.setdefault(metric.name, metric.value)
+    return values
+
+
+def _district_of(report: DiagnosisReport) -> str:
+    return report.raw_metrics.business_district if report.raw_metrics else _DEFAULT_DISTRICT
+
+
+class PeerIndex:
+    """
+    同类店铺百分位索引
+
+    只为最细的 (品类, 商圈, 阶段) 分组保存有序数组；放宽后的分组在查询时
+    对其包含的各个细分组分别二分查找再求和，每个值只存一份。
+
+    Example:
+        >>> index = PeerIndex.from_reports(reports)
+        >>> index.percentile("cook_time", 14.5, "快餐简餐", "CBD", "growth")
+        23.4
+        >>> index.annotate(report)      # 写入每个 MetricDetail.percentile
+    """
+
+    def __init__(self):
+        self._sorted: Dict[Tuple[PeerKey, str], array] = {}   # (细分组, 指标) -> 有序数组
+        self._sizes: Dict[PeerKey, int] = {}                  # 各层级分组的店铺数
+        self._members: Dict[PeerKey, List[PeerKey]] = {}      # 放宽后的分组 -> 包含的细分组
+
+    def __len__(self) -> int:
+        return sum(size for key, size in self._sizes.items() if key[1] is None and key[2] is None)
+
+    def _register(self, exact: PeerKey, count: int = 1):
+        if exact not in self._sizes:
+            for coarse in _coarse_keys(exact):
+                self._members.setdefault(coarse, []).append(exact)
+        for key in [exact] + _coarse_keys(exact):
+            self._sizes[key] = self._sizes.get(key, 0) + count
+
+    # ---------- 建立与更新 ----------
+
+    @classmethod
+    def from_reports(cls, reports: Iterable[DiagnosisReport]) -> "PeerIndex":
+        """批量建立索引：先收集再整体排序，比逐条 insort 快得多"""
+        index = cls()
+        pending: Dict[Tuple[PeerKey, str], List[float]] = {}
+        for report in reports:
+            exact = (report.category, _district_of(report), report.stage)
+            index._register(exact)
+            for metric, value in _report_values(report).items():
+                pending.setdefault((exact, metric), []).append(value)
+        for slot, values in pending.items():
+            values.sort()
+            index._sorted[slot] = array("d", values)
+        return index
+
+    @classmethod
+    def from_frame(cls, frame) -> "PeerIndex":
+        """
+        由 core.frame.DiagnosisResultFrame 批量建立索引（需要 NumPy）
+
+        按 (分组, 值) 整体排序后切分，百万级店铺无需逐行构造报告对象。
+        """
+        import numpy as np
+
+        index = cls()
+        size = len(frame)
+        if size == 0:
+            return index
+        keys = [np.asarray(frame.column(name), dtype=object).astype(str)
+                for name in ("category", "business_district", "stage")]
+        combined = np.char.add(np.char.add(np.char.add(keys[0], "\x1f"), np.char.add(keys[1], "\x1f")), keys[2])
+        groups, group_ids = np.unique(combined, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        exact_keys = [tuple(g.split("\x1f")) for g in groups.tolist()]
+        for exact, count in zip(exact_keys, np.bincount(group_ids, minlength=len(groups)).tolist()):
+            index._register(exact, count)
+
+        for metric, values in frame.metric_columns().items():
+            values = np.asarray(values, dtype=np.float64)
+            valid = ~np.isnan(values)
+            ids, vals = group_ids[valid], values[valid]
+            order = np.lexsort((vals, ids))
+            ids, vals = ids[order], vals[order]
+            bounds = np.flatnonzero(np.diff(ids)) + 1
+            for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(ids)]))):
+                if end > start:
+                    index._sorted[(exact_keys[ids[start]], metric)] = array("d", vals[start:end].tobytes())
+        return index
+
+    def add(self, report: DiagnosisReport):
+        """增量加入一家新诊断的店铺"""
+        exact = (report.category, _district_of(report), report.stage)
+        self._register(exact)
+        for metric, value in _report_values(report).items():
+            column = self._sorted.get((exact, metric))
+            if column is None:
+                column = self._sorted[(exact, metric)] = array("d")
+            insort(column, value)
+
+    def size(self, key: PeerKey) -> int:
+        """分组中的店铺数"""
+        return self._sizes.get(key, 0)
+
+    # ---------- 查询 ----------
+
+    def _counts(self, key: PeerKey, metric: str, value: float) -> Tuple[int, int, int]:
+        """返回 (比该值差的店铺数, 持平的店铺数, 分组内有该指标的店铺数)"""
+        reverse = METRIC_DIRECTIONS.get(metric, False)
+        worse = ties = total = 0
+        for exact in self._members.get(key, (key,)):
+            column = self._sorted.get((exact, metric))
+            if not column:
+                continue
+            left = bisect_left(column, value)
+            right = bisect_right(column, value)
+            worse += len(column) - right if reverse else left
+            ties += right - left
+            total += len(column)
+        return worse, ties, total
+
+    def percentile(self, metric: str, value: float, category: str,
+                   district: Optional[str] = None, stage: Optional[str] = None) -> Optional[float]:
+        """
+        某个指标值在同类店铺中的百分位 (0-100，越高越好)
+
+        district / stage 为 None 时不按该字段分组；分组内没有数据时返回 None。
+        """
+        worse, ties, total = self._counts((category, district, stage), metric, value)
+        if total == 0:
+            return None
+        return round((worse + ties / 2) / total * 100, 1)
+
+    def rank(self, metric: str, value: float, category: str,
+             district: Optional[str] = None, stage: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """
+        某个指标值在同类店铺中的名次 (名次, 总数)，第 1 名最好；并列时取最好名次
+        """
+        worse, ties, total = self._counts((category, district, stage), metric, value)
+        if total == 0:
+            return None
+        return total - worse - ties + 1, total
+
+    def resolve_key(self, category: str, district: str, stage: str,
+                    level: str = "exact", min_peers: int = 10) -> PeerKey:
+        """
+        从指定层级开始逐级放宽，返回第一个店铺数不少于 min_peers 的分组键
+
+        都不满足时返回最粗的品类分组。
+        """
+        start = PEER_LEVELS.index(level)
+        for candidate in PEER_LEVELS[start:]:
+            key = peer_key(candidate, category, district, stage)
+            if self.size(key) >= min_peers:
+                return key
+        return peer_key("category", category, district, stage)
+
+    def annotate(self, report: DiagnosisReport, level: str = "exact", min_peers: int = 10) -> PeerKey:
+        """
+        为报告中的每个 MetricDetail 填入同类百分位 (percentile)
+
+        Returns:
+            实际使用的分组键
+        """
+        key = self.resolve_key(report.category, _district_of(report), report.stage, level, min_peers)
+        for dim in report.dimension_scores:
+            for metric in dim.metrics:
+                metric.percentile = self.percentile(metric.name, metric.value, *key)
+        return key
+
+
+def describe_key(key: PeerKey) -> str:
+    """分组键的中文描述，如 "快餐简餐 · CBD · growth" """
+    return " · ".join(part for part in key if part is not None)
@@ -0,0 +1,604 @@
+# -*- coding: utf-8 -*-
+"""
+提分空间分析模块
+回答"某项指标改善多少，总分能涨多少"，不需要改数据重跑诊断
+
+指标得分是原始指标的分段线性函数，总体评分是指标得分的两级加权平均，
+所以每个 ShopMetrics 字段对总分的边际影响可以按链式法则精确求出：
+
+    ∂总分/∂指标得分 = 维度权重/Σ维度权重 × 指标权重/Σ维度内指标权重
+    ∂指标得分/∂指标值 = 所在阈值分段的斜率 (FiveThresholdScoring.slope)
+    ∂指标值/∂字段     = MetricsCalculator 中计算公式的偏导
+
+每个指标还给出改善方向上的下一个阈值：达到它总分提升多少 (gain)、指标要变化多少 (cost)、
+对应的杠杆字段（访问UV、推广费等）要变化多少 (lever_delta)。同一指标出现在多个维度时影响累加。
+
+gain 只改这一个指标；杠杆字段还会带动用到它的其他指标（访问UV 同时是下单转化率的分母），
+所以另给出只改杠杆字段、其余字段不变时重新评分的总分变化 (lever_gain)，排序按它进行。
+
+按未取整的维度得分计算，与重新诊断的结果只差取整误差（维度得分、总分各保留 1 位小数）。
+sensitivity() 逐店计算，不依赖 NumPy；portfolio_sensitivity() 对整个店铺组合向量化计算。
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 NumPy 时只能逐店计算
+    np = None
+
+from models import ShopMetrics, CalculationResult, DimensionScore
+from core.batch import DIMENSION_LAYOUT, LEVELS, LEVEL_BOUNDS, MetricSpec
+from core.scoring import STRATEGIES, ThresholdTable
+
+
+# ==================== 指标与字段 ====================
+
+METRIC_LABELS = {
+    "visit_conversion": "入店转化率",
+    "order_conversion": "下单转化率",
+    "overall_conversion": "综合转化率",
+    "exposure_cost": "曝光成本",
+    "cancel_rate": "取消率",
+    "aov": "客单价",
+    "profit_margin": "毛利率",
+    "rating": "平台评分",
+    "positive_rate": "好评率",
+    "negative_rate": "差评率",
+    "complaint_rate": "投诉率",
+    "cook_time": "出餐时间",
+    "ontime_rate": "准时率",
+    "refund_rate": "退单率",
+}
+
+FIELD_LABELS = {
+    "exposure_uv": "曝光UV",
+    "visit_uv": "访问UV",
+    "order_uv": "下单UV",
+    "order_count": "订单量",
+    "revenue": "营业额",
+    "promotion_cost": "推广费",
+    "cancel_count": "取消单量",
+    "rating": "评分",
+    "positive_reviews": "好评数",
+    "negative_reviews": "差评数",
+    "complaints": "投诉数",
+    "cook_time": "出餐时间",
+    "ontime_rate": "准时率",
+    "refund_rate": "退单率",
+}
+
+# 各指标第一次出现时的规格（阈值曲线、方向、展示单位在各维度中相同）
+METRIC_SPECS: Dict[str, MetricSpec] = {}
+for _, _, _specs in DIMENSION_LAYOUT:
+    for _spec in _specs:
+        METRIC_SPECS.setdefault(_spec.name, _spec)
+
+# MetricsCalculator 估算毛利率时的 1 - 基础成本率
+PROFIT_BASE = 1.0 - 0.55
+
+# 客单价按 当前值/品类P50 分档：(比例下限, 得分)，比例低于 0.8 时得分 max(30, 比例×50)
+AOV_RATIO_BANDS = ((0.8, 60.0), (1.0, 75.0), (1.2, 85.0), (1.5, 95.0))
+
+
+def _div(a, b):
+    """a / b，分母不为正时取 0（标量和数组通用）"""
+    if np is not None and isinstance(b, np.ndarray):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(b > 0, a / b, 0.0)
+    return a / b if b > 0 else 0.0
+
+
+# 指标 -> [(字段, ∂指标值/∂字段)]，m 为 ShopMetrics 或按字段取列的对象，v 为指标原始值
+FIELD_PARTIALS: Dict[str, List[Tuple[str, Callable[[Any, Any], Any]]]] = {
+    "visit_conversion": [
+        ("visit_uv", lambda m, v: _div(1.0, m.exposure_uv)),
+        ("exposure_uv", lambda m, v: _div(-m.visit_uv, m.exposure_uv * m.exposure_uv)),
+    ],
+    "order_conversion": [
+        ("order_uv", lambda m, v: _div(1.0, m.visit_uv)),
+        ("visit_uv", lambda m, v: _div(-m.order_uv, m.visit_uv * m.visit_uv)),
+    ],
+    "overall_conversion": [
+        ("order_uv", lambda m, v: _div(1.0, m.exposure_uv)),
+        ("exposure_uv", lambda m, v: _div(-m.order_uv, m.exposure_uv * m.exposure_uv)),
+    ],
+    "exposure_cost": [
+        ("promotion_cost", lambda m, v: _div(1.0, m.exposure_uv)),
+        ("exposure_uv", lambda m, v: _div(-m.promotion_cost, m.exposure_uv * m.exposure_uv)),
+    ],
+    "aov": [
+        ("revenue", lambda m, v: _div(1.0, m.order_count)),
+        ("order_count", lambda m, v: _div(-m.revenue, m.order_count * m.order_count)),
+    ],
+    "cancel_rate": [
+        ("cancel_count", lambda m, v: _div(m.order_count, (m.order_count + m.cancel_count) ** 2)),
+        ("order_count", lambda m, v: _div(-m.cancel_count, (m.order_count + m.cancel_count) ** 2)),
+    ],
+    "profit_margin": [  # 毛利率被截断到 0 时对字段不敏感
+        ("promotion_cost", lambda m, v: _div(-1.0, m.revenue) * (v > 0)),
+        ("revenue", lambda m, v: _div(m.promotion_cost, m.revenue * m.revenue) * (v > 0)),
+    ],
+    "rating": [("rating", lambda m, v: 1.0)],
+    "positive_rate": [
+        ("positive_reviews", lambda m, v: _div(m.negative_reviews, (m.positive_reviews + m.negative_reviews) ** 2)),
+        ("negative_reviews", lambda m, v: _div(-m.positive_reviews, (m.positive_reviews + m.negative_reviews) ** 2)),
+    ],
+    "negative_rate": [
+        ("negative_reviews", lambda m, v: _div(m.positive_reviews, (m.positive_reviews + m.negative_reviews) ** 2)),
+        ("positive_reviews", lambda m, v: _div(-m.negative_reviews, (m.positive_reviews + m.negative_reviews) ** 2)),
+    ],
+    "complaint_rate": [
+        ("complaints", lambda m, v: _div(1.0, m.order_count * 30)),
+        ("order_count", lambda m, v: _div(-m.complaints, m.order_count * m.order_count * 30)),
+    ],
+    "cook_time": [("cook_time", lambda m, v: 1.0)],
+    "ontime_rate": [("ontime_rate", lambda m, v: 0.01)],
+    "refund_rate": [("refund_rate", lambda m, v: 0.01)],
+}
+
+# 字段 -> 用到它的指标（杠杆字段变化时这些指标的得分一起变）
+COUPLED_METRICS: Dict[str, set] = {}
+for _name, _partials in FIELD_PARTIALS.items():
+    for _field, _ in _partials:
+        COUPLED_METRICS.setdefault(_field, set()).add(_name)
+
+# 指标 -> (杠杆字段, 分母字段, 指标达到原始值 t 时杠杆字段应取的值)
+# 其余字段不变；分母字段不为正时（如没有曝光）无法由杠杆字段达到目标
+LEVERS: Dict[str, Tuple[str, Optional[str], Callable[[Any, Any], Any]]] = {
+    "visit_conversion": ("visit_uv", "exposure_uv", lambda m, t: t * m.exposure_uv),
+    "order_conversion": ("order_uv", "visit_uv", lambda m, t: t * m.visit_uv),
+    "overall_conversion": ("order_uv", "exposure_uv", lambda m, t: t * m.exposure_uv),
+    "exposure_cost": ("promotion_cost", "exposure_uv", lambda m, t: t * m.exposure_uv),
+    "aov": ("revenue", "order_count", lambda m, t: t * m.order_count),
+    "cancel_rate": ("cancel_count", "order_count", lambda m, t: t * m.order_count / (1 - t)),
+    "profit_margin": ("promotion_cost", "revenue", lambda m, t: (PROFIT_BASE - t) * m.revenue),
+    "rating": ("rating", None, lambda m, t: t),
+    "positive_rate": ("positive_reviews", None, lambda m, t: t * m.negative_reviews / (1 - t)),
+    "negative_rate": ("negative_reviews", None, lambda m, t: t * m.positive_reviews / (1 - t)),
+    "complaint_rate": ("complaints", "order_count", lambda m, t: t * m.order_count * 30),
+    "cook_time": ("cook_time", None, lambda m, t: t),
+    "ontime_rate": ("ontime_rate", None, lambda m, t: t * 100),
+    "refund_rate": ("refund_rate", None, lambda m, t: t * 100),
+}
+
+
+def _display_factor(spec: MetricSpec) -> float:
+    """原始值 -> 展示值的倍数（与 display_values 一致，ndigits 为 None 时展示原始值）"""
+    return 1.0 if spec.ndigits is None else spec.scale
+
+
+def _level(score: float) -> str:
+    """与 ScoreEvaluator._get_level 相同的得分分档"""
+    for level, bound in zip(LEVELS, LEVEL_BOUNDS):
+        if score >= bound:
+            return level
+    return LEVELS[-1]
+
+
+class _Columns:
+    """按属性取列，让 FIELD_PARTIALS / LEVERS 中的公式同时适用于数组"""
+
+    def __init__(self, columns: Mapping[str, Any]):
+        self._columns = columns
+
+    def __getattr__(self, name: str):
+        return self._columns[name]
+
+
+# ==================== 客单价 ====================
+
+def _aov_slope(aov: float, benchmark_p50: Optional[float]) -> float:
+    """客单价得分对客单价的导数：只有比例在 0.6-0.8 时随客单价线性变化"""
+    if not benchmark_p50 or benchmark_p50 <= 0:
+        return 0.0
+    ratio = aov / benchmark_p50
+    return 50 / benchmark_p50 if 0.6 <= ratio < AOV_RATIO_BANDS[0][0] else 0.0
+
+
+def _aov_score(aov: float, benchmark_p50: Optional[float]) -> float:
+    """与 ScoreEvaluator._evaluate_aov 相同的客单价分档得分"""
+    ratio = aov / benchmark_p50 if benchmark_p50 and benchmark_p50 > 0 else 1.0
+    for bound, score in reversed(AOV_RATIO_BANDS):
+        if ratio >= bound:
+            return score
+    return max(30.0, ratio * 50)
+
+
+def _aov_target(aov: float, benchmark_p50: Optional[float]) -> Tuple[Optional[float], Optional[float]]:
+    """下一个客单价分档的 (目标客单价, 目标得分)"""
+    if not benchmark_p50 or benchmark_p50 <= 0:
+        return None, None
+    ratio = aov / benchmark_p50
+    for bound, score in AOV_RATIO_BANDS:
+        if ratio < bound:
+            return bound * benchmark_p50, score
+    return None, None
+
+
+# ==================== 结果 ====================
+
+@dataclass
+class MetricSensitivity:
+    """
+    单个指标的提分空间
+
+    "改善"对正向指标是变大，对反向指标（曝光成本、取消率、差评率等）是变小；
+    value / target / cost 均为展示单位（%、‱、元、分钟、分）。
+    """
+    name: str                               # 指标名称
+    label: str                              # 指标中文名
+    unit: str                               # 展示单位
+    value: float                            # 当前值
+    score: float                            # 当前指标得分
+    level: str                              # 当前档位 (excellent/good/fair/poor/danger)
+    weight: float                           # 指标得分每涨 1 分，总分涨多少
+    slope: float                            # 指标每改善 1 个单位，总分涨多少（当前分段内）
+    target: Optional[float] = None          # 下一个阈值分段的起点（已在最高档时为 None）
+    target_score: Optional[float] = None    # 达到目标时的指标得分
+    target_level: str = ""                  # 达到目标时的档位
+    gain: float = 0.0                       # 达到目标时总分提升
+    cost: Optional[float] = None            # 指标需要变化多少（带符号）
+    lever: str = ""                         # 杠杆字段 (ShopMetrics 字段名)
+    lever_delta: Optional[float] = None     # 杠杆字段需要变化多少（带符号，无法估算时为 None）
+    lever_gain: Optional[float] = None      # 杠杆字段变化 lever_delta 后总分实际变化（含连带指标，可能为负）
+
+    @property
+    def impact(self) -> float:
+        """按杠杆字段改善时总分的实际变化；没有杠杆估算时取 gain"""
+        return self.gain if self.lever_gain is None else self.lever_gain
+
+
+@dataclass
+class SensitivityReport:
+    """单店提分空间"""
+    shop_name: str
+    overall_score: float
+    metrics: List[MetricSensitivity] = field(default_factory=list)
+    field_slopes: Dict[str, float] = field(default_factory=dict)  # ShopMetrics 字段 -> ∂总分/∂字段
+
+    def get(self, name: str) -> Optional[MetricSensitivity]:
+        for item in self.metrics:
+            if item.name == name:
+                return item
+        return None
+
+    def ranked(self, limit: Optional[int] = None) -> List[MetricSensitivity]:
+        """按实际总分变化 (impact) 排序，只保留还能升档的指标"""
+        items = sorted((item for item in self.metrics if item.gain > 0),
+                       key=lambda item: (-item.impact, -item.gain, -item.slope))
+        return items[:limit] if limit is not None else items
+
+
+# ==================== 逐店计算 ====================
+
+def _lever_gain(metrics: ShopMetrics, lever: str, delta: float,
+                occurrences: List[Tuple[str, float, Callable[[float], float], float]]) -> float:
+    """
+    只把杠杆字段改变 delta、其余字段不变时总分的变化
+
+    重算用到该字段的全部指标（COUPLED_METRICS），其余指标得分不变。
+    occurrences 为各维度中的 (指标名, ∂总分/∂指标得分, 指标原始值 -> 得分, 当前得分)。
+    """
+    from core.calculator import quick_calculate
+
+    moved = replace(metrics, **{lever: getattr(metrics, lever) + delta})
+    calc = quick_calculate(moved)
+    total = 0.0
+    for name, weight, score_of, score in occurrences:
+        if name in COUPLED_METRICS[lever]:
+            source = METRIC_SPECS[name].source
+            total += weight * (score_of(moved.rating if source == "rating" else getattr(calc, source)) - score)
+    return total
+
+
+def sensitivity(
+    metrics: ShopMetrics,
+    calculation: Optional[CalculationResult] = None,
+    dimensions: Optional[List[DimensionScore]] = None,
+) -> SensitivityReport:
+    """
+    计算单店的提分空间
+
+    Args:
+        metrics: 原始指标
+        calculation: 计算结果（为空时现算）
+        dimensions: 维度评分（为空时现算；传入时权重和客单价基准以它为准）
+
+    Example:
+        >>> report = sensitivity(shop)
+        >>> for item in report.ranked(3):
+        ...     print(item.label, item.target, f"+{item.gain:.1f}分")
+    """
+    from core.calculator import quick_calculate
+    from core.evaluator import ScoreEvaluator
+
+    calc = calculation if calculation is not None else quick_calculate(metrics)
+    evaluator = ScoreEvaluator(metrics, calc)
+    if dimensions is None:
+        dimensions = evaluator.evaluate_all_dimensions()
+    table = ThresholdTable.from_dimension_thresholds(metrics.category, metrics.stage)
+    strategy = table.strategy
+
+    total_weight = sum(d.weight for d in dimensions)
+    # 指标 -> [∂总分/∂指标得分, ∂总分/∂指标原始值, 达到目标时的总分提升]
+    totals: Dict[str, List[float]] = {}
+    details = {}
+    targets: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+    occurrences = []
+    for dim in dimensions:
+        metric_total = sum(m.weight for m in dim.metrics)
+        if total_weight == 0 or metric_total == 0:
+            continue
+        for detail in dim.metrics:
+            spec = METRIC_SPECS[detail.name]
+            raw = metrics.rating if spec.source == "rating" else getattr(calc, spec.source)
+            weight = dim.weight / total_weight * detail.weight / metric_total
+            if detail.name == "aov":
+                derivative = _aov_slope(raw, detail.benchmark)
+                target, target_score = targets.setdefault(detail.name, _aov_target(raw, detail.benchmark))
+                score_of = lambda value, p50=detail.benchmark: _aov_score(value, p50)
+            else:
+                rule = table.by_name[f"{dim.name}.{detail.name}"]
+                derivative = strategy.slope(raw, rule.thresholds, rule.reverse)
+                if detail.name not in targets:
+                    target = strategy.next_target(raw, rule.thresholds, rule.reverse)
+                    targets[detail.name] = (target, None if target is None
+                                            else strategy.score(target, rule.thresholds, rule.reverse))
+                target, target_score = targets[detail.name]
+                score_of = lambda value, rule=rule: strategy.score(value, rule.thresholds, rule.reverse)
+            occurrences.append((detail.name, weight, score_of, detail.score))
+            entry = totals.setdefault(detail.name, [0.0, 0.0, 0.0])
+            entry[0] += weight
+            entry[1] += weight * derivative
+            if target_score is not None:
+                entry[2] += weight * (target_score - detail.score)
+            details.setdefault(detail.name, (detail, raw))
+
+    items = []
+    field_slopes: Dict[str, float] = {}
+    for name, (weight, derivative, gain) in totals.items():
+        detail, raw = details[name]
+        spec = METRIC_SPECS[name]
+        factor = _display_factor(spec)
+        target, target_score = targets[name]
+        lever, base, formula = LEVERS[name]
+        lever_delta = lever_gain = None
+        if target is not None and (base is None or getattr(metrics, base) > 0):
+            lever_delta = formula(metrics, target) - getattr(metrics, lever)
+            lever_gain = _lever_gain(metrics, lever, lever_delta, occurrences)
+        items.append(MetricSensitivity(
+            name=name,
+            label=METRIC_LABELS[name],
+            unit=spec.unit,
+            value=raw * factor,
+            score=detail.score,
+            level=_level(detail.score),
+            weight=weight,
+            slope=(-derivative if spec.is_reverse else derivative) / factor,
+            target=None if target is None else target * factor,
+            target_score=target_score,
+            target_level="" if target_score is None else _level(target_score),
+            gain=gain,
+            cost=None if target is None else (target - raw) * factor,
+            lever=lever,
+            lever_delta=lever_delta,
+            lever_gain=lever_gain,
+        ))
+        for field_name, partial in FIELD_PARTIALS[name]:
+            field_slopes[field_name] = field_slopes.get(field_name, 0.0) + derivative * partial(metrics, raw)
+
+    return SensitivityReport(
+        shop_name=metrics.name,
+        overall_score=evaluator.calculate_overall_score(dimensions),
+        metrics=items,
+        field_slopes=field_slopes,
+    )
+
+
+# ==================== 店铺组合（向量化） ====================
+
+@dataclass
+class PortfolioSensitivity:
+    """
+    店铺组合的提分空间
+
+    各字典为 指标名 -> 长度等于店铺数的数组，含义与 MetricSensitivity 同名字段相同；
+    没有目标（已在最高档）或无法估算时为 NaN。新店不考核客单价维度，相应指标 weight 为 0。
+    """
+    names: Any                                  # 店铺名称数组
+    overall: Any                                # 总体评分数组
+    value: Dict[str, Any]
+    score: Dict[str, Any]
+    weight: Dict[str, Any]
+    slope: Dict[str, Any]
+    target: Dict[str, Any]
+    target_score: Dict[str, Any]
+    gain: Dict[str, Any]
+    cost: Dict[str, Any]
+    lever_delta: Dict[str, Any]
+    lever_gain: Dict[str, Any]
+    field_slopes: Dict[str, Any]                # ShopMetrics 字段 -> ∂总分/∂字段 数组
+
+    def __len__(self) -> int:
+        return len(self.overall)
+
+    def impact(self, name: str):
+        """按杠杆字段改善时总分的实际变化（同 MetricSensitivity.impact）"""
+        return np.where(np.isnan(self.lever_gain[name]), self.gain[name], self.lever_gain[name])
+
+    def best_metric(self):
+        """每家店铺实际提分最多的指标（没有提升空间时为空字符串）"""
+        names = list(self.gain)
+        impacts = np.vstack([np.where(self.gain[name] > 0, self.impact(name), -np.inf) for name in names])
+        best = np.array(names, dtype=object)[np.argmax(impacts, axis=0)]
+        return np.where(impacts.max(axis=0) > 0, best, "")
+
+    def row(self, index: int) -> SensitivityReport:
+        """取出单家店铺的结果（与 sensitivity() 的结构相同）"""
+        def optional(values):
+            value = float(values[index])
+            return None if value != value else value
+
+        items = []
+        for name in self.score:
+            if not self.weight[name][index] > 0:
+                continue
+            score = float(self.score[name][index])
+            target_score = optional(self.target_score[name])
+            items.append(MetricSensitivity(
+                name=name,
+                label=METRIC_LABELS[name],
+                unit=METRIC_SPECS[name].unit,
+                value=float(self.value[name][index]),
+                score=score,
+                level=_level(score),
+                weight=float(self.weight[name][index]),
+                slope=float(self.slope[name][index]),
+                target=optional(self.target[name]),
+                target_score=target_score,
+                target_level="" if target_score is None else _level(target_score),
+                gain=float(self.gain[name][index]),
+                cost=optional(self.cost[name]),
+                lever=LEVERS[name][0],
+                lever_delta=optional(self.lever_delta[name]),
+                lever_gain=optional(self.lever_gain[name]),
+            ))
+        return SensitivityReport(
+            shop_name=str(self.names[index]),
+            overall_score=float(self.overall[index]),
+            metrics=items,
+            field_slopes={name: float(values[index]) for name, values in self.field_slopes.items()},
+        )
+
+
+def portfolio_sensitivity(columns: Mapping[str, Any]) -> PortfolioSensitivity:
+    """
+    对整个店铺组合计算提分空间（需要 NumPy）
+
+    Args:
+        columns: ShopMetrics 字段名 -> 数组，与 BatchScorer.score 的输入相同
+
+    Example:
+        >>> result = portfolio_sensitivity(columns_from_metrics(shops))
+        >>> result.gain["visit_conversion"]      # 各店铺入店转化率达到下一档时的总分提升
+    """
+    from core.batch import (BatchScorer, NUMERIC_FIELDS, NON_NEGATIVE_FIELDS,
+                            _column, _column_size, aov_ratio_scores)
+
+    scorer = BatchScorer()
+    scores = scorer.score(columns)
+    calc = scores.calc
+    size = _column_size(columns)
+    raw_fields = {name: _column(columns, name, size) for name in NUMERIC_FIELDS}
+    for name in NON_NEGATIVE_FIELDS:
+        raw_fields[name] = np.maximum(0, raw_fields[name])
+    fields_ = _Columns(raw_fields)
+    stages, stage_index = scorer._codes(columns, "stage", size, "growth")
+    categories, category_index = scorer._codes(columns, "category", size, "快餐简餐")
+    group_index = category_index * len(stages) + stage_index
+    benchmark_p50 = scores.benchmarks[("aov", "aov")]
+    strategy = STRATEGIES["five"]
+
+    has_aov = ~np.isnan(scores.dimension_scores["aov"])
+    present = {dim: has_aov if dim == "aov" else np.ones(size, dtype=bool) for dim, _, _ in DIMENSION_LAYOUT}
+    total_weight = sum(np.where(present[dim], scores.dimension_weights[dim], 0.0) for dim, _, _ in DIMENSION_LAYOUT)
+
+    weight: Dict[str, Any] = {}
+    derivative: Dict[str, Any] = {}
+    gain: Dict[str, Any] = {}
+    target: Dict[str, Any] = {}
+    target_score: Dict[str, Any] = {}
+    current: Dict[str, Any] = {}
+    occurrences = []   # (指标名, 权重数组, 指标原始值数组 -> 得分数组, 当前得分数组)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for dim, _, specs in DIMENSION_LAYOUT:
+            metric_total = scorer.metric_weight_totals[dim]
+            dim_factor = np.where(present[dim] & (total_weight > 0),
+                                  scores.dimension_weights[dim] / total_weight, 0.0)
+            for spec in specs:
+                raw = calc[spec.source]
+                occurrence = dim_factor * spec.weight / metric_total
+                if dim == "aov" and spec.name == "aov":
+                    ratio = np.where(benchmark_p50 > 0, raw / benchmark_p50, 1.0)
+                    slope = np.where((benchmark_p50 > 0) & (ratio >= 0.6) & (ratio < AOV_RATIO_BANDS[0][0]),
+                                     50 / benchmark_p50, 0.0)
+                    if spec.name not in target:
+                        aov_target = np.full(size, np.nan)
+                        aov_score = np.full(size, np.nan)
+                        for bound, band_score in reversed(AOV_RATIO_BANDS):
+                            below = (benchmark_p50 > 0) & (ratio < bound)
+                            aov_target = np.where(below, bound * benchmark_p50, aov_target)
+                            aov_score = np.where(below, band_score, aov_score)
+                        target[spec.name], target_score[spec.name] = aov_target, aov_score
+                        current[spec.name] = aov_ratio_scores(raw, benchmark_p50)
+                    score_of = lambda values: aov_ratio_scores(values, benchmark_p50)
+                else:
+                    thresholds = scorer._row_thresholds(dim, spec, categories, stages, group_index)
+                    compiled = STRATEGIES["five"].compile(thresholds)
+                    slope = strategy.slope_array(raw, compiled, spec.is_reverse)
+                    if spec.name not in target:
+                        metric_target = strategy.next_target_array(raw, compiled, spec.is_reverse)
+                        target[spec.name] = metric_target
+                        target_score[spec.name] = np.where(
+                            np.isnan(metric_target), np.nan,
+                            strategy.score_array(np.where(np.isnan(metric_target), raw, metric_target),
+                                                 compiled, spec.is_reverse))
+                        current[spec.name] = scores.metric_scores[dim][spec.name]
+                    score_of = lambda values, compiled=compiled, reverse=spec.is_reverse: \
+                        strategy.score_array(values, compiled, reverse)
+                occurrences.append((spec.name, occurrence, score_of,
+                                    np.nan_to_num(scores.metric_scores[dim][spec.name])))
+                weight[spec.name] = weight.get(spec.name, 0.0) + occurrence
+                derivative[spec.name] = derivative.get(spec.name, 0.0) + occurrence * slope
+                delta = np.where(np.isnan(target_score[spec.name]), 0.0,
+                                 target_score[spec.name] - current[spec.name])
+                gain[spec.name] = gain.get(spec.name, 0.0) + occurrence * delta
+
+        value, slope_out, target_out, cost, lever_delta, lever_gain = {}, {}, {}, {}, {}, {}
+        field_slopes: Dict[str, Any] = {}
+        for name in weight:
+            spec = METRIC_SPECS[name]
+            factor = _display_factor(spec)
+            raw = calc[spec.source]
+            value[name] = raw * factor
+            slope_out[name] = (-derivative[name] if spec.is_reverse else derivative[name]) / factor
+            target_out[name] = target[name] * factor
+            cost[name] = (target[name] - raw) * factor
+            lever, base, formula = LEVERS[name]
+            reachable = ~np.isnan(target[name])
+            if base is not None:
+                reachable &= getattr(fields_, base) > 0
+            required = formula(fields_, np.where(reachable, target[name], 0.0))
+            lever_delta[name] = np.where(reachable, required - getattr(fields_, lever), np.nan)
+            # 只把杠杆字段移到位、其余字段不变，重算用到它的指标
+            moved = dict(raw_fields)
+            moved[lever] = getattr(fields_, lever) + np.where(reachable, lever_delta[name], 0.0)
+            moved_calc = scorer.calculate(moved)
+            moved_gain = 0.0
+            for metric, occurrence, score_of, score in occurrences:
+                if metric in COUPLED_METRICS[lever]:
+                    new_score = np.nan_to_num(score_of(moved_calc[METRIC_SPECS[metric].source]))
+                    moved_gain = moved_gain + occurrence * (new_score - score)
+            lever_gain[name] = np.where(reachable, moved_gain, np.nan)
+            for field_name, partial in FIELD_PARTIALS[name]:
+                term = derivative[name] * partial(fields_, raw)
+                field_slopes[field_name] = field_slopes.get(field_name, 0.0) + term
+
+    names = columns.get("name")
+    return PortfolioSensitivity(
+        names=np.asarray(names, dtype=object) if names is not None else np.full(size, "", dtype=object),
+        overall=scores.overall,
+        value=value,
+        score=current,
+        weight=weight,
+        slope=slope_out,
+        target=target_out,
+        target_score=target_score,
+        gain=gain,
+        cost=cost,
+        lever_delta=lever_delta,
+        lever_gain=lever_gain,
+        field_slopes=field_slopes,
+    )
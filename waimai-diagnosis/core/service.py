@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+"""
+诊断服务模块
+HTTP 服务 (diagnosis_server.py) 背后的诊断逻辑，与 HTTP 框架无关：
+
+- 请求体按 ShopMetrics 字段规范化（数值统一为 float），规范化结果的哈希作为缓存键
+- 结果缓存 (LRU + TTL) 直接保存编码好的 JSON 字节，命中时不再评分、不再序列化
+- 并发的单店请求由 MicroBatcher 合并成一批，达到一定规模时走 BatchScorer 向量化评分；
+  批次很小时逐店走标量路径（两条路径结果逐位一致，小批量时标量更快）
+- 同一时刻相同内容的请求只计算一次
+- JSON 编码优先使用 orjson，未安装时退回标准库 json
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import fields, asdict
+from queue import Empty, SimpleQueue
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 NumPy 时全部走标量路径
+    np = None
+
+from models import ShopMetrics, DiagnosisReport, GradeLevel
+from core.calculator import quick_calculate
+from core.evaluator import ScoreEvaluator
+from core.analyzer import DiagnosisAnalyzer
+from config.thresholds import calibrated_version
+
+# 批次达到该店铺数时使用 BatchScorer 向量化评分
+VECTOR_MIN_BATCH = 48
+
+# DimensionScore.get_score_level 的等级文字（与 core.batch.LEVELS 一一对应）
+DIMENSION_LEVEL_LABELS = ("优秀", "良好", "及格", "较差", "危险")
+
+# ShopMetrics 字段分类
+TEXT_FIELDS = ("name", "platform", "category", "stage", "business_district")
+FIELD_DEFAULTS = {f.name: f.default for f in fields(ShopMetrics) if f.name != "name"}
+NUMERIC_FIELDS = tuple(name for name in FIELD_DEFAULTS if name not in TEXT_FIELDS)
+
+
+# ==================== JSON ====================
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """编码为 UTF-8 JSON 字节"""
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+else:
+    _ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any) -> bytes:
+        """编码为 UTF-8 JSON 字节"""
+        return _ENCODER.encode(obj).encode("utf-8")
+
+    loads = json.loads
+
+
+# ==================== 请求规范化 ====================
+
+def normalize_payload(payload: Any) -> Dict[str, Any]:
+    """
+    按 ShopMetrics 字段规范化请求体
+
+    未知字段忽略，缺失字段取默认值，数值统一转为 float（100 与 100.0 视为相同）。
+
+    Raises:
+        ValueError: 请求体不是对象，或数值字段无法转换
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("❌ 店铺数据应为 JSON 对象")
+    normalized: Dict[str, Any] = {"name": str(payload.get("name") or "")}
+    for name in TEXT_FIELDS[1:]:
+        value = payload.get(name)
+        normalized[name] = FIELD_DEFAULTS[name] if value in (None, "") else str(value)
+    for name in NUMERIC_FIELDS:
+        value = payload.get(name)
+        if value is None or value == "":
+            normalized[name] = None if FIELD_DEFAULTS[name] is None else float(FIELD_DEFAULTS[name])
+            continue
+        if isinstance(value, bool):
+            raise ValueError(f"❌ 字段 {name} 应为数字: {value!r}")
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"❌ 字段 {name} 应为数字: {value!r}") from None
+        if number != number or number in (float("inf"), float("-inf")):
+            raise ValueError(f"❌ 字段 {name} 应为有限数字: {value!r}")
+        normalized[name] = number
+    return normalized
+
+
+def payload_key(normalized: Dict[str, Any], detail: bool = False) -> str:
+    """
+    缓存键：规范化请求体 + 是否含行动计划 + 当前阈值版本
+
+    阈值版本变化后旧的缓存自然失效。
+    """
+    canonical = json.dumps([normalized, detail, calibrated_version()], ensure_ascii=False,
+                           separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ==================== 报告序列化 ====================
+
+def report_to_dict(report: DiagnosisReport, detail: bool = False) -> Dict[str, Any]:
+    """
+    将诊断报告转为可序列化的字典
+
+    数值统一输出为浮点数，标量路径与向量化路径的结果编码后逐字节相同。
+
+    Args:
+        report: 诊断报告
+        detail: 是否包含优先问题、行动计划和提分空间
+    """
+    data = {
+        "shop_name": report.shop_name,
+        "platform": report.platform,
+        "category": report.category,
+        "stage": report.stage,
+        "overall_score": float(report.overall_score),
+        "grade": report.grade.code,
+        "grade_label": report.grade.label,
+        "thresholds_version": calibrated_version(),
+        "dimensions": [
+            {
+                "name": dim.name,
+                "name_cn": dim.name_cn,
+                "score": float(dim.score),
+                "weight": float(dim.weight),
+                "level": dim.get_score_level(),
+                "metrics": [
+                    {
+                        "name": m.name,
+                        "value": float(m.value),
+                        "score": float(m.score),
+                        "level": m.threshold_level,
+                        "unit": m.unit,
+                        "benchmark": None if m.benchmark is None else float(m.benchmark),
+                    }
+                    for m in dim.metrics
+                ],
+            }
+            for dim in report.dimension_scores
+        ],
+    }
+    if detail:
+        data["top_issues"] = report.top_issues
+        data["action_plan"] = {priority: [asdict(item) for item in items]
+                               for priority, items in report.action_plan.items()}
+        if report.sensitivity is not None:
+            data["sensitivity"] = [asdict(item) for item in report.sensitivity.ranked()]
+    return data
+
+
+# ==================== 诊断 ====================
+
+class DiagnosisEngine:
+    """
+    批量诊断入口：一批规范化后的店铺数据 -> 一批结果字典
+
+    只需评分的店铺数达到 VECTOR_MIN_BATCH 且安装了 NumPy 时用 BatchScorer 向量化评分，
+    否则逐店走 quick_calculate + ScoreEvaluator；需要行动计划的店铺逐店评分后
+    交给 DiagnosisAnalyzer。
+    """
+
+    def __init__(self, vector_min_batch: int = VECTOR_MIN_BATCH):
+        self.vector_min_batch = vector_min_batch
+        self._scorer = None
+        self._scorer_version: Optional[str] = None
+
+    def _batch_scorer(self):
+        # BatchScorer 构造时固定阈值，阈值版本变化后重建
+        version = calibrated_version()
+        if self._scorer is None or self._scorer_version != version:
+            from core.batch import BatchScorer
+            self._scorer = BatchScorer()
+            self._scorer_version = version
+        return self._scorer
+
+    def _vector_results(self, shops: List[ShopMetrics]) -> List[Dict[str, Any]]:
+        """
+        向量化评分，直接由 BatchScores 的列拼出结果字典（与 report_to_dict 的输出相同）
+
+        不为每家店铺创建 DimensionScore / MetricDetail，否则对象构造的开销会抵消向量化的收益。
+        """
+        from core.batch import LEVELS, columns_from_metrics, metric_levels
+
+        scorer = self._batch_scorer()
+        scores = scorer.score(columns_from_metrics(shops))
+        version = calibrated_version()
+        columns = []
+        for dim, name_cn, specs in scorer.layout:
+            dim_scores = scores.dimension_scores[dim]
+            metrics = []
+            for spec in specs:
+                benchmark = scores.benchmarks.get((dim, spec.name))
+                metric_scores = scores.metric_scores[dim][spec.name]
+                metrics.append((spec.name, spec.unit, scores.metric_values(dim, spec).tolist(),
+                                metric_scores.tolist(), metric_levels(metric_scores).tolist(),
+                                None if benchmark is None else benchmark.tolist()))
+            columns.append((dim, name_cn, dim_scores.tolist(), scores.dimension_weights[dim].tolist(),
+                            metric_levels(np.nan_to_num(dim_scores)).tolist(), metrics))
+
+        results = []
+        for i, (metrics, overall) in enumerate(zip(shops, scores.overall.tolist())):
+            grade = GradeLevel.from_score(overall)
+            dimensions = []
+            for dim, name_cn, dim_scores, weights, dim_levels, metric_columns in columns:
+                if dim_scores[i] != dim_scores[i]:  # 新店没有客单价维度 (NaN)
+                    continue
+                dimensions.append({
+                    "name": dim,
+                    "name_cn": name_cn,
+                    "score": dim_scores[i],
+                    "weight": weights[i],
+                    "level": DIMENSION_LEVEL_LABELS[dim_levels[i]],
+                    "metrics": [
+                        {
+                            "name": name,
+                            "value": values[i],
+                            "score": metric_scores[i],
+                            "level": LEVELS[levels[i]],
+                            "unit": unit,
+                            "benchmark": None if benchmarks is None else benchmarks[i],
+                        }
+                        for name, unit, values, metric_scores, levels, benchmarks in metric_columns
+                    ],
+                })
+            results.append({
+                "shop_name": metrics.name,
+                "platform": metrics.platform,
+                "category": metrics.category,
+                "stage": metrics.stage,
+                "overall_score": overall,
+                "grade": grade.code,
+                "grade_label": grade.label,
+                "thresholds_version": version,
+                "dimensions": dimensions,
+            })
+        return results
+
+    @staticmethod
+    def _scalar_report(metrics: ShopMetrics) -> DiagnosisReport:
+        """逐店评分，返回只含评分的报告"""
+        evaluator = ScoreEvaluator(metrics, quick_calculate(metrics))
+        dimensions = evaluator.evaluate_all_dimensions()
+        overall = evaluator.calculate_overall_score(dimensions)
+        return DiagnosisReport(
+            shop_name=metrics.name,
+            diagnosis_date="",
+            platform=metrics.platform,
+            category=metrics.category,
+            stage=metrics.stage,
+            overall_score=overall,
+            grade=GradeLevel.from_score(overall),
+            dimension_scores=dimensions,
+        )
+
+    def diagnose(self, records: Sequence[Dict[str, Any]], details: Sequence[bool]) -> List[Dict[str, Any]]:
+        """
+        诊断一批店铺
+
+        Args:
+            records: normalize_payload() 的结果
+            details: 每家店铺是否需要优先问题和行动计划
+        """
+        shops = [ShopMetrics(**record) for record in records]
+        # 行动计划需要逐店分析，这些店铺直接走标量路径
+        scored = [i for i, detail in enumerate(details) if not detail]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(shops)
+        if np is not None and len(scored) >= self.vector_min_batch:
+            for i, result in zip(scored, self._vector_results([shops[i] for i in scored])):
+                results[i] = result
+
+        for i, (metrics, detail) in enumerate(zip(shops, details)):
+            if detail:
+                calc = quick_calculate(metrics)
+                dimensions = ScoreEvaluator(metrics, calc).evaluate_all_dimensions()
+                results[i] = report_to_dict(DiagnosisAnalyzer(metrics, calc, dimensions).analyze(), True)
+            elif results[i] is None:
+                results[i] = report_to_dict(self._scalar_report(metrics))
+        return results
+
+
+# ==================== 缓存 ====================
+
+class ResultCache:
+    """
+    LRU + TTL 结果缓存（线程安全）
+
+    值为编码好的 JSON 字节；过期条目在读取时删除，容量满时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_size: int = 100000, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: bytes):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+# ==================== 微批处理 ====================
+
+class MicroBatcher:
+    """
+    把并发提交的单条任务合并成批处理
+
+    后台线程取到第一条任务后，继续收集已排队的任务，最多再等 max_wait 秒或凑满
+    max_batch 条，然后一次调用 handler。空闲时不额外等待；负载越高批次越大。
+
+    Example:
+        >>> batcher = MicroBatcher(lambda items: [x * 2 for x in items])
+        >>> batcher.submit(21).result()
+        42
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]], max_batch: int = 256,
+                 max_wait: float = 0.0):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self._queue: SimpleQueue = SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="diagnosis-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+            try:
+                results = self.handler([item for item, _ in batch])
+            except Exception as e:  # 整批失败时每个请求都拿到同一个异常
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else None,
+            "largest_batch": self.largest,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+# ==================== 服务 ====================
+
+class DiagnosisService:
+    """
+    诊断服务：规范化 -> 查缓存 -> (合并相同的在途请求) -> 微批评分 -> 写缓存
+
+    diagnose() / diagnose_many() 返回编码好的 JSON 字节，可直接写入响应。
+    """
+
+    def __init__(self, cache_size: int = 100000, ttl: float = 300.0, max_batch: int = 256,
+                 max_wait: float = 0.0, vector_min_batch: int = VECTOR_MIN_BATCH):
+        self.engine = DiagnosisEngine(vector_min_batch)
+        self.cache = ResultCache(cache_size, ttl)
+        self.batcher = MicroBatcher(self._handle_batch, max_batch, max_wait)
+        self.started_at = time.time()
+        self.requests = 0
+        self.shops = 0
+        self.errors = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _handle_batch(self, items: List[Tuple[str, Dict[str, Any], bool]]) -> List[bytes]:
+        results = self.engine.diagnose([record for _, record, _ in items], [detail for _, _, detail in items])
+        encoded = []
+        for (key, _, _), result in zip(items, results):
+            data = dumps(result)
+            self.cache.put(key, data)
+            encoded.append(data)
+        return encoded
+
+    def _lookup(self, payload: Any, detail: bool) -> Tuple[str, Dict[str, Any], Optional[bytes]]:
+        record = normalize_payload(payload)
+        key = payload_key(record, detail)
+        return key, record, self.cache.get(key)
+
+    def diagnose(self, payload: Any, detail: bool = False, timeout: Optional[float] = 10.0) -> bytes:
+        """
+        诊断单家店铺（与其他并发请求合并成微批）
+
+        Raises:
+            ValueError: 请求体不合法
+        """
+        with self._lock:
+            self.requests += 1
+            self.shops += 1
+        key, record, cached = self._lookup(payload, detail)
+        if cached is not None:
+            return cached
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = self.batcher.submit((key, record, detail))
+        try:
+            return future.result(timeout)
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def diagnose_many(self, payloads: Sequence[Any], detail: bool = False) -> bytes:
+        """
+        批量诊断：未命中缓存的店铺在当前线程一次评分
+
+        Returns:
+            {"count": n, "results": [...]} 的 JSON 字节
+
+        Raises:
+            ValueError: 任一店铺数据不合法（消息中带序号）
+        """
+        with self._lock:
+            self.requests += 1
+            self.shops += len(payloads)
+        parts: List[Optional[bytes]] = []
+        missing: Dict[str, List[int]] = {}
+        records: Dict[str, Dict[str, Any]] = {}
+        for index, payload in enumerate(payloads):
+            try:
+                key, record, cached = self._lookup(payload, detail)
+            except ValueError as e:
+                raise ValueError(f"❌ 第 {index + 1} 家店铺: {str(e).lstrip('❌ ')}") from None
+            parts.append(cached)
+            if cached is None:
+                missing.setdefault(key, []).append(index)
+                records[key] = record
+        if missing:
+            keys = list(missing)
+            encoded = self._handle_batch([(key, records[key], detail) for key in keys])
+            for key, data in zip(keys, encoded):
+                for index in missing[key]:
+                    parts[index] = data
+        return b'{"count":' + str(len(parts)).encode() + b',"results":[' + b",".join(parts) + b"]}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uptime": round(time.time() - self.started_at, 1),
+            "requests": self.requests,
+            "shops": self.shops,
+            "errors": self.errors,
+            "cache": self.cache.stats(),
+            "batcher": self.batcher.stats(),
+            "vectorized": np is not None,
+            "json": "orjson" if orjson is not None else "json",
+            "thresholds_version": calibrated_version(),
+        }
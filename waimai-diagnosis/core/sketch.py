@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+分位数草图模块
+KLL 草图 (Karnin-Lang-Liberty)：单遍流式估算分位数，内存有界且可合并
+
+草图由若干层 compactor 组成，第 h 层的每个元素代表 2^h 个原始值。
+某层满了就排序后隔一个取一个（随机取奇数位或偶数位）推到上一层，
+因此无论输入多少条，保存的元素数都只与 k 和 log(n/k) 有关。
+两台机器各自生成的草图逐层拼接后再压缩即可合并，结果与单机处理全部数据的精度相同。
+
+k=200 时分位数的名次误差约为 1.5%。
+"""
+
+import math
+import random
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# 相邻层容量的衰减系数
+_CAPACITY_DECAY = 2 / 3
+
+
+class KLLSketch:
+    """
+    可合并的流式分位数草图
+
+    Example:
+        >>> sketch = KLLSketch(k=200)
+        >>> sketch.update_many(values)
+        >>> sketch.quantile(0.5)
+        >>> sketch.merge(KLLSketch.from_dict(other_machine_dict))
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        if k < 8:
+            raise ValueError(f"❌ KLL 草图的 k 至少为 8，当前为 {k}")
+        self.k = k
+        self.n = 0                                  # 已写入的原始值个数
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.compactors: List[List[float]] = []
+        self._size = 0                              # 当前保存的元素数
+        self._max_size = 0
+        self._rng = random.Random(seed)
+        self._cdf = None                            # (有序值, 累计权重) 缓存
+        self._grow()
+
+    def __len__(self) -> int:
+        return self.n
+
+    # ---------- 内部结构 ----------
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * _CAPACITY_DECAY ** depth)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self._max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self):
+        """压缩满了的层，直到总元素数回到容量以内"""
+        for height in range(len(self.compactors)):
+            items = self.compactors[height]
+            if len(items) < self._capacity(height):
+                continue
+            if height + 1 >= len(self.compactors):
+                self._grow()
+            items.sort()
+            # 奇数个时保留最小的一个在本层
+            start = len(items) % 2
+            offset = start + (self._rng.random() < 0.5)
+            self.compactors[height + 1].extend(items[offset::2])
+            self.compactors[height] = items[:start]
+            self._size = sum(len(c) for c in self.compactors)
+            if self._size < self._max_size:
+                break
+
+    # ---------- 写入 ----------
+
+    def update(self, value: float):
+        """写入一个值"""
+        self.compactors[0].append(value)
+        self.n += 1
+        self._size += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._cdf = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]):
+        """批量写入：按剩余容量分段 extend，比逐个 update 快得多"""
+        iterator = iter(values)
+        while True:
+            room = max(1, self._max_size - self._size)
+            chunk = list(islice(iterator, room))
+            if not chunk:
+                break
+            self.compactors[0].extend(chunk)
+            self.n += len(chunk)
+            self._size += len(chunk)
+            low, high = min(chunk), max(chunk)
+            if self.min is None or low < self.min:
+                self.min = low
+            if self.max is None or high > self.max:
+                self.max = high
+            self._cdf = None
+            while self._size >= self._max_size:
+                self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """合并另一份草图（k 必须相同）"""
+        if other.k != self.k:
+            raise ValueError(f"❌ 无法合并 k 不同的草图: {self.k} 与 {other.k}")
+        if other.n == 0:
+            return
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for height, items in enumerate(other.compactors):
+            self.compactors[height].extend(items)
+        self.n += other.n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._size = sum(len(c) for c in self.compactors)
+        self._cdf = None
+        while self._size >= self._max_size:
+            self._compress()
+
+    # ---------- 查询 ----------
+
+    def _weighted(self):
+        if self._cdf is None:
+            pairs = sorted(
+                (value, 1 << height)
+                for height, items in enumerate(self.compactors)
+                for value in items
+            )
+            values, cumulative, total = [], [], 0
+            for value, weight in pairs:
+                total += weight
+                values.append(value)
+                cumulative.append(total)
+            self._cdf = (values, cumulative)
+        return self._cdf
+
+    def quantile(self, q: float) -> Optional[float]:
+        """第 q 分位数 (0 <= q <= 1)；空草图返回 None"""
+        if self.n == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._weighted()
+        target = q * cumulative[-1]
+        for value, total in zip(values, cumulative):
+            if total >= target:
+                return value
+        return values[-1]
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        return [self.quantile(q) for q in qs]
+
+    # ---------- 序列化 ----------
+
+    def to_dict(self) -> Dict:
+        return {
+            "k": self.k,
+            "n": self.n,
+            "min": self.min,
+            "max": self.max,
+            "compactors": [list(items) for items in self.compactors],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(k=data["k"])
+        sketch.compactors = [list(items) for items in data["compactors"]] or [[]]
+        sketch.n = data["n"]
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        sketch._size = sum(len(c) for c in sketch.compactors)
+        sketch._max_size = sum(sketch._capacity(h) for h in range(len(sketch.compactors)))
+        while sketch._size >= sketch._max_size:
+            sketch._compress()
+        return sketch
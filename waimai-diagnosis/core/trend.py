@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+趋势诊断模块
+按天滚动更新每家店铺的 7 日 / 30 日累加器，计算全部 CalculationResult 指标和维度评分的
+日环比 (DoD)、周环比 (WoW)，并标记明显恶化
+
+每家店铺保存最近 30 天的按日汇总（环形数组，与 core.ingest 的槽位相同）和 7 日 / 30 日合计：
+新的一天加入当天汇总、减去滑出窗口那天的汇总，更新代价与历史长度无关。
+每 30 天用环形数组重算一次合计，消除浮点累加误差。
+"""
+
+import json
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from core.calculator import quick_calculate
+from core.evaluator import ScoreEvaluator
+from core.ingest import SHORT_WINDOW, LONG_WINDOW, SLOT_COUNT, ShopWindowAggregator, metrics_from_totals
+from models import ShopMetrics
+
+# 值越小越好的指标
+REVERSE_METRICS = {
+    "exposure_cost_per_uv", "cancel_rate", "negative_rate", "complaint_rate", "cook_time", "refund_rate",
+}
+
+# 指标 / 维度中文名
+METRIC_LABELS: Dict[str, str] = {
+    "visit_conversion_rate": "入店转化率",
+    "order_conversion_rate": "下单转化率",
+    "overall_conversion_rate": "综合转化率",
+    "exposure_cost_per_uv": "曝光成本",
+    "aov": "客单价",
+    "actual_aov": "实收客单价",
+    "cancel_rate": "取消率",
+    "total_reviews": "评价数",
+    "positive_rate": "好评率",
+    "negative_rate": "差评率",
+    "complaint_rate": "投诉率",
+    "negative_reply_rate": "差评回复率",
+    "cook_time": "出餐时间",
+    "ontime_rate": "准时率",
+    "refund_rate": "退单率",
+    "profit_margin": "毛利率",
+    "traffic": "流量健康度",
+    "conversion": "转化能力",
+    "aov_score": "客单价水平",
+    "satisfaction": "顾客满意度",
+    "efficiency": "运营效率",
+    "overall": "总体评分",
+}
+
+# 评分类的键（维度评分 + 总体评分），变化按分数差计算；其余指标按相对变化计算
+# 客单价维度与客单价指标同名，维度评分记为 aov_score
+SCORE_KEYS = {"traffic", "conversion", "aov_score", "satisfaction", "efficiency", "overall"}
+
+# 明显恶化的判定阈值
+METRIC_DROP_RATIO = {"dod": 0.25, "wow": 0.15}   # 指标相对变化
+SCORE_DROP_POINTS = {"dod": 8.0, "wow": 5.0}     # 评分下降分数
+
+PERIOD_LABELS = {"dod": "日环比", "wow": "周环比"}
+PERIOD_DAYS = {"dod": 1, "wow": SHORT_WINDOW}
+
+_EMPTY_DAY = (0.0,) * SLOT_COUNT
+
+
+@dataclass
+class TrendAlert:
+    """一项明显恶化"""
+    metric: str             # 指标 / 维度名
+    period: str             # dod / wow
+    previous: float
+    current: float
+    change: float           # 指标为相对变化，评分为分数差
+
+    @property
+    def message(self) -> str:
+        label = METRIC_LABELS.get(self.metric, self.metric)
+        if self.metric in SCORE_KEYS:
+            return f"{label}{PERIOD_LABELS[self.period]}下降 {-self.change:.1f} 分 ({self.previous:.1f} → {self.current:.1f})"
+        return f"{label}{PERIOD_LABELS[self.period]}恶化 {abs(self.change):.0%} ({self.previous:.4g} → {self.current:.4g})"
+
+
+@dataclass
+class TrendPoint:
+    """某家店铺某天的趋势诊断结果"""
+    shop_id: str
+    day: date
+    metrics: ShopMetrics                                    # 当天的滚动窗口指标
+    values: Dict[str, float]                                # CalculationResult 字段 + 维度评分 + overall
+    dod: Dict[str, float] = field(default_factory=dict)     # 日环比变化量
+    wow: Dict[str, float] = field(default_factory=dict)     # 周环比变化量
+    alerts: List[TrendAlert] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            "shop_id": self.shop_id,
+            "shop_name": self.metrics.name,
+            "day": self.day.isoformat(),
+            "overall": self.values.get("overall"),
+            "values": self.values,
+            "dod": self.dod,
+            "wow": self.wow,
+            "alerts": [dict(asdict(a), message=a.message) for a in self.alerts],
+        }
+
+
+def snapshot_values(metrics: ShopMetrics) -> Dict[str, float]:
+    """一家店铺的全部趋势值：CalculationResult 字段、各维度评分和总体评分"""
+    calc = quick_calculate(metrics)
+    evaluator = ScoreEvaluator(metrics, calc)
+    dimensions = evaluator.evaluate_all_dimensions()
+    values = {name: float(value) for name, value in vars(calc).items()}
+    for dim in dimensions:
+        values["aov_score" if dim.name == "aov" else dim.name] = dim.score
+    values["overall"] = evaluator.calculate_overall_score(dimensions)
+    return values
+
+
+def find_alerts(values: Dict[str, float], previous: Dict[str, float], period: str,
+                metric_drop: float, score_drop: float) -> List[TrendAlert]:
+    """与前一期比较，返回明显恶化的指标"""
+    alerts = []
+    for name, current in values.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        if name in SCORE_KEYS:
+            change = current - before
+            if change <= -score_drop:
+                alerts.append(TrendAlert(name, period, before, current, round(change, 1)))
+        elif before != 0:
+            change = (current - before) / abs(before)
+            worse = change if name in REVERSE_METRICS else -change
+            if worse >= metric_drop:
+                alerts.append(TrendAlert(name, period, before, current, round(change, 4)))
+    return alerts
+
+
+class ShopTrend:
+    """
+    单家店铺的滚动累加器
+
+    ring[day % 30] 保存该日的按日汇总；week / month 为最近 7 / 30 天合计；
+    history 保存最近 7 天的趋势值，用于日环比和周环比。
+    """
+
+    __slots__ = ("shop_id", "info", "first_day", "last_day", "ring", "week", "month", "history", "_pushes")
+
+    def __init__(self, shop_id: str, info: Optional[Dict[str, str]] = None):
+        self.shop_id = shop_id
+        self.info = info or {}
+        self.first_day: Optional[int] = None
+        self.last_day: Optional[int] = None
+        self.ring: List[Sequence[float]] = [_EMPTY_DAY] * LONG_WINDOW
+        self.week = [0.0] * SLOT_COUNT
+        self.month = [0.0] * SLOT_COUNT
+        self.history: deque = deque(maxlen=SHORT_WINDOW)    # (日, 趋势值)
+        self._pushes = 0
+
+    def _resync(self):
+        """按环形数组重算合计（last_day 为窗口末日）"""
+        self.month = [sum(column) for column in zip(*self.ring)]
+        recent = [self.ring[(self.last_day - offset) % LONG_WINDOW] for offset in range(SHORT_WINDOW)]
+        self.week = [sum(column) for column in zip(*recent)]
+
+    def _push(self, day: int, bucket: Sequence[float]):
+        """O(1) 加入一天：加上当天、减去 7 天前和 30 天前滑出窗口的汇总"""
+        slot = day % LONG_WINDOW
+        leaving_month = self.ring[slot]
+        leaving_week = self.ring[(day - SHORT_WINDOW) % LONG_WINDOW]
+        week, month = self.week, self.month
+        for i in range(SLOT_COUNT):
+            value = bucket[i]
+            month[i] += value - leaving_month[i]
+            week[i] += value - leaving_week[i]
+        self.ring[slot] = tuple(bucket)
+        self.last_day = day
+        self._pushes += 1
+        if self._pushes % LONG_WINDOW == 0:
+            self._resync()
+
+    def metrics(self) -> ShopMetrics:
+        """当前窗口的 ShopMetrics"""
+        span = max(1, min(SHORT_WINDOW, self.last_day - self.first_day + 1))
+        return metrics_from_totals(self.shop_id, self.info, self.week, self.month, span)
+
+    def _previous(self, day: int) -> Optional[Dict[str, float]]:
+        for history_day, values in self.history:
+            if history_day == day:
+                return values
+        return None
+
+    def advance(self, day: int, bucket: Optional[Sequence[float]] = None,
+                metric_drop: Dict[str, float] = METRIC_DROP_RATIO,
+                score_drop: Dict[str, float] = SCORE_DROP_POINTS) -> TrendPoint:
+        """
+        推进到 day（日序号），bucket 为当天汇总（None 表示当天无数据）
+
+        中间缺的日期按无数据补齐；只为最近 7 天补算趋势值，所以补齐的代价也有上限。
+        """
+        if self.last_day is not None and day <= self.last_day:
+            raise ValueError(f"❌ 店铺 {self.shop_id} 的日期必须递增: {date.fromordinal(day)} <= {date.fromordinal(self.last_day)}")
+        if self.first_day is None:
+            self.first_day = day
+            self.last_day = day - 1
+        for missing in range(max(self.last_day + 1, day - LONG_WINDOW), day):
+            self._push(missing, _EMPTY_DAY)
+            if missing >= day - SHORT_WINDOW:
+                self.history.append((missing, snapshot_values(self.metrics())))
+        self._push(day, bucket or _EMPTY_DAY)
+
+        metrics = self.metrics()
+        values = snapshot_values(metrics)
+        point = TrendPoint(self.shop_id, date.fromordinal(day), metrics, values)
+        for period in ("dod", "wow"):
+            previous = self._previous(day - PERIOD_DAYS[period])
+            if previous is None:
+                continue
+            setattr(point, period, {name: round(value - previous[name], 6)
+                                    for name, value in values.items() if name in previous})
+            point.alerts.extend(find_alerts(values, previous, period, metric_drop[period], score_drop[period]))
+        self.history.append((day, values))
+        return point
+
+    def to_dict(self) -> Dict:
+        return {
+            "info": self.info,
+            "first_day": self.first_day,
+            "last_day": self.last_day,
+            "ring": [list(bucket) for bucket in self.ring],
+            "history": [[day, values] for day, values in self.history],
+        }
+
+    @classmethod
+    def from_dict(cls, shop_id: str, data: Dict) -> "ShopTrend":
+        trend = cls(shop_id, data.get("info"))
+        trend.first_day = data["first_day"]
+        trend.last_day = data["last_day"]
+        trend.ring = [tuple(bucket) for bucket in data["ring"]]
+        trend.history.extend((day, values) for day, values in data["history"])
+        if trend.last_day is not None:
+            trend._resync()
+        return trend
+
+
+class TrendTracker:
+    """
+    店铺组合的趋势跟踪器
+
+    Example:
+        >>> tracker = TrendTracker.load("trend_state.json")        # 首次运行时为空
+        >>> points = tracker.ingest_day(aggregator, date(2026, 10, 18))
+        >>> for point in points:
+        ...     for alert in point.alerts:
+        ...         print(point.metrics.name, alert.message)
+        >>> tracker.save("trend_state.json")
+    """
+
+    STATE_SCHEMA = 1
+
+    def __init__(self, metric_drop: Optional[Dict[str, float]] = None,
+                 score_drop: Optional[Dict[str, float]] = None):
+        self.metric_drop = dict(METRIC_DROP_RATIO, **(metric_drop or {}))
+        self.score_drop = dict(SCORE_DROP_POINTS, **(score_drop or {}))
+        self.shops: Dict[str, ShopTrend] = {}
+        self.last_day: Optional[int] = None
+
+    def update_day(self, day: date, buckets: Dict[str, Sequence[float]],
+                   shop_info: Optional[Dict[str, Dict[str, str]]] = None) -> List[TrendPoint]:
+        """
+        推进一天
+
+        Args:
+            day: 日期
+            buckets: 店铺ID -> 当天汇总 (core.ingest 的槽位)；已跟踪但当天没有数据的店铺按无数据处理
+            shop_info: 店铺ID -> 店铺信息（名称、品类、阶段等，可选）
+        """
+        ordinal = day.toordinal()
+        if self.last_day is not None and ordinal <= self.last_day:
+            raise ValueError(f"❌ 日期必须递增: {day} <= {date.fromordinal(self.last_day)}")
+        shop_info = shop_info or {}
+        points = []
+        for shop_id in sorted(set(self.shops) | set(buckets)):
+            trend = self.shops.get(shop_id)
+            if trend is None:
+                trend = self.shops[shop_id] = ShopTrend(shop_id)
+            if shop_id in shop_info:
+                trend.info = shop_info[shop_id]
+            points.append(trend.advance(ordinal, buckets.get(shop_id), self.metric_drop, self.score_drop))
+        self.last_day = ordinal
+        return points
+
+    def ingest_day(self, aggregator: ShopWindowAggregator, day: date) -> List[TrendPoint]:
+        """
+        用导入器中的按日汇总推进到 day
+
+        上次推进之后、day 之前的日期会依次补上；返回 day 当天的结果。
+        首次运行时从导入器窗口内最早有数据的一天开始。
+        """
+        end = day.toordinal()
+        if self.last_day is not None:
+            if end <= self.last_day:
+                raise ValueError(f"❌ 趋势状态已更新到 {date.fromordinal(self.last_day)}，不能再推进到 {day}")
+            start = self.last_day + 1
+        else:
+            seen = [d for shop_days in aggregator.days.values() for d in shop_days]
+            start = min(seen) if seen else end
+        # 超过 30 天的空档不必逐日推进，ShopTrend.advance 会补齐
+        start = max(start, end - LONG_WINDOW + 1)
+        points: List[TrendPoint] = []
+        for ordinal in range(start, end + 1):
+            buckets = {shop_id: shop_days[ordinal] for shop_id, shop_days in aggregator.days.items()
+                       if ordinal in shop_days}
+            points = self.update_day(date.fromordinal(ordinal), buckets, aggregator.shops)
+        return points
+
+    # ---------- 状态文件 ----------
+
+    def save(self, path: str):
+        data = {
+            "schema": self.STATE_SCHEMA,
+            "last_day": self.last_day,
+            "metric_drop": self.metric_drop,
+            "score_drop": self.score_drop,
+            "shops": {shop_id: trend.to_dict() for shop_id, trend in self.shops.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "TrendTracker":
+        """读取状态文件；文件不存在时返回空的跟踪器"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(**kwargs)
+        if data.get("schema") != cls.STATE_SCHEMA:
+            raise ValueError(f"❌ 不支持的趋势状态文件版本: {data.get('schema')}")
+        tracker = cls(kwargs.get("metric_drop") or data.get("metric_drop"),
+                      kwargs.get("score_drop") or data.get("score_drop"))
+        tracker.last_day = data["last_day"]
+        tracker.shops = {shop_id: ShopTrend.from_dict(shop_id, shop) for shop_id, shop in data["shops"].items()}
+        return tracker
+
+
+def iter_alerts(points: Iterable[TrendPoint]) -> Iterable[TrendPoint]:
+    """只保留有明显恶化的店铺，按恶化项数从多到少"""
+    return sorted((p for p in points if p.alerts), key=lambda p: -len(p.alerts))
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+诊断 HTTP 服务
+在诊断引擎外包一层 JSON 接口，供 test.html 和商家端 App 调用（零依赖，基于标准库 http.server）
+
+接口:
+    POST /diagnose[?detail=1]          单店诊断，请求体为 ShopMetrics 字段组成的 JSON 对象
+    POST /diagnose/batch[?detail=1]    批量诊断，请求体为 {"shops": [...]} 或 [...]
+    GET  /health                       健康检查
+    GET  /stats                        缓存命中率、微批大小等统计
+
+detail=1 时结果附带优先问题 (top_issues)、行动计划 (action_plan) 和提分空间 (sensitivity)。
+
+使用方法:
+    python3 diagnosis_server.py serve --port 8600
+    curl -s localhost:8600/diagnose -d '{"name": "测试店", "exposure_uv": 1000, "visit_uv": 100, "order_uv": 20, "order_count": 22, "revenue": 600}'
+
+    # 压测（不指定 --url 时自动在子进程启动服务）
+    python3 diagnosis_server.py loadtest -n 5000 -c 32
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from core.service import DiagnosisService, dumps, loads
+
+DEFAULT_PORT = 8600
+MAX_BODY = 16 * 1024 * 1024    # 请求体上限（字节）
+MAX_BATCH_SHOPS = 10000        # /diagnose/batch 单次店铺数上限
+
+
+# ==================== HTTP 服务 ====================
+
+class DiagnosisHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128    # 默认 5，并发建连时会被拒绝
+
+
+class DiagnosisHandler(BaseHTTPRequestHandler):
+    server_version = "WaimaiDiagnosis/1.0"
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，开着 Nagle 算法会与客户端的延迟 ACK 叠加出约 40ms 延迟
+    disable_nagle_algorithm = True
+
+    @property
+    def service(self) -> DiagnosisService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def _send(self, status: int, data: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str):
+        self.service.errors += 1
+        self._send(status, dumps({"error": message}))
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # 不知道请求体在哪结束，读下去会一直等到客户端断开；回 400 后关闭连接
+            self.close_connection = True
+            raise ValueError("❌ Content-Length 无效")
+        if length > MAX_BODY:
+            raise OverflowError(f"❌ 请求体过大 ({length} 字节，上限 {MAX_BODY})")
+        try:
+            return loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise ValueError("❌ 请求体不是合法的 JSON") from None
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            stats = self.service.stats()
+            self._send(200, dumps({"status": "ok", "vectorized": stats["vectorized"],
+                                   "thresholds_version": stats["thresholds_version"]}))
+        elif path == "/stats":
+            self._send(200, dumps(self.service.stats()))
+        else:
+            self._send_error(404, f"❌ 未知接口: {path}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        detail = parse_qs(url.query).get("detail", ["0"])[0].lower() in ("1", "true", "yes")
+        if url.path not in ("/diagnose", "/diagnose/batch"):
+            # 未读取的请求体会污染长连接上的下一个请求
+            self.close_connection = True
+            self._send_error(404, f"❌ 未知接口: {url.path}")
+            return
+        try:
+            payload = self._read_body()
+        except OverflowError as e:
+            self.close_connection = True
+            self._send_error(413, str(e))
+            return
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+
+        try:
+            if url.path == "/diagnose":
+                data = self.service.diagnose(payload, detail)
+            else:
+                shops = payload.get("shops") if isinstance(payload, dict) else payload
+                if not isinstance(shops, list):
+                    raise ValueError('❌ 请求体应为 {"shops": [...]} 或店铺数组')
+                if len(shops) > MAX_BATCH_SHOPS:
+                    self._send_error(413, f"❌ 单次最多诊断 {MAX_BATCH_SHOPS} 家店铺，收到 {len(shops)} 家")
+                    return
+                data = self.service.diagnose_many(shops, detail)
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+        except Exception as e:
+            self._send_error(500, f"❌ 诊断失败: {e}")
+            return
+        self._send(200, data)
+
+
+class DiagnosisServer:
+    """
+    在后台线程中运行的诊断服务
+
+    用法:
+        with DiagnosisServer(port=0) as server:
+            print(server.base_url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, verbose: bool = False, **options):
+        self.httpd = DiagnosisHTTPServer((host, port), DiagnosisHandler)
+        self.httpd.service = DiagnosisService(**options)
+        self.httpd.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def service(self) -> DiagnosisService:
+        return self.httpd.service
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "DiagnosisServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+# ==================== 压测 ====================
+
+def random_shop(rng: random.Random, index: int) -> Dict:
+    """随机生成一家店铺的指标"""
+    exposure = rng.randint(500, 20000)
+    visit = int(exposure * rng.uniform(0.05, 0.25))
+    order_uv = int(visit * rng.uniform(0.1, 0.4))
+    orders = max(1, int(order_uv * rng.uniform(1.0, 1.2)))
+    return {
+        "name": f"压测店铺{index}",
+        "category": rng.choice(["快餐简餐", "正餐", "饮品甜品", "夜宵烧烤"]),
+        "stage": rng.choice(["new", "growth", "mature"]),
+        "exposure_uv": exposure,
+        "visit_uv": visit,
+        "order_uv": order_uv,
+        "order_count": orders,
+        "revenue": round(orders * rng.uniform(15, 60), 2),
+        "promotion_cost": round(rng.uniform(0, 300), 2),
+        "cancel_count": rng.randint(0, max(1, orders // 20)),
+        "positive_reviews": rng.randint(0, 300),
+        "negative_reviews": rng.randint(0, 30),
+        "complaints": rng.randint(0, 5),
+        "rating": round(rng.uniform(3.8, 5.0), 1),
+        "cook_time": round(rng.uniform(5, 25), 1),
+        "ontime_rate": round(rng.uniform(85, 100), 1),
+        "refund_rate": round(rng.uniform(0, 5), 1),
+    }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _wait_ready(host: str, port: int, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_loadtest(args) -> int:
+    """多个长连接并发请求 /diagnose，统计吞吐和延迟分位数"""
+    process = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", str(port)],
+                                   stdout=subprocess.DEVNULL)
+    try:
+        _wait_ready(host, port)
+        rng = random.Random(args.seed)
+        distinct = max(1, int(args.requests * args.unique))
+        pool = [dumps(random_shop(rng, i)) for i in range(distinct)]
+        bodies = [pool[i % distinct] for i in range(args.requests)]
+        rng.shuffle(bodies)
+        path = "/diagnose?detail=1" if args.detail else "/diagnose"
+
+        latencies: List[float] = []
+        failures = [0]
+        lock = threading.Lock()
+        interval = args.concurrency / args.rate if args.rate else 0.0
+
+        def worker(worker_id: int):
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            local = []
+            next_at = time.perf_counter() + rng.random() * interval
+            for body in bodies[worker_id::args.concurrency]:
+                if interval:
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_at += interval
+                started = time.perf_counter()
+                try:
+                    conn.request("POST", path, body, {"Content-Type": "application/json"})
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except OSError:
+                    conn.close()
+                    ok = False
+                local.append(time.perf_counter() - started)
+                if not ok:
+                    with lock:
+                        failures[0] += 1
+            conn.close()
+            with lock:
+                latencies.extend(local)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/stats")
+        stats = json.loads(conn.getresponse().read())
+        conn.close()
+
+        latencies.sort()
+        print(f"📊 {len(latencies)} 个请求，{args.concurrency} 并发，不同店铺 {distinct} 家，用时 {elapsed:.2f} 秒")
+        print(f"   吞吐: {len(latencies) / elapsed:.0f} 请求/秒，失败 {failures[0]} 个")
+        print("   延迟: " + "  ".join(f"{name} {_percentile(latencies, q) * 1000:.2f}ms" for name, q in
+                                     (("p50", 0.50), ("p90", 0.90), ("p99", 0.99), ("max", 1.0))))
+        cache, batcher = stats["cache"], stats["batcher"]
+        print(f"   缓存命中率: {cache['hit_rate']}，平均批大小: {batcher['avg_batch']}，"
+              f"最大批: {batcher['largest_batch']}，JSON: {stats['json']}")
+        return 1 if failures[0] else 0
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description='外卖店铺诊断 HTTP 服务')
+    sub = parser.add_subparsers(dest='command')
+
+    serve = sub.add_parser('serve', help='启动服务')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--cache-size', type=int, default=100000, help='缓存条目数上限 (0 表示不缓存)')
+    serve.add_argument('--ttl', type=float, default=300.0, help='缓存有效期（秒）')
+    serve.add_argument('--max-batch', type=int, default=256, help='微批最大店铺数')
+    serve.add_argument('--max-wait-ms', type=float, default=0.0, help='微批最长等待（毫秒），0 表示只合并已排队的请求')
+    serve.add_argument('--verbose', '-v', action='store_true', help='打印每个请求')
+
+    loadtest = sub.add_parser('loadtest', help='压测 /diagnose')
+    loadtest.add_argument('--url', type=str, help='已启动的服务地址 (默认在子进程启动)')
+    loadtest.add_argument('--port', type=int, default=DEFAULT_PORT + 1, help='子进程服务端口')
+    loadtest.add_argument('--requests', '-n', type=int, default=5000, help='请求总数')
+    loadtest.add_argument('--concurrency', '-c', type=int, default=32, help='并发连接数')
+    loadtest.add_argument('--rate', type=float, default=0, help='总请求速率上限 (请求/秒，0 表示不限)')
+    loadtest.add_argument('--unique', type=float, default=0.5, help='不同店铺数占请求数的比例')
+    loadtest.add_argument('--detail', action='store_true', help='请求行动计划 (detail=1)')
+    loadtest.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = DiagnosisServer(args.host, args.port, args.verbose, cache_size=args.cache_size,
+                                 ttl=args.ttl, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+        stats = server.service.stats()
+        print(f"🚀 诊断服务已启动: {server.base_url}")
+        print(f"   向量化评分: {'开启' if stats['vectorized'] else '未安装 NumPy，逐店评分'}，"
+              f"JSON: {stats['json']}，阈值版本: {stats['thresholds_version'] or '默认'}")
+        print(f"   试一试: curl -s {server.base_url}/diagnose -d '{{\"name\": \"测试店\", \"exposure_uv\": 1000}}'\n")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            stats = server.service.stats()
+            print(f"\n📊 请求 {stats['requests']} 个，缓存命中率 {stats['cache']['hit_rate']}，"
+                  f"平均批大小 {stats['batcher']['avg_batch']}")
+    elif args.command == 'loadtest':
+        sys.exit(run_loadtest(args))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平台导出数据导入工具
+读取订单 / 流量 / 评价明细 CSV，按店铺聚合近 7 日日均和近 30 日累计，
+输出可直接诊断的 ShopMetrics (JSONL，每行一家店铺)，替代手工在表格中汇总
+
+使用方法:
+    python3 ingest_exports.py --orders orders_*.csv --traffic traffic.csv --reviews reviews.csv \\
+        --shops shops.csv --as-of 2026-10-18 -o shop_metrics.jsonl
+
+    # 同时批量评分（需要 NumPy）
+    python3 ingest_exports.py --orders orders.csv --traffic traffic.csv --reviews reviews.csv \\
+        -o shop_metrics.jsonl --scores scores.jsonl
+
+输出的 JSONL 也可以直接作为 calibrate_thresholds.py 的输入。
+"""
+
+import sys
+import json
+import time
+import argparse
+from dataclasses import asdict
+from datetime import date
+
+from core.ingest import ingest_exports
+from models import GradeLevel
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='从平台导出明细生成店铺指标')
+    parser.add_argument('--orders', nargs='+', default=[], help='订单明细 CSV')
+    parser.add_argument('--traffic', nargs='+', default=[], help='流量明细 CSV')
+    parser.add_argument('--reviews', nargs='+', default=[], help='评价明细 CSV')
+    parser.add_argument('--shops', type=str, help='店铺信息 CSV (名称、品类、阶段、商圈)')
+    parser.add_argument('--as-of', type=str, help='窗口截止日 YYYY-MM-DD (默认取数据中最晚日期)')
+    parser.add_argument('-o', '--output', type=str, default='shop_metrics.jsonl', help='输出 ShopMetrics JSONL')
+    parser.add_argument('--scores', type=str, help='同时批量评分并输出结果 JSONL')
+
+    args = parser.parse_args()
+
+    if not (args.orders or args.traffic or args.reviews):
+        parser.print_help()
+        print("\n💡 提示: 至少指定 --orders / --traffic / --reviews 之一")
+        return
+
+    as_of = date.fromisoformat(args.as_of) if args.as_of else None
+    started = time.time()
+    try:
+        aggregator = ingest_exports(args.orders, args.traffic, args.reviews, shops=args.shops, as_of=as_of)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    shops = list(aggregator.to_metrics())
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for metrics in shops:
+            f.write(json.dumps(asdict(metrics), ensure_ascii=False) + "\n")
+
+    elapsed = time.time() - started
+    print(f"✅ 导入完成: {aggregator.rows} 行明细 → {len(shops)} 家店铺 "
+          f"(截止 {aggregator.as_of_date}，用时 {elapsed:.1f} 秒，{aggregator.rows / max(elapsed, 1e-9):.0f} 行/秒)")
+    if aggregator.skipped:
+        print(f"⚠️ 跳过 {aggregator.skipped} 行 (窗口外或格式错误)")
+        for error in aggregator.errors[:5]:
+            print(f"   {error}")
+    print(f"📄 店铺指标已保存到: {args.output}")
+
+    if args.scores:
+        from core.batch import score_shops
+
+        scores = score_shops(shops)
+        with open(args.scores, 'w', encoding='utf-8') as f:
+            for i, metrics in enumerate(shops):
+                row = scores.row(i)
+                row["grade"] = GradeLevel.from_score(row["overall_score"]).code
+                f.write(json.dumps(dict(shop_name=metrics.name, **row), ensure_ascii=False) + "\n")
+        print(f"📊 评分结果已保存到: {args.scores}")
+
+
+if __name__ == "__main__":
+    main()
@@ -137,6 +137,7 @@ class MetricDetail:
     benchmark: Optional[float] = None # 行业基准值
     unit: str = ""                    # 单位
     description: str = ""             # 指标说明
+    percentile: Optional[float] = None  # 同类店铺中的百分位 (0-100，越高越好)
 
 
 @dataclass
@@ -184,6 +185,7 @@ class ActionItem:
     expected_effect: str                # 预期效果
     time_estimate: str                  # 预计耗时
     dimension: str = ""                 # 关联维度
+    score_gain: float = 0.0             # 相关指标达到下一档时总分提升
 
 
 @dataclass
@@ -208,6 +210,7 @@ class DiagnosisReport:
     # ==================== 诊断结果 ====================
     top_issues: List[Dict[str, Any]] = field(default_factory=list)   # 优先处理问题
     action_plan: Dict[str, List[ActionItem]] = field(default_factory=dict)  # 行动计划
+    sensitivity: Optional[Any] = None                   # 提分空间 (core.sensitivity.SensitivityReport)
     
     # ==================== 原始数据引用 ====================
     raw_metrics: Optional[ShopMetrics] = None           # 原始指标数据
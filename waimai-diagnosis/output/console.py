@@ -90,6 +90,10 @@ class ConsoleRenderer:
         if report.top_issues:
             lines.append(self._render_top_issues(report))
         
+        # 提分空间
+        if report.sensitivity is not None and report.sensitivity.ranked():
+            lines.append(self._render_sensitivity(report))
+        
         # 行动计划
         if report.action_plan:
             lines.append(self._render_action_plan(report))
@@ -223,6 +227,8 @@ class ConsoleRenderer:
         level_str = self._get_level_str(metric.score)
         
         line = f"    {name:12s} {value_str:10s} {score_color}●{metric.score:.0f}分{self.c.RESET} {self.c.DIM}{level_str}{self.c.RESET}"
+        if metric.percentile is not None:
+            line += f" {self.c.DIM}同类P{metric.percentile:.0f}{self.c.RESET}"
         return line
     
     def _render_score_bar(self, score: float, width: int = 20) -> str:
@@ -272,6 +278,28 @@ class ConsoleRenderer:
         
         return "\n".join(lines)
     
+    def _render_sensitivity(self, report: DiagnosisReport, limit: int = 5) -> str:
+        """渲染提分空间：各指标达到下一档的总分提升、当前斜率，以及只调杠杆字段时的实际变化"""
+        from core.sensitivity import FIELD_LABELS
+        
+        lines = [f"\n{self.c.BOLD}📐 提分空间{self.c.RESET} {self.c.DIM}(单项指标达到下一档的总分提升，按只调杠杆字段时的实际变化排序){self.c.RESET}"]
+        
+        for item in report.sensitivity.ranked(limit):
+            digits = 2 if item.unit in ("元", "分", "‱") else 1
+            lines.append(
+                f"    {item.label:10s} {item.value:.{digits}f}{item.unit} → {item.target:.{digits}f}{item.unit}"
+                f"  {self.c.BRIGHT_GREEN}总分 +{item.gain:.1f}{self.c.RESET}"
+                f"  {self.c.DIM}每改善1{item.unit} +{item.slope:.2f}分{self.c.RESET}"
+            )
+            if item.lever_delta is not None:
+                # 杠杆字段还会带动其他指标，给出只改它时总分的实际变化
+                lever = FIELD_LABELS.get(item.lever, item.lever)
+                color = self.c.BRIGHT_GREEN if item.lever_gain > 0 else self.c.BRIGHT_RED
+                lines.append(f"      {self.c.DIM}只调 {lever} {item.lever_delta:+.{digits}f}:{self.c.RESET}"
+                             f" {color}总分实际 {item.lever_gain:+.1f}{self.c.RESET}")
+        
+        return "\n".join(lines)
+    
     def _render_action_plan(self, report: DiagnosisReport) -> str:
         """渲染行动计划"""
         lines = [f"\n{self.c.BOLD}📋 行动计划{self.c.RESET}"]
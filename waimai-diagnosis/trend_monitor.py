@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+店铺趋势监控工具
+每晚读取当天的订单 / 流量 / 评价明细，滚动更新每家店铺的 7 日 / 30 日窗口，
+输出各指标和维度评分的日环比、周环比，并列出明显恶化的店铺
+
+状态保存在 --state 文件中，每次只处理新增的明细，耗时与历史长度无关。
+首次运行时可以传入最近 30 天的明细，从最早一天开始逐日补算。
+
+使用方法:
+    python3 trend_monitor.py --state trend_state.json --day 2026-10-18 \\
+        --orders orders_1018.csv --traffic traffic_1018.csv --reviews reviews_1018.csv \\
+        --shops shops.csv -o trend_1018.jsonl
+"""
+
+import sys
+import json
+import time
+import argparse
+from datetime import date
+
+from core.ingest import ingest_exports
+from core.trend import TrendTracker, iter_alerts
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='店铺趋势监控 (日环比 / 周环比)')
+    parser.add_argument('--state', type=str, default='trend_state.json', help='趋势状态文件')
+    parser.add_argument('--day', type=str, help='推进到的日期 YYYY-MM-DD (默认取明细中最晚日期)')
+    parser.add_argument('--orders', nargs='+', default=[], help='订单明细 CSV')
+    parser.add_argument('--traffic', nargs='+', default=[], help='流量明细 CSV')
+    parser.add_argument('--reviews', nargs='+', default=[], help='评价明细 CSV')
+    parser.add_argument('--shops', type=str, help='店铺信息 CSV')
+    parser.add_argument('-o', '--output', type=str, help='输出当天趋势结果 JSONL')
+    parser.add_argument('--top', type=int, default=10, help='打印恶化最多的店铺数')
+
+    args = parser.parse_args()
+
+    started = time.time()
+    day = date.fromisoformat(args.day) if args.day else None
+    try:
+        aggregator = ingest_exports(args.orders, args.traffic, args.reviews, shops=args.shops, as_of=day)
+        day = day or aggregator.as_of_date
+        if day is None:
+            print("❌ 明细中没有数据，请指定 --day 或明细文件")
+            sys.exit(1)
+        tracker = TrendTracker.load(args.state)
+        points = tracker.ingest_day(aggregator, day)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    tracker.save(args.state)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for point in points:
+                f.write(json.dumps(point.to_dict(), ensure_ascii=False) + "\n")
+
+    flagged = iter_alerts(points)
+    print(f"✅ {day} 趋势更新完成: {len(points)} 家店铺，{len(flagged)} 家出现明显恶化 "
+          f"(用时 {time.time() - started:.1f} 秒)")
+    for point in flagged[:args.top]:
+        print(f"\n⚠️ {point.metrics.name} (总体评分 {point.values['overall']:.1f})")
+        for alert in point.alerts:
+            print(f"   - {alert.message}")
+    if args.output:
+        print(f"\n📄 趋势结果已保存到: {args.output}")
+    print(f"💾 状态已保存到: {args.state}")
+
+
+if __name__ == "__main__":
+    main()
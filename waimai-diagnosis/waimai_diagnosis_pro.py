@@ -7,10 +7,18 @@
 使用方法:
     python waimai_diagnosis_pro.py --input data.json
     python waimai_diagnosis_pro.py --demo
+    python waimai_diagnosis_pro.py --batch shops.jsonl --workers 8 --output results.jsonl --reports reports/
 """
 
+import os
+import re
+import sys
+import csv
+import time
 import json
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, asdict, field
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
@@ -666,6 +674,187 @@ class ReportGenerator:
         return json.dumps(report, ensure_ascii=False, indent=2)
 
 
+# ==================== 批量诊断 ====================
+
+BATCH_INFO_FIELDS = ("shop_name", "category", "district", "period")
+
+
+def _shop_info(data: Dict) -> Dict:
+    """与 --input 相同的店铺信息默认值"""
+    return {
+        "shop_name": data.get("shop_name", "未命名店铺"),
+        "category": data.get("category", "未指定品类"),
+        "district": data.get("district", "未指定区域"),
+        "period": data.get("period", "未指定")
+    }
+
+
+def iter_batch_records(path: str, fmt: str = "auto"):
+    """
+    逐条读取批量输入，不把整个文件读进内存
+
+    - JSONL: 每行一个与 --input 相同结构的对象；没有 metrics 字段时取顶层的指标ID
+    - CSV: 表头为 shop_name/category/district/period 和指标ID，空单元格视为缺失
+
+    Yields:
+        (行号, 记录) ；无法解析的行记录为 {"error": ...}
+    """
+    if fmt == "auto":
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    stream = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8-sig', newline='')
+    try:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(stream), 2):
+                metrics = {}
+                try:
+                    for key, value in row.items():
+                        if key in METRIC_CONFIGS and value not in (None, ""):
+                            metrics[key] = float(value)
+                except ValueError as e:
+                    yield line_no, {"error": f"数值格式错误: {e}"}
+                    continue
+                record = {k: row[k] for k in BATCH_INFO_FIELDS if row.get(k)}
+                record["metrics"] = metrics
+                yield line_no, record
+        else:
+            for line_no, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {"error": f"JSON 解析失败: {e.msg}"}
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, {"error": "每行应为一个 JSON 对象"}
+                    continue
+                if "metrics" not in record:
+                    record = dict(record, metrics={k: v for k, v in record.items() if k in METRIC_CONFIGS})
+                elif not isinstance(record["metrics"], (dict, type(None))):
+                    yield line_no, {"error": "metrics 应为 {指标ID: 数值} 对象"}
+                    continue
+                yield line_no, record
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _report_filename(line_no: int, shop_name: str) -> str:
+    safe = re.sub(r'[\\/:*?"<>|\s]+', "_", shop_name).strip("_")[:40] or "shop"
+    return f"{line_no:07d}_{safe}.txt"
+
+
+def diagnose_record(line_no: int, record: Dict, report_dir: Optional[str] = None) -> Dict:
+    """诊断一条批量记录，返回可写入 JSONL 的结果"""
+    if "error" in record:
+        return {"line": line_no, "error": record["error"]}
+    shop_info = _shop_info(record)
+    try:
+        metrics = {k: float(v) for k, v in (record.get("metrics") or {}).items()}
+        result = DiagnosisEngine.diagnose(metrics)
+    except (AttributeError, TypeError, ValueError, ZeroDivisionError) as e:
+        return {"line": line_no, "shop_name": shop_info["shop_name"], "error": str(e)}
+
+    output = {
+        "line": line_no,
+        **shop_info,
+        "overall_score": result["overall_score"],
+        "grade": result["grade"],
+        "grade_desc": result["grade_desc"],
+        "downgrade_reason": result["downgrade_reason"],
+        "category_scores": {cat: data["score"] for cat, data in result["category_scores"].items()},
+        "metric_scores": {m.metric_id: m.score for m in result["metrics_detail"]},
+        "problems": [{"metric_id": p["metric_id"], "severity": p["severity"], "gap": p["gap"]}
+                     for p in result["problems"]],
+    }
+    if report_dir:
+        path = os.path.join(report_dir, _report_filename(line_no, shop_info["shop_name"]))
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(ReportGenerator(result, shop_info).generate_text_report())
+            output["report"] = path
+        except OSError as e:
+            # 诊断结果照常输出，只把这一条记为失败
+            output["error"] = f"报告写入失败: {e}"
+    return output
+
+
+def diagnose_chunk(chunk: List[Tuple[int, Dict]], report_dir: Optional[str] = None) -> Tuple[List[str], int]:
+    """在工作进程中诊断一批记录，直接返回序列化好的 JSONL 行和失败条数"""
+    lines = []
+    errors = 0
+    for line_no, record in chunk:
+        output = diagnose_record(line_no, record, report_dir)
+        errors += "error" in output
+        lines.append(json.dumps(output, ensure_ascii=False))
+    return lines, errors
+
+
+def _chunked(records, size: int):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(input_path: str, output_path: str, workers: int = 1, report_dir: Optional[str] = None,
+              fmt: str = "auto", chunk_size: int = 200) -> Dict[str, float]:
+    """
+    流式批量诊断
+
+    输入按块分发给进程池，同时在途的块数有上限（workers × 2），
+    因此内存占用与输入文件大小无关；结果按输入顺序写出。
+
+    Returns:
+        统计信息 {shops, errors, seconds}
+    """
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+
+    stats = {"shops": 0, "errors": 0, "seconds": 0.0}
+    start = time.time()
+    last_progress = 0.0
+
+    def write(chunk_result: Tuple[List[str], int]):
+        nonlocal last_progress
+        lines, errors = chunk_result
+        out.writelines(line + "\n" for line in lines)
+        stats["shops"] += len(lines)
+        stats["errors"] += errors
+        now = time.time()
+        if now - last_progress >= 0.5:
+            last_progress = now
+            rate = stats["shops"] / max(now - start, 1e-9)
+            print(f"\r⏳ 已诊断 {stats['shops']:,} 家店铺 | {rate:,.0f} 家/秒 | 失败 {stats['errors']}",
+                  end="", flush=True)
+
+    chunks = _chunked(iter_batch_records(input_path, fmt), chunk_size)
+    with open(output_path, 'w', encoding='utf-8') as out:
+        if workers <= 1:
+            for chunk in chunks:
+                write(diagnose_chunk(chunk, report_dir))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(diagnose_chunk, chunk, report_dir))
+                    while len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+
+    stats["seconds"] = time.time() - start
+    rate = stats["shops"] / max(stats["seconds"], 1e-9)
+    print(f"\r✅ 批量诊断完成: {stats['shops']:,} 家店铺，用时 {stats['seconds']:.1f} 秒 "
+          f"({rate:,.0f} 家/秒)，失败 {stats['errors']} 条")
+    return stats
+
+
 def demo():
     """运行演示"""
     print("🚀 外卖店铺智能诊断模型 (PRD完整版) - 演示模式\n")
@@ -739,12 +928,23 @@ def main():
     parser = argparse.ArgumentParser(description='外卖店铺智能诊断模型 (PRD版)')
     parser.add_argument('--demo', action='store_true', help='运行演示模式')
     parser.add_argument('--input', type=str, help='输入JSON文件路径')
-    parser.add_argument('--output', type=str, default='report_prd.txt', help='输出报告文件路径')
+    parser.add_argument('--output', type=str,
+                        help='输出路径 (单店: 报告文件，默认 report_prd.txt；批量: 结果 JSONL，默认 diagnosis_results.jsonl)')
+    parser.add_argument('--batch', type=str, help='批量输入文件 (JSONL 或 CSV，- 表示标准输入)')
+    parser.add_argument('--format', choices=['auto', 'jsonl', 'csv'], default='auto', help='批量输入格式')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='批量诊断进程数')
+    parser.add_argument('--reports', type=str, help='批量模式下逐店铺文本报告的输出目录')
+    parser.add_argument('--chunk-size', type=int, default=200, help='每个任务块的店铺数')
     
     args = parser.parse_args()
     
     if args.demo:
         demo()
+    elif args.batch:
+        output = args.output or 'diagnosis_results.jsonl'
+        run_batch(args.batch, output, workers=args.workers, report_dir=args.reports,
+                  fmt=args.format, chunk_size=args.chunk_size)
+        print(f"📄 结果已保存到: {output}")
     elif args.input:
         # 从文件读取数据
         with open(args.input, 'r', encoding='utf-8') as f:
@@ -765,10 +965,11 @@ def main():
         generator = ReportGenerator(result, shop_info)
         report = generator.generate_text_report()
         
-        with open(args.output, 'w', encoding='utf-8') as f:
+        output = args.output or 'report_prd.txt'
+        with open(output, 'w', encoding='utf-8') as f:
             f.write(report)
         
-        print(f"✅ 诊断完成！报告已保存到: {args.output}")
+        print(f"✅ 诊断完成！报告已保存到: {output}")
         print(f"\n综合评分: {result['overall_score']} 分 ({result['grade_emoji']} {result['grade']}级 - {result['grade_desc']})")
         
         # 打印各维度得分
@@ -785,6 +986,7 @@ def main():
         parser.print_help()
         print("\n💡 提示: 使用 --demo 参数运行演示模式")
         print("💡 提示: 使用 --input 参数指定数据文件")
+        print("💡 提示: 使用 --batch 参数批量诊断 JSONL/CSV 店铺列表")
 
 
 if __name__ == "__main__":
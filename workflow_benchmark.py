@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Workflow Benchmark - 工作流 A/B 基准测试
+在固定任务集上运行多个预设工作流，对比耗时、Token 消耗和最终结果
+
+使用方法:
+    python3 workflow_benchmark.py --mock
+    python3 workflow_benchmark.py --cassette run.jsonl --replay --timing fast
+    python3 workflow_benchmark.py -w quad_basic,mvp_fast --tasks tasks.json
+"""
+
+import io
+import json
+import time
+import random
+import argparse
+import contextlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from dataclasses import dataclass, field, asdict
+
+from extended_roles import EXTENDED_ROLES, WORKFLOWS
+from quad_brain_extended import ExtendedAgenticSystem, WorkflowResult, MODEL
+from llm_cassette import Cassette, CassetteSession
+from llm_telemetry import OutputLengthStats, set_output_stats
+import run_trace
+from run_budget import RunBudget, add_budget_arguments, budget_from_args
+
+# ============== 默认任务集 ==============
+
+DEFAULT_TASKS = [
+    "写一个 Python 函数，计算斐波那契数列第 n 项",
+    "实现一个带过期时间的 LRU 缓存",
+    "写一个命令行 TODO 列表工具，支持增删改查",
+    "实现一个简单的 URL 短链服务 API",
+    "写一个解析 CSV 并按列统计的脚本",
+]
+
+# 各角色的 verdict 标记（与 quad_brain_extended.parse_verdict 对应）
+VERDICT_LINES = {
+    "REVIEWER": ("**VERDICT: PASS**", "**VERDICT: FAIL**"),
+    "TESTER": ("**TEST VERDICT: PASS**", "**TEST VERDICT: NEEDS_FIX**"),
+    "SECURITY": ("**SECURITY VERDICT: SECURE**", "**SECURITY VERDICT: NEEDS_FIX**"),
+}
+
+
+# ============== 模拟网关 ==============
+
+class MockResponse:
+    """模拟 requests.Response 的最小接口"""
+
+    def __init__(self, data: Dict, status_code: int = 200):
+        self.status_code = status_code
+        self._data = data
+        self.text = json.dumps(data, ensure_ascii=False)
+
+    def json(self) -> Dict:
+        return self._data
+
+
+class MockGateway:
+    """
+    模拟 OpenClaw Gateway
+
+    可直接替换 ExtendedAgenticSystem.session，按角色返回确定性的回复，
+    审查类角色按 fail_rate 随机给出 FAIL（随机种子固定，结果可复现）。
+
+    每次调用的随机数由 (种子, 任务, 角色, 该角色第几次调用) 决定：run_benchmark 在每次
+    运行前调用 reseed(任务)，不同工作流在同一任务上得到相同的失败/长度序列，A/B 对比才公平。
+    """
+
+    def __init__(self, fail_rate: float = 0.3, latency_scale: float = 0.0, seed: int = 42):
+        self.fail_rate = fail_rate
+        self.latency_scale = latency_scale
+        self.seed = seed
+        self.headers: Dict[str, str] = {}
+        self._task_key = ""
+        self._role_calls: Dict[str, int] = {}
+        self._prompt_roles = {
+            info["system_prompt"]: role_id for role_id, info in EXTENDED_ROLES.items()
+        }
+
+    def reseed(self, task_key: str):
+        """开始一次新的运行：按任务重置随机序列"""
+        self._task_key = task_key
+        self._role_calls = {}
+
+    def post(self, url: str, json: Dict = None, timeout: float = None, **kwargs) -> MockResponse:
+        messages = json["messages"]
+        role_id = self._prompt_roles.get(messages[0]["content"], "DEV")
+        prompt = messages[-1]["content"]
+
+        call_index = self._role_calls.get(role_id, 0)
+        self._role_calls[role_id] = call_index + 1
+        rng = random.Random(f"{self.seed}|{self._task_key}|{role_id}|{call_index}")
+
+        content = f"[{role_id}] 针对任务的模拟输出。\n" + "要点说明。" * rng.randint(20, 120)
+        if role_id in VERDICT_LINES:
+            passed, failed = VERDICT_LINES[role_id]
+            content += "\n" + (failed if rng.random() < self.fail_rate else passed)
+
+        prompt_tokens = len(prompt) // 2 + len(messages[0]["content"]) // 2
+        completion_tokens = len(content) // 2
+        if self.latency_scale > 0:
+            # 粗略模拟生成耗时：每 100 token 约 1 秒
+            time.sleep(completion_tokens / 100 * self.latency_scale)
+
+        return MockResponse({
+            "choices": [{"message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+# ============== 数据类 ==============
+
+@dataclass
+class RunMetrics:
+    """单次（工作流 × 任务）运行的指标"""
+    workflow_id: str
+    task: str
+    wall_time: float
+    critical_path_time: float
+    total_tokens: int
+    tokens_per_role: Dict[str, int]
+    attempts_per_role: Dict[str, int]
+    loops: int
+    final_verdict: str
+    budget_stopped: bool = False
+
+
+@dataclass
+class WorkflowSummary:
+    """单个工作流在整个任务集上的汇总"""
+    workflow_id: str
+    workflow_name: str
+    runs: int
+    pass_rate: float
+    avg_wall_time: float
+    avg_critical_path_time: float
+    avg_tokens: float
+    avg_loops: float
+    pass_per_1k_tokens: float
+    pass_per_minute: float
+    tokens_per_role: Dict[str, float] = field(default_factory=dict)
+    budget_stopped: int = 0  # 因预算耗尽提前结束的运行数（不算通过，但也不是审查失败）
+
+
+# ============== 指标计算 ==============
+
+def critical_path_seconds(result: WorkflowResult) -> float:
+    """
+    计算关键路径耗时（秒）
+
+    顺序步骤的 LLM 耗时相加，并行组只取组内最慢的角色，
+    即假设并行组真正并发执行时的理论耗时（不含节流 sleep）。
+    """
+    step_role_latency: Dict[int, Dict[str, int]] = {}
+    for role_id, outputs in result.outputs.items():
+        for output in outputs:
+            per_role = step_role_latency.setdefault(output.step, {})
+            per_role[role_id] = per_role.get(role_id, 0) + (output.latency_ms or 0)
+
+    return sum(max(per_role.values()) for per_role in step_role_latency.values()) / 1000
+
+
+def collect_metrics(workflow_id: str, result: WorkflowResult) -> RunMetrics:
+    """从 WorkflowResult 提取基准指标"""
+    tokens_per_role = {
+        role_id: sum(o.tokens_used or 0 for o in outputs)
+        for role_id, outputs in result.outputs.items()
+    }
+    attempts_per_role = {
+        role_id: len(outputs) for role_id, outputs in result.outputs.items()
+    }
+    loops = sum(
+        1 for outputs in result.outputs.values() for o in outputs if o.attempt > 1
+    )
+
+    return RunMetrics(
+        workflow_id=workflow_id,
+        task=result.task,
+        wall_time=round(result.total_time, 3),
+        critical_path_time=round(critical_path_seconds(result), 3),
+        total_tokens=sum(tokens_per_role.values()),
+        tokens_per_role=tokens_per_role,
+        attempts_per_role=attempts_per_role,
+        loops=loops,
+        final_verdict=result.final_verdict,
+        budget_stopped=bool(result.budget and result.budget.get("stopped"))
+    )
+
+
+def summarize(workflow_id: str, runs: List[RunMetrics]) -> WorkflowSummary:
+    """汇总单个工作流的多次运行"""
+    n = len(runs)
+    passes = sum(1 for r in runs if r.final_verdict == "PASS")
+    total_tokens = sum(r.total_tokens for r in runs)
+    total_wall = sum(r.wall_time for r in runs)
+
+    role_totals: Dict[str, int] = {}
+    for r in runs:
+        for role_id, tokens in r.tokens_per_role.items():
+            role_totals[role_id] = role_totals.get(role_id, 0) + tokens
+
+    return WorkflowSummary(
+        workflow_id=workflow_id,
+        workflow_name=WORKFLOWS[workflow_id]["name"],
+        runs=n,
+        pass_rate=round(passes / n, 3) if n else 0.0,
+        avg_wall_time=round(total_wall / n, 2) if n else 0.0,
+        avg_critical_path_time=round(sum(r.critical_path_time for r in runs) / n, 2) if n else 0.0,
+        avg_tokens=round(total_tokens / n, 1) if n else 0.0,
+        avg_loops=round(sum(r.loops for r in runs) / n, 2) if n else 0.0,
+        pass_per_1k_tokens=round(passes / total_tokens * 1000, 3) if total_tokens else 0.0,
+        pass_per_minute=round(passes / total_wall * 60, 3) if total_wall else 0.0,
+        tokens_per_role={k: round(v / n, 1) for k, v in role_totals.items()} if n else {},
+        budget_stopped=sum(1 for r in runs if r.budget_stopped)
+    )
+
+
+# ============== 基准运行 ==============
+
+def load_tasks(path: Optional[str]) -> List[str]:
+    """
+    加载任务集
+
+    支持 JSON（字符串列表或 {"task": ...} 对象列表）和纯文本（每行一个任务）
+    """
+    if not path:
+        return list(DEFAULT_TASKS)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+            return [item["task"] if isinstance(item, dict) else str(item) for item in data]
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def run_benchmark(workflow_ids: List[str], tasks: List[str], model: str = MODEL,
+                  gateway=None, cassette: Optional[Cassette] = None,
+                  verbose: bool = False,
+                  budget_factory: Optional[Callable[[], Optional[RunBudget]]] = None
+                  ) -> Dict[str, List[RunMetrics]]:
+    """
+    在任务集上依次运行各个工作流
+
+    Args:
+        workflow_ids: 工作流ID列表
+        tasks: 任务列表
+        model: 模型名称
+        gateway: 替换 HTTP session 的网关对象（如 MockGateway），None 表示真实网关
+        cassette: 录制/回放磁带，录制时包装 gateway，回放时不访问网关
+        verbose: 是否输出工作流自身的日志
+        budget_factory: 为每次运行创建独立预算的函数，None 表示不限制
+
+    模拟网关和磁带回放不经过真实模型，每次运行换用不落盘的独立统计实例，
+    既不把零延迟/合成样本写进真实统计文件，也不让前一个工作流的样本影响后一个。
+
+    Returns:
+        {workflow_id: [RunMetrics, ...]}
+    """
+    all_runs: Dict[str, List[RunMetrics]] = {wf_id: [] for wf_id in workflow_ids}
+    offline = gateway is not None or (cassette is not None and cassette.mode == "replay")
+    saved_stats = set_output_stats(None) if offline else None
+
+    try:
+        for wf_id in workflow_ids:
+            for i, task in enumerate(tasks, 1):
+                all_runs[wf_id].append(_run_one(wf_id, i, task, len(tasks), model, gateway,
+                                                cassette, verbose, budget_factory, offline))
+    finally:
+        if offline:
+            set_output_stats(saved_stats)
+
+    return all_runs
+
+
+def _run_one(wf_id: str, index: int, task: str, total: int, model: str, gateway,
+             cassette: Optional[Cassette], verbose: bool,
+             budget_factory: Optional[Callable[[], Optional[RunBudget]]],
+             offline: bool) -> RunMetrics:
+    """运行一次 (工作流 × 任务)"""
+    if offline:
+        set_output_stats(OutputLengthStats(None))
+    if hasattr(gateway, "reseed"):
+        gateway.reseed(f"{index}|{task}")
+
+    system = ExtendedAgenticSystem(model=model)
+    if gateway is not None:
+        system.session = gateway
+    if cassette is not None:
+        system.session = CassetteSession(cassette, system.session)
+
+    budget = budget_factory() if budget_factory else None
+    print(f"  ▶ {wf_id} [{index}/{total}] {task[:40]}")
+    if verbose:
+        result = system.run_workflow(task, wf_id, use_discord=False, budget=budget)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = system.run_workflow(task, wf_id, use_discord=False, budget=budget)
+
+    metrics = collect_metrics(wf_id, result)
+    verdict = f"{metrics.final_verdict}（预算中止）" if metrics.budget_stopped else metrics.final_verdict
+    print(f"    {verdict}  墙钟 {metrics.wall_time:.1f}s  "
+          f"关键路径 {metrics.critical_path_time:.1f}s  Token {metrics.total_tokens:,}")
+    return metrics
+
+
+def format_table(summaries: List[WorkflowSummary]) -> str:
+    """生成对比表格（Markdown）"""
+    lines = [
+        "| 工作流 | 运行 | 通过率 | 预算中止 | 平均墙钟(s) | 关键路径(s) | 平均Token | 平均重试 | PASS/千Token | PASS/分钟 |",
+        "|--------|-----:|-------:|---------:|------------:|------------:|----------:|---------:|-------------:|----------:|",
+    ]
+    for s in summaries:
+        lines.append(
+            f"| {s.workflow_id} | {s.runs} | {s.pass_rate:.0%} | {s.budget_stopped} | {s.avg_wall_time:.1f} | "
+            f"{s.avg_critical_path_time:.1f} | {s.avg_tokens:,.0f} | {s.avg_loops:.2f} | "
+            f"{s.pass_per_1k_tokens:.3f} | {s.pass_per_minute:.3f} |"
+        )
+    return "\n".join(lines)
+
+
+def save_results(all_runs: Dict[str, List[RunMetrics]], summaries: List[WorkflowSummary],
+                 model: str, filename: Optional[str] = None) -> str:
+    """保存 JSON 结果"""
+    if filename is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"workflow_benchmark_{timestamp}.json"
+
+    data = {
+        "model": model,
+        "timestamp": datetime.now().isoformat(),
+        "summaries": [asdict(s) for s in summaries],
+        "runs": {wf_id: [asdict(r) for r in runs] for wf_id, runs in all_runs.items()},
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    return filename
+
+
+# ============== 主入口 ==============
+
+def main():
+    parser = argparse.ArgumentParser(description='工作流 A/B 基准测试')
+    parser.add_argument('--workflows', '-w', default=",".join(WORKFLOWS.keys()),
+                       help='逗号分隔的工作流ID (默认: 全部)')
+    parser.add_argument('--tasks', '-t', help='任务集文件 (.json 或 .txt)，默认使用内置任务集')
+    parser.add_argument('--model', '-m', default=MODEL, help='模型')
+    parser.add_argument('--mock', action='store_true', help='使用模拟网关（不消耗 Token）')
+    parser.add_argument('--mock-fail-rate', type=float, default=0.3, help='模拟审查失败概率')
+    parser.add_argument('--mock-latency', type=float, default=0.0,
+                       help='模拟延迟倍率 (0 = 不等待)')
+    parser.add_argument('--seed', type=int, default=42, help='模拟网关随机种子')
+    parser.add_argument('--cassette', help='录制/回放磁带文件 (JSONL)')
+    parser.add_argument('--replay', action='store_true', help='从磁带回放而不是录制')
+    parser.add_argument('--timing', default='recorded',
+                       help='回放节奏: recorded / fast / 延迟倍率 (默认: recorded)')
+    parser.add_argument('--output', '-o', help='JSON 结果输出路径')
+    parser.add_argument('--verbose', '-v', action='store_true', help='显示工作流详细输出')
+    parser.add_argument('--trace', action='store_true',
+                       help='每次运行都输出时间线 trace（默认关闭，避免批量运行产生大量文件）')
+    add_budget_arguments(parser)
+
+    args = parser.parse_args()
+
+    workflow_ids = [w.strip() for w in args.workflows.split(",") if w.strip()]
+    unknown = [w for w in workflow_ids if w not in WORKFLOWS]
+    if unknown:
+        parser.error(f"未知工作流: {', '.join(unknown)}")
+
+    tasks = load_tasks(args.tasks)
+    if not args.trace:
+        run_trace.TRACE_DIR = "off"
+    gateway = None
+    if args.mock:
+        gateway = MockGateway(args.mock_fail_rate, args.mock_latency, args.seed)
+
+    cassette = None
+    if args.cassette:
+        mode = "replay" if args.replay else "record"
+        cassette = Cassette(args.cassette, mode=mode, timing=args.timing)
+
+    gateway_desc = "模拟" if gateway else "真实"
+    if cassette:
+        gateway_desc = f"磁带回放 ({args.cassette})" if args.replay else f"{gateway_desc} + 录制 ({args.cassette})"
+
+    print(f"🏁 工作流基准测试: {len(workflow_ids)} 个工作流 × {len(tasks)} 个任务")
+    print(f"   模型: {args.model}  网关: {gateway_desc}\n")
+
+    all_runs = run_benchmark(workflow_ids, tasks, args.model, gateway, cassette, args.verbose,
+                             budget_factory=lambda: budget_from_args(args))
+    summaries = [summarize(wf_id, runs) for wf_id, runs in all_runs.items()]
+
+    print("\n" + format_table(summaries))
+    filename = save_results(all_runs, summaries, args.model, args.output)
+    print(f"\n📄 结果已保存: {filename}")
+
+
+if __name__ == "__main__":
+    main()